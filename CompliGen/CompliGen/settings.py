@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
 from pathlib import Path
+from corsheaders.defaults import default_headers
 from decouple import config
 from dotenv import load_dotenv
 load_dotenv()
@@ -90,6 +91,10 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173",
 ]
 
+# request headers of the generation endpoints, and the response headers the forms read
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key", "x-request-id", "x-generation-priority")
+CORS_EXPOSE_HEADERS = ["Retry-After", "Idempotent-Replayed"]
+
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
@@ -142,15 +147,71 @@ USE_TZ = True
 
 STATIC_URL = "static/"
 
+# LLM / embedding prices in USD per 1M tokens, used to estimate the cost
+# stored with each GenerationUsage record
+LLM_PRICING = {
+    "gemini-2.0-flash": {"input": 0.10, "output": 0.40},
+    "gemini-2.0-flash-lite": {"input": 0.075, "output": 0.30},
+    "text-embedding-3-small": {"input": 0.02, "output": 0.0},
+}
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Admission control for the generation endpoints (policy_generator/admission.py)
+# - *_concurrency: generations that may run at once per customer / company / in total
+# - bulk_share: fraction of the global slots that bulk requests may use, the
+#   rest is kept free for interactive users
+# - burst / refill_per_minute: token bucket for starting generations per customer
+# - lease_seconds: a slot not released within this time is considered dead
+GENERATION_ADMISSION = {
+    "customer_concurrency": 2,
+    "company_concurrency": 5,
+    "global_concurrency": 20,
+    "bulk_share": 0.5,
+    "burst": 6,
+    "refill_per_minute": 2,
+    "lease_seconds": 300,
+}
+
+# Idempotency keys and deduplication of generation POSTs (policy_generator/idempotency.py)
+# - key_ttl_seconds: how long the response of a request with an Idempotency-Key is replayed
+# - coalesce_seconds: how long the outcome of a request without one is kept for its duplicates
+# - poll_seconds: how often a duplicate on another worker checks for the outcome
+GENERATION_IDEMPOTENCY = {
+    "key_ttl_seconds": 24 * 60 * 60,
+    "coalesce_seconds": 15,
+    "poll_seconds": 0.5,
+}
+
+# Rendered PDF/DOCX exports (policy_generator/export.py), shared by all workers;
+# the least recently downloaded files are deleted past EXPORT_CACHE_MAX_BYTES
+EXPORT_CACHE_DIR = config('EXPORT_CACHE_DIR', default=str(BASE_DIR / 'export_cache'))
+EXPORT_CACHE_MAX_BYTES = config('EXPORT_CACHE_MAX_BYTES', default=256 * 1024 * 1024, cast=int)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# emails are sent by the outbox worker (python manage.py send_outbox, see authentication/outbox.py);
+# EMAIL_BACKEND=django.core.mail.backends.console.EmailBackend (or .filebased, writing to
+# EMAIL_FILE_PATH) sends nothing in development; tests use Django's locmem backend
+EMAIL_BACKEND = config('EMAIL_BACKEND', default="django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = config('GMAIL')
 EMAIL_HOST_PASSWORD = config('GMAIL_PASSWORD')  # Use an App Password, not your real Gmail password
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
+
+# Transactional email outbox (authentication/outbox.py)
+EMAIL_OUTBOX = {
+    "batch_size": 50,
+    "lease_seconds": 5 * 60,
+    "retry_seconds": 30,
+    "max_retry_seconds": 60 * 60,
+    "max_attempts": 8,
+    "poll_seconds": 2,
+    # at least VERIFICATION_MAX_AGE: the unverified account purge reads sent verification emails
+    "keep_sent_seconds": 24 * 60 * 60,
+}
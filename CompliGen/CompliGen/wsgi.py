@@ -14,3 +14,13 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CompliGen.settings")
 
 application = get_wsgi_application()
+
+# import the LLM/vector SDKs and create the retrieval clients in the
+# background, so the first generation does not wait for them (RAG_WARM_UP=false
+# to skip)
+if os.environ.get("RAG_WARM_UP", "true").lower() in ("1", "true", "yes"):
+    import threading
+
+    from policy_generator.rag.warmup import warm_up
+
+    threading.Thread(target=warm_up, name="rag-warm-up", daemon=True).start()
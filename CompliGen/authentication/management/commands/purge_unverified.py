@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from authentication.purge import DEFAULT_BATCH_SIZE, PurgeError, expired_customers, purge
+
+# tables the login and verification lookups read, vacuumed with --vacuum
+VACUUM_TABLES = ("auth_user", "authentication_customer")
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the accounts that were not verified before their verification link expired, "
+        "in batches of set-based deletes, and report the rows deleted and the throughput. "
+        "Meant to run on a schedule, e.g. hourly from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Accounts deleted per transaction")
+        parser.add_argument("--max-batches", type=int, help="Stop after this many batches")
+        parser.add_argument("--dry-run", action="store_true", help="Only count the expired accounts")
+        parser.add_argument(
+            "--vacuum", action="store_true", help=f"VACUUM ANALYZE {', '.join(VACUUM_TABLES)} afterwards"
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+        if options["dry_run"]:
+            self.stdout.write(f"{expired_customers().count()} expired unverified accounts")
+            return
+
+        def report(number, deleted, seconds):
+            users = deleted.get("auth.User", 0)
+            self.stdout.write(
+                f"batch {number}: {users} accounts, {sum(deleted.values())} rows in {seconds * 1000:.0f} ms"
+            )
+
+        try:
+            totals, seconds = purge(options["batch_size"], options["max_batches"], on_batch=report)
+        except PurgeError as error:
+            raise CommandError(str(error))
+
+        users = totals.get("auth.User", 0)
+        rate = users / seconds if seconds else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {users} unverified accounts ({sum(totals.values())} rows) in {seconds:.2f} s, {rate:.0f} accounts/s"
+        ))
+        for label, count in sorted(totals.items()):
+            self.stdout.write(f"  {count:8d}  {label}")
+
+        if options["vacuum"] and users:
+            # VACUUM cannot run in a transaction; management commands run in autocommit
+            with connection.cursor() as cursor:
+                for table in VACUUM_TABLES:
+                    cursor.execute(f"VACUUM ANALYZE {connection.ops.quote_name(table)}")
+            self.stdout.write(f"Vacuumed {', '.join(VACUUM_TABLES)}")
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from authentication.outbox import drain, get_settings, prune_sent
+
+
+class Command(BaseCommand):
+    help = (
+        "Send the verification and password reset emails in the outbox, in batches over one SMTP "
+        "connection, retrying failures. Runs until stopped; --once drains the outbox and exits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Send what is due, then exit")
+        parser.add_argument("--batch-size", type=int, help="Emails per SMTP connection (EMAIL_OUTBOX batch_size)")
+
+    def handle(self, *args, **options):
+        poll_seconds = get_settings()["poll_seconds"]
+        while True:
+            sent, failed = drain(options["batch_size"])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed")
+            pruned = prune_sent()
+            if pruned:
+                self.stdout.write(f"Deleted {pruned} sent emails")
+            if options["once"]:
+                return
+            # a long-running worker: drop connections the database has closed meanwhile
+            close_old_connections()
+            time.sleep(poll_seconds)
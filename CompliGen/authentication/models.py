@@ -11,13 +11,67 @@ class Company(models.Model):
     name = models.CharField(max_length=255)
     industry = models.CharField(max_length=255)
 
+# how long a verification link is valid, in seconds
+VERIFICATION_MAX_AGE = 60 * 60 * 24
+
 # the Customer model
 # one to one relationbship with the user and one to many with the company 
 # there can be multiple roles within the company
 # send email and if the user is not verified within 24 hrs the user will be deleted
+# (python manage.py purge_unverified, see purge.py)
 class Customer(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
     role = models.CharField(max_length=255)
     company = models.ForeignKey(Company, on_delete=models.CASCADE)
     verified = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # the purge's candidates: only the unverified customers, with the user to join the join date on
+            models.Index(fields=["user"], condition=models.Q(verified=False), name="customer_unverified_idx"),
+        ]
+
+
+
+# emails waiting to be sent by the outbox worker (python manage.py send_outbox)
+# written in the transaction that changed the user, so a request never waits on SMTP
+class OutboxEmail(models.Model):
+    VERIFICATION = "verification"
+    PASSWORD_RESET = "password_reset"
+    KINDS = [
+        (VERIFICATION, "Email verification"),
+        (PASSWORD_RESET, "Password reset"),
+    ]
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+    STATES = [
+        (PENDING, "Pending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="outbox_emails")
+    kind = models.CharField(max_length=20, choices=KINDS)
+    to = models.EmailField(max_length=254)
+    from_email = models.CharField(max_length=254)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+
+    state = models.CharField(max_length=10, choices=STATES, default=PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # when the worker may (re)try; a worker that claims the email moves it past its lease
+    next_attempt_at = models.DateTimeField()
+    last_error = models.TextField(blank=True, default="")
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "next_attempt_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} to {self.to} ({self.state})"
@@ -0,0 +1,174 @@
+"""
+Transactional email outbox.
+
+Registration, resending the verification email and password reset used to
+call send_mail() inside the request, so they waited on the SMTP handshake
+with Gmail and failed when it was slow. They now only add an OutboxEmail row,
+in the same transaction as the user change: the email exists exactly when
+the change was committed, and the request does not depend on the mail
+provider.
+
+A worker (python manage.py send_outbox) drains the outbox:
+
+    - claim_batch() takes up to batch_size due emails with SELECT ... FOR
+      UPDATE SKIP LOCKED, so several workers never take the same email, and
+      moves them past a lease; an email of a worker that died is due again
+      once the lease runs out.
+    - send_batch() sends them over one SMTP connection, opened once per
+      batch instead of once per email.
+    - a failed email is retried after retry_seconds, doubling per attempt,
+      and marked failed after max_attempts.
+
+Sent emails are deleted after keep_sent_seconds; their links hold tokens.
+It is never shorter than VERIFICATION_MAX_AGE: the purge of unverified
+accounts (purge.py) takes a sent verification email as a link that may
+still be valid, so it must not be pruned while the link is.
+"""
+
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from .models import VERIFICATION_MAX_AGE, OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # emails sent per SMTP connection
+    "batch_size": 50,
+    # how long a claimed email is left to its worker before it is due again
+    "lease_seconds": 5 * 60,
+    # first retry delay, doubled after every failed attempt (capped at max_retry_seconds)
+    "retry_seconds": 30,
+    "max_retry_seconds": 60 * 60,
+    "max_attempts": 8,
+    # how long the worker sleeps when the outbox is empty
+    "poll_seconds": 2,
+    "keep_sent_seconds": 24 * 60 * 60,
+}
+
+
+def get_settings():
+    options = {**DEFAULT_SETTINGS, **getattr(settings, "EMAIL_OUTBOX", {})}
+    options["keep_sent_seconds"] = max(options["keep_sent_seconds"], VERIFICATION_MAX_AGE)
+    return options
+
+
+def enqueue(user, kind, subject, body, from_email=None):
+    """
+    Add an email to the outbox; call it inside the transaction of the user change.
+
+    Returns:
+        OutboxEmail: The pending email
+    """
+    return OutboxEmail.objects.create(
+        user=user,
+        kind=kind,
+        to=user.email,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        subject=subject,
+        body=body,
+        next_attempt_at=timezone.now(),
+    )
+
+
+def claim_batch(batch_size=None):
+    """
+    Take the emails that are due, oldest first, for this worker.
+
+    Returns:
+        list[OutboxEmail]: Up to batch_size emails, leased to the caller
+    """
+    options = get_settings()
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(state=OutboxEmail.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at", "id")[:batch_size or options["batch_size"]]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                next_attempt_at=now + timedelta(seconds=options["lease_seconds"])
+            )
+    return emails
+
+
+def _failed(email, error, options):
+    email.attempts += 1
+    email.last_error = str(error)[:2000] or error.__class__.__name__
+    if email.attempts >= options["max_attempts"]:
+        email.state = OutboxEmail.FAILED
+        logger.error(f"Giving up on outbox email {email.id} ({email.kind}) after {email.attempts} attempts: {error}")
+    else:
+        delay = min(options["retry_seconds"] * 2 ** (email.attempts - 1), options["max_retry_seconds"])
+        email.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        logger.warning(f"Outbox email {email.id} ({email.kind}) failed, retrying in {delay}s: {error}")
+    email.save(update_fields=["attempts", "last_error", "state", "next_attempt_at"])
+
+
+def send_batch(emails):
+    """
+    Send claimed emails over one connection and record the outcome of each.
+
+    Returns:
+        (int, int): Emails sent and emails that failed
+    """
+    options = get_settings()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as error:
+        # the server cannot be reached: every email of the batch is retried later
+        for email in emails:
+            _failed(email, error, options)
+        return 0, len(emails)
+
+    sent = 0
+    try:
+        for email in emails:
+            message = EmailMessage(email.subject, email.body, email.from_email, [email.to], connection=connection)
+            try:
+                message.send()
+            except Exception as error:
+                _failed(email, error, options)
+                # the connection may be broken; the next email opens a new one
+                connection.close()
+                try:
+                    connection.open()
+                except Exception:
+                    pass
+                continue
+            email.state = OutboxEmail.SENT
+            email.attempts += 1
+            email.sent_at = timezone.now()
+            email.save(update_fields=["state", "attempts", "sent_at"])
+            sent += 1
+    finally:
+        connection.close()
+    return sent, len(emails) - sent
+
+
+def prune_sent():
+    """Delete sent emails older than keep_sent_seconds."""
+    cutoff = timezone.now() - timedelta(seconds=get_settings()["keep_sent_seconds"])
+    return OutboxEmail.objects.filter(state=OutboxEmail.SENT, sent_at__lt=cutoff).delete()[0]
+
+
+def drain(batch_size=None):
+    """
+    Send every email that is due, batch by batch.
+
+    Returns:
+        (int, int): Emails sent and emails that failed
+    """
+    sent = failed = 0
+    while emails := claim_batch(batch_size):
+        batch_sent, batch_failed = send_batch(emails)
+        sent += batch_sent
+        failed += batch_failed
+    return sent, failed
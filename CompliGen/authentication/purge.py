@@ -0,0 +1,138 @@
+"""
+Purge of accounts that were never verified.
+
+A verification link is valid for VERIFICATION_MAX_AGE after it was sent
+(UserVerificationView), and an account that is not verified by then is
+dead: its owner cannot log in and has to register again. Nothing deleted
+those accounts, so User and Customer rows piled up and every login lookup
+scanned past them.
+
+expired_customers() finds them: not verified, joined more than
+VERIFICATION_MAX_AGE ago, and no verification email queued within
+VERIFICATION_MAX_AGE (a resent link is still valid). The outbox keeps a
+sent email for keep_sent_seconds, which outbox.get_settings() never lets
+drop below VERIFICATION_MAX_AGE, so a recent one is still there.
+
+purge_batch() deletes a bounded batch of them with set-based SQL, one
+DELETE ... WHERE <fk> IN (<subquery>) per related table, children first,
+instead of Django's collector, which loads every related row and deletes
+them object by object. The tables are found by walking the relations of
+User, so models added later are covered; a relation that protects its rows
+stops the purge instead of being skipped. Companies left without customers
+are deleted with them.
+"""
+
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.db import models, transaction
+from django.utils import timezone
+
+from .models import VERIFICATION_MAX_AGE, Company, Customer, OutboxEmail
+
+DEFAULT_BATCH_SIZE = 500
+
+
+class PurgeError(Exception):
+    """A related row cannot be deleted along with its account."""
+
+
+def expired_customers(now=None):
+    """Unverified customers whose verification link (and any resent one) has expired."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=VERIFICATION_MAX_AGE)
+    recent_link = OutboxEmail.objects.filter(
+        user=models.OuterRef("user"), kind=OutboxEmail.VERIFICATION, created_at__gte=cutoff
+    )
+    return Customer.objects.filter(verified=False, user__date_joined__lt=cutoff).exclude(models.Exists(recent_link))
+
+
+def delete_cascade(queryset, deleted, path=()):
+    """Delete the rows of a queryset and, first, the rows that cascade from them, one statement per table."""
+    model = queryset.model
+    keys = queryset.values("pk")
+
+    for relation in model._meta.related_objects:
+        related = relation.related_model
+        if relation.many_to_many:
+            # the other side of a many-to-many: only the rows of its through table go
+            through = relation.through
+            field = next(f for f in through._meta.fields if f.related_model is model)
+            delete_cascade(through._base_manager.filter(**{f"{field.name}__in": keys}), deleted, path + (model,))
+            continue
+        # rows that reference rows of the same table go in the same statement
+        if related is model or related in path:
+            continue
+
+        rows = related._base_manager.filter(**{f"{relation.field.name}__in": keys})
+        on_delete = relation.on_delete
+        if on_delete is models.CASCADE:
+            delete_cascade(rows, deleted, path + (model,))
+        elif on_delete is models.SET_NULL:
+            rows.update(**{relation.field.name: None})
+        elif on_delete is not models.DO_NOTHING and rows.exists():
+            raise PurgeError(
+                f"{related._meta.label}.{relation.field.name} ({on_delete.__name__}) keeps {model._meta.label} rows"
+            )
+
+    for field in model._meta.many_to_many:
+        through = field.remote_field.through
+        if through._meta.auto_created:
+            delete_cascade(through._base_manager.filter(**{f"{field.m2m_field_name()}__in": keys}), deleted, path + (model,))
+
+    # the DELETE of the collector's fast path, without signals or loading the rows
+    count = queryset._raw_delete(queryset.db)
+    if count:
+        deleted[model._meta.label] = deleted.get(model._meta.label, 0) + count
+
+
+def purge_batch(batch_size=DEFAULT_BATCH_SIZE, now=None):
+    """
+    Delete up to batch_size expired accounts in one transaction. Accounts
+    another purge is deleting are skipped (SKIP LOCKED).
+
+    Returns:
+        dict: Rows deleted per model label ("auth.User", ...); empty when none was expired
+    """
+    deleted = {}
+    with transaction.atomic():
+        batch = list(
+            expired_customers(now).select_for_update(skip_locked=True)
+            .order_by("id").values_list("user_id", "company_id")[:batch_size]
+        )
+        if not batch:
+            return deleted
+        user_ids = [user_id for user_id, _ in batch]
+        company_ids = {company_id for _, company_id in batch}
+
+        delete_cascade(User.objects.filter(id__in=user_ids), deleted)
+        # companies are shared by name and industry; only those nobody else belongs to go
+        delete_cascade(Company.objects.filter(id__in=company_ids, customer__isnull=True), deleted)
+    return deleted
+
+
+def purge(batch_size=DEFAULT_BATCH_SIZE, max_batches=None, now=None, on_batch=None):
+    """
+    purge_batch() until no expired account is left (or max_batches).
+
+    Args:
+        on_batch: Called with (batch number, rows deleted per model, seconds) after each batch
+
+    Returns:
+        (dict, float): Rows deleted per model label, and seconds taken
+    """
+    now = now or timezone.now()
+    totals = {}
+    started = time.perf_counter()
+    number = 0
+    while max_batches is None or number < max_batches:
+        batch_started = time.perf_counter()
+        deleted = purge_batch(batch_size, now)
+        if not deleted:
+            break
+        number += 1
+        for label, count in deleted.items():
+            totals[label] = totals.get(label, 0) + count
+        if on_batch is not None:
+            on_batch(number, deleted, time.perf_counter() - batch_started)
+    return totals, time.perf_counter() - started
@@ -1,3 +1,97 @@
-from django.test import TestCase
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .models import Company, Customer, OutboxEmail
+from .outbox import claim_batch, drain, enqueue, prune_sent
+from .purge import purge
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class OutboxTests(TestCase):
+
+    def register(self, email="owner@acme.test"):
+        return self.client.post("/api/register", {
+            "username": "owner",
+            "email": email,
+            "password": "a-long-Passw0rd!",
+            "company_name": "Acme",
+            "industry_type": "Retail",
+            "role": "Owner",
+        }, content_type="application/json")
+
+    def test_registration_queues_the_email_instead_of_sending_it(self):
+        response = self.register()
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(len(mail.outbox), 0)
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.kind, email.to, email.state), (OutboxEmail.VERIFICATION, "owner@acme.test", OutboxEmail.PENDING))
+
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(mail.outbox[0].to, ["owner@acme.test"])
+        self.assertIn("verify_email?token=", mail.outbox[0].body)
+        self.assertEqual(OutboxEmail.objects.get().state, OutboxEmail.SENT)
+
+    def test_failed_email_is_retried_later(self):
+        user = User.objects.create(username="a@acme.test", email="a@acme.test", last_login=timezone.now())
+        OutboxEmail.objects.create(
+            user=user, kind=OutboxEmail.PASSWORD_RESET, to=user.email, from_email="noreply@acme.test",
+            subject="Reset", body="link", next_attempt_at=timezone.now(),
+        )
+        with mock.patch("django.core.mail.EmailMessage.send", side_effect=SMTPServerDisconnected("gone")):
+            self.assertEqual(drain(), (0, 1))
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.state, email.attempts, email.last_error), (OutboxEmail.PENDING, 1, "gone"))
+        self.assertGreater(email.next_attempt_at, timezone.now())
+        self.assertEqual(claim_batch(), [])
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(drain(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class PurgeTests(TestCase):
+
+    def account(self, name, company, joined_days_ago=2, verified=False):
+        joined = timezone.now() - timedelta(days=joined_days_ago)
+        user = User.objects.create(username=name, email=f"{name}@acme.test", last_login=joined, date_joined=joined)
+        Customer.objects.create(user=user, role="Owner", company=company, verified=verified)
+        return user
+
+    def test_expired_unverified_accounts_are_deleted_in_batches(self):
+        shared = Company.objects.create(name="Acme", industry="Retail")
+        alone = Company.objects.create(name="Solo", industry="Retail")
+        self.account("verified", shared, verified=True)
+        self.account("new", shared, joined_days_ago=0)
+        # a link resent today is still valid
+        enqueue(self.account("resent", shared), OutboxEmail.VERIFICATION, "Verify", "link")
+        for name in ("expired1", "expired2"):
+            self.account(name, shared)
+        self.account("expired3", alone)
+
+        batches = []
+        totals, _ = purge(batch_size=2, on_batch=lambda number, deleted, seconds: batches.append(deleted["auth.User"]))
+
+        self.assertEqual(batches, [2, 1])
+        self.assertEqual(totals["auth.User"], 3)
+        self.assertEqual(set(User.objects.values_list("username", flat=True)), {"verified", "new", "resent"})
+        # a company goes once nobody belongs to it
+        self.assertEqual(set(Company.objects.values_list("name", flat=True)), {"Acme"})
+
+    @override_settings(EMAIL_OUTBOX={"keep_sent_seconds": 60})
+    def test_a_sent_link_is_kept_while_it_is_valid(self):
+        company = Company.objects.create(name="Acme", industry="Retail")
+        enqueue(self.account("resent", company), OutboxEmail.VERIFICATION, "Verify", "link")
+        # sent an hour ago: past the configured keep_sent_seconds, not past the link's validity
+        OutboxEmail.objects.update(state=OutboxEmail.SENT, sent_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(prune_sent(), 0)
+        purge()
+        self.assertTrue(User.objects.filter(username="resent").exists())
@@ -16,10 +16,11 @@ Security Features:
 """
 
 from django.contrib.auth.models import User
-from .models import Company, Customer
+from .models import VERIFICATION_MAX_AGE, Company, Customer, OutboxEmail
+from .outbox import enqueue
 from django.core import signing
 from .serializers import CustomerSerializer, EmailVerificationSerializer
-from django.core.mail import send_mail
+from django.db import transaction
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
@@ -58,14 +59,12 @@ def create_email_verification_token(user):
 
 def send_email_user(user):
     """
-    Send email verification link to the user.
+    Queue the email verification link for the user.
 
-    Generates a verification token and sends an email containing a clickable
-    verification link. The link points to the frontend verification page
-    with the token as a query parameter.
-
-    Note: Consider moving to Celery task queue in production to avoid
-    blocking the response while sending email.
+    Generates a verification token and adds an email containing a clickable
+    verification link to the outbox (see outbox.py); the outbox worker sends
+    it, so the request does not wait on SMTP. The link points to the
+    frontend verification page with the token as a query parameter.
 
     Args:
         user: Django User object to send verification email to
@@ -79,15 +78,8 @@ def send_email_user(user):
     subject = "Verify the email"
     message = f"Hi {user.username},\n\n Thanks for creating an account with compligen . Please click on the link below to verify your identity.\n{link}\n\n. If you did not create an account, please ignore."
 
-    # Send email synchronously - blocks until complete
-    # TODO: Move to Celery for async email delivery in production
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email="24varun09@gmail.com",
-        recipient_list=[user.email],
-        fail_silently=False,  # Raise exception on SMTP errors
-    )
+    # Sent by the outbox worker once the transaction commits
+    enqueue(user, OutboxEmail.VERIFICATION, subject, message, from_email="24varun09@gmail.com")
 
 
 # =============================================================================
@@ -98,9 +90,9 @@ class UserRegisterView(APIView):
     """
     Handle new user registration with automatic email verification.
 
-    Creates a new User, Company, and Customer record, then sends a verification
-    email with a 24-hour expiry token. Users must verify their email before
-    they can log in.
+    Creates a new User, Company, and Customer record and, in the same
+    transaction, queues a verification email with a 24-hour expiry token.
+    Users must verify their email before they can log in.
 
     POST /api/register
     Request Body:
@@ -116,11 +108,11 @@ class UserRegisterView(APIView):
         serialized = CustomerSerializer(data=request.data)
 
         if serialized.is_valid():
-            # Create User, Company, and Customer records via serializer
-            customer = serialized.save()
-
-            # Send verification email (consider async queue for production)
-            send_email_user(customer.user)
+            # Create User, Company, and Customer records and queue the
+            # verification email together: either both exist or neither
+            with transaction.atomic():
+                customer = serialized.save()
+                send_email_user(customer.user)
 
             return Response(
                 {"message": "Account created! Check your email and verify within 24 hours."},
@@ -180,7 +172,7 @@ class UserVerificationView(APIView):
             payload = signing.loads(
                 token,
                 salt="email-verification",
-                max_age=60 * 60 * 24  # 24 hours in seconds
+                max_age=VERIFICATION_MAX_AGE  # 24 hours in seconds
             )
         except signing.SignatureExpired:
             return Response({"status": "expired"}, status=status.HTTP_400_BAD_REQUEST)
@@ -259,7 +251,7 @@ class ResendEmailVerification(APIView):
 
 def password_reset(user):
     """
-    Generate password reset token and send reset email.
+    Generate password reset token and queue the reset email.
 
     Creates a secure, one-time-use password reset link using Django's
     built-in token generator. The token is tied to the user's current
@@ -290,14 +282,8 @@ def password_reset(user):
     subject = "Reset your password"
     message = f"Hi {user.username},\n\nClick the link below to reset your password:\n{reset_link}\n\nIf you didn't request this, please ignore this email."
 
-    # Send email synchronously - consider Celery for production
-    send_mail(
-        subject=subject,
-        message=message,
-        from_email="24varun09@gmail.com",
-        recipient_list=[user.email],
-        fail_silently=False,
-    )
+    # Sent by the outbox worker, so the request does not wait on SMTP
+    enqueue(user, OutboxEmail.PASSWORD_RESET, subject, message, from_email="24varun09@gmail.com")
 
     return uid, token
 
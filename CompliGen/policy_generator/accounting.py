@@ -0,0 +1,123 @@
+"""
+Usage accounting for policy generation.
+
+Wraps a generation request in a usage collector (see rag/usage.py) and stores
+the totals as a GenerationUsage row, with the cost estimated from
+settings.LLM_PRICING.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager, contextmanager
+from decimal import Decimal
+
+from django.conf import settings
+
+from .models import GenerationUsage
+from .rag.cancellation import GenerationCancelled
+from .rag.usage import collect_usage
+
+logger = logging.getLogger(__name__)
+
+
+def _price(pricing, model):
+    # provider model names can carry a prefix/version suffix (models/gemini-2.0-flash-001),
+    # so take the longest configured name contained in it
+    matches = [name for name in pricing if name in (model or "")]
+    return pricing[max(matches, key=len)] if matches else {}
+
+
+def estimate_cost(tokens_by_model, embedding_tokens=0):
+    """
+    Estimated cost in USD from the per 1M token prices in settings.LLM_PRICING.
+
+    Args:
+        tokens_by_model: {model: {"input_tokens", "output_tokens"}}, so a
+                         generation that fell back to another model partway
+                         through pays each model's own price
+    """
+    pricing = getattr(settings, "LLM_PRICING", {})
+    per_million = Decimal(1_000_000)
+
+    cost = Decimal(0)
+    for model, tokens in tokens_by_model.items():
+        price = _price(pricing, model)
+        cost += (
+            Decimal(str(price.get("input", 0))) * tokens["input_tokens"]
+            + Decimal(str(price.get("output", 0))) * tokens["output_tokens"]
+        )
+    embedding_price = pricing.get(getattr(settings, "EMBEDDING_MODEL", ""), {})
+    cost += Decimal(str(embedding_price.get("input", 0))) * embedding_tokens
+    return (cost / per_million).quantize(Decimal("0.000001"))
+
+
+def _usage_record(customer, policy_type, operation, usage, succeeded):
+    return GenerationUsage(
+        customer_linked=customer,
+        policy_type=policy_type,
+        operation=operation,
+        policy_id=usage.policy_id,
+        model=usage.model,
+        input_tokens=usage.input_tokens,
+        output_tokens=usage.output_tokens,
+        embedding_tokens=usage.embedding_tokens,
+        cache_hits=usage.cache_hits,
+        latency_ms=usage.latency_ms,
+        estimated_cost_usd=estimate_cost(usage.tokens_by_model, usage.embedding_tokens),
+        succeeded=succeeded,
+        details=usage.details(),
+    )
+
+
+@contextmanager
+def track_generation(customer, policy_type, operation="generate"):
+    """
+    Record the token usage, cost and latency of a generation.
+
+    Usage:
+        with track_generation(customer, "privacy") as usage:
+            generated = generate_privacy_policy(**data)
+            saved = serializer.save()
+            usage.policy_id = saved.id
+
+    A row is written whether the block succeeds or raises, so failed
+    generations are still visible in the usage totals. Errors while writing
+    the row are logged and never hide the result of the generation itself.
+    Cancelled generations are flagged in the row's details.
+    """
+    succeeded = False
+    with collect_usage() as usage:
+        usage.policy_id = None
+        try:
+            yield usage
+            succeeded = True
+        except GenerationCancelled:
+            usage.cancelled = True
+            raise
+        finally:
+            if customer is not None:
+                try:
+                    _usage_record(customer, policy_type, operation, usage, succeeded).save()
+                except Exception:
+                    logger.exception(f"Failed to record usage for {policy_type} {operation}")
+
+
+@asynccontextmanager
+async def atrack_generation(customer, policy_type, operation="generate"):
+    """track_generation() for async views."""
+    succeeded = False
+    with collect_usage() as usage:
+        usage.policy_id = None
+        try:
+            yield usage
+            succeeded = True
+        except (GenerationCancelled, asyncio.CancelledError):
+            # CancelledError: the client disconnected
+            usage.cancelled = True
+            raise
+        finally:
+            if customer is not None:
+                try:
+                    await _usage_record(customer, policy_type, operation, usage, succeeded).asave()
+                except Exception:
+                    logger.exception(f"Failed to record usage for {policy_type} {operation}")
@@ -0,0 +1,233 @@
+"""
+Admission control for the generation endpoints.
+
+A generation holds a worker for tens of seconds, so the number of
+generations running at once is limited per customer, per company and in
+total. State lives in Postgres (GenerationSlot / GenerationBucket), so the
+limits hold across every worker process.
+
+Fairness:
+    - A customer can never take more than customer_concurrency of their
+      company's slots, so one user cannot block their colleagues.
+    - Requests are "bulk" when the client says so (X-Generation-Priority: bulk)
+      or when the customer already has a generation running. Bulk requests
+      may only use bulk_share of the global slots, the rest stays free for
+      interactive users.
+    - A token bucket per customer limits how fast new generations can be
+      started, independent of how quickly earlier ones finish.
+
+Rejected requests get a 429 with a Retry-After header.
+
+Cancellation:
+    A client that sends X-Request-ID can cancel its running generation with
+    DELETE api/generations/<request_id> (e.g. when the user leaves the page).
+    The request is stored on the slot and the generation stops at its next
+    check (see rag/cancellation.py); nothing is saved for it.
+"""
+
+import math
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from authentication.models import Customer
+from .models import GenerationBucket, GenerationSlot, GenerationUsage
+from .rag.cancellation import cancellable
+
+# key of the Postgres advisory lock serialising admission decisions
+ADMISSION_LOCK_KEY = 720_290
+
+# used for Retry-After until there is usage history to go on
+DEFAULT_GENERATION_SECONDS = 30
+
+DEFAULT_LIMITS = {
+    "customer_concurrency": 2,
+    "company_concurrency": 5,
+    "global_concurrency": 20,
+    "bulk_share": 0.5,
+    "burst": 6,
+    "refill_per_minute": 2,
+    "lease_seconds": 300,
+}
+
+
+class GenerationThrottled(Exception):
+    """Raised when a generation is not admitted; wait is the retry hint in seconds."""
+
+    def __init__(self, message, wait):
+        super().__init__(message)
+        self.message = message
+        self.wait = wait
+
+
+def get_limits():
+    return {**DEFAULT_LIMITS, **getattr(settings, "GENERATION_ADMISSION", {})}
+
+
+def _expected_wait(slots, now):
+    """Seconds until the oldest of the given running generations should finish."""
+    avg_ms = GenerationUsage.objects.filter(succeeded=True).order_by("-created_at")[:50].aggregate(
+        avg=Avg("latency_ms")
+    )["avg"]
+    duration = (avg_ms / 1000) if avg_ms else DEFAULT_GENERATION_SECONDS
+
+    oldest = slots.order_by("created_at").values_list("created_at", flat=True).first()
+    if oldest is None:
+        return 1
+    return max(1, math.ceil(duration - (now - oldest).total_seconds()))
+
+
+def _take_token(customer, limits, now):
+    """Take one token from the customer's bucket. Returns seconds to wait, or 0."""
+    bucket, _ = GenerationBucket.objects.select_for_update().get_or_create(
+        customer_linked=customer,
+        defaults={"tokens": limits["burst"], "refilled_at": now},
+    )
+
+    rate = limits["refill_per_minute"] / 60
+    elapsed = (now - bucket.refilled_at).total_seconds()
+    bucket.tokens = min(limits["burst"], bucket.tokens + elapsed * rate)
+    bucket.refilled_at = now
+
+    if bucket.tokens < 1:
+        bucket.save(update_fields=["tokens", "refilled_at"])
+        return math.ceil((1 - bucket.tokens) / rate)
+
+    bucket.tokens -= 1
+    bucket.save(update_fields=["tokens", "refilled_at"])
+    return 0
+
+
+def acquire_slot(customer, priority="interactive", path="", request_id=""):
+    """
+    Admit a generation for the customer or raise GenerationThrottled.
+
+    Returns:
+        GenerationSlot: release it with release_slot() when the generation ends
+    """
+    limits = get_limits()
+
+    with transaction.atomic():
+        # one admission decision at a time across all workers; the lock is
+        # held only for the few queries below, not for the generation
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [ADMISSION_LOCK_KEY])
+
+        now = timezone.now()
+        GenerationSlot.objects.filter(expires_at__lte=now).delete()
+        live = GenerationSlot.objects.all()
+
+        customer_slots = live.filter(customer_linked=customer)
+        if customer_slots.exists():
+            # a customer running generations in parallel is doing bulk work
+            priority = "bulk"
+
+        if customer_slots.count() >= limits["customer_concurrency"]:
+            raise GenerationThrottled(
+                wait=_expected_wait(customer_slots, now),
+                message="You already have the maximum number of documents generating. Please wait for one to finish.",
+            )
+
+        company_slots = live.filter(company_id=customer.company_id)
+        if company_slots.count() >= limits["company_concurrency"]:
+            raise GenerationThrottled(
+                wait=_expected_wait(company_slots, now),
+                message="Your company already has the maximum number of documents generating. Please retry shortly.",
+            )
+
+        capacity = limits["global_concurrency"]
+        if priority == "bulk":
+            capacity = max(1, int(capacity * limits["bulk_share"]))
+        if live.count() >= capacity:
+            raise GenerationThrottled(
+                wait=_expected_wait(live, now),
+                message="The generator is busy. Please retry shortly.",
+            )
+
+        wait = _take_token(customer, limits, now)
+        if wait:
+            raise GenerationThrottled(
+                wait=wait,
+                message="Too many documents generated in a short time. Please retry shortly.",
+            )
+
+        return GenerationSlot.objects.create(
+            customer_linked=customer,
+            company_id=customer.company_id,
+            priority=priority,
+            path=path[:255],
+            request_id=request_id[:64],
+            expires_at=now + timedelta(seconds=limits["lease_seconds"]),
+        )
+
+
+def release_slot(slot):
+    if slot is not None:
+        GenerationSlot.objects.filter(id=slot.id).delete()
+
+
+def request_cancel(customer, request_id):
+    """Ask the customer's running generation with this request id to stop. Returns False if none is running."""
+    return GenerationSlot.objects.filter(
+        customer_linked=customer,
+        request_id=request_id,
+        expires_at__gt=timezone.now(),
+    ).update(cancel_requested=True) > 0
+
+
+def cancel_requested(slot):
+    return slot is not None and GenerationSlot.objects.filter(id=slot.id, cancel_requested=True).exists()
+
+
+class GenerationAdmissionMixin:
+    """
+    Mixin for APIViews whose POST runs a generation.
+
+    The slot is acquired after authentication (so the customer is known) and
+    before the handler runs, and released once the response is finalised,
+    whether the generation succeeded or not. While the handler runs, a cancel
+    request for the slot stops the generation (GenerationCancelled).
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        request.generation_slot = None
+        request.generation_scope = ExitStack()
+
+        if request.method != "POST":
+            return
+
+        customer = Customer.objects.filter(user=request.user).first()
+        if customer is None:
+            return
+
+        priority = "bulk" if request.headers.get("X-Generation-Priority", "").lower() == "bulk" else "interactive"
+        request_id = request.headers.get("X-Request-ID", "")
+        slot = acquire_slot(customer, priority=priority, path=request.path, request_id=request_id)
+        request.generation_slot = slot
+        if request_id:
+            # only a generation with a request id can be cancelled
+            request.generation_scope.enter_context(cancellable(lambda: cancel_requested(slot)))
+
+    def handle_exception(self, exc):
+        # same body shape as the other generation errors, plus the retry hint
+        if isinstance(exc, GenerationThrottled):
+            return Response(
+                {"error": exc.message, "retry_after": exc.wait},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(exc.wait)},
+            )
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        scope = getattr(request, "generation_scope", None)
+        if scope is not None:
+            scope.close()
+        release_slot(getattr(request, "generation_slot", None))
+        return super().finalize_response(request, response, *args, **kwargs)
@@ -0,0 +1,410 @@
+"""
+Server-side PDF and DOCX export of policies, with a render cache.
+
+The browser used to render the nested policy JSON into a PDF itself
+(Pdfgenerator.jsx), which froze low-end devices on large DPAs and privacy
+policies and rendered again on every download. Policies are now rendered
+here from their read serializer output, into the same layout: a title,
+the company details, the sections (with the subsections of a privacy
+policy) and, for a DPA, its role, processing locations and annexes.
+
+Rendered files are cached on disk under EXPORT_CACHE_DIR, shared by every
+worker. The file name holds the policy type, id and updated_at, so an
+edited policy (section regeneration bumps updated_at) is rendered afresh
+and its old files are never served again. Reads refresh a file's mtime, and
+once the cache is over EXPORT_CACHE_MAX_BYTES the least recently used
+files are deleted.
+
+Bulk export streams every policy of a customer, as NDJSON (the read
+serializer output, one policy per line) or as a ZIP of rendered files. The
+policies are read type by type with iterator(chunk_size=...), i.e. a
+server-side cursor, with the related rows of each chunk prefetched, and
+the response is produced as it is read, so memory does not grow with the
+number of policies.
+
+reportlab (PDF) and python-docx (DOCX) are imported on the first render.
+"""
+
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .revisions import POLICY_MODELS
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+}
+
+TITLES = {
+    "privacy": "Privacy Policy",
+    "tos": "Terms of Service",
+    "dpa": "Data Processing Agreement",
+    "aup": "Acceptable Use Policy",
+    "cookie": "Cookie Policy",
+}
+
+# (label, field) of the company details, shown when the policy has the field
+META_FIELDS = (
+    ("Company", "company_name"),
+    ("Last Updated", "last_updated"),
+    ("Website", "website_url"),
+    ("Website", "website"),
+    ("Contact", "contact_email"),
+    ("Phone", "phone_number"),
+    ("Phone", "contact_phone"),
+)
+
+# same colour as the browser export
+ACCENT = "#0e334d"
+
+
+def _list(value):
+    if not value:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+# -----------------------------
+# Layout
+# -----------------------------
+def outline(policy_type, data):
+    """
+    The document as a list of blocks, shared by both renderers.
+
+    Returns:
+        (title, meta, blocks): meta is a list of (label, value); blocks are
+        ("heading", text, level), ("paragraph", text) or ("bullet", text)
+    """
+    meta = [(label, str(data[name])) for label, name in META_FIELDS if data.get(name)]
+    blocks = []
+
+    def bullets(heading, items, level=1):
+        if _list(items):
+            blocks.append(("heading", heading, level))
+            blocks.extend(("bullet", str(item)) for item in _list(items))
+
+    if policy_type == "dpa":
+        bullets("Role", data.get("role_controller_or_processor"))
+        bullets("Data Processing Locations", data.get("data_processing_locations"))
+
+    for section in data.get("sections") or []:
+        blocks.append(("heading", f"{section['section_number']}. {section['heading']}", 1))
+        blocks.extend(("paragraph", str(paragraph)) for paragraph in _list(section.get("content")))
+        for subsection in section.get("subsections") or []:
+            number = subsection.get("subsection_number")
+            blocks.append(("heading", f"{number} {subsection['heading']}" if number else subsection["heading"], 2))
+            blocks.extend(("paragraph", str(paragraph)) for paragraph in _list(subsection.get("content")))
+
+    if policy_type == "dpa":
+        annex_a = data.get("annex_a") or {}
+        if annex_a:
+            blocks.append(("heading", "Annex A – Processing Details", 1))
+            if _list(annex_a.get("subject_matter_of_processing")):
+                blocks.append(("heading", "Subject Matter of Processing", 2))
+                blocks.extend(("paragraph", str(item)) for item in _list(annex_a["subject_matter_of_processing"]))
+            bullets("Duration of Processing", annex_a.get("duration_of_processing"), 2)
+            bullets("Nature and Purpose of Processing", annex_a.get("nature_and_purpose_of_processing"), 2)
+        annex_b = data.get("annex_b") or {}
+        if annex_b:
+            blocks.append(("heading", "Annex B – Technical and Organisational Measures", 1))
+            bullets("Technical Measures", annex_b.get("technical_measures"), 2)
+            bullets("Organisational Measures", annex_b.get("organisational_measures"), 2)
+
+    return TITLES[policy_type], meta, blocks
+
+
+# -----------------------------
+# Renderers
+# -----------------------------
+def render_pdf(title, meta, blocks):
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+    from reportlab.lib.units import mm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+    styles = getSampleStyleSheet()
+    accent = colors.HexColor(ACCENT)
+    body = ParagraphStyle("body", parent=styles["BodyText"], fontSize=11, leading=17, spaceAfter=6)
+    bullet = ParagraphStyle("bullet", parent=body, leftIndent=12, bulletIndent=2, spaceAfter=2)
+    headings = {
+        1: ParagraphStyle("h1", parent=styles["Heading2"], fontSize=16, textColor=accent, spaceBefore=10),
+        2: ParagraphStyle("h2", parent=styles["Heading3"], fontSize=14, textColor=accent, spaceBefore=6),
+    }
+
+    story = [Paragraph(escape(title), ParagraphStyle("title", parent=styles["Title"], textColor=accent, alignment=0))]
+    story.extend(Paragraph(f"<b>{escape(label)}:</b> {escape(value)}", body) for label, value in meta)
+    story.append(Spacer(1, 8 * mm))
+    for block in blocks:
+        if block[0] == "heading":
+            story.append(Paragraph(escape(block[1]), headings[block[2]]))
+        elif block[0] == "bullet":
+            story.append(Paragraph(escape(block[1]), bullet, bulletText="•"))
+        else:
+            story.append(Paragraph(escape(block[1]), body))
+
+    def page_number(canvas, document):
+        canvas.setFont("Helvetica", 9)
+        canvas.setFillColor(colors.HexColor("#94a3b8"))
+        canvas.drawRightString(A4[0] - 40, 20, f"Page {document.page}")
+
+    output = io.BytesIO()
+    document = SimpleDocTemplate(output, pagesize=A4, leftMargin=40, rightMargin=40, topMargin=40, bottomMargin=40, title=title)
+    document.build(story, onFirstPage=page_number, onLaterPages=page_number)
+    return output.getvalue()
+
+
+def render_docx(title, meta, blocks):
+    from docx import Document
+    from docx.shared import RGBColor
+
+    document = Document()
+    document.core_properties.title = title
+    heading = document.add_heading(title, level=0)
+    for run in heading.runs:
+        run.font.color.rgb = RGBColor.from_string(ACCENT[1:])
+
+    for label, value in meta:
+        paragraph = document.add_paragraph()
+        paragraph.add_run(f"{label}: ").bold = True
+        paragraph.add_run(value)
+
+    for block in blocks:
+        if block[0] == "heading":
+            document.add_heading(block[1], level=block[2])
+        elif block[0] == "bullet":
+            document.add_paragraph(block[1], style="List Bullet")
+        else:
+            document.add_paragraph(block[1])
+
+    output = io.BytesIO()
+    document.save(output)
+    return output.getvalue()
+
+
+RENDERERS = {"pdf": render_pdf, "docx": render_docx}
+
+
+def filename(policy_type, company_name, fmt):
+    """Download name, like the browser export used: Privacy_Policy_Acme_Pty_Ltd.pdf"""
+    return re.sub(r"[^\w.-]+", "_", f"{TITLES[policy_type]} {company_name}").strip("_") + f".{fmt}"
+
+
+def render(policy_type, data, fmt):
+    """A policy (read serializer output) as PDF or DOCX bytes."""
+    return RENDERERS[fmt](*outline(policy_type, data))
+
+
+# -----------------------------
+# Cache
+# -----------------------------
+class RenderCache:
+    """
+    Size-bounded LRU cache of rendered files in a directory.
+
+    Args:
+        directory: Where the files are kept (created on first write)
+        max_bytes: Total size the cache is trimmed back to after a write
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+
+    def path(self, key):
+        return self.directory / key
+
+    def get(self, key):
+        """Path of a cached file, or None. A hit makes the file the most recently used."""
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def put(self, key, content):
+        """Store a file (atomically, so readers never see a partial one) and evict. Returns its path."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        handle, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(handle, "wb") as f:
+            f.write(content)
+        os.replace(tmp, self.path(key))
+        self.evict()
+        return self.path(key)
+
+    def evict(self):
+        """Delete the least recently used files until the cache fits in max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and not entry.name.startswith(".tmp-"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # another worker evicted it first
+                pass
+            total -= size
+
+
+def cache_key(policy_type, policy, fmt):
+    """Names a rendering of one version of a policy: any edit bumps updated_at."""
+    return f"{policy_type}-{policy.id}-{policy.updated_at.timestamp():.6f}.{fmt}"
+
+
+_cache = None
+
+
+def render_cache():
+    global _cache
+    if _cache is None:
+        _cache = RenderCache(settings.EXPORT_CACHE_DIR, settings.EXPORT_CACHE_MAX_BYTES)
+    return _cache
+
+
+def open_rendered(policy_type, policy, fmt):
+    """
+    The rendered file of a policy, from the cache or rendered (and cached) now.
+
+    Returns:
+        (file, hit): A binary file to read it from, which the caller closes,
+        and whether it came from the cache
+    """
+    cache = render_cache()
+    key = cache_key(policy_type, policy, fmt)
+    path = cache.get(key)
+    if path is not None:
+        try:
+            return open(path, "rb"), True
+        except FileNotFoundError:
+            # evicted by another worker since
+            pass
+    content = render(policy_type, POLICY_MODELS[policy_type][1](policy).data, fmt)
+    if len(content) <= cache.max_bytes:
+        cache.put(key, content)
+    return io.BytesIO(content), False
+
+
+def rendered(policy_type, policy, fmt):
+    """The rendered file of a policy as bytes (see open_rendered())."""
+    stream, _ = open_rendered(policy_type, policy, fmt)
+    with stream:
+        return stream.read()
+
+
+# -----------------------------
+# Bulk export
+# -----------------------------
+# policies fetched per round trip of the server-side cursor
+ITERATOR_CHUNK_SIZE = 50
+
+# related rows the read serializers walk, fetched once per chunk instead of per policy
+RELATED = {
+    "privacy": (("contact_info",), ("sections__subsections",)),
+    "tos": ((), ("sections",)),
+    "dpa": (("definitions", "annex_a", "annex_b"), ("annex_a__sub_processors", "sections")),
+    "aup": ((), ("sections",)),
+    "cookie": ((), ("sections", "third_party_services", "browser_instructions")),
+}
+
+
+def customer_policies(customer):
+    """(policy_type, policy) for every policy of a customer, type by type, oldest first."""
+    for policy_type, (model, _) in POLICY_MODELS.items():
+        select, prefetch = RELATED[policy_type]
+        policies = (
+            model.objects.filter(customer_linked=customer)
+            .select_related(*select)
+            .prefetch_related(*prefetch)
+            .order_by("created_at", "id")
+        )
+        for policy in policies.iterator(chunk_size=ITERATOR_CHUNK_SIZE):
+            yield policy_type, policy
+
+
+def ndjson_lines(customer):
+    """Every policy of a customer as one JSON line: {"policy_type": ..., <read serializer fields>}."""
+    for policy_type, policy in customer_policies(customer):
+        data = POLICY_MODELS[policy_type][1](policy).data
+        yield json.dumps({"policy_type": policy_type, **data}, cls=DjangoJSONEncoder) + "\n"
+
+
+class _ChunkStream(io.RawIOBase):
+    """Write-only, unseekable file that zipfile writes into and zip_chunks() drains."""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+def zip_chunks(customer, fmt):
+    """
+    A ZIP of every policy of a customer rendered as PDF or DOCX, yielded
+    file by file. Files come from the render cache when they were exported
+    before. A policy that fails to render is listed in FAILED.txt instead.
+    """
+    stream = _ChunkStream()
+    failed = []
+    # zipfile writes data descriptors when it cannot seek back, so entries can be streamed
+    with zipfile.ZipFile(stream, "w", compression=zipfile.ZIP_STORED) as archive:
+        for policy_type, policy in customer_policies(customer):
+            name = f"{policy_type}/{policy.id}_{filename(policy_type, policy.company_name, fmt)}"
+            try:
+                content = rendered(policy_type, policy, fmt)
+            except Exception:
+                logger.error(f"Bulk export of {name} failed", exc_info=True)
+                failed.append(name)
+                continue
+            info = zipfile.ZipInfo(name, date_time=policy.updated_at.timetuple()[:6])
+            archive.writestr(info, content)
+            yield stream.drain()
+
+        if failed:
+            archive.writestr("FAILED.txt", "These documents could not be rendered:\n" + "\n".join(failed) + "\n")
+    yield stream.drain()
+
+
+async def aiterate(iterator):
+    """
+    Serve a blocking generator from ASGI without buffering it.
+
+    Django's ASGI handler reads a sync iterator into a list before sending
+    it. This pulls one chunk at a time instead, always on the same thread,
+    so the generator keeps its database connection (and server-side cursor).
+    """
+    done = object()
+    pull = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await pull(iterator, done)) is not done:
+            yield chunk
+    finally:
+        await sync_to_async(iterator.close, thread_sensitive=True)()
@@ -0,0 +1,251 @@
+"""
+Idempotency keys and single-flight deduplication for the generation POSTs.
+
+The forms resend a generation POST when it times out, and each resend used
+to start another Gemini call and could save a duplicate policy. A POST is
+now claimed in Postgres (GenerationRequest) before admission control, keyed
+by the customer and:
+
+    - the client's Idempotency-Key header: while the generation runs, a
+      request with the same key attaches to it; once it has finished, the
+      stored response is returned (for key_ttl_seconds) with an
+      Idempotent-Replayed: true header. A failed generation is run again by
+      the next request with the key. The key reused with another body is
+      refused with 422.
+    - otherwise a hash of the path and body: identical requests that arrive
+      while one is running share its result, later ones generate anew (the
+      finished row is only kept for requests already polling it from other
+      workers, and is never replayed).
+
+Only the first request (the leader) takes an admission slot and runs the
+generation. Requests handled by the same process await the same task;
+requests that landed on another worker poll the row until it has an
+outcome. A running row carries a lease like the admission slots, so the
+generation of a worker that died is taken over by the next request.
+
+The generation runs in its own task. Without a key it is cancelled when the
+last request waiting for it disconnects, as before; with a key it carries
+on, so the client's retry can collect the result (DELETE
+api/generations/<X-Request-ID> still cancels it).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from .admission import get_limits
+from .models import GenerationRequest
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SETTINGS = {
+    # how long the response of a request with an Idempotency-Key is replayed
+    "key_ttl_seconds": 24 * 60 * 60,
+    # how long the outcome of a request without one is kept, for the waiters on other
+    # workers that were polling it when it finished; it is not replayed to new requests
+    "coalesce_seconds": 15,
+    # how often a waiter on another worker checks the row
+    "poll_seconds": 0.5,
+}
+
+AUTO_KEY_PREFIX = "auto:"
+
+
+class IdempotencyConflict(Exception):
+    """The Idempotency-Key was already used for a different request."""
+
+
+def get_settings():
+    return {**DEFAULT_SETTINGS, **getattr(settings, "GENERATION_IDEMPOTENCY", {})}
+
+
+def request_fingerprint(path, data):
+    """Hash of the path and body; key order and whitespace of the JSON do not matter."""
+    body = json.dumps({"path": path, "body": data}, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def claim(customer, key, path, data):
+    """
+    Find or start the generation for a request.
+
+    Args:
+        customer: The requesting customer
+        key: Idempotency-Key header, "" if the client sent none
+        path / data: Request path and parsed body
+
+    Returns:
+        (GenerationRequest, bool): The row, and whether this request runs the generation
+
+    Raises:
+        IdempotencyConflict: If the key belongs to a request with another body
+    """
+    fingerprint = request_fingerprint(path, data)
+    now = timezone.now()
+    lease = timedelta(seconds=get_limits()["lease_seconds"])
+
+    with transaction.atomic():
+        GenerationRequest.objects.filter(expires_at__lte=now).exclude(state=GenerationRequest.RUNNING).delete()
+
+        record, created = GenerationRequest.objects.select_for_update().get_or_create(
+            customer_linked=customer,
+            key=key[:255] if key else AUTO_KEY_PREFIX + fingerprint,
+            defaults={
+                "fingerprint": fingerprint,
+                "path": path[:255],
+                "replayable": bool(key),
+                "started_at": now,
+                "expires_at": now + lease,
+            },
+        )
+        if created:
+            return record, True
+
+        expired = record.expires_at <= now
+        if record.fingerprint != fingerprint and not expired:
+            raise IdempotencyConflict("This Idempotency-Key was already used for a different request.")
+
+        # without a key only the requests that arrived while it ran share the
+        # outcome: a later identical request generates anew
+        finished = not record.replayable and record.state != GenerationRequest.RUNNING
+
+        # a failed generation is retried, and a dead worker's one taken over
+        if expired or finished or record.state == GenerationRequest.FAILED:
+            record.fingerprint = fingerprint
+            record.path = path[:255]
+            record.state = GenerationRequest.RUNNING
+            record.status_code = None
+            record.response = None
+            record.started_at = now
+            record.expires_at = now + lease
+            record.save()
+            return record, True
+
+        return record, False
+
+
+def poll(record, key, path, data):
+    """
+    The current state of a generation another request runs.
+
+    Returns:
+        (GenerationRequest, bool): As claim(); the caller takes over when the
+        attempt it waited for is gone or its lease has run out
+    """
+    current = GenerationRequest.objects.filter(id=record.id, started_at=record.started_at).first()
+    if current is None or (current.state == GenerationRequest.RUNNING and current.expires_at <= timezone.now()):
+        return claim(record.customer_linked, key, path, data)
+    return current, False
+
+
+def finish(record, status_code, body):
+    """Store the outcome of the attempt; a newer attempt (after a lease expiry) is left alone."""
+    options = get_settings()
+    succeeded = 200 <= status_code < 300
+    keep = options["key_ttl_seconds"] if succeeded and record.replayable else options["coalesce_seconds"]
+    GenerationRequest.objects.filter(id=record.id, started_at=record.started_at).update(
+        state=GenerationRequest.SUCCEEDED if succeeded else GenerationRequest.FAILED,
+        status_code=status_code,
+        response=body,
+        expires_at=timezone.now() + timedelta(seconds=keep),
+    )
+
+
+@dataclass
+class _Flight:
+    """A generation running in this process and the requests waiting for it."""
+    task: asyncio.Task
+    detached: bool
+    waiters: int = field(default=0)
+
+
+# (customer id, key) -> _Flight; an event loop's own flights only (see _local_flight())
+_flights = {}
+
+
+def _local_flight(record):
+    flight = _flights.get((record.customer_linked_id, record.key))
+    # under WSGI every request runs on its own event loop; those cannot await each other's tasks
+    if flight is not None and flight.task.get_loop() is asyncio.get_running_loop():
+        return flight
+    return None
+
+
+async def _run(record, compute):
+    """Run the generation and store its outcome, even if every waiting request went away."""
+    try:
+        outcome = await compute()
+    except asyncio.CancelledError:
+        await sync_to_async(finish)(record, 409, {"error": "Generation was cancelled"})
+        raise
+    except Exception:
+        logger.error(f"Generation {record.key} failed", exc_info=True)
+        outcome = (500, {"error": "Policy failed to generate. Please retry"})
+    await sync_to_async(finish)(record, *outcome)
+    return outcome
+
+
+async def _wait(flight):
+    flight.waiters += 1
+    try:
+        # shielded: a request that disconnects stops waiting, not the generation
+        return await asyncio.shield(flight.task)
+    except asyncio.CancelledError:
+        if flight.waiters == 1 and not flight.detached and not flight.task.done():
+            flight.task.cancel()
+        raise
+    finally:
+        flight.waiters -= 1
+
+
+def _lead(record, compute):
+    flight_key = (record.customer_linked_id, record.key)
+    flight = _Flight(task=asyncio.get_running_loop().create_task(_run(record, compute)), detached=record.replayable)
+    _flights[flight_key] = flight
+
+    def forget(_):
+        if _flights.get(flight_key) is flight:
+            del _flights[flight_key]
+
+    flight.task.add_done_callback(forget)
+    return flight
+
+
+async def single_flight(customer, key, path, data, compute):
+    """
+    Run a generation once per customer and key (or identical request).
+
+    Args:
+        compute: Async function running the generation, returns (status_code, body)
+
+    Returns:
+        (status_code, body, replayed): replayed is False only for the request that ran it
+    """
+    record, leader = await sync_to_async(claim)(customer, key, path, data)
+    poll_seconds = get_settings()["poll_seconds"]
+
+    while True:
+        if leader:
+            status_code, body = await _wait(_lead(record, compute))
+            return status_code, body, False
+
+        flight = _local_flight(record)
+        if flight is not None:
+            status_code, body = await _wait(flight)
+            return status_code, body, True
+
+        if record.state != GenerationRequest.RUNNING:
+            return record.status_code, record.response, True
+
+        # running on another worker
+        await asyncio.sleep(poll_seconds)
+        record, leader = await sync_to_async(poll)(record, key, path, data)
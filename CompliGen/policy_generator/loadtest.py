@@ -0,0 +1,581 @@
+"""
+Load-test scenarios for the authentication and policy endpoints.
+
+There was no way to reproduce production load locally. This module (driven
+by python manage.py load_test) provides:
+
+    - seed(): synthetic customers with realistic nested policies of all
+      five types (sections, subsections, annexes, cookie services...),
+      written with bulk_create in chunks (a thousand customers with ten
+      thousand policies take well under a minute). Their users are named PREFIX... and share PASSWORD.
+    - stub_generators(): the generate views call a canned generator
+      instead of retrieval, the embeddings and the LLM; it waits a set
+      latency and returns the content of a seeded policy. Everything after
+      it (validation, admission, idempotency, saving, revisions) is real.
+    - journey(): register -> verify (with the link from the outbox email)
+      -> login -> generate -> list -> dashboard -> delete, as a new user.
+    - browse(): a seeded user logs in and reads: the five lists, the
+      dashboard, documents, a search and the NDJSON export.
+
+Requests go through the whole Django stack in process (django.test.Client,
+one per thread), so the database queries of every request are counted
+next to its latency. Stats reports, per endpoint, the throughput, latency
+percentiles and queries per request. QUERY_BUDGETS caps the queries of the
+endpoints whose count must not grow with the data, which catches an N+1
+before it ships; a p95 over that of a baseline report catches a slower
+read or auth path.
+
+Run it against a development database: it writes users and policies, which
+clean() removes again.
+"""
+
+import json
+import math
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from authentication.models import Company, Customer, OutboxEmail
+from authentication.purge import delete_cascade
+
+from .models import (
+    AUPSection,
+    AcceptableUsePolicy,
+    CookieBrowserInstruction,
+    CookiePolicy,
+    CookiePolicySection,
+    CookieThirdPartyService,
+    DataProcessingAgreement,
+    DPAAnnexA,
+    DPAAnnexB,
+    DPADefinitions,
+    DPASection,
+    DPASubProcessor,
+    PrivacyPolicy,
+    PrivacyPolicyContactInfo,
+    PrivacyPolicySection,
+    PrivacyPolicySubsection,
+    TermsOfService,
+    ToSSection,
+)
+from .revisions import POLICY_MODELS, content_of
+
+PREFIX = "loadtest-"
+PASSWORD = "LoadTest-Passw0rd!"
+
+# policy_type -> URL segment of its endpoints
+ENDPOINTS = {
+    "privacy": "privacypolicy",
+    "tos": "tos",
+    "dpa": "dpa",
+    "aup": "aup",
+    "cookie": "cookie",
+}
+
+# most queries one request of an endpoint may make, whatever the data size. The
+# lists are not capped: their read serializers query each policy's sections, so
+# their count grows with the customer's policies (the report still shows it). The
+# export prefetches the related rows of every type, so it makes the same queries
+# for any customer with up to export.ITERATOR_CHUNK_SIZE policies of each type
+QUERY_BUDGETS = {
+    "register": 10,
+    "verify": 4,
+    "login": 4,
+    "generate": 70,
+    "dashboard": 40,
+    "documents": 4,
+    "search": 10,
+    "export": 30,
+    "delete": 15,
+}
+
+COMPANY_NAMES = ("Acme", "Southern Cross", "Harbour", "Blue Gum", "Coastal", "Outback", "Wattle")
+INDUSTRIES = ("Retail", "Healthcare", "Education", "Finance", "Software", "Hospitality", "Logistics")
+
+# policy text is drawn from these, so searches find realistic matches
+PHRASES = (
+    "we collect personal information", "when you create an account", "to provide our services",
+    "in accordance with the Australian Privacy Principles", "you may request access to", "we retain records",
+    "for as long as necessary", "third party service providers", "stored on secure servers in Australia",
+    "you may opt out of marketing", "refunds are issued within fourteen days", "subject to the Australian Consumer Law",
+    "we may suspend your account", "prohibited activities include", "unauthorised access to the service",
+    "data breaches are notified", "within seventy two hours", "the processor shall assist the controller",
+    "sub-processors are engaged", "cookies are small text files", "analytics cookies measure usage",
+    "you can disable cookies in your browser", "complaints are handled by our privacy officer",
+    "disputes are resolved by mediation", "these terms are governed by the laws of New South Wales",
+)
+
+HEADINGS = {
+    "privacy": ("Information We Collect", "How We Use Information", "Disclosure", "Overseas Recipients",
+                "Security", "Access and Correction", "Complaints", "Cookies"),
+    "tos": ("Acceptance", "Accounts", "Fees and Payment", "Refunds", "Acceptable Use", "User Content",
+            "Intellectual Property", "Liability", "Termination", "Disputes", "Governing Law", "Changes"),
+    "dpa": ("Definitions", "Scope", "Processing Instructions", "Confidentiality", "Security",
+            "Sub-processors", "Data Breach", "Audits", "Deletion", "Liability"),
+    "aup": ("Purpose", "Permitted Use", "Prohibited Activities", "Security", "Monitoring",
+            "Reporting", "Enforcement", "Changes"),
+    "cookie": ("What Are Cookies", "Essential Cookies", "Analytics Cookies", "Marketing Cookies",
+               "Third Parties", "Managing Cookies", "Retention", "Contact"),
+}
+
+
+# -----------------------------
+# Synthetic data
+# -----------------------------
+def _paragraphs(rng, count, sentences=(2, 4)):
+    return [
+        " ".join(
+            f"{rng.choice(PHRASES).capitalize()} {rng.choice(PHRASES)}."
+            for _ in range(rng.randint(*sentences))
+        )
+        for _ in range(count)
+    ]
+
+
+def _items(rng, count=3):
+    return [rng.choice(PHRASES).capitalize() for _ in range(count)]
+
+
+def _sections(rng, policy_type, model, parent_field, parent):
+    return [
+        model(**{parent_field: parent}, section_number=number, heading=heading, content=_paragraphs(rng, rng.randint(2, 5)))
+        for number, heading in enumerate(HEADINGS[policy_type], start=1)
+    ]
+
+
+def _meta(company):
+    slug = re.sub(r"\W+", "", company.name.lower())
+    return {
+        "company_name": company.name,
+        "last_updated": date.today().isoformat(),
+        "website_url": f"https://{slug}.example.com.au",
+        "contact_email": f"privacy@{slug}.example.com.au",
+    }
+
+
+def _seed_privacy(rng, customers):
+    policies = PrivacyPolicy.objects.bulk_create([
+        PrivacyPolicy(
+            customer_linked=customer,
+            company_name=customer.company.name,
+            last_updated=date.today().isoformat(),
+            introduction=_paragraphs(rng, 2),
+            complaints_process=_paragraphs(rng, 2),
+            oaic_contact=["Office of the Australian Information Commissioner", "www.oaic.gov.au"],
+            apps_addressed=list(range(1, 14)),
+        )
+        for customer in customers
+    ])
+    PrivacyPolicyContactInfo.objects.bulk_create([
+        PrivacyPolicyContactInfo(
+            policy=policy,
+            email=_meta(customer.company)["contact_email"],
+            website=_meta(customer.company)["website_url"],
+            postal_address="1 George Street, Sydney NSW 2000",
+        )
+        for policy, customer in zip(policies, customers)
+    ])
+    sections = PrivacyPolicySection.objects.bulk_create([
+        section for policy in policies for section in _sections(rng, "privacy", PrivacyPolicySection, "policy", policy)
+    ])
+    PrivacyPolicySubsection.objects.bulk_create([
+        PrivacyPolicySubsection(
+            section=section,
+            subsection_number=f"{section.section_number}.{n}",
+            heading=f"{section.heading} ({n})",
+            content=_paragraphs(rng, 2),
+        )
+        for section in sections if section.section_number % 3 == 1
+        for n in (1, 2)
+    ])
+
+
+def _seed_tos(rng, customers):
+    policies = TermsOfService.objects.bulk_create([
+        TermsOfService(
+            customer_linked=customer,
+            **_meta(customer.company),
+            governing_law="New South Wales, Australia",
+            service_description=_paragraphs(rng, 2),
+            service_type=["SaaS"],
+            payment_terms=_items(rng),
+            refund_policy=_items(rng),
+            prohibited_activities=_items(rng, 5),
+            liability_limitations=_items(rng),
+            termination_rights=_items(rng),
+        )
+        for customer in customers
+    ])
+    ToSSection.objects.bulk_create([
+        section for policy in policies for section in _sections(rng, "tos", ToSSection, "terms", policy)
+    ])
+
+
+def _seed_dpa(rng, customers):
+    policies = DataProcessingAgreement.objects.bulk_create([
+        DataProcessingAgreement(
+            customer_linked=customer,
+            **_meta(customer.company),
+            role_controller_or_processor=["Processor"],
+            breach_notification_timeframe=["72 hours"],
+            data_deletion_timelines=["30 days after termination"],
+            audit_rights=_items(rng, 2),
+            data_processing_locations=["Australia", "Singapore"],
+        )
+        for customer in customers
+    ])
+    DPADefinitions.objects.bulk_create([DPADefinitions(dpa=policy, terms=_items(rng, 6)) for policy in policies])
+    annexes = DPAAnnexA.objects.bulk_create([
+        DPAAnnexA(
+            dpa=policy,
+            subject_matter_of_processing=_items(rng, 2),
+            duration_of_processing=["For the term of the agreement"],
+            nature_and_purpose_of_processing=_items(rng, 2),
+            categories_of_data_subjects=["Customers", "Employees"],
+            types_of_personal_information=["Name", "Email address", "Payment details"],
+            data_processing_locations=["Australia"],
+        )
+        for policy in policies
+    ])
+    DPASubProcessor.objects.bulk_create([
+        DPASubProcessor(annex_a=annex, category_name=category, provider_names=providers)
+        for annex in annexes
+        for category, providers in (("Hosting", ["AWS Sydney"]), ("Email", ["SendGrid"]), ("Payments", ["Stripe"]))
+    ])
+    DPAAnnexB.objects.bulk_create([
+        DPAAnnexB(
+            dpa=policy,
+            technical_measures=["Encryption at rest", "TLS 1.2+"],
+            organisational_measures=["Staff training", "Access reviews"],
+            physical_security_measures=["Badge access"],
+            security_certifications=["ISO 27001"],
+        )
+        for policy in policies
+    ])
+    DPASection.objects.bulk_create([
+        section for policy in policies for section in _sections(rng, "dpa", DPASection, "dpa", policy)
+    ])
+
+
+def _seed_aup(rng, customers):
+    policies = AcceptableUsePolicy.objects.bulk_create([
+        AcceptableUsePolicy(
+            customer_linked=customer,
+            **_meta(customer.company),
+            permitted_usage_types=_items(rng),
+            prohibited_activities=_items(rng, 5),
+            user_monitoring_practices=_items(rng, 2),
+            reporting_illegal_activities=_items(rng, 2),
+        )
+        for customer in customers
+    ])
+    AUPSection.objects.bulk_create([
+        section for policy in policies for section in _sections(rng, "aup", AUPSection, "policy", policy)
+    ])
+
+
+def _seed_cookie(rng, customers):
+    policies = CookiePolicy.objects.bulk_create([
+        CookiePolicy(
+            customer_linked=customer,
+            company_name=customer.company.name,
+            last_updated=date.today().isoformat(),
+            contact_email=_meta(customer.company)["contact_email"],
+            website=_meta(customer.company)["website_url"],
+            introduction=_paragraphs(rng, 2),
+            cookie_types=["Essential", "Analytics", "Marketing"],
+            cookie_duration=["Session", "13 months"],
+        )
+        for customer in customers
+    ])
+    CookieThirdPartyService.objects.bulk_create([
+        CookieThirdPartyService(policy=policy, service_name=name, purpose=_items(rng, 1), opt_out_link=link)
+        for policy in policies
+        for name, link in (("Google Analytics", "https://tools.google.com/dlpage/gaoptout"), ("Meta Pixel", None), ("Hotjar", None))
+    ])
+    CookieBrowserInstruction.objects.bulk_create([
+        CookieBrowserInstruction(policy=policy, browser_name=name, instructions=_items(rng, 2), help_link=link)
+        for policy in policies
+        for name, link in (
+            ("Chrome", "https://support.google.com/chrome/answer/95647"),
+            ("Firefox", "https://support.mozilla.org/kb/clear-cookies-and-site-data-firefox"),
+            ("Safari", "https://support.apple.com/guide/safari/manage-cookies-sfri11471"),
+        )
+    ])
+    CookiePolicySection.objects.bulk_create([
+        section for policy in policies for section in _sections(rng, "cookie", CookiePolicySection, "policy", policy)
+    ])
+
+
+SEEDERS = {
+    "privacy": _seed_privacy,
+    "tos": _seed_tos,
+    "dpa": _seed_dpa,
+    "aup": _seed_aup,
+    "cookie": _seed_cookie,
+}
+
+
+def _seed_chunk(rng, run, start, size, password, now, policies_per_type):
+    """Customers start..start+size, their users and companies, and their policies; returns the policies created."""
+    companies = Company.objects.bulk_create([
+        Company(name=f"{rng.choice(COMPANY_NAMES)} {start + n} Pty Ltd", industry=rng.choice(INDUSTRIES))
+        for n in range(size)
+    ])
+    users = User.objects.bulk_create([
+        User(username=f"{PREFIX}{run}-{start + n}", email=f"{PREFIX}{run}-{start + n}@example.com",
+             password=password, last_login=now)
+        for n in range(size)
+    ])
+    batch = Customer.objects.bulk_create([
+        Customer(user=user, company=company, role="Owner", verified=True)
+        for user, company in zip(users, companies)
+    ])
+    policies = 0
+    for seeder in SEEDERS.values():
+        owners = [customer for customer in batch for _ in range(rng.randint(0, 2 * policies_per_type))]
+        if owners:
+            seeder(rng, owners)
+            policies += len(owners)
+    return policies
+
+
+def seed(customers, policies_per_type=2, chunk_size=200, random_seed=None, on_chunk=None):
+    """
+    Create verified customers with policies of every type.
+
+    Args:
+        customers: Number of customers
+        policies_per_type: Average policies of each type per customer (0 to twice this many)
+        chunk_size: Customers written per round of bulk inserts
+        on_chunk: Called with the number of customers created so far
+
+    Returns:
+        int: Policies created
+    """
+    rng = random.Random(random_seed)
+    run = uuid.uuid4().hex[:8]
+    password = make_password(PASSWORD)  # hashed once; every seeded user shares it
+    now = timezone.now()
+    created = policies = 0
+
+    while created < customers:
+        size = min(chunk_size, customers - created)
+        with transaction.atomic():
+            policies += _seed_chunk(rng, run, created, size, password, now, policies_per_type)
+        created += size
+        if on_chunk is not None:
+            on_chunk(created)
+    return policies
+
+
+def seeded_users():
+    """Usernames of the seeded users (not the ones the journeys register)."""
+    # journey users are PREFIX + "j...", seeded ones PREFIX + a hex run id
+    return list(
+        User.objects.filter(username__startswith=PREFIX).exclude(username__startswith=f"{PREFIX}j")
+        .values_list("username", flat=True)
+    )
+
+
+def clean():
+    """
+    Delete every user the load tests created, with their policies, and their companies.
+
+    Returns:
+        dict: Rows deleted per model label
+    """
+    deleted = {}
+    companies = list(Company.objects.filter(customer__user__username__startswith=PREFIX).values_list("id", flat=True))
+    delete_cascade(User.objects.filter(username__startswith=PREFIX), deleted)
+    delete_cascade(Company.objects.filter(id__in=companies, customer__isnull=True), deleted)
+    return deleted
+
+
+# -----------------------------
+# Stubbed generation
+# -----------------------------
+def canned_outputs():
+    """A seeded policy of every type, as the generator would return it."""
+    outputs = {}
+    for policy_type, (model, _) in POLICY_MODELS.items():
+        policy = model.objects.filter(customer_linked__user__username__startswith=PREFIX).order_by("id").first()
+        if policy is not None:
+            outputs[policy_type] = content_of(policy_type, policy)
+    return outputs
+
+
+@contextmanager
+def stub_generators(outputs, latency=0.0):
+    """
+    Make the generate views return `outputs[policy_type]` after `latency`
+    seconds, instead of running retrieval, the embeddings and the LLM.
+    """
+    import asyncio
+
+    from .views import AsyncGenerationView
+
+    def stub(policy_type):
+        async def generate(**data):
+            await asyncio.sleep(latency)
+            return json.loads(json.dumps(outputs[policy_type]))
+        return generate
+
+    views = [view for view in AsyncGenerationView.__subclasses__() if view.policy_type in outputs]
+    originals = {view: view.__dict__["generate"] for view in views}
+    try:
+        for view in views:
+            view.generate = staticmethod(stub(view.policy_type))
+        yield
+    finally:
+        for view, original in originals.items():
+            view.generate = original
+
+
+# -----------------------------
+# Measurement
+# -----------------------------
+def percentile(values, q):
+    """Nearest-rank percentile (q in 0..100) of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+class Stats:
+    """Latency, outcome and query count of every request, by endpoint; shared by the worker threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, name, seconds, queries, ok):
+        with self._lock:
+            self.samples.setdefault(name, []).append((seconds, queries, ok))
+
+    def summary(self, wall_seconds):
+        """Per endpoint: requests, errors, requests/s, p50/p95/p99/max ms, mean and max queries."""
+        rows = []
+        for name, samples in self.samples.items():
+            latencies = [seconds * 1000 for seconds, _, _ in samples]
+            queries = [count for _, count, _ in samples]
+            rows.append({
+                "endpoint": name,
+                "requests": len(samples),
+                "errors": sum(1 for *_, ok in samples if not ok),
+                "throughput": len(samples) / wall_seconds if wall_seconds else 0.0,
+                "p50_ms": percentile(latencies, 50),
+                "p95_ms": percentile(latencies, 95),
+                "p99_ms": percentile(latencies, 99),
+                "max_ms": max(latencies),
+                "queries_mean": statistics.fmean(queries),
+                "queries_max": max(queries),
+            })
+        return rows
+
+
+def over_budget(rows, budgets=QUERY_BUDGETS):
+    """Endpoints whose most queries in one request exceed their budget: [(endpoint, queries, budget)]."""
+    exceeded = []
+    for row in rows:
+        # "list privacy" and "generate aup" fall under the budget of their action
+        budget = budgets.get(row["endpoint"], budgets.get(row["endpoint"].split(" ")[0]))
+        if budget is not None and row["queries_max"] > budget:
+            exceeded.append((row["endpoint"], row["queries_max"], budget))
+    return exceeded
+
+
+# -----------------------------
+# Scenarios
+# -----------------------------
+class VirtualUser:
+    """One client session; every request is timed and its queries counted."""
+
+    def __init__(self, stats):
+        self.stats = stats
+        # DEBUG's default ALLOWED_HOSTS lets localhost through, not the test client's testserver
+        self.client = Client(SERVER_NAME="localhost")
+        self.headers = {}
+
+    def call(self, name, method, path, expect=(200,), data=None, **headers):
+        options = {"headers": {**self.headers, **headers}}
+        if data is not None:
+            # the query string of a GET, a JSON body otherwise
+            options.update({"data": data} if method == "get" else {"data": data, "content_type": "application/json"})
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = getattr(self.client, method)(path, **options)
+            if response.streaming:
+                # a streamed body is read, and its queries made, only as it is consumed
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        self.stats.record(name, elapsed, len(queries), response.status_code in expect)
+        return response
+
+    def login(self, email):
+        response = self.call("login", "post", "/api/login", data={"email": email, "password": PASSWORD})
+        if response.status_code != 200:
+            return False
+        self.headers = {"Authorization": f"Bearer {response.json()['access']}"}
+        return True
+
+
+def journey(stats, policy_type="aup"):
+    """A new user: register, verify, log in, generate a policy, list, dashboard, delete it."""
+    user = VirtualUser(stats)
+    name = f"{PREFIX}j{uuid.uuid4().hex[:12]}"
+    email = f"{name}@example.com"
+    segment = ENDPOINTS[policy_type]
+    try:
+        response = user.call("register", "post", "/api/register", expect=(201,), data={
+            "username": name, "email": email, "password": PASSWORD,
+            "company_name": f"{name} Pty Ltd", "industry_type": "Software", "role": "Owner",
+        })
+        if response.status_code != 201:
+            return
+
+        # the link the outbox worker would email
+        body = OutboxEmail.objects.filter(to=email, kind=OutboxEmail.VERIFICATION).values_list("body", flat=True).last()
+        token = re.search(r"token=(\S+)", body or "")
+        if token is None:
+            return
+        user.call("verify", "post", "/api/user/verify", data={"token": token.group(1)})
+        if not user.login(email):
+            return
+
+        base = f"/documents/generate/api/{segment}"
+        response = user.call(f"generate {policy_type}", "post", base, data={}, **{"Idempotency-Key": str(uuid.uuid4())})
+        user.call(f"list {policy_type}", "get", base)
+        user.call("dashboard", "get", "/documents/generate/api/dashboard")
+        if response.status_code == 200:
+            user.call(f"delete {policy_type}", "delete", f"{base}/{response.json()['id']}", expect=(200, 204))
+    finally:
+        connection.close()
+
+
+def browse(stats, username, query):
+    """A seeded user reads: the lists of every policy type, the dashboard, documents, a search and the export."""
+    user = VirtualUser(stats)
+    try:
+        email = User.objects.filter(username=username).values_list("email", flat=True).first()
+        if not email or not user.login(email):
+            return
+        for policy_type, segment in ENDPOINTS.items():
+            user.call(f"list {policy_type}", "get", f"/documents/generate/api/{segment}")
+        user.call("dashboard", "get", "/documents/generate/api/dashboard")
+        user.call("documents", "get", "/documents/generate/api/documents")
+        user.call("search", "get", "/documents/generate/api/search", data={"q": query})
+        user.call("export", "get", "/documents/generate/api/export/ndjson")
+    finally:
+        connection.close()
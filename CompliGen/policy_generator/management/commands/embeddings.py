@@ -0,0 +1,76 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client import QdrantClient
+from policy_generator.rag.collection import LOCAL_EMBEDDINGS_MODEL, LOCAL_MODEL_DIMENSIONS
+from policy_generator.rag.embeddings import LocalEmbeddings, compare_embeddings, make_embeddings, reembed_collection
+
+OPENAI_COLLECTION = "ingested_law_docs"
+LOCAL_COLLECTION = "ingested_law_docs_local"
+
+
+class Command(BaseCommand):
+    help = (
+        "Warm up the local embeddings model, fill its collection from the OpenAI one, "
+        "or compare the two on retrieval quality and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["warmup", "reembed", "benchmark"],
+            help=(
+                "warmup: load the local model and time it; "
+                "reembed: embed the chunks of --openai-collection into --local-collection; "
+                "benchmark: hit rate, MRR and latency of both"
+            ),
+        )
+        parser.add_argument("--model", default=LOCAL_EMBEDDINGS_MODEL, help="Local sentence-transformers model")
+        parser.add_argument("--dimensions", type=int, help="Output size of the local model (known models need none)")
+        parser.add_argument("--openai-collection", default=OPENAI_COLLECTION)
+        parser.add_argument("--local-collection", default=LOCAL_COLLECTION)
+        parser.add_argument("--url", help="Qdrant URL (default QDRANT_URL)")
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--samples", type=int, default=100)
+
+    def handle(self, *args, **options):
+        local = LocalEmbeddings(model=options["model"])
+        seconds = local.warmup()
+        self.stdout.write(f"Loaded {options['model']} in {seconds:.1f}s")
+        if options["action"] == "warmup":
+            return
+
+        if options["url"]:
+            client = QdrantClient(url=options["url"])
+        else:
+            client = QdrantClient(url=os.environ.get("QDRANT_URL"), api_key=os.environ.get("QDRANT_API_KEY"))
+
+        if options["action"] == "reembed":
+            dimensions = options["dimensions"] or LOCAL_MODEL_DIMENSIONS.get(options["model"])
+            if not dimensions:
+                raise CommandError(f"--dimensions is needed for {options['model']}")
+            embedded = reembed_collection(client, options["openai_collection"], options["local_collection"], local, dimensions)
+            self.stdout.write(self.style.SUCCESS(
+                f"Embedded {embedded} chunks of {options['openai_collection']} into {options['local_collection']}"
+            ))
+            self.stdout.write("Set EMBEDDINGS_PROVIDER=local to search it.")
+            return
+
+        rows = compare_embeddings(
+            client,
+            [
+                ("openai", make_embeddings("openai"), options["openai_collection"]),
+                (options["model"], local, options["local_collection"]),
+            ],
+            k=options["k"],
+            samples=options["samples"],
+        )
+        self.stdout.write(
+            f"{'model':<32} {'hit@' + str(options['k']):>7} {'MRR':>6} "
+            f"{'embed p50':>10} {'embed p95':>10} {'search p50':>11} {'search p95':>11}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['label']:<32} {row['hit_rate']:>7.3f} {row['mrr']:>6.3f} "
+                f"{row['embed_p50_ms']:>8.1f}ms {row['embed_p95_ms']:>8.1f}ms "
+                f"{row['search_p50_ms']:>9.1f}ms {row['search_p95_ms']:>9.1f}ms"
+            )
@@ -0,0 +1,146 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from qdrant_client import QdrantClient
+from policy_generator.rag.collection import (
+    COLLECTION_NAME,
+    EMBEDDING_DIMENSIONS,
+    FULL_DIMENSIONS,
+    ON_DISK_PAYLOAD,
+    QUANTIZATION,
+    QUANTIZATIONS,
+    copy_collection,
+    create_collection,
+    recall_report,
+    update_collection,
+)
+from policy_generator.rag import pg_store
+from policy_generator.rag.local_index import DTYPES, export_index
+from policy_generator.rag.reindex import ReindexError, adopt, live_version, rollback, versions
+
+LOCAL_QDRANT_URL = "http://localhost:6333"
+
+
+class Command(BaseCommand):
+    help = (
+        "Create, migrate or export the law collection (quantization, on-disk payload, "
+        "truncated embeddings), or report recall versus latency for those settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["create", "update", "copy", "report", "export", "pgvector", "versions", "rollback", "adopt"],
+            help=(
+                "create: new collection; update: quantization and payload storage in place; "
+                "copy: into --target with new settings (e.g. fewer dimensions); "
+                "report: recall/latency of --settings against a local Qdrant; "
+                "export: snapshot for in-process search into --output; "
+                "pgvector: copy the collection into a new Postgres table and swap it in for the live one; "
+                "versions: list the versions behind the alias; rollback: switch the alias to the previous one; "
+                "adopt: turn a plain collection into the first version behind the alias"
+            ),
+        )
+        parser.add_argument("--collection", default=COLLECTION_NAME, help="Collection to act on (the source for copy/report)")
+        parser.add_argument("--target", help="Collection to copy into")
+        parser.add_argument("--dimensions", type=int, default=EMBEDDING_DIMENSIONS)
+        parser.add_argument("--quantization", choices=QUANTIZATIONS, default=QUANTIZATION)
+        parser.add_argument("--on-disk-payload", dest="on_disk_payload", action="store_true", default=ON_DISK_PAYLOAD)
+        parser.add_argument("--payload-in-ram", dest="on_disk_payload", action="store_false")
+        parser.add_argument(
+            "--url",
+            help=f"Qdrant URL (default QDRANT_URL; {LOCAL_QDRANT_URL} for report)",
+        )
+        parser.add_argument(
+            "--settings",
+            nargs="+",
+            default=["1536:none", "1536:scalar", "1536:binary", "512:scalar", "256:scalar"],
+            help="dimensions:quantization pairs to compare in the report",
+        )
+        parser.add_argument("--output", help="Directory to export the snapshot to (VECTOR_INDEX_PATH)")
+        parser.add_argument("--dtype", choices=DTYPES, default="float16", help="Precision of the exported vectors")
+        parser.add_argument("--k", type=int, default=8)
+        parser.add_argument("--samples", type=int, default=100)
+
+    def handle(self, *args, **options):
+        action = options["action"]
+        if not 0 < options["dimensions"] <= FULL_DIMENSIONS:
+            raise CommandError(f"--dimensions must be between 1 and {FULL_DIMENSIONS}")
+
+        if options["url"]:
+            client = QdrantClient(url=options["url"])
+        elif action == "report":
+            # the report creates and drops collections: keep it off the production cluster
+            client = QdrantClient(url=LOCAL_QDRANT_URL)
+        else:
+            client = QdrantClient(url=os.environ.get("QDRANT_URL"), api_key=os.environ.get("QDRANT_API_KEY"))
+
+        name = options["collection"]
+        if action == "create":
+            create_collection(client, name, options["dimensions"], options["quantization"], options["on_disk_payload"])
+            self.stdout.write(self.style.SUCCESS(f"Created {name}"))
+
+        elif action == "update":
+            update_collection(client, name, options["quantization"], options["on_disk_payload"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Updated {name}: quantization={options['quantization']}, on_disk_payload={options['on_disk_payload']}"
+            ))
+
+        elif action == "copy":
+            if not options["target"]:
+                raise CommandError("copy needs --target")
+            copied = copy_collection(
+                client, name, options["target"],
+                options["dimensions"], options["quantization"], options["on_disk_payload"],
+            )
+            self.stdout.write(self.style.SUCCESS(f"Copied {copied} points from {name} to {options['target']}"))
+            self.stdout.write("Point QDRANT_COLLECTION, EMBEDDING_DIMENSIONS and QDRANT_QUANTIZATION at it to use it.")
+
+        elif action == "export":
+            if not options["output"]:
+                raise CommandError("export needs --output")
+            rows = export_index(client, name, options["output"], options["dtype"])
+            self.stdout.write(self.style.SUCCESS(f"Exported {rows} rows of {name} to {options['output']}"))
+            self.stdout.write("Set VECTOR_INDEX_PATH to it and restart the workers to search in process.")
+
+        elif action in ("versions", "rollback", "adopt"):
+            try:
+                if action == "rollback":
+                    self.stdout.write(self.style.SUCCESS(f"{name} now points at {rollback(client, name)}"))
+                elif action == "adopt":
+                    self.stdout.write(self.style.SUCCESS(f"{name} is now an alias of {adopt(client, name)}"))
+                live = live_version(client, name)
+            except ReindexError as e:
+                raise CommandError(str(e))
+            for version in versions(client, name):
+                points = client.count(collection_name=version, exact=True).count
+                self.stdout.write(f"{'*' if version == live else ' '} {version} ({points} points)")
+
+        elif action == "pgvector":
+            staging = pg_store.create_staging_table(options["dimensions"])
+            copied = pg_store.copy_from_qdrant(client, name, staging)
+            try:
+                pg_store.validate_table(staging, copied)
+            except ReindexError as e:
+                raise CommandError(str(e))
+            pg_store.swap_table(staging)
+            self.stdout.write(self.style.SUCCESS(f"Copied {copied} points from {name} to the {pg_store.TABLE} table"))
+            self.stdout.write("Set VECTOR_BACKEND=pgvector to search it.")
+
+        else:
+            rows = recall_report(client, name, self._settings(options["settings"]), k=options["k"], samples=options["samples"])
+            self.stdout.write(f"{'dims':>6} {'quantization':<13} {'recall@' + str(options['k']):>9} {'p50 ms':>8} {'p95 ms':>8} {'RAM MB':>8}")
+            for row in rows:
+                self.stdout.write(
+                    f"{row['dimensions']:>6} {row['quantization']:<13} {row['recall']:>9.3f} "
+                    f"{row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} {row['vector_ram_mb']:>8.1f}"
+                )
+
+    @staticmethod
+    def _settings(values):
+        settings = []
+        for value in values:
+            dimensions, _, quantization = value.partition(":")
+            if not dimensions.isdigit() or quantization not in QUANTIZATIONS:
+                raise CommandError(f"Invalid setting {value!r}, expected dimensions:quantization (e.g. 512:scalar)")
+            settings.append((int(dimensions), quantization))
+        return settings
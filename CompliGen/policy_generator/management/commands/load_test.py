@@ -0,0 +1,117 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from policy_generator import loadtest
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the authentication and policy endpoints in process, with the LLM, embeddings and "
+        "vector store stubbed: seed synthetic customers, run user journeys and report throughput, "
+        "latency percentiles and queries per endpoint, or clean the load-test data up."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "action",
+            choices=["seed", "run", "clean"],
+            help=(
+                "seed: create --customers verified customers with nested policies of every type; "
+                "run: --journeys new-user journeys and --browsers read sessions of seeded users; "
+                "clean: delete every load-test user and their data"
+            ),
+        )
+        parser.add_argument("--customers", type=int, default=1000, help="seed: customers to create")
+        parser.add_argument("--policies", type=int, default=2, help="seed: average policies of each type per customer")
+        parser.add_argument("--seed", type=int, help="seed: random seed, for repeatable data")
+        parser.add_argument("--journeys", type=int, default=50, help="run: register -> ... -> delete journeys")
+        parser.add_argument("--browsers", type=int, default=200, help="run: read sessions of seeded users")
+        parser.add_argument("--concurrency", type=int, default=8, help="run: virtual users at a time (threads)")
+        parser.add_argument("--policy-type", choices=sorted(loadtest.ENDPOINTS), default="aup", help="run: type the journeys generate")
+        parser.add_argument("--llm-latency", type=float, default=0.0, help="run: seconds the stubbed generation takes")
+        parser.add_argument("--output", help="run: write the report to this JSON file")
+        parser.add_argument("--baseline", help="run: fail when a p95 is over --tolerance of this earlier report's")
+        parser.add_argument("--tolerance", type=float, default=0.25, help="run: allowed p95 increase over the baseline (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        getattr(self, f"_{options['action']}")(options)
+
+    def _seed(self, options):
+        started = time.perf_counter()
+        policies = loadtest.seed(
+            options["customers"],
+            policies_per_type=options["policies"],
+            random_seed=options["seed"],
+            on_chunk=lambda created: self.stdout.write(f"  {created} customers"),
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {options['customers']} customers and {policies} policies in {time.perf_counter() - started:.1f} s"
+        ))
+
+    def _clean(self, options):
+        deleted = loadtest.clean()
+        self.stdout.write(self.style.SUCCESS(f"Deleted {sum(deleted.values())} rows"))
+        for label, count in sorted(deleted.items()):
+            self.stdout.write(f"  {count:8d}  {label}")
+
+    def _run(self, options):
+        users = loadtest.seeded_users()
+        outputs = loadtest.canned_outputs()
+        if not users or options["policy_type"] not in outputs:
+            raise CommandError("No seeded data; run `python manage.py load_test seed` first")
+
+        rng = random.Random(options["seed"])
+        stats = loadtest.Stats()
+        tasks = [lambda: loadtest.journey(stats, options["policy_type"])] * options["journeys"]
+        tasks += [
+            (lambda username, query: lambda: loadtest.browse(stats, username, query))(
+                rng.choice(users), " ".join(rng.choice(loadtest.PHRASES).split()[:2])
+            )
+            for _ in range(options["browsers"])
+        ]
+        rng.shuffle(tasks)
+
+        self.stdout.write(
+            f"{options['journeys']} journeys and {options['browsers']} read sessions, "
+            f"{options['concurrency']} at a time, over {len(users)} seeded users"
+        )
+        with loadtest.stub_generators(outputs, latency=options["llm_latency"]):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+                for future in [pool.submit(task) for task in tasks]:
+                    future.result()
+            wall = time.perf_counter() - started
+
+        rows = sorted(stats.summary(wall), key=lambda row: row["endpoint"])
+        self.stdout.write(
+            f"\n{'endpoint':<18} {'reqs':>6} {'errors':>6} {'req/s':>7} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'max ms':>8} {'queries':>8} {'max q':>6}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['endpoint']:<18} {row['requests']:>6} {row['errors']:>6} {row['throughput']:>7.1f} "
+                f"{row['p50_ms']:>8.1f} {row['p95_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} "
+                f"{row['queries_mean']:>8.1f} {row['queries_max']:>6}"
+            )
+        self.stdout.write(f"\n{sum(row['requests'] for row in rows)} requests in {wall:.1f} s")
+
+        if options["output"]:
+            Path(options["output"]).write_text(json.dumps({"wall_seconds": wall, "endpoints": rows}, indent=2))
+
+        problems = [f"{row['endpoint']}: {row['errors']} failed requests" for row in rows if row["errors"]]
+        problems += [
+            f"{endpoint}: {queries} queries in one request, budget {budget}"
+            for endpoint, queries, budget in loadtest.over_budget(rows)
+        ]
+        if options["baseline"]:
+            baseline = {row["endpoint"]: row for row in json.loads(Path(options["baseline"]).read_text())["endpoints"]}
+            for row in rows:
+                before = baseline.get(row["endpoint"])
+                if before and row["p95_ms"] > before["p95_ms"] * (1 + options["tolerance"]):
+                    problems.append(f"{row['endpoint']}: p95 {row['p95_ms']:.1f} ms, baseline {before['p95_ms']:.1f} ms")
+        if problems:
+            raise CommandError("Load test regressions:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS("No regressions"))
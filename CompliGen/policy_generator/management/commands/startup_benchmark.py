@@ -0,0 +1,78 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# SDKs that only generations need; none of them should be imported at startup
+HEAVY_MODULES = (
+    "langchain_core",
+    "langchain_google_genai",
+    "google.genai",
+    "langchain_openai",
+    "openai",
+    "langchain_qdrant",
+    "qdrant_client",
+    "sentence_transformers",
+)
+
+# what a worker does before it can serve: load the app and its URLconf (views)
+WSGI_READY = (
+    "import CompliGen.wsgi\n"
+    "from django.urls import get_resolver\n"
+    "get_resolver().url_patterns\n"
+)
+
+LOADED_SDKS = WSGI_READY + (
+    "import sys\n"
+    f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure startup: time-to-ready of `manage.py check` and of the WSGI app, "
+        "the slowest imports (python -X importtime) and the SDKs loaded at startup."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5, help="Runs per measurement (the median is reported)")
+        parser.add_argument("--top", type=int, default=15, help="Slowest imports to list")
+
+    def _python(self, *args):
+        env = {**os.environ, "RAG_WARM_UP": "false", "DJANGO_SETTINGS_MODULE": "CompliGen.settings"}
+        return subprocess.run(
+            [sys.executable, *args], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+
+    def _time(self, *args, runs):
+        seconds = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            self._python(*args)
+            seconds.append(time.perf_counter() - started)
+        return statistics.median(seconds)
+
+    def handle(self, *args, **options):
+        runs = options["runs"]
+        self.stdout.write(f"manage.py check   {self._time('manage.py', 'check', runs=runs) * 1000:8.0f} ms")
+        self.stdout.write(f"WSGI app ready    {self._time('-c', WSGI_READY, runs=runs) * 1000:8.0f} ms")
+
+        loaded = self._python("-c", LOADED_SDKS).stdout.strip()
+        self.stdout.write(f"SDKs loaded at startup: {loaded or 'none'}")
+
+        # -X importtime writes "import time: self [us] | cumulative | name" lines to stderr
+        report = self._python("-X", "importtime", "-c", WSGI_READY).stderr
+        packages = {}
+        for line in report.splitlines():
+            if not line.startswith("import time:") or "cumulative" in line:
+                continue
+            own, _, name = line[len("import time:"):].split("|")
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(own)
+        total = sum(packages.values())
+        self.stdout.write(f"\nImport time of the WSGI app by package (total {total / 1000:.0f} ms):")
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:options["top"]]:
+            self.stdout.write(f"  {own / 1000:8.1f} ms  {package}")
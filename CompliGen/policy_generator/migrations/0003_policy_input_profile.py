@@ -0,0 +1,48 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_generator', '0002_remove_termsofservice_tos_acl_statement_exact'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acceptableusepolicy',
+            name='input_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='cookiepolicy',
+            name='input_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='dataprocessingagreement',
+            name='input_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='privacypolicy',
+            name='input_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='termsofservice',
+            name='input_profile',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='cookiepolicy',
+            name='last_updated',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='privacypolicy',
+            name='last_updated',
+            field=models.CharField(max_length=255),
+        ),
+    ]
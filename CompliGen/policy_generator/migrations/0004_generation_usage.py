@@ -0,0 +1,38 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('policy_generator', '0003_policy_input_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('policy_type', models.CharField(choices=[('privacy', 'Privacy Policy'), ('tos', 'Terms of Service'), ('dpa', 'Data Processing Agreement'), ('aup', 'Acceptable Use Policy'), ('cookie', 'Cookie Policy')], max_length=20)),
+                ('operation', models.CharField(choices=[('generate', 'Full generation'), ('section', 'Section regeneration'), ('update', 'Incremental update')], default='generate', max_length=20)),
+                ('policy_id', models.BigIntegerField(blank=True, null=True)),
+                ('model', models.CharField(blank=True, max_length=100)),
+                ('input_tokens', models.PositiveIntegerField(default=0)),
+                ('output_tokens', models.PositiveIntegerField(default=0)),
+                ('embedding_tokens', models.PositiveIntegerField(default=0)),
+                ('cache_hits', models.PositiveIntegerField(default=0)),
+                ('latency_ms', models.PositiveIntegerField(default=0)),
+                ('estimated_cost_usd', models.DecimalField(decimal_places=6, default=0, max_digits=12)),
+                ('succeeded', models.BooleanField(default=True)),
+                ('details', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer_linked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_usage', to='authentication.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['customer_linked', 'created_at'], name='policy_gene_custome_5567c6_idx'), models.Index(fields=['policy_type', 'created_at'], name='policy_gene_policy__b9d376_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('policy_generator', '0004_generation_usage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tokens', models.FloatField()),
+                ('refilled_at', models.DateTimeField()),
+                ('customer_linked', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='generation_bucket', to='authentication.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='GenerationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('priority', models.CharField(choices=[('interactive', 'Interactive'), ('bulk', 'Bulk')], default='interactive', max_length=20)),
+                ('path', models.CharField(blank=True, max_length=255)),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_slots', to='authentication.company')),
+                ('customer_linked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_slots', to='authentication.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='policy_gene_expires_433a18_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.7 on 2026-10-19 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_generator', '0005_generation_admission'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generationslot',
+            name='cancel_requested',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='generationslot',
+            name='request_id',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
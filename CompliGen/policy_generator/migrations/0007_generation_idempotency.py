@@ -0,0 +1,36 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('policy_generator', '0006_generation_cancellation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GenerationRequest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255)),
+                ('fingerprint', models.CharField(max_length=64)),
+                ('path', models.CharField(blank=True, max_length=255)),
+                ('replayable', models.BooleanField(default=True)),
+                ('state', models.CharField(choices=[('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], default='running', max_length=20)),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('started_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer_linked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='generation_requests', to='authentication.customer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='policy_gene_expires_d2ebd6_idx')],
+                'constraints': [models.UniqueConstraint(fields=('customer_linked', 'key'), name='unique_generation_request_key')],
+            },
+        ),
+    ]
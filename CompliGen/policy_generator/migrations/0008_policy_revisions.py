@@ -0,0 +1,54 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:33
+
+import django.contrib.postgres.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('authentication', '0001_initial'),
+        ('policy_generator', '0007_generation_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PolicyDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('policy_type', models.CharField(choices=[('privacy', 'Privacy Policy'), ('tos', 'Terms of Service'), ('dpa', 'Data Processing Agreement'), ('aup', 'Acceptable Use Policy'), ('cookie', 'Cookie Policy')], max_length=20)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('latest_number', models.PositiveIntegerField(default=0)),
+                ('latest_policy_id', models.BigIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('customer_linked', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='policy_documents', to='authentication.customer')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PolicyRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('operation', models.CharField(choices=[('generate', 'Full generation'), ('section', 'Section regeneration'), ('update', 'Incremental update')], default='generate', max_length=20)),
+                ('policy_id', models.BigIntegerField(db_index=True)),
+                ('snapshot', models.JSONField(blank=True, null=True)),
+                ('delta', models.JSONField(blank=True, null=True)),
+                ('changed_sections', django.contrib.postgres.fields.ArrayField(base_field=models.IntegerField(), blank=True, default=list, size=None)),
+                ('changed_fields', django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=100), blank=True, default=list, size=None)),
+                ('stored_bytes', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('base', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='deltas', to='policy_generator.policyrevision')),
+                ('document', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='revisions', to='policy_generator.policydocument')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='policydocument',
+            index=models.Index(fields=['customer_linked', 'policy_type', '-updated_at'], name='policy_gene_custome_ca63e1_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='policyrevision',
+            constraint=models.UniqueConstraint(fields=('document', 'number'), name='unique_policy_revision_number'),
+        ),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.7 on 2026-10-19 12:44
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import policy_generator.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('policy_generator', '0008_policy_revisions'),
+    ]
+
+    operations = [
+        # array_to_string() is only STABLE; the search vectors are generated columns, which need IMMUTABLE
+        migrations.RunSQL(
+            sql=(
+                "CREATE FUNCTION policy_paragraph_text(text[]) RETURNS text "
+                "LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT array_to_string($1, ' ') $$"
+            ),
+            reverse_sql="DROP FUNCTION policy_paragraph_text(text[])",
+        ),
+        migrations.AddField(
+            model_name='aupsection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='cookiepolicysection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='dpasection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='privacypolicysection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='privacypolicysubsection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='tossection',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.CombinedSearchVector(django.contrib.postgres.search.SearchVector('heading', config='english', weight='A'), '||', django.contrib.postgres.search.SearchVector(policy_generator.models.ParagraphText('content'), config='english', weight='B'), django.contrib.postgres.search.SearchConfig('english')), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='aupsection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__a98bc4_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='cookiepolicysection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__2b59b1_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='dpasection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__8c1550_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='privacypolicysection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__a078ed_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='privacypolicysubsection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__6dade5_gin'),
+        ),
+        migrations.AddIndex(
+            model_name='tossection',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='policy_gene_search__44e517_gin'),
+        ),
+    ]
@@ -2,12 +2,48 @@ from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.indexes import GinIndex
-from authentication.models import Customer
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from authentication.models import Company, Customer
 
 ACL_EXACT_STATEMENT = (
     "Nothing in these Terms excludes, restricts or modifies rights under the Australian Consumer Law."
 )
 
+# text search configuration of the section search vectors and of search queries
+SEARCH_CONFIG = "english"
+
+
+class ParagraphText(models.Func):
+    """
+    The paragraphs of an ArrayField as one text. array_to_string() is not
+    IMMUTABLE, which a generated column needs, so migration 0009 wraps it in
+    policy_paragraph_text().
+    """
+    function = "policy_paragraph_text"
+    output_field = models.TextField()
+
+
+def section_search_vector():
+    """
+    Generated, stored full-text search vector of a section: its heading
+    (weight A) and its paragraphs (weight B), kept up to date by Postgres.
+    """
+    return models.GeneratedField(
+        expression=(
+            SearchVector("heading", config=SEARCH_CONFIG, weight="A")
+            + SearchVector(ParagraphText("content"), config=SEARCH_CONFIG, weight="B")
+        ),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+
+class SectionManager(models.Manager):
+    """Sections without their search vector, which only search queries read."""
+
+    def get_queryset(self):
+        return super().get_queryset().defer("search_vector")
+
 
 #---------------------------------------------------------------------------------------------------------
 # TERMS OF SERVICE
@@ -156,6 +192,9 @@ class TermsOfService(models.Model):
         blank=True
     )
 
+    # the generation input, kept so later profile edits can be diffed
+    input_profile = models.JSONField(default=dict, blank=True)
+
     # Audit meta (optional but useful for “professional” app)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -185,6 +224,10 @@ class ToSSection(models.Model):
         help_text="Array of paragraphs; each item is a paragraph"
     )
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -192,6 +235,7 @@ class ToSSection(models.Model):
                 name="unique_section_number_per_terms",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["section_number"]
 
     def __str__(self):
@@ -222,6 +266,9 @@ class AcceptableUsePolicy(models.Model):
     user_monitoring_practices = ArrayField(models.TextField(), default=list, blank=True)
     reporting_illegal_activities = ArrayField(models.TextField(), default=list, blank=True)
 
+    # the generation input, kept so later profile edits can be diffed
+    input_profile = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -246,6 +293,10 @@ class AUPSection(models.Model):
     heading = models.CharField(max_length=255)
     content = ArrayField(models.TextField(), default=list, blank=True)
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -253,6 +304,7 @@ class AUPSection(models.Model):
                 name="unique_section_number_per_aup",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["section_number"]
 
     def __str__(self):
@@ -282,6 +334,9 @@ class DataProcessingAgreement(models.Model):
     audit_rights = ArrayField(models.TextField(), default=list, blank=True)
     data_processing_locations = ArrayField(models.TextField(), default=list, blank=True)
 
+    # the generation input, kept so later profile edits can be diffed
+    input_profile = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -362,6 +417,10 @@ class DPASection(models.Model):
     heading = models.CharField(max_length=255)
     content = ArrayField(models.TextField(), default=list, blank=True)
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -369,6 +428,7 @@ class DPASection(models.Model):
                 name="unique_section_number_per_dpa",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["section_number"]
 
     def __str__(self):
@@ -418,6 +478,9 @@ class PrivacyPolicy(models.Model):
         help_text="List of APP numbers addressed (1–13)"
     )
 
+    # the generation input, kept so later profile edits can be diffed
+    input_profile = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -461,6 +524,10 @@ class PrivacyPolicySection(models.Model):
         blank=True
     )
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -468,6 +535,7 @@ class PrivacyPolicySection(models.Model):
                 name="unique_privacy_section_number_per_policy",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["section_number"]
 
     def __str__(self):
@@ -489,6 +557,10 @@ class PrivacyPolicySubsection(models.Model):
         blank=True
     )
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -496,6 +568,7 @@ class PrivacyPolicySubsection(models.Model):
                 name="unique_privacy_subsection_number_per_section",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["subsection_number"]
 
     def __str__(self):
@@ -545,6 +618,9 @@ class CookiePolicy(models.Model):
     contact_phone = models.CharField(max_length=50, blank=True, null=True)
     website = models.URLField(max_length=500)
 
+    # the generation input, kept so later profile edits can be diffed
+    input_profile = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -620,6 +696,10 @@ class CookiePolicySection(models.Model):
         blank=True
     )
 
+    search_vector = section_search_vector()
+
+    objects = SectionManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -627,7 +707,241 @@ class CookiePolicySection(models.Model):
                 name="unique_cookie_section_number_per_policy",
             )
         ]
+        indexes = [GinIndex(fields=["search_vector"])]
         ordering = ["section_number"]
 
     def __str__(self):
         return f"Section {self.section_number}: {self.heading}"
+
+
+#---------------------------------------------------------------------------------------------------------
+# USAGE ACCOUNTING
+#---------------------------------------------------------------------------------------------------------
+
+
+class GenerationUsage(models.Model):
+    """Token usage, cost and latency of one generation request."""
+
+    POLICY_TYPES = [
+        ("privacy", "Privacy Policy"),
+        ("tos", "Terms of Service"),
+        ("dpa", "Data Processing Agreement"),
+        ("aup", "Acceptable Use Policy"),
+        ("cookie", "Cookie Policy"),
+    ]
+
+    OPERATIONS = [
+        ("generate", "Full generation"),
+        ("section", "Section regeneration"),
+        ("update", "Incremental update"),
+    ]
+
+    customer_linked = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="generation_usage"
+    )
+
+    policy_type = models.CharField(max_length=20, choices=POLICY_TYPES)
+    operation = models.CharField(max_length=20, choices=OPERATIONS, default="generate")
+
+    # id of the saved policy row in the table for policy_type (null if nothing was saved)
+    policy_id = models.BigIntegerField(blank=True, null=True)
+
+    model = models.CharField(max_length=100, blank=True)
+    input_tokens = models.PositiveIntegerField(default=0)
+    output_tokens = models.PositiveIntegerField(default=0)
+    embedding_tokens = models.PositiveIntegerField(default=0)
+    cache_hits = models.PositiveIntegerField(default=0)
+    latency_ms = models.PositiveIntegerField(default=0)
+    estimated_cost_usd = models.DecimalField(max_digits=12, decimal_places=6, default=0)
+    succeeded = models.BooleanField(default=True)
+
+    # per LLM call breakdown and approximate token size of each prompt part
+    details = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer_linked", "created_at"]),
+            models.Index(fields=["policy_type", "created_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.policy_type} {self.operation}: {self.input_tokens}+{self.output_tokens} tokens"
+
+
+#---------------------------------------------------------------------------------------------------------
+# ADMISSION CONTROL
+#---------------------------------------------------------------------------------------------------------
+
+
+class GenerationSlot(models.Model):
+    """
+    An in-flight generation. Rows are shared by every worker, so the count of
+    live rows is the number of generations running for a customer/company.
+    """
+
+    PRIORITIES = [
+        ("interactive", "Interactive"),
+        ("bulk", "Bulk"),
+    ]
+
+    customer_linked = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="generation_slots"
+    )
+    company = models.ForeignKey(
+        Company,
+        on_delete=models.CASCADE,
+        related_name="generation_slots"
+    )
+    priority = models.CharField(max_length=20, choices=PRIORITIES, default="interactive")
+    path = models.CharField(max_length=255, blank=True)
+
+    # client supplied X-Request-ID, so the generation can be cancelled from
+    # another request (DELETE api/generations/<request_id>)
+    request_id = models.CharField(max_length=64, blank=True, db_index=True)
+    cancel_requested = models.BooleanField(default=False)
+
+    # lease: a worker that dies mid generation never releases its slot,
+    # so slots past this time no longer count
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+
+class GenerationBucket(models.Model):
+    """Token bucket limiting how often a customer can start a generation."""
+
+    customer_linked = models.OneToOneField(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="generation_bucket"
+    )
+    tokens = models.FloatField()
+    refilled_at = models.DateTimeField()
+
+
+class GenerationRequest(models.Model):
+    """
+    A generation POST, keyed by the client's Idempotency-Key (or by a hash of
+    the request when it sent none), so a retried or duplicated request
+    attaches to the running generation or gets its stored result instead of
+    starting another one. See idempotency.py.
+    """
+
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    STATES = [
+        (RUNNING, "Running"),
+        (SUCCEEDED, "Succeeded"),
+        (FAILED, "Failed"),
+    ]
+
+    customer_linked = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="generation_requests"
+    )
+    key = models.CharField(max_length=255)
+    # hash of the path and body, a key reused for another request is refused
+    fingerprint = models.CharField(max_length=64)
+    path = models.CharField(max_length=255, blank=True)
+    # False for requests without a key: only concurrent duplicates share a result
+    replayable = models.BooleanField(default=True)
+
+    state = models.CharField(max_length=20, choices=STATES, default=RUNNING)
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+
+    # identifies the attempt: a generation whose lease expired is taken over by the next request
+    started_at = models.DateTimeField()
+    # lease while running, then the end of the time the result is kept
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["customer_linked", "key"], name="unique_generation_request_key"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+
+#---------------------------------------------------------------------------------------------------------
+# REVISION HISTORY
+#---------------------------------------------------------------------------------------------------------
+
+
+class PolicyDocument(models.Model):
+    """
+    One document of a customer across its generations: a new generation
+    starts a document, updates and section regenerations add revisions to it.
+    """
+
+    customer_linked = models.ForeignKey(
+        Customer,
+        on_delete=models.CASCADE,
+        related_name="policy_documents"
+    )
+    policy_type = models.CharField(max_length=20, choices=GenerationUsage.POLICY_TYPES)
+    # company name of the latest revision, so documents can be listed without their content
+    title = models.CharField(max_length=255, blank=True)
+    latest_number = models.PositiveIntegerField(default=0)
+    latest_policy_id = models.BigIntegerField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["customer_linked", "policy_type", "-updated_at"]),
+        ]
+
+
+class PolicyRevision(models.Model):
+    """
+    The content of a document at one point. A revision stores either a full
+    snapshot, or a section-level delta against the snapshot in `base`
+    (see revisions.py).
+    """
+
+    document = models.ForeignKey(PolicyDocument, on_delete=models.CASCADE, related_name="revisions")
+    number = models.PositiveIntegerField()
+    operation = models.CharField(max_length=20, choices=GenerationUsage.OPERATIONS, default="generate")
+
+    # id of the policy row in the table for the document's policy_type; the
+    # rows of a version an update replaced are deleted (see revisions.py)
+    policy_id = models.BigIntegerField(db_index=True)
+
+    base = models.ForeignKey(
+        "self",
+        on_delete=models.PROTECT,
+        null=True,
+        blank=True,
+        related_name="deltas"
+    )
+    snapshot = models.JSONField(null=True, blank=True)
+    delta = models.JSONField(null=True, blank=True)
+
+    # section numbers that differ from the previous revision, for the revision list
+    changed_sections = ArrayField(models.IntegerField(), default=list, blank=True)
+    changed_fields = ArrayField(models.CharField(max_length=100), default=list, blank=True)
+    # bytes of JSON stored for this revision
+    stored_bytes = models.PositiveIntegerField(default=0)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["document", "number"], name="unique_policy_revision_number"),
+        ]
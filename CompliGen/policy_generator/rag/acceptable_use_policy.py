@@ -2,55 +2,32 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from .policy_outputs import StructuredAcceptableUsePolicy
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+from .fragments import CONTACT_FIELDS, contact_fragments, fill, without_fields
+from .prompt_cache import static_prefix
 
 # -----------------------------
 # Setup (same as your pattern)
 # -----------------------------
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.3,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    streaming=False,
-)
-
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",  # Cost-effective and good quality
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
-
-# Initialize Qdrant client and vector store
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
-
-prompt_template = ChatPromptTemplate.from_messages([("human", "{input}")])
+# what the model is asked for: the policy without the contact block,
+# which is rendered from the inputs (see fragments.py)
+GeneratedAcceptableUsePolicy = without_fields(StructuredAcceptableUsePolicy, CONTACT_FIELDS)
 
-llm_with_output = llm.with_structured_output(StructuredAcceptableUsePolicy)
-
-chain = prompt_template | llm_with_output
+# structured output chain with deadlines, retries, hedging and fallback (see llm.py)
+chain = build_chain(GeneratedAcceptableUsePolicy, "aup")
 
 
 # -----------------------------
 # Acceptable Use Policy (AUP)
 # Includes ALL Basic fields + ALL AUP fields
 # -----------------------------
-AUP_PROMPT = """
+# fixed part of the prompt, sent first so the provider can cache it (see prompt_cache.py)
+AUP_INSTRUCTIONS = """
 You are a compliance and cybersecurity expert specialising in Acceptable Use Policies for SaaS platforms.
 
 Write a complete Acceptable Use Policy for the company described below. The policy must be suitable for Australian businesses and written in Australian English.
@@ -62,6 +39,32 @@ IMPORTANT RULES:
 - Keep the policy clear and non-technical.
 - Be transparent about monitoring and enforcement.
 
+========================
+MANDATORY POLICY SECTIONS
+========================
+1. Last Updated
+2. Purpose of This Policy
+3. Who This Policy Applies To
+4. Permitted Use
+5. Prohibited Activities
+6. Industry-Specific Restrictions
+7. User Content and User Responsibilities (general – do not create ToS terms)
+8. Security and Account Protection Expectations
+9. Monitoring, Logging, and Enforcement
+10. Reporting Illegal or Prohibited Activity
+11. Consequences of Breach
+12. Changes to This Policy
+13. Contact Information
+
+=== OUTPUT FORMAT ===
+- The full policy with headings matching the sections above.
+"""
+
+# sent before every AUP prompt (instructions + output schema)
+AUP_PREFIX = static_prefix(AUP_INSTRUCTIONS, GeneratedAcceptableUsePolicy)
+
+# per request part of the prompt, sent after the instructions
+AUP_PROMPT = """
 === LEGAL CONTEXT (RAG) ===
 {legal_context}
 
@@ -92,30 +95,11 @@ Industry-specific restrictions: {industry_specific_restrictions}
 User monitoring practices: {user_monitoring_practices}
 Reporting of illegal activities: {reporting_illegal_activities}
 
-========================
-MANDATORY POLICY SECTIONS
-========================
-1. Last Updated
-2. Purpose of This Policy
-3. Who This Policy Applies To
-4. Permitted Use
-5. Prohibited Activities
-6. Industry-Specific Restrictions
-7. User Content and User Responsibilities (general – do not create ToS terms)
-8. Security and Account Protection Expectations
-9. Monitoring, Logging, and Enforcement
-10. Reporting Illegal or Prohibited Activity
-11. Consequences of Breach
-12. Changes to This Policy
-13. Contact Information
-
-=== OUTPUT FORMAT ===
-- Start with: "Last Updated: {today}"
-- Then the full policy with headings matching the sections above.
+Write the Acceptable Use Policy now.
 """
 
 
-def generate_acceptable_use_policy(
+def _acceptable_use_policy_steps(
     # --- Basic Company Information (ALL fields) ---
     company_name: str,
     business_description: str,
@@ -137,25 +121,32 @@ def generate_acceptable_use_policy(
 ):
     today = datetime.now(ZoneInfo("Australia/Sydney"))
 
-    # RAG: legal + examples
-    legal_docs = vector_store.similarity_search(
-        "acceptable use policy Australia platform misuse monitoring enforcement illegal activity reporting",
-        k=8,
-        filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))]),
-    )
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
 
-    example_docs = vector_store.similarity_search(
-        f"acceptable use policy {industry_type} SaaS prohibited activities monitoring enforcement",
-        k=8,
-        filter=Filter(must=[
-            FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
-            FieldCondition(key="metadata.policy_type", match=MatchValue(value="Acceptable Use Policy")),
-        ]),
-    )
+    # RAG: legal + examples
+    legal_docs, example_docs = yield [
+        Search(
+            "acceptable use policy Australia platform misuse monitoring enforcement illegal activity reporting",
+            k=8,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))]),
+        ),
+        Search(
+            f"acceptable use policy {industry_type} SaaS prohibited activities monitoring enforcement",
+            k=8,
+            filter=Filter(must=[
+                FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
+                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Acceptable Use Policy")),
+            ]),
+        ),
+    ]
+
+    legal_context = "\n\n".join(d.page_content for d in legal_docs) or "Not specified"
+    example_context = "\n\n".join(d.page_content for d in example_docs) or "Not specified"
 
     prompt = AUP_PROMPT.format(
-        legal_context="\n\n".join(d.page_content for d in legal_docs) or "Not specified",
-        example_context="\n\n".join(d.page_content for d in example_docs) or "Not specified",
+        legal_context=legal_context,
+        example_context=example_context,
         company_name=company_name or "Not specified",
         business_description=business_description or "Not specified",
         industry_type=industry_type or "Not specified",
@@ -172,11 +163,21 @@ def generate_acceptable_use_policy(
         industry_specific_restrictions=industry_specific_restrictions or "Not specified",
         user_monitoring_practices=user_monitoring_practices or "Not specified",
         reporting_illegal_activities=reporting_illegal_activities or "Not specified",
-        today=today,
     )
 
-    result = chain.invoke({"input": prompt})
-    return result.model_dump()
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
+        legal_context=legal_context,
+        example_context=example_context,
+        instructions=AUP_PREFIX + AUP_PROMPT,
+    )
+
+    result = yield Invoke(chain, {"prefix": AUP_PREFIX, "input": prompt})
+    return fill(
+        StructuredAcceptableUsePolicy,
+        result.model_dump(),
+        contact_fragments(company_name, website_url, contact_email, phone_number, today),
+    )
 
 """
 generate_acceptable_use_policy(
@@ -239,3 +240,13 @@ generate_acceptable_use_policy(
 )
 
 """
+
+
+def generate_acceptable_use_policy(**inputs):
+    """_acceptable_use_policy_steps() with blocking I/O, for sync callers."""
+    return run(_acceptable_use_policy_steps(**inputs))
+
+
+async def agenerate_acceptable_use_policy(**inputs):
+    """_acceptable_use_policy_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_acceptable_use_policy_steps(**inputs))
@@ -0,0 +1,98 @@
+# cancellation.py
+# Stops generations nobody is waiting for any more.
+#
+# Under ASGI a client disconnect cancels the view's task, and asyncio
+# cancellation reaches the pending searches and LLM requests by itself.
+# Blocking generations get no such signal, so the caller installs a check
+# with cancellable() and run() / ResilientChain call raise_if_cancelled()
+# between steps and while waiting on the model. The check is whatever the
+# caller knows about (a cancel request stored in the database), polled at
+# most once per CANCEL_POLL_SECONDS.
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+CANCEL_POLL_SECONDS = 1.0
+
+_current_check = ContextVar("generation_cancel_check", default=None)
+
+
+class GenerationCancelled(Exception):
+    """The generation was cancelled before it finished."""
+
+
+class _Check:
+    """A cancel check, polled no more often than poll_seconds."""
+
+    def __init__(self, is_cancelled, poll_seconds):
+        self.is_cancelled = is_cancelled
+        self.poll_seconds = poll_seconds
+        self.checked_at = None
+        self.cancelled = False
+
+    def __call__(self, force=False):
+        now = time.monotonic()
+        due = self.checked_at is None or now - self.checked_at >= self.poll_seconds
+        if not self.cancelled and (force or due):
+            self.checked_at = now
+            self.cancelled = bool(self.is_cancelled())
+        return self.cancelled
+
+
+@contextmanager
+def cancellable(is_cancelled, poll_seconds=CANCEL_POLL_SECONDS):
+    """Generations run inside the block stop once is_cancelled() returns True."""
+    token = _current_check.set(_Check(is_cancelled, poll_seconds))
+    try:
+        yield
+    finally:
+        _current_check.reset(token)
+
+
+def raise_if_cancelled(force=False):
+    """
+    Raise GenerationCancelled if the enclosing cancellable() block was cancelled.
+
+    force skips the poll interval; use it right before persisting a result.
+    """
+    check = _current_check.get()
+    if check is not None and check(force):
+        raise GenerationCancelled("Generation was cancelled")
+
+
+def poll_interval():
+    """How often a blocking wait should wake up to check, or None outside cancellable()."""
+    check = _current_check.get()
+    return check.poll_seconds if check is not None else None
+
+
+async def _wait_for_cancel(is_cancelled, poll_seconds):
+    while not await is_cancelled():
+        await asyncio.sleep(poll_seconds)
+
+
+async def run_cancellable(awaitable, is_cancelled, poll_seconds=CANCEL_POLL_SECONDS):
+    """
+    Await an async generation, cancelling it once the async is_cancelled()
+    returns True (raises GenerationCancelled). Cancelling the caller, as
+    Django does when the client disconnects, cancels it as well.
+    """
+    task = asyncio.ensure_future(awaitable)
+    watcher = asyncio.ensure_future(_wait_for_cancel(is_cancelled, poll_seconds))
+    try:
+        done, _ = await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if task not in done and watcher.exception() is not None:
+            # the check itself failed; finish the generation rather than drop it
+            return await task
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            # let it clean up (pending requests, usage record) before returning
+            await asyncio.wait({task})
+
+    if task.cancelled():
+        raise GenerationCancelled("Generation was cancelled")
+    return task.result()
@@ -0,0 +1,254 @@
+# collection.py
+# Storage settings of the law collection, and the tooling that applies them.
+#
+# The collection was created with 1536-dim float32 vectors and the chunk text
+# and metadata held in RAM, so memory (and search latency) grew with every
+# document ingested. It can now be created or migrated with:
+#   - scalar (int8) or binary quantization: the quantized vectors stay in RAM
+#     for the search, the originals move to disk and rescore the top
+#     candidates, so results stay close to full precision
+#   - the payload (chunk text + metadata) on disk, read only for the k results
+#   - Matryoshka-truncated embeddings: text-embedding-3-small vectors keep
+#     most of their quality cut to their first 512 or 256 dimensions
+#
+# QDRANT_QUANTIZATION, QDRANT_ON_DISK_PAYLOAD and EMBEDDING_DIMENSIONS must
+# match the collection the app searches (QDRANT_COLLECTION): the embeddings
+# and the search parameters in store.py are built from them. recall_report()
+# measures what a setting costs in recall against exact search before it is
+# applied. Run it all through `python manage.py law_collection`.
+
+import math
+import os
+import random
+import time
+from dotenv import load_dotenv
+from qdrant_client.models import (
+    BinaryQuantization,
+    BinaryQuantizationConfig,
+    CollectionParamsDiff,
+    Disabled,
+    Distance,
+    PayloadSchemaType,
+    PointStruct,
+    QuantizationSearchParams,
+    ScalarQuantization,
+    ScalarQuantizationConfig,
+    ScalarType,
+    SearchParams,
+    VectorParams,
+    VectorParamsDiff,
+)
+
+# Load environment
+load_dotenv()
+
+# where the chunks are stored and searched: "qdrant" or "pgvector" (see pg_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "qdrant").lower()
+# what embeds them: "openai" or "local" (a CPU model, see embeddings.py)
+EMBEDDINGS_PROVIDER = os.getenv("EMBEDDINGS_PROVIDER", "openai").lower()
+LOCAL_EMBEDDINGS_MODEL = os.getenv("LOCAL_EMBEDDINGS_MODEL", "BAAI/bge-small-en-v1.5")
+# vectors of the local model live in their own collection (and pgvector table)
+COLLECTION_SUFFIX = "_local" if EMBEDDINGS_PROVIDER == "local" else ""
+COLLECTION_NAME = os.getenv("QDRANT_COLLECTION", "ingested_law_docs" + COLLECTION_SUFFIX)
+FULL_DIMENSIONS = 1536  # text-embedding-3-small
+# output size of the local models we have tried; others need EMBEDDING_DIMENSIONS
+LOCAL_MODEL_DIMENSIONS = {
+    "BAAI/bge-small-en-v1.5": 384,
+    "BAAI/bge-base-en-v1.5": 768,
+    "sentence-transformers/all-MiniLM-L6-v2": 384,
+    "nomic-ai/nomic-embed-text-v1.5": 768,
+}
+
+QUANTIZATIONS = ("none", "scalar", "binary")
+QUANTIZATION = os.getenv("QDRANT_QUANTIZATION", "none").lower()
+ON_DISK_PAYLOAD = os.getenv("QDRANT_ON_DISK_PAYLOAD", "true").lower() in ("1", "true", "yes")
+EMBEDDING_DIMENSIONS = int(os.getenv(
+    "EMBEDDING_DIMENSIONS",
+    str(LOCAL_MODEL_DIMENSIONS.get(LOCAL_EMBEDDINGS_MODEL, 0) if EMBEDDINGS_PROVIDER == "local" else FULL_DIMENSIONS),
+))
+if not EMBEDDING_DIMENSIONS:
+    raise ValueError(f"Set EMBEDDING_DIMENSIONS to the output size of {LOCAL_EMBEDDINGS_MODEL}")
+# quantized search fetches this many times k candidates to rescore
+OVERSAMPLING = float(os.getenv("QDRANT_OVERSAMPLING", "2.0"))
+
+# fields the generators filter on
+PAYLOAD_INDEXES = ("metadata.doc_type", "metadata.policy_type")
+
+# bytes per dimension held in RAM for search
+RAM_BYTES_PER_DIMENSION = {"none": 4, "scalar": 1, "binary": 1 / 8}
+
+COPY_BATCH_SIZE = 256
+
+
+def quantization_config(quantization):
+    """Qdrant quantization config for 'none', 'scalar' or 'binary'."""
+    if quantization == "scalar":
+        return ScalarQuantization(scalar=ScalarQuantizationConfig(type=ScalarType.INT8, quantile=0.99, always_ram=True))
+    if quantization == "binary":
+        return BinaryQuantization(binary=BinaryQuantizationConfig(always_ram=True))
+    if quantization == "none":
+        return None
+    raise ValueError(f"Unknown quantization {quantization!r}, expected one of {', '.join(QUANTIZATIONS)}")
+
+
+def search_params(quantization=QUANTIZATION):
+    """Search parameters for a collection: quantized search rescored with the original vectors."""
+    if quantization == "none":
+        return None
+    return SearchParams(quantization=QuantizationSearchParams(rescore=True, oversampling=OVERSAMPLING))
+
+
+def create_collection(client, name, dimensions=EMBEDDING_DIMENSIONS, quantization=QUANTIZATION,
+                      on_disk_payload=ON_DISK_PAYLOAD):
+    """Create a collection with these storage settings and the payload indexes the generators filter on."""
+    client.create_collection(
+        collection_name=name,
+        vectors_config=VectorParams(
+            size=dimensions,
+            distance=Distance.COSINE,
+            # quantized search only reads the originals to rescore
+            on_disk=quantization != "none",
+        ),
+        quantization_config=quantization_config(quantization),
+        on_disk_payload=on_disk_payload,
+    )
+    ensure_payload_indexes(client, name)
+
+
+def ensure_payload_indexes(client, name):
+    """Keyword indexes on the fields the generators filter on."""
+    for field_name in PAYLOAD_INDEXES:
+        client.create_payload_index(
+            collection_name=name,
+            field_name=field_name,
+            field_schema=PayloadSchemaType.KEYWORD,
+        )
+
+
+def update_collection(client, name, quantization=QUANTIZATION, on_disk_payload=ON_DISK_PAYLOAD):
+    """
+    Apply quantization and payload storage to an existing collection in place
+    (Qdrant rebuilds the segments in the background). The vector size cannot
+    change in place; use copy_collection() for that.
+    """
+    client.update_collection(
+        collection_name=name,
+        vectors_config={"": VectorParamsDiff(on_disk=quantization != "none")},
+        quantization_config=quantization_config(quantization) or Disabled.DISABLED,
+        collection_params=CollectionParamsDiff(on_disk_payload=on_disk_payload),
+    )
+
+
+def truncate(vector, dimensions):
+    """A Matryoshka embedding cut to its first dimensions and normalised again."""
+    vector = list(vector[:dimensions])
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def copy_collection(client, source, target, dimensions=EMBEDDING_DIMENSIONS, quantization=QUANTIZATION,
+                    on_disk_payload=ON_DISK_PAYLOAD, target_client=None):
+    """
+    Copy every point of a collection into a new one with other storage
+    settings, truncating the vectors if dimensions is smaller. Points keep
+    their ids and payload, so nothing has to be embedded again.
+
+    Returns:
+        int: Number of points copied
+    """
+    target_client = target_client or client
+    create_collection(target_client, target, dimensions, quantization, on_disk_payload)
+
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=source,
+            limit=COPY_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        if records:
+            target_client.upsert(
+                collection_name=target,
+                points=[
+                    PointStruct(id=record.id, vector=truncate(record.vector, dimensions), payload=record.payload)
+                    for record in records
+                ],
+            )
+            copied += len(records)
+        if offset is None:
+            return copied
+
+
+# -----------------------------
+# Recall versus latency
+# -----------------------------
+def _sample_queries(client, name, samples, seed):
+    """Stored vectors of random points, used as queries (no embedding calls)."""
+    records, _ = client.scroll(collection_name=name, limit=10_000, with_vectors=True, with_payload=False)
+    random.Random(seed).shuffle(records)
+    return [record.vector for record in records[:samples]]
+
+
+def _search(client, name, vector, k, params):
+    started = time.perf_counter()
+    response = client.query_points(collection_name=name, query=vector, limit=k, search_params=params)
+    return [point.id for point in response.points], time.perf_counter() - started
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def recall_report(client, source, settings, k=8, samples=100, seed=0):
+    """
+    Recall@k and search latency of storage settings, measured against exact
+    search on the full-precision source collection.
+
+    Every setting is copied into a temporary collection next to the source
+    (so run this against a local Qdrant holding a copy of the corpus, not the
+    production cluster) and dropped afterwards.
+
+    Args:
+        client: QdrantClient of the local Qdrant
+        source: Collection with full-dimension, unquantized vectors
+        settings: List of (dimensions, quantization) to compare
+        k: Results per query (the generators ask for 6 to 12)
+        samples: Number of query vectors
+
+    Returns:
+        list[dict]: One row per setting with recall, p50/p95 latency (ms) and
+                    the vector memory held in RAM (MB)
+    """
+    queries = _sample_queries(client, source, samples, seed)
+    points = client.count(collection_name=source, exact=True).count
+    exact = [_search(client, source, query, k, SearchParams(exact=True))[0] for query in queries]
+
+    rows = []
+    for dimensions, quantization in settings:
+        name = f"{source}_eval_{dimensions}_{quantization}"
+        if client.collection_exists(name):
+            client.delete_collection(name)
+        copy_collection(client, source, name, dimensions, quantization)
+        try:
+            hits, latencies = 0, []
+            params = search_params(quantization)
+            for query, expected in zip(queries, exact):
+                found, seconds = _search(client, name, truncate(query, dimensions), k, params)
+                hits += len(set(found) & set(expected))
+                latencies.append(seconds * 1000)
+        finally:
+            client.delete_collection(name)
+
+        rows.append({
+            "dimensions": dimensions,
+            "quantization": quantization,
+            "recall": hits / (len(queries) * k) if queries else 0.0,
+            "p50_ms": _percentile(latencies, 0.5),
+            "p95_ms": _percentile(latencies, 0.95),
+            "vector_ram_mb": points * dimensions * RAM_BYTES_PER_DIMENSION[quantization] / 1_000_000,
+        })
+    return rows
@@ -1,90 +1,34 @@
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from .cookie_output import StructuredCookiePolicy
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+from .fragments import (
+    BROWSER_HELP_LINKS, COOKIE_FIELDS, OPT_OUT_LINKS, cookie_fragments, fill, with_opt_out_links, without_fields,
+)
+from .prompt_cache import static_prefix
 
 # Load environment
 load_dotenv()
 
-# Initialize LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=.3,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    streaming=False
-)
-
-# Initialize embeddings model
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
-
-# Initialize Qdrant client and vector store
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
+# what the model is asked for: the policy without the boilerplate fields,
+# which are rendered from the inputs (see fragments.py)
+GeneratedCookiePolicy = without_fields(StructuredCookiePolicy, COOKIE_FIELDS)
 
-# Simple prompt template
-prompt_template = ChatPromptTemplate.from_messages([
-    ("human", "{input}"),
-])
+# structured output chain with deadlines, retries, hedging and fallback (see llm.py)
+chain = build_chain(GeneratedCookiePolicy, "cookie")
 
-llm_with_output = llm.with_structured_output(StructuredCookiePolicy)
-
-chain = prompt_template | llm_with_output
-
-COOKIE_POLICY_PROMPT = """
+# fixed part of the cookie policy prompt: the same for every request, so it
+# is sent first and cached by the provider (see prompt_cache.py)
+COOKIE_POLICY_INSTRUCTIONS = """
 You are an expert in privacy law and online tracking technologies. You specialize in drafting clear, compliant cookie policies that explain tracking technologies in accessible language while meeting Australian Privacy Act requirements.
 
-=== LEGAL REQUIREMENTS ===
-
-The following are excerpts from the Privacy Act 1988 and privacy guidelines about cookies and tracking technologies:
-
-{legal_context}
-
-=== INDUSTRY EXAMPLES ===
-
-Here are examples of how similar companies in the {industry} industry have structured their cookie policies:
-
-{example_context}
-
-=== COMPANY INFORMATION ===
-
-Company Details:
-- Company Name: {company_name}
-- Business Description: {business_description}
-- Industry: {industry}
-- Website: {website}
-- Contact Email: {contact_email}
-- Phone: {phone_number}
-
-Cookie Information:
-- Essential Cookies: {essential_cookies}
-- Analytics Cookies: {analytics_cookies}
-- Marketing Cookies: {marketing_cookies}
-- Advertising Cookies: {advertising_cookies}
-- Functional Cookies: {functional_cookies}
-- Third-Party Services: {third_party_services}
-- Cookie Duration: {cookie_duration}
-
 === YOUR TASK ===
 
-Generate a clear Cookie Policy for {company_name} (800-1,500 words) that:
+Generate a clear Cookie Policy (800-1,500 words) for the company described after these instructions that:
 
 **COMPLIANCE:**
 - Complies with Privacy Act notification requirements
@@ -139,15 +83,88 @@ Include opt-out links for:
 - Facebook: https://www.facebook.com/settings?tab=ads
 (Add others based on services used)
 
+=== ADDITIONAL INSTRUCTIONS (QUALITY + SAFETY GUARDRAILS) ===
+
+1) NO PLACEHOLDERS / NO FABRICATION
+- Do not output placeholders like "[insert...]" or "TBD".
+- Do not invent missing company details (ABN, address, cookie vendor lists not provided).
+- If info is missing, use a compliant general statement.
+
+2) ONLY INCLUDE USED COOKIE TYPES
+- Only include sections for cookie categories that are TRUE in the cookie information.
+- If a category is False, do not mention it.
+
+3) THIRD-PARTY SERVICES: STRICT LINK HYGIENE
+- Only name third-party services provided in input list.
+- For opt-out links, ONLY include links explicitly provided in the prompt.
+- If a service has no opt-out link provided, state that opt-out options are available via the provider’s privacy/advertising settings without adding a URL.
+
+4) WEBSITE / LINKS
+- Use only the provided website domain for CompliGen references.
+- Do not add other CompliGen URLs or paths.
+- You MAY include the browser help links and the third-party opt-out links provided (they are vendor links).
+
+5) AUSTRALIAN ENGLISH + CLEAR LANGUAGE
+- Use Australian spelling.
+- Non-technical wording, short paragraphs, bullet lists.
+
+Browser cookie controls (use only these where relevant):
+""" + "\n".join(f"- {name}: {link}" for name, link in BROWSER_HELP_LINKS.items()) + """
+
+- IMPORTANT: Do NOT use markdown link formatting like [text](url).
+- Output URLs as plain text only (e.g., https://example.com).
+
+- Do not mention an "app" or "APP privacy policy" unless explicitly stated.
+- If referencing privacy handling, say: "Our Privacy Policy explains how we handle personal information."
+
+- The policy must end after Section 8 (Contact Us). Do not append extra paragraphs after Contact Us.
+"""
+
+# sent before every cookie policy prompt (instructions + output schema)
+COOKIE_POLICY_PREFIX = static_prefix(COOKIE_POLICY_INSTRUCTIONS, GeneratedCookiePolicy)
+
+# per request part of the prompt, sent after the instructions
+COOKIE_POLICY_PROMPT = """
+=== LEGAL REQUIREMENTS ===
+
+The following are excerpts from the Privacy Act 1988 and privacy guidelines about cookies and tracking technologies:
+
+{legal_context}
+
+=== INDUSTRY EXAMPLES ===
+
+Here are examples of how similar companies in the {industry} industry have structured their cookie policies:
+
+{example_context}
+
+=== COMPANY INFORMATION ===
+
+Company Details:
+- Company Name: {company_name}
+- Business Description: {business_description}
+- Industry: {industry}
+- Website: {website}
+- Contact Email: {contact_email}
+- Phone: {phone_number}
+
+Cookie Information:
+- Essential Cookies: {essential_cookies}
+- Analytics Cookies: {analytics_cookies}
+- Marketing Cookies: {marketing_cookies}
+- Advertising Cookies: {advertising_cookies}
+- Functional Cookies: {functional_cookies}
+- Third-Party Services: {third_party_services}
+- Cookie Duration: {cookie_duration}
+
 {additional_instructions}
 
 === OUTPUT ===
 
-Generate the complete Cookie Policy now. Include "Last Updated: [Current Date]" at the top.
+Generate the complete Cookie Policy for {company_name} now.
 
 Cookie Policy:
 """
-def generate_cookie_policy(
+def _cookie_policy_steps(
     # Basic Company Info (minimal)
     company_name,
     business_description,
@@ -198,57 +215,34 @@ def generate_cookie_policy(
         legal_query += " functional cookies preferences"
         example_query += " functional"
 
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
     # -----------------------------
     # 2) Retrieve legal + example context
     # -----------------------------
-    legal_docs = vector_store.similarity_search(
-        legal_query,
-        k=8,
-        filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
-    )
-
-    example_docs = vector_store.similarity_search(
-        example_query,
-        k=6,
-        filter=Filter(must=[
-            FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
-            FieldCondition(key="metadata.policy_type", match=MatchValue(value="Cookies Policy")),
-        ])
-    )
+    legal_docs, example_docs = yield [
+        Search(
+            legal_query,
+            k=8,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
+        ),
+        Search(
+            example_query,
+            k=6,
+            filter=Filter(must=[
+                FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
+                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Cookies Policy")),
+            ])
+        ),
+    ]
 
     legal_context = "\n\n---\n\n".join([doc.page_content for doc in legal_docs])
     example_context = "\n\n---\n\n".join([doc.page_content for doc in example_docs])
 
     # -----------------------------
-    # 3) Third-party opt-out links (NO fabrication)
-    #    - Only include links we can confidently provide.
-    #    - For unknown services: no URL; require provider controls instead.
+    # 3) Third-party opt-out links (NO fabrication, see fragments.py)
     # -----------------------------
-    third_party_opt_out_map = {
-        # Google
-        "Google Analytics": "https://tools.google.com/dlpage/gaoptout/",
-        "Google Ads": "https://adssettings.google.com/",
-        "Google Tag Manager": "https://adssettings.google.com/",
-
-        # Meta
-        "Facebook": "https://www.facebook.com/settings?tab=ads",
-        "Facebook Pixel": "https://www.facebook.com/settings?tab=ads",
-        "Meta Pixel": "https://www.facebook.com/settings?tab=ads",
-        "Instagram": "https://www.facebook.com/settings?tab=ads",
-
-        # Microsoft
-        "Microsoft Advertising": "https://account.microsoft.com/privacy/ad-settings/",
-
-        # LinkedIn
-        "LinkedIn Insight Tag": "https://www.linkedin.com/psettings/advertising/actions-that-showed-interest",
-
-        # TikTok
-        "TikTok Pixel": "https://www.tiktok.com/legal/page/row/privacy-policy/en",
-
-        # Hotjar (no single global opt-out URL; provide non-link instruction via model)
-        # Leave out to avoid inventing an inaccurate opt-out link.
-    }
-
     # Normalise + dedupe services
     # third party services properly formatted
     services = []
@@ -266,81 +260,26 @@ def generate_cookie_policy(
     unrecognised_services = []
 
     for s in services:
-        if s in third_party_opt_out_map:
-            recognised_services_with_links.append((s, third_party_opt_out_map[s]))
+        if s in OPT_OUT_LINKS:
+            recognised_services_with_links.append((s, OPT_OUT_LINKS[s]))
         else:
             unrecognised_services.append(s)
 
     # -----------------------------
-    # 4) Browser help links (stable vendor help pages)
-    # -----------------------------
-    browser_help_links = {
-        "Chrome": "https://support.google.com/chrome/answer/95647",
-        "Firefox": "https://support.mozilla.org/en-US/kb/clear-cookies-and-site-data-firefox",
-        "Safari (macOS)": "https://support.apple.com/en-au/guide/safari/sfri11471/mac",
-        "Edge": "https://support.microsoft.com/en-au/microsoft-edge/delete-cookies-in-microsoft-edge-63947406-40ac-c3b8-57b9-2a946a29ae09",
-        "iPhone/iPad (iOS Safari)": "https://support.apple.com/en-au/HT201265",
-        "Android (Chrome)": "https://support.google.com/chrome/answer/95647",
-    }
-
-    # -----------------------------
-    # 5) Additional instructions (concise, strict)
+    # 4) Links for the services used (browser help links are in the instructions)
     # -----------------------------
     additional_instructions = f"""
-        === ADDITIONAL INSTRUCTIONS (QUALITY + SAFETY GUARDRAILS) ===
-
-        1) NO PLACEHOLDERS / NO FABRICATION
-        - Do not output placeholders like "[insert...]" or "TBD".
-        - Do not invent missing company details (ABN, address, cookie vendor lists not provided).
-        - If info is missing, use a compliant general statement.
-
-        2) ONLY INCLUDE USED COOKIE TYPES
-        - Only include sections for cookie categories that are TRUE in inputs:
-        essential={essential_cookies}, analytics={analytics_cookies}, marketing={marketing_cookies},
-        advertising={advertising_cookies}, functional={functional_cookies}.
-        - If a category is False, do not mention it.
-
-        3) THIRD-PARTY SERVICES: STRICT LINK HYGIENE
-        - Only name third-party services provided in input list.
-        - For opt-out links, ONLY include links explicitly provided in the prompt below.
-        - If a service has no opt-out link provided, state that opt-out options are available via the provider’s privacy/advertising settings without adding a URL.
-
-        4) WEBSITE / LINKS
-        - Use only the provided website domain for CompliGen references: {website}
-        - Do not add other CompliGen URLs or paths.
-        - You MAY include the browser help links and the third-party opt-out links provided below (they are vendor links).
-
-        5) AUSTRALIAN ENGLISH + CLEAR LANGUAGE
-        - Use Australian spelling.
-        - Non-technical wording, short paragraphs, bullet lists.
-
         === PROVIDED LINKS (USE ONLY THESE WHERE RELEVANT) ===
 
-        Browser cookie controls:
-        - Chrome: {browser_help_links["Chrome"]}
-        - Firefox: {browser_help_links["Firefox"]}
-        - Safari (macOS): {browser_help_links["Safari (macOS)"]}
-        - Edge: {browser_help_links["Edge"]}
-        - iPhone/iPad (iOS Safari): {browser_help_links["iPhone/iPad (iOS Safari)"]}
-        - Android (Chrome): {browser_help_links["Android (Chrome)"]}
-
         Third-party opt-out links (only if the named service appears in our third_party_services list):
         {chr(10).join([f"- {name}: {link}" for name, link in recognised_services_with_links])}
 
         Third-party services without provided opt-out links (do NOT add URLs):
         {(", ".join(unrecognised_services) if unrecognised_services else "None")}
-
-        - IMPORTANT: Do NOT use markdown link formatting like [text](url).
-        - Output URLs as plain text only (e.g., https://example.com).
-
-        - Do not mention an "app" or "APP privacy policy" unless explicitly stated.
-        - If referencing privacy handling, say: "Our Privacy Policy explains how we handle personal information."
-
-        - The policy must end after Section 8 (Contact Us). Do not append extra paragraphs after Contact Us.
     """.strip()
 
     # -----------------------------
-    # 6) Build final prompt + invoke
+    # 5) Build final prompt + invoke
     # -----------------------------
     prompt = COOKIE_POLICY_PROMPT.format(
         legal_context=legal_context,
@@ -361,11 +300,29 @@ def generate_cookie_policy(
         additional_instructions=additional_instructions,
     )
 
-    # Replace the placeholder in the prompt template line:
-    # Include "Last Updated: [Current Date]" at the top.
-    prompt = prompt.replace("Last Updated: [Current Date]", f"Last Updated: {today}")
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
+        legal_context=legal_context,
+        example_context=example_context,
+        instructions=COOKIE_POLICY_PREFIX + COOKIE_POLICY_PROMPT + additional_instructions,
+    )
 
-    result = chain.invoke({"input": prompt})
+    result = yield Invoke(chain, {"prefix": COOKIE_POLICY_PREFIX, "input": prompt})
     # the cookie policy can act strangely and give error.
-    return result.model_dump()
+    cookie_dict = result.model_dump()
+    cookie_dict["third_party_services"] = with_opt_out_links(cookie_dict["third_party_services"])
+    return fill(
+        StructuredCookiePolicy,
+        cookie_dict,
+        cookie_fragments(company_name, website, contact_email, phone_number, today),
+    )
+
+
+def generate_cookie_policy(**inputs):
+    """_cookie_policy_steps() with blocking I/O, for sync callers."""
+    return run(_cookie_policy_steps(**inputs))
+
 
+async def agenerate_cookie_policy(**inputs):
+    """_cookie_policy_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_cookie_policy_steps(**inputs))
@@ -4,47 +4,24 @@ import os
 from dotenv import load_dotenv
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from .policy_outputs import StructuredDataProcessingAgreement
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+from .fragments import CONTACT_FIELDS, contact_fragments, fill, without_fields
+from .prompt_cache import static_prefix
 
 # -----------------------------
 # Setup
 # -----------------------------
 load_dotenv()
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.3,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    streaming=False,
-)
+# what the model is asked for: the agreement without the contact block,
+# which is rendered from the inputs (see fragments.py)
+GeneratedDataProcessingAgreement = without_fields(StructuredDataProcessingAgreement, CONTACT_FIELDS)
 
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
-
-# Initialize Qdrant client and vector store
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
-
-prompt_template = ChatPromptTemplate.from_messages([("human", "{input}")])
-
-llm_with_output = llm.with_structured_output(StructuredDataProcessingAgreement)
-chain = prompt_template | llm_with_output
+# structured output chain with deadlines, retries, hedging and fallback (see llm.py)
+chain = build_chain(GeneratedDataProcessingAgreement, "dpa")
 
 
 def ns(value: str | None) -> str:
@@ -55,7 +32,8 @@ def ns(value: str | None) -> str:
     return v if v else "Not specified"
 
 
-DPA_PROMPT = """
+# fixed part of the prompt, sent first so the provider can cache it (see prompt_cache.py)
+DPA_INSTRUCTIONS = """
 You are a compliance and cybersecurity expert specialising in Data Processing Agreements (DPAs) for Australian SaaS platforms.
 
 Write a complete Data Processing Agreement suitable for an Australian SaaS provider with international customers.
@@ -82,6 +60,41 @@ Use clear, non-technical Australian English.
    - Do NOT include placeholders like [Company Name], <insert>, [ABN], etc.
    - Do NOT quote long passages of legal text verbatim
 
+========================
+GENERATE DPA WITH 21 SECTIONS
+========================
+
+1. Last Updated
+2. Parties and Purpose
+3. Definitions (10 terms: Agreement, Controller, Customer, Data Protection Laws, Personal Data, Personal Information, Processor, Processing, Sub-processor, Eligible Data Breach)
+4. Roles and Scope
+5. Details of Processing
+6. Processor Obligations
+7. Controller Obligations
+8. Confidentiality
+9. Security Measures
+10. Sub-processors
+11. Overseas Disclosures (APP 8)
+12. Assistance with Individual Rights
+13. Eligible Data Breaches (NDB scheme)
+14. Deletion or Return of Data
+15. Audits and Compliance
+16. Liability
+17. Term and Termination
+18. Changes to This DPA
+19. Contact Information
+20. Annex A – Processing Details (leave content empty)
+21. Annex B – TOMs (leave content empty)
+
+=== OUTPUT FORMAT ===
+Use Australian English spelling. Generate the complete DPA.
+"""
+
+# sent before every DPA prompt (instructions + output schema)
+DPA_PREFIX = static_prefix(DPA_INSTRUCTIONS, GeneratedDataProcessingAgreement)
+
+# per request part of the prompt, sent after the instructions
+DPA_PROMPT = """
 === LEGAL CONTEXT (RAG) ===
 {legal_context}
 
@@ -112,37 +125,10 @@ Deletion timeline: {data_deletion_timelines}
 Audit rights: {audit_rights}
 Processing summary: {processing_summary}
 
-========================
-GENERATE DPA WITH 21 SECTIONS
-========================
-
-1. Last Updated
-2. Parties and Purpose
-3. Definitions (10 terms: Agreement, Controller, Customer, Data Protection Laws, Personal Data, Personal Information, Processor, Processing, Sub-processor, Eligible Data Breach)
-4. Roles and Scope
-5. Details of Processing
-6. Processor Obligations
-7. Controller Obligations
-8. Confidentiality
-9. Security Measures
-10. Sub-processors
-11. Overseas Disclosures (APP 8)
-12. Assistance with Individual Rights
-13. Eligible Data Breaches (NDB scheme)
-14. Deletion or Return of Data
-15. Audits and Compliance
-16. Liability
-17. Term and Termination
-18. Changes to This DPA
-19. Contact Information
-20. Annex A – Processing Details (leave content empty)
-21. Annex B – TOMs (leave content empty)
-
-=== OUTPUT FORMAT ===
-Use Australian English spelling. Generate complete DPA starting with "Last Updated: {today}".
+Write the Data Processing Agreement now.
 """
 
-def generate_data_processing_agreement(
+def _data_processing_agreement_steps(
     # --- Basic Company Information ---
     company_name: str,
     business_description: str,
@@ -167,25 +153,32 @@ def generate_data_processing_agreement(
 ):
     today = datetime.now(ZoneInfo("Australia/Sydney"))
     
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
     # RAG
-    legal_docs = vector_store.similarity_search(
-        "Australia Privacy Act 1988 APP 8 overseas disclosure Notifiable Data Breaches scheme processor obligations",
-        k=8,
-        filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))]),
-    )
+    legal_docs, example_docs = yield [
+        Search(
+            "Australia Privacy Act 1988 APP 8 overseas disclosure Notifiable Data Breaches scheme processor obligations",
+            k=8,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))]),
+        ),
+        Search(
+            f"Australian SaaS data processing agreement annex security measures sub-processors {industry_type}",
+            k=8,
+            filter=Filter(must=[
+                FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
+                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Data Processing Agreement")),
+            ]),
+        ),
+    ]
 
-    example_docs = vector_store.similarity_search(
-        f"Australian SaaS data processing agreement annex security measures sub-processors {industry_type}",
-        k=8,
-        filter=Filter(must=[
-            FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
-            FieldCondition(key="metadata.policy_type", match=MatchValue(value="Data Processing Agreement")),
-        ]),
-    )
+    legal_context = "\n\n".join(d.page_content for d in legal_docs) or "Not specified"
+    example_context = "\n\n".join(d.page_content for d in example_docs) or "Not specified"
 
     prompt = DPA_PROMPT.format(
-        legal_context="\n\n".join(d.page_content for d in legal_docs) or "Not specified",
-        example_context="\n\n".join(d.page_content for d in example_docs) or "Not specified",
+        legal_context=legal_context,
+        example_context=example_context,
         company_name=ns(company_name),
         business_description=ns(business_description),
         industry_type=ns(industry_type),
@@ -205,11 +198,21 @@ def generate_data_processing_agreement(
         data_deletion_timelines=ns(data_deletion_timelines),
         audit_rights=ns(audit_rights),
         processing_summary=ns(processing_summary),
-        today=today,
     )
 
-    result = chain.invoke({"input": prompt})
-    dpa_dict = result.model_dump()
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
+        legal_context=legal_context,
+        example_context=example_context,
+        instructions=DPA_PREFIX + DPA_PROMPT,
+    )
+
+    result = yield Invoke(chain, {"prefix": DPA_PREFIX, "input": prompt})
+    dpa_dict = fill(
+        StructuredDataProcessingAgreement,
+        result.model_dump(),
+        contact_fragments(company_name, website_url, contact_email, phone_number, today),
+    )
     
     # ============================================
     # POST-PROCESSING: FILL EMPTY FIELDS
@@ -329,9 +332,14 @@ def generate_data_processing_agreement(
     if security_certifications != "Not specified" and not dpa_dict['annex_b']['security_certifications']:
         dpa_dict['annex_b']['security_certifications'] = [security_certifications]
     
-    # 5. Fix phone_number
-    if dpa_dict.get('phone_number') == "Not specified":
-        dpa_dict['phone_number'] = None
-    
     return dpa_dict
 
+
+def generate_data_processing_agreement(**inputs):
+    """_data_processing_agreement_steps() with blocking I/O, for sync callers."""
+    return run(_data_processing_agreement_steps(**inputs))
+
+
+async def agenerate_data_processing_agreement(**inputs):
+    """_data_processing_agreement_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_data_processing_agreement_steps(**inputs))
@@ -0,0 +1,228 @@
+# embeddings.py
+# The embeddings model that queries and ingested chunks go through.
+#
+# By default that is OpenAI's text-embedding-3-small, which costs a network
+# round trip (100-400 ms) per query and ties ingestion to the API's rate
+# limit. EMBEDDINGS_PROVIDER=local runs a sentence-transformers model on the
+# CPU instead (torch, or ONNX Runtime with LOCAL_EMBEDDINGS_BACKEND=onnx):
+# inputs are encoded in batches over EMBEDDINGS_THREADS threads, and the
+# model is loaded and warmed up in the background when the app starts (see
+# store.warm_up()), so the first query does not pay for it.
+#
+# Local vectors are not comparable with OpenAI's, so they live in their own
+# collection (see collection.py). `python manage.py embeddings reembed` fills
+# it from the OpenAI collection, and `embeddings benchmark` compares the two
+# on retrieval quality and latency.
+#
+# sentence-transformers (and onnxruntime for the ONNX backend) are only
+# needed with the local provider.
+
+import os
+import random
+import threading
+import time
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from qdrant_client.models import PointStruct
+from .collection import (
+    COPY_BATCH_SIZE, EMBEDDING_DIMENSIONS, EMBEDDINGS_PROVIDER, FULL_DIMENSIONS, LOCAL_EMBEDDINGS_MODEL, create_collection,
+)
+from .usage import count_tokens, current_usage
+
+LOCAL_EMBEDDINGS_BACKEND = os.getenv("LOCAL_EMBEDDINGS_BACKEND", "torch").lower()
+EMBEDDINGS_THREADS = int(os.getenv("EMBEDDINGS_THREADS", str(os.cpu_count() or 1)))
+EMBEDDINGS_BATCH_SIZE = int(os.getenv("EMBEDDINGS_BATCH_SIZE", "32"))
+
+# retrieval models trained with an instruction before the query (not the passages)
+QUERY_INSTRUCTIONS = {
+    "BAAI/bge-small-en-v1.5": "Represent this sentence for searching relevant passages: ",
+    "BAAI/bge-base-en-v1.5": "Represent this sentence for searching relevant passages: ",
+    "nomic-ai/nomic-embed-text-v1.5": "search_query: ",
+}
+DOCUMENT_INSTRUCTIONS = {
+    "nomic-ai/nomic-embed-text-v1.5": "search_document: ",
+}
+
+
+class TrackedOpenAIEmbeddings(OpenAIEmbeddings):
+    """
+    OpenAIEmbeddings that counts the tokens it sends (see usage.py).
+
+    The embeddings API response is not surfaced by LangChain, so the count is
+    computed locally with the same encoding the model uses. Query embeddings
+    go through embed_documents/aembed_documents, so only those are wrapped.
+    """
+
+    def _track(self, texts):
+        tracker = current_usage()
+        if tracker is not None:
+            tracker.embedding_tokens += sum(count_tokens(t) for t in texts)
+
+    def embed_documents(self, texts, chunk_size=None, **kwargs):
+        self._track(texts)
+        return super().embed_documents(texts, chunk_size=chunk_size, **kwargs)
+
+    async def aembed_documents(self, texts, chunk_size=None, **kwargs):
+        self._track(texts)
+        return await super().aembed_documents(texts, chunk_size=chunk_size, **kwargs)
+
+
+class LocalEmbeddings(Embeddings):
+    """
+    sentence-transformers model on the CPU, loaded on first use.
+
+    Args:
+        model: Hugging Face model name
+        backend: "torch" or "onnx"
+        threads: CPU threads used by one encode
+        batch_size: Inputs per forward pass
+    """
+
+    def __init__(self, model=LOCAL_EMBEDDINGS_MODEL, backend=LOCAL_EMBEDDINGS_BACKEND,
+                 threads=EMBEDDINGS_THREADS, batch_size=EMBEDDINGS_BATCH_SIZE):
+        self.model_name = model
+        self.backend = backend
+        self.threads = threads
+        self.batch_size = batch_size
+        self._model = None
+        # one encode at a time: each already uses every thread it is given
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._model is None:
+            import torch
+            from sentence_transformers import SentenceTransformer
+
+            torch.set_num_threads(self.threads)
+            self._model = SentenceTransformer(self.model_name, device="cpu", backend=self.backend, trust_remote_code=True)
+        return self._model
+
+    def _encode(self, texts):
+        with self._lock:
+            vectors = self._load().encode(
+                texts,
+                batch_size=self.batch_size,
+                normalize_embeddings=True,
+                convert_to_numpy=True,
+                show_progress_bar=False,
+            )
+        return vectors.tolist()
+
+    def warmup(self):
+        """Load the model and run one batch, so the first real query is not the slow one."""
+        started = time.perf_counter()
+        self.embed_query("warm up")
+        return time.perf_counter() - started
+
+    def embed_documents(self, texts):
+        prefix = DOCUMENT_INSTRUCTIONS.get(self.model_name, "")
+        return self._encode([prefix + text for text in texts])
+
+    def embed_query(self, text):
+        return self._encode([QUERY_INSTRUCTIONS.get(self.model_name, "") + text])[0]
+
+
+def make_embeddings(provider=EMBEDDINGS_PROVIDER):
+    """The embeddings model for a provider ("openai" or "local")."""
+    if provider == "local":
+        return LocalEmbeddings()
+    if provider == "openai":
+        return TrackedOpenAIEmbeddings(
+            model="text-embedding-3-small",
+            openai_api_key=os.environ.get("OPENAI_API_KEY"),
+            # Matryoshka-truncated vectors when the collection holds them
+            dimensions=EMBEDDING_DIMENSIONS if EMBEDDING_DIMENSIONS < FULL_DIMENSIONS else None,
+        )
+    raise ValueError(f"Unknown embeddings provider {provider!r}, expected openai or local")
+
+
+# -----------------------------
+# Separate collection and benchmark
+# -----------------------------
+def reembed_collection(client, source, target, embeddings, dimensions):
+    """
+    Copy a collection into a new one with the chunks embedded again by
+    another model. Points keep their ids and payload, so results of the two
+    collections can be compared point for point.
+
+    Returns:
+        int: Number of points embedded
+    """
+    create_collection(client, target, dimensions)
+    embedded = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(collection_name=source, limit=COPY_BATCH_SIZE, offset=offset, with_payload=True)
+        if records:
+            vectors = embeddings.embed_documents([(r.payload or {}).get("page_content", "") for r in records])
+            client.upsert(
+                collection_name=target,
+                points=[PointStruct(id=r.id, vector=v, payload=r.payload) for r, v in zip(records, vectors)],
+            )
+            embedded += len(records)
+        if offset is None:
+            return embedded
+
+
+def _query_from(text, rng, words=12):
+    """A run of words from a chunk: the query that chunk should answer."""
+    tokens = text.split()
+    if len(tokens) <= words:
+        return " ".join(tokens)
+    start = rng.randrange(len(tokens) - words)
+    return " ".join(tokens[start:start + words])
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+def compare_embeddings(client, candidates, k=8, samples=100, seed=0):
+    """
+    Retrieval quality and latency of embeddings models, each searched on its
+    own collection.
+
+    Queries are runs of words taken from random chunks, so the chunk a query
+    came from is the expected result; both collections must hold the same
+    points (see reembed_collection()).
+
+    Args:
+        client: QdrantClient
+        candidates: List of (label, embeddings, collection)
+        k: Results per query
+        samples: Number of queries
+
+    Returns:
+        list[dict]: One row per candidate with hit rate@k, MRR, and p50/p95
+                    of the query embedding and search times (ms)
+    """
+    rng = random.Random(seed)
+    records, _ = client.scroll(collection_name=candidates[0][2], limit=10_000, with_payload=True)
+    rng.shuffle(records)
+    queries = [(r.id, _query_from((r.payload or {}).get("page_content", ""), rng)) for r in records[:samples]]
+
+    rows = []
+    for label, embeddings, collection in candidates:
+        embeddings.embed_query("warm up")
+        hits, reciprocal_ranks, embed_ms, search_ms = 0, 0.0, [], []
+        for expected, query in queries:
+            started = time.perf_counter()
+            vector = embeddings.embed_query(query)
+            embedded = time.perf_counter()
+            found = [p.id for p in client.query_points(collection_name=collection, query=vector, limit=k).points]
+            embed_ms.append((embedded - started) * 1000)
+            search_ms.append((time.perf_counter() - embedded) * 1000)
+            if expected in found:
+                hits += 1
+                reciprocal_ranks += 1 / (found.index(expected) + 1)
+        rows.append({
+            "label": label,
+            "hit_rate": hits / len(queries) if queries else 0.0,
+            "mrr": reciprocal_ranks / len(queries) if queries else 0.0,
+            "embed_p50_ms": _percentile(embed_ms, 0.5),
+            "embed_p95_ms": _percentile(embed_ms, 0.95),
+            "search_p50_ms": _percentile(search_ms, 0.5),
+            "search_p95_ms": _percentile(search_ms, 0.95),
+        })
+    return rows
@@ -0,0 +1,194 @@
+# fragments.py
+# Boilerplate fields rendered from the inputs instead of generated.
+#
+# Several output fields are not creative at all: the company's own contact
+# details, the date, the OAIC's contact details, the browser cookie help
+# pages, the known third-party opt-out links. Asking the model for them costs
+# output tokens (the slowest part of a generation) and gives it the chance to
+# get a URL or phone number wrong. The generators build their chains with
+# without_fields(), so the model is never asked for these fields, and fill()
+# adds them to the output from the fragments below before validating it
+# against the full document schema.
+
+from functools import lru_cache
+from pydantic import create_model
+from .repair import coerce
+
+# -----------------------------
+# Fields filled here, per document schema
+# -----------------------------
+CONTACT_FIELDS = ("company_name", "last_updated", "website_url", "contact_email", "phone_number")
+PRIVACY_FIELDS = ("company_name", "last_updated", "complaints_process", "oaic_contact", "contact_info")
+COOKIE_FIELDS = ("company_name", "last_updated", "browser_instructions", "contact_email", "contact_phone", "website")
+
+# -----------------------------
+# Third-party opt-out links (NO fabrication)
+# - Only include links we can confidently provide.
+# - For unknown services: no URL; require provider controls instead.
+# -----------------------------
+OPT_OUT_LINKS = {
+    # Google
+    "Google Analytics": "https://tools.google.com/dlpage/gaoptout/",
+    "Google Ads": "https://adssettings.google.com/",
+    "Google Tag Manager": "https://adssettings.google.com/",
+
+    # Meta
+    "Facebook": "https://www.facebook.com/settings?tab=ads",
+    "Facebook Pixel": "https://www.facebook.com/settings?tab=ads",
+    "Meta Pixel": "https://www.facebook.com/settings?tab=ads",
+    "Instagram": "https://www.facebook.com/settings?tab=ads",
+
+    # Microsoft
+    "Microsoft Advertising": "https://account.microsoft.com/privacy/ad-settings/",
+
+    # LinkedIn
+    "LinkedIn Insight Tag": "https://www.linkedin.com/psettings/advertising/actions-that-showed-interest",
+
+    # TikTok
+    "TikTok Pixel": "https://www.tiktok.com/legal/page/row/privacy-policy/en",
+
+    # Hotjar (no single global opt-out URL; provide non-link instruction via model)
+    # Leave out to avoid inventing an inaccurate opt-out link.
+}
+
+# -----------------------------
+# Browser help links (stable vendor help pages) and the steps they describe
+# -----------------------------
+BROWSER_HELP_LINKS = {
+    "Chrome": "https://support.google.com/chrome/answer/95647",
+    "Firefox": "https://support.mozilla.org/en-US/kb/clear-cookies-and-site-data-firefox",
+    "Safari (macOS)": "https://support.apple.com/en-au/guide/safari/sfri11471/mac",
+    "Edge": "https://support.microsoft.com/en-au/microsoft-edge/delete-cookies-in-microsoft-edge-63947406-40ac-c3b8-57b9-2a946a29ae09",
+    "iPhone/iPad (iOS Safari)": "https://support.apple.com/en-au/HT201265",
+    "Android (Chrome)": "https://support.google.com/chrome/answer/95647",
+}
+
+BROWSER_STEPS = {
+    "Chrome": [
+        "Open Chrome and select the menu (three dots), then Settings.",
+        "Select Privacy and security, then Third-party cookies to choose which cookies are allowed.",
+        "To delete cookies, select Delete browsing data and tick Cookies and other site data.",
+    ],
+    "Firefox": [
+        "Open the Firefox menu and select Settings.",
+        "Select Privacy & Security and go to Cookies and Site Data.",
+        "Select Manage Data to remove cookies for particular websites, or Clear Data to remove all of them.",
+    ],
+    "Safari (macOS)": [
+        "Open Safari and choose Safari, then Settings (Preferences on older versions).",
+        "Select Privacy.",
+        "Select Manage Website Data to remove cookies, or turn on Block all cookies.",
+    ],
+    "Edge": [
+        "Open Edge and select Settings and more (three dots), then Settings.",
+        "Select Cookies and site permissions, then Manage and delete cookies and site data.",
+        "Choose which cookies are allowed, or select See all cookies and site data to delete them.",
+    ],
+    "iPhone/iPad (iOS Safari)": [
+        "Open the Settings app and select Safari (Apps, then Safari on newer versions).",
+        "Turn on Block All Cookies, or select Clear History and Website Data to delete cookies.",
+    ],
+    "Android (Chrome)": [
+        "Open Chrome and tap the menu (three dots), then Settings.",
+        "Tap Site settings, then Third-party cookies to choose which cookies are allowed.",
+        "To delete cookies, tap Privacy and security, then Delete browsing data.",
+    ],
+}
+
+# -----------------------------
+# Office of the Australian Information Commissioner
+# -----------------------------
+OAIC_CONTACT = [
+    "Office of the Australian Information Commissioner (OAIC)",
+    "Website: https://www.oaic.gov.au",
+    "Online complaint form: https://www.oaic.gov.au/privacy/privacy-complaints",
+    "Phone: 1300 363 992",
+    "Post: GPO Box 5288, Sydney NSW 2001",
+]
+
+
+@lru_cache(maxsize=None)
+def without_fields(schema, fields):
+    """The schema without the fields filled here: what the model is asked for."""
+    return create_model(
+        f"{schema.__name__}Generated",
+        **{name: (info.annotation, info) for name, info in schema.model_fields.items() if name not in fields},
+    )
+
+
+def fill(schema, data, fragments):
+    """
+    Add the rendered fragments to generated output and validate the whole
+    document against its full schema.
+
+    Args:
+        schema: Full document schema
+        data: Output of the without_fields() schema (dict)
+        fragments: {field: value} rendered from the inputs
+
+    Returns:
+        dict: The document, validated against the schema
+    """
+    return schema.model_validate(coerce(schema, {**data, **fragments})).model_dump()
+
+
+def _phone(phone_number):
+    phone = " ".join(str(phone_number or "").split())
+    return phone if phone and phone.lower() != "not specified" else None
+
+
+def contact_fragments(company_name, website, contact_email, phone_number, today):
+    """CONTACT_FIELDS of the terms of service, acceptable use policy and DPA."""
+    return {
+        "company_name": company_name,
+        "last_updated": today.strftime("%Y-%m-%d"),
+        "website_url": website,
+        "contact_email": contact_email,
+        "phone_number": _phone(phone_number),
+    }
+
+
+def privacy_fragments(company_name, website, contact_email, phone_number, today):
+    """PRIVACY_FIELDS of the privacy policy."""
+    phone = _phone(phone_number)
+    reach_us = f"by email at {contact_email}" + (f" or by phone on {phone}" if phone else "")
+    return {
+        "company_name": company_name,
+        "last_updated": today.strftime("%Y-%m-%d"),
+        "complaints_process": [
+            f"If you have a complaint about how we have handled your personal information, please contact us first {reach_us}, "
+            "with your contact details and a description of your complaint.",
+            "We will acknowledge your complaint, investigate it and aim to respond in writing within 30 days.",
+            "If you are not satisfied with our response, you may lodge a complaint with the Office of the Australian Information Commissioner (OAIC).",
+        ],
+        "oaic_contact": list(OAIC_CONTACT),
+        "contact_info": {
+            "email": contact_email,
+            "phone": phone,
+            "website": website,
+            "postal_address": None,
+        },
+    }
+
+
+def cookie_fragments(company_name, website, contact_email, phone_number, today):
+    """COOKIE_FIELDS of the cookie policy."""
+    return {
+        "company_name": company_name,
+        "last_updated": today.strftime("%Y-%m-%d"),
+        "browser_instructions": [
+            {"browser_name": name, "instructions": list(BROWSER_STEPS[name]), "help_link": link}
+            for name, link in BROWSER_HELP_LINKS.items()
+        ],
+        "contact_email": contact_email,
+        "contact_phone": _phone(phone_number),
+        "website": website,
+    }
+
+
+def with_opt_out_links(third_party_services):
+    """Generated third-party services with their opt-out link set from OPT_OUT_LINKS (None when unknown)."""
+    return [
+        {**service, "opt_out_link": OPT_OUT_LINKS.get(" ".join(str(service.get("service_name", "")).split()))}
+        for service in third_party_services
+    ]
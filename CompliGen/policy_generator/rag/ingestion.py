@@ -1,26 +1,20 @@
 import os
 from dotenv import load_dotenv
-from langchain_openai import OpenAIEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from pathlib import Path
 from langchain_community.document_loaders import PyPDFLoader
 from uuid import uuid4
 from langchain_qdrant import QdrantVectorStore
 from qdrant_client import QdrantClient
-from qdrant_client.models import VectorParams, Distance, PayloadSchemaType
-from qdrant_client.http.exceptions import UnexpectedResponse
-
-COLLECTION = "ingested_law_docs"
-VECTOR_SIZE = 1536  # text-embedding-3-small
+from .collection import COLLECTION_NAME as COLLECTION, VECTOR_BACKEND, create_collection
+from .embeddings import make_embeddings
+from .reindex import ReindexError, live_version, new_version, prune_versions, swap_alias, validate_version
 
 # Load environment
 load_dotenv()
 
-# Initialize embeddings model
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",  # Cost-effective and good quality
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
+# Initialize embeddings model (OpenAI, or a local CPU model: see embeddings.py)
+embeddings = make_embeddings()
 
 # Initialize text splitter
 splitter = RecursiveCharacterTextSplitter(
@@ -31,44 +25,40 @@ splitter = RecursiveCharacterTextSplitter(
     separators=["\n\n", "\n", ". ", " ", ""]
 )
 
-# Qdrant client
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
+if VECTOR_BACKEND == "pgvector":
+    # chunks go to the app's Postgres database (see pg_store.py); they are
+    # loaded into a staging table that replaces the live one once it is complete
+    import django
 
-# check if the client originally exist or not
-try:
-    client.get_collection(COLLECTION)
-    print(f"✅ Collection exists: {COLLECTION}")
-except UnexpectedResponse as e:
-    # Qdrant returns 404 if not found
-    if "doesn't exist" in str(e) or "404" in str(e):
-        print(f"⚠️ Collection missing. Creating: {COLLECTION}")
-        client.create_collection(
-            collection_name=COLLECTION,
-            vectors_config=VectorParams(
-                size=VECTOR_SIZE,
-                distance=Distance.COSINE,
-            ),
-        )
-    else:
-        raise
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "CompliGen.settings")
+    django.setup()
+    from . import pg_store
 
-# Ensure payload indexes exist for filtered fields
-for field_name in ("metadata.doc_type", "metadata.policy_type"):
-    client.create_payload_index(
-        collection_name=COLLECTION,
-        field_name=field_name,
-        field_schema=PayloadSchemaType.KEYWORD,
+    target = pg_store.create_staging_table()
+    print(f"🆕 Building {target} (live: {pg_store.TABLE})")
+    vector_store = None
+else:
+    # Qdrant client
+    client = QdrantClient(
+        url=os.environ.get("QDRANT_URL"),
+        api_key=os.environ.get("QDRANT_API_KEY"),
     )
 
-# Create vector store
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
+    # Build a new version of the collection; the generators keep reading the
+    # live one through the COLLECTION alias until this one is validated and
+    # swapped in (see reindex.py)
+    live = live_version(client, COLLECTION)
+    target = new_version(COLLECTION)
+    print(f"🆕 Building {target} (live: {live or 'none'})")
+    # storage settings from the environment; payload indexes before the bulk upload
+    create_collection(client, target)
+
+    # Create vector store
+    vector_store = QdrantVectorStore(
+        client=client,
+        collection_name=target,
+        embedding=embeddings,
+    )
 
 
 # Get directories
@@ -187,20 +177,48 @@ for file_path in DOCS_DIR.rglob('*.pdf'):
     uuids = [str(uuid4()) for _ in range(len(chunks))]
     
     # Add to vector store
-    vector_store.add_documents(
-        documents=chunks,  # ✅ Can pass Document objects directly
-        ids=uuids
-    )
+    if vector_store is None:
+        pg_store.add_documents(chunks, uuids, embeddings, target)
+    else:
+        vector_store.add_documents(
+            documents=chunks,  # ✅ Can pass Document objects directly
+            ids=uuids
+        )
     
     # ✅ Track progress
     total_chunks += len(chunks)
     print(f"   ✓ Created {len(chunks)} chunks from {len(docs)} pages")
 
+# ✅ Validate the new version and make it live
+if vector_store is None:
+    try:
+        pg_store.validate_table(target, total_chunks)
+    except ReindexError:
+        print(f"❌ {target} failed validation; {pg_store.TABLE} stays live")
+        raise
+    pg_store.swap_table(target)
+    print(f"🔀 {pg_store.TABLE} now holds the chunks of {target}")
+else:
+    try:
+        validate_version(client, target, total_chunks, embeddings, live=live)
+    except ReindexError:
+        client.delete_collection(target)
+        print(f"❌ {target} failed validation and was deleted; {live or 'nothing'} stays live")
+        raise
+    swap_alias(client, COLLECTION, target)
+    print(f"🔀 {COLLECTION} now points at {target}")
+    for pruned in prune_versions(client, COLLECTION):
+        print(f"🗑️ Deleted old version {pruned}")
+
 # ✅ Final summary
 print("\n" + "="*50)
 print("✅ Ingestion Complete!")
 print(f"📄 Total Files Processed: {total_files}")
 print(f"📦 Total Chunks Created: {total_chunks}")
-print("💾 Vector DB: Qdrant Cloud")
-print("📚 Collection: ingested_law_docs")
+if vector_store is None:
+    print("💾 Vector DB: Postgres (pgvector)")
+    print(f"📚 Table: {pg_store.TABLE}")
+else:
+    print("💾 Vector DB: Qdrant Cloud")
+    print(f"📚 Collection: {COLLECTION} -> {target} (previous: {live or 'none'})")
 print("="*50)
\ No newline at end of file
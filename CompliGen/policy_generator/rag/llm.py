@@ -0,0 +1,403 @@
+# llm.py
+# Shared LLM setup and a resilient invoke for the generator chains.
+#
+# Every generator used to build its own ChatGoogleGenerativeAI and call
+# chain.invoke() with no timeout, so one slow provider response held a worker
+# for as long as the provider liked and one transient error failed the whole
+# policy. Chains built here are invoked with:
+#   - a deadline per policy type (the call gives up and raises LLMTimeout)
+#   - bounded retries with full jitter for transient errors
+#   - an optional hedged second request once the first is slower than the
+#     recent p95 for that policy type
+#   - a fallback model once the primary model has used up its attempts
+#   - repair of output that fails schema validation (see repair.py), so a
+#     small follow-up call fixes the broken fields instead of starting over
+#   - cancellation: a blocking call stops waiting once the generation is
+#     cancelled (see cancellation.py)
+#   - the fixed prompt prefix (inputs["prefix"]) sent as cached content once
+#     the provider has it (see prompt_cache.py)
+
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextvars import copy_context
+from dotenv import load_dotenv
+from .usage import usage_callback
+from .cancellation import GenerationCancelled, poll_interval, raise_if_cancelled
+from .repair import arepair_output, raw_output_data, repair_output
+from .prompt_cache import prompt_cache
+
+# Load environment
+load_dotenv()
+
+PRIMARY_MODEL = os.getenv("LLM_MODEL", "gemini-2.0-flash")
+# empty string disables the fallback
+FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "gemini-2.0-flash-lite")
+HEDGING_ENABLED = os.getenv("LLM_HEDGING", "true").lower() in ("1", "true", "yes")
+
+# -----------------------------
+# Per policy type limits (seconds)
+# - deadline: total time budget for the call, retries and fallback included
+# - hedge_after: delay before a hedged request while there is not enough
+#   latency history to use the observed p95
+# -----------------------------
+LLM_LIMITS = {
+    "privacy": {"deadline": 120, "hedge_after": 45},
+    "tos": {"deadline": 120, "hedge_after": 45},
+    "dpa": {"deadline": 120, "hedge_after": 45},
+    "aup": {"deadline": 90, "hedge_after": 30},
+    "cookie": {"deadline": 90, "hedge_after": 30},
+    "section": {"deadline": 45, "hedge_after": 15},
+    "outline": {"deadline": 45, "hedge_after": 15},
+    "repair": {"deadline": 45, "hedge_after": 15},
+}
+
+MAX_ATTEMPTS = 3          # per model
+BACKOFF_BASE = 1.0        # seconds, doubled per attempt
+BACKOFF_CAP = 8.0
+MIN_SAMPLES_FOR_P95 = 20
+
+# calls run on this pool so the caller can stop waiting at the deadline;
+# a call that is abandoned still finishes in the background, bounded by the
+# request timeout set on the client
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm")
+
+
+class LLMTimeout(Exception):
+    """The LLM did not answer within the deadline for the policy type."""
+
+
+def make_llm(model=PRIMARY_MODEL, temperature=0.3, timeout=None, cached_content=None):
+    """Gemini chat model with usage tracking; retries are handled by ResilientChain."""
+    # the SDK is imported by the first generation, not at startup
+    from langchain_google_genai import ChatGoogleGenerativeAI
+
+    return ChatGoogleGenerativeAI(
+        model=model,
+        temperature=temperature,
+        api_key=os.getenv("GOOGLE_API_KEY"),
+        streaming=False,
+        callbacks=[usage_callback()],
+        timeout=timeout,
+        max_retries=0,
+        cached_content=cached_content,
+    )
+
+
+def is_retryable(exc):
+    """
+    Transient errors are worth retrying; bad requests and auth errors are not.
+
+    The provider SDK errors carry the HTTP status as `code` (google-genai) or
+    `status_code` (httpx style). Anything without a status (timeouts,
+    connection resets, malformed structured output) is treated as transient.
+    """
+    status = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if isinstance(status, int) and 400 <= status < 500:
+        return status in (408, 429)
+    return True
+
+
+class LatencyTracker:
+    """Recent successful call latencies per policy type, for the hedge threshold."""
+
+    def __init__(self, size=200):
+        self.size = size
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, policy_type, seconds):
+        with self._lock:
+            self._samples.setdefault(policy_type, deque(maxlen=self.size)).append(seconds)
+
+    def p95(self, policy_type):
+        with self._lock:
+            samples = sorted(self._samples.get(policy_type, ()))
+        if len(samples) < MIN_SAMPLES_FOR_P95:
+            return None
+        return samples[int(len(samples) * 0.95) - 1]
+
+
+latencies = LatencyTracker()
+
+
+def _submit(runnable, inputs):
+    # copy the context so usage tracking (contextvars) follows the call
+    ctx = copy_context()
+    return _executor.submit(ctx.run, runnable.invoke, inputs)
+
+
+class ResilientChain:
+    """
+    A prompt | structured-output chain per model, invoked with deadlines,
+    retries, hedging and fallback.
+
+    Args:
+        runnables: Runnables tried in order (primary first, then fallbacks)
+        policy_type: Key into LLM_LIMITS
+        schema: Output schema; when set the runnables return include_raw
+                results and output that fails validation is repaired
+        hedging: Send a second request when the first is slow
+        limits: Override the LLM_LIMITS entry (deadline, hedge_after)
+        sleep / asleep: Backoff sleep functions (tests pass no-ops)
+
+    invoke() runs calls on the thread pool; ainvoke() runs them as asyncio
+    tasks, where a losing hedged request can also be cancelled.
+    """
+
+    def __init__(self, runnables, policy_type, schema=None, hedging=HEDGING_ENABLED, limits=None,
+                 sleep=time.sleep, asleep=asyncio.sleep):
+        self.runnables = list(runnables)
+        self.policy_type = policy_type
+        self.schema = schema
+        self.limits = limits or LLM_LIMITS[policy_type]
+        self.hedging = hedging
+        self.sleep = sleep
+        self.asleep = asleep
+
+    def hedge_after(self):
+        return latencies.p95(self.policy_type) or self.limits["hedge_after"]
+
+    def _timeout(self, started, hedged, deadline):
+        """How long to wait: until the deadline, or until it is time to hedge."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMTimeout(f"{self.policy_type} generation exceeded its deadline")
+        if hedged:
+            return remaining
+        return min(remaining, max(0, started + self.hedge_after() - time.monotonic()))
+
+    @staticmethod
+    def _backoff(attempt, deadline):
+        # full jitter backoff, never past the deadline
+        backoff = random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+        return max(0, min(backoff, deadline - time.monotonic()))
+
+    def invoke(self, inputs, deadline=None):
+        """Invoke the chain; raises LLMTimeout or the last provider error."""
+        deadline = deadline or time.monotonic() + self.limits["deadline"]
+        last_error = None
+
+        for runnable in self.runnables:
+            for attempt in range(MAX_ATTEMPTS):
+                if time.monotonic() >= deadline:
+                    raise LLMTimeout(f"{self.policy_type} generation exceeded its deadline") from last_error
+                raise_if_cancelled()
+
+                try:
+                    return self._parsed(self._attempt(runnable, inputs, deadline), deadline)
+                except (LLMTimeout, GenerationCancelled):
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable(e):
+                        break
+
+                if attempt < MAX_ATTEMPTS - 1:
+                    self.sleep(self._backoff(attempt, deadline))
+
+        raise last_error
+
+    async def ainvoke(self, inputs, deadline=None):
+        """Async invoke(), with the same deadline, retries, hedging and fallback."""
+        deadline = deadline or time.monotonic() + self.limits["deadline"]
+        last_error = None
+
+        for runnable in self.runnables:
+            for attempt in range(MAX_ATTEMPTS):
+                if time.monotonic() >= deadline:
+                    raise LLMTimeout(f"{self.policy_type} generation exceeded its deadline") from last_error
+
+                try:
+                    return await self._aparsed(await self._aattempt(runnable, inputs, deadline), deadline)
+                except (LLMTimeout, GenerationCancelled):
+                    raise
+                except Exception as e:
+                    last_error = e
+                    if not is_retryable(e):
+                        break
+
+                if attempt < MAX_ATTEMPTS - 1:
+                    await self.asleep(self._backoff(attempt, deadline))
+
+        raise last_error
+
+    def _unwrap(self, result):
+        """
+        (parsed, raw_data) from an include_raw result: the parsed output, or
+        the raw JSON to repair when it failed validation. Output that is not
+        JSON at all raises and is retried as a whole.
+        """
+        if self.schema is None or not (isinstance(result, dict) and "parsing_error" in result):
+            return result, None
+        if result.get("parsed") is not None and result.get("parsing_error") is None:
+            return result["parsed"], None
+        return None, raw_output_data(result["raw"])
+
+    def _parsed(self, result, deadline):
+        """The schema instance, keeping what the model produced and fixing only what is broken."""
+        parsed, data = self._unwrap(result)
+        if data is None:
+            return parsed
+        return repair_output(self.schema, data, lambda schema, prompt: ask_repair(schema, prompt, deadline=deadline))
+
+    async def _aparsed(self, result, deadline):
+        parsed, data = self._unwrap(result)
+        if data is None:
+            return parsed
+
+        async def aask(schema, prompt):
+            return await aask_repair(schema, prompt, deadline=deadline)
+
+        return await arepair_output(self.schema, data, aask)
+
+    def _attempt(self, runnable, inputs, deadline):
+        """One attempt, plus a hedged duplicate if the first is slow."""
+        started = time.monotonic()
+        pending = {_submit(runnable, inputs)}
+        hedged = not self.hedging
+        error = None
+
+        while pending:
+            raise_if_cancelled()
+            timeout = self._timeout(started, hedged, deadline)
+            # wake up now and then to notice a cancellation; an abandoned
+            # call finishes in the background like one past its deadline
+            poll = poll_interval()
+            if poll is not None:
+                timeout = min(timeout, poll)
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                latencies.record(self.policy_type, time.monotonic() - started)
+                return result
+
+            if not done and not hedged and time.monotonic() >= started + self.hedge_after():
+                # first request is slower than usual: race a second one
+                pending.add(_submit(runnable, inputs))
+                hedged = True
+
+        raise error
+
+    async def _aattempt(self, runnable, inputs, deadline):
+        """Async _attempt(); requests still pending when it returns are cancelled."""
+        started = time.monotonic()
+        pending = {asyncio.ensure_future(runnable.ainvoke(inputs))}
+        hedged = not self.hedging
+        error = None
+
+        try:
+            while pending:
+                timeout = self._timeout(started, hedged, deadline)
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    if task.exception() is not None:
+                        error = task.exception()
+                        continue
+                    latencies.record(self.policy_type, time.monotonic() - started)
+                    return task.result()
+
+                if not done and not hedged and time.monotonic() >= started + self.hedge_after():
+                    # first request is slower than usual: race a second one
+                    pending.add(asyncio.ensure_future(runnable.ainvoke(inputs)))
+                    hedged = True
+
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+@lru_cache(maxsize=None)
+def prompt_template():
+    """Simple prompt template shared by every chain."""
+    from langchain_core.prompts import ChatPromptTemplate
+
+    return ChatPromptTemplate.from_messages([("human", "{input}")])
+
+
+@lru_cache(maxsize=64)
+def structured_chain(model, schema, temperature, timeout, include_raw, cached_content=None):
+    """prompt | structured-output chain for one model (one per cache name, as caches are renewed)."""
+    llm = make_llm(model, temperature, timeout, cached_content=cached_content)
+    return prompt_template() | llm.with_structured_output(schema, include_raw=include_raw)
+
+
+class PrefixCachedChain:
+    """
+    structured_chain() invoked with {"prefix": ..., "input": ...}: the prefix
+    is sent as cached content once the provider has it, inline until then.
+    Inputs without a prefix are sent as they are.
+    """
+
+    def __init__(self, model, schema, temperature, timeout, include_raw, cache=prompt_cache):
+        self.model = model
+        self.args = (model, schema, temperature, timeout, include_raw)
+        self.cache = cache
+
+    def _prepare(self, inputs):
+        cached_content, inline = self.cache.split(self.model, inputs.get("prefix"))
+        return structured_chain(*self.args, cached_content), {"input": inline + inputs["input"]}, cached_content
+
+    def _rejected(self, inputs, cached_content, error):
+        # a cache that expired early or that the provider refuses is a bad
+        # request; send the prefix inline rather than fail the attempt
+        if cached_content is None or is_retryable(error):
+            return False
+        self.cache.discard(self.model, inputs["prefix"])
+        return True
+
+    def invoke(self, inputs):
+        runnable, prompt, cached_content = self._prepare(inputs)
+        try:
+            return runnable.invoke(prompt)
+        except Exception as e:
+            if not self._rejected(inputs, cached_content, e):
+                raise
+        return self.invoke(inputs)
+
+    async def ainvoke(self, inputs):
+        runnable, prompt, cached_content = self._prepare(inputs)
+        try:
+            return await runnable.ainvoke(prompt)
+        except Exception as e:
+            if not self._rejected(inputs, cached_content, e):
+                raise
+        return await self.ainvoke(inputs)
+
+
+def build_chain(schema, policy_type, temperature=0.3, repair=True):
+    """
+    Structured-output chain for a schema, with the fallback model if configured.
+
+    With repair (the default) output that fails validation is repaired rather
+    than discarded; repair chains themselves are built with repair=False.
+    """
+    timeout = LLM_LIMITS[policy_type]["deadline"]
+    models = [PRIMARY_MODEL] + ([FALLBACK_MODEL] if FALLBACK_MODEL and FALLBACK_MODEL != PRIMARY_MODEL else [])
+    return ResilientChain(
+        [PrefixCachedChain(model, schema, temperature, timeout, include_raw=repair) for model in models],
+        policy_type,
+        schema=schema if repair else None,
+    )
+
+
+def ask_repair(repair_schema, prompt, deadline=None):
+    """Ask the model for just the fields of a repair schema (see repair.py)."""
+    return build_chain(repair_schema, "repair", repair=False).invoke({"input": prompt}, deadline=deadline)
+
+
+async def aask_repair(repair_schema, prompt, deadline=None):
+    """Async ask_repair()."""
+    return await build_chain(repair_schema, "repair", repair=False).ainvoke({"input": prompt}, deadline=deadline)
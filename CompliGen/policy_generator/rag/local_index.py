@@ -0,0 +1,230 @@
+# local_index.py
+# In-process vector search over a snapshot of the law collection.
+#
+# The corpus (laws and example policies) is a few thousand chunks, so every
+# generation crossing the network to Qdrant Cloud for its searches costs far
+# more than searching it in process. export_index() writes a snapshot of the
+# collection to a directory:
+#   vectors.npy     normalised vectors, one row per chunk (float16 by default)
+#   payloads.jsonl  the payload of each row (chunk text + metadata), row order
+#   index.json      collection, dimensions, dtype, row count, export time
+# LocalIndex memory-maps the matrix, so every worker process on a host shares
+# the same pages instead of holding its own copy, and answers a search with
+# one vectorised cosine scan, filtered with the same Filter objects the
+# generators pass to Qdrant.
+#
+# The snapshot does not follow later ingestion: export again after ingesting
+# (workers pick it up when they restart). Set VECTOR_INDEX_PATH to use it
+# (see store.py).
+
+import json
+import logging
+import os
+from datetime import datetime, timezone
+import numpy as np
+from langchain_core.documents import Document
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchExcept, MatchValue
+from .collection import COPY_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "vectors.npy"
+PAYLOADS_FILE = "payloads.jsonl"
+MANIFEST_FILE = "index.json"
+
+DTYPES = ("float16", "float32")
+
+# float16 rows are scored this many at a time in float32, so a search never
+# holds a float32 copy of the whole matrix
+SCORE_BLOCK_ROWS = 1024
+
+
+def _write(path, write):
+    """Write through a temporary file, so processes opening the old file keep a whole one."""
+    temporary = path + ".tmp"
+    write(temporary)
+    os.replace(temporary, path)
+
+
+def export_index(client, collection, path, dtype="float16"):
+    """
+    Write a snapshot of a collection for LocalIndex.
+
+    Args:
+        client: QdrantClient
+        collection: Collection to export
+        path: Directory to write the snapshot to (created if missing)
+        dtype: "float16" (half the size) or "float32" (faster to score)
+
+    Returns:
+        int: Number of rows written
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown dtype {dtype!r}, expected one of {', '.join(DTYPES)}")
+    os.makedirs(path, exist_ok=True)
+
+    vectors, payloads = [], []
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection,
+            limit=COPY_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        for record in records:
+            vectors.append(record.vector)
+            payloads.append(record.payload or {})
+        if offset is None:
+            break
+
+    if not vectors:
+        raise ValueError(f"Collection {collection!r} is empty")
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+
+    def write_vectors(temporary):
+        with open(temporary, "wb") as f:
+            np.save(f, matrix.astype(dtype))
+
+    def write_payloads(temporary):
+        with open(temporary, "w", encoding="utf-8") as f:
+            for payload in payloads:
+                f.write(json.dumps(payload, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write_manifest(temporary):
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({
+                "collection": collection,
+                "dimensions": matrix.shape[1],
+                "dtype": dtype,
+                "rows": matrix.shape[0],
+                "exported_at": datetime.now(timezone.utc).isoformat(),
+            }, f, indent=2)
+
+    _write(os.path.join(path, VECTORS_FILE), write_vectors)
+    _write(os.path.join(path, PAYLOADS_FILE), write_payloads)
+    # last, so a manifest always describes files that are complete
+    _write(os.path.join(path, MANIFEST_FILE), write_manifest)
+    return matrix.shape[0]
+
+
+def _value(payload, key):
+    """Payload value at a dotted key ("metadata.doc_type"), None when missing."""
+    for part in key.split("."):
+        if not isinstance(payload, dict):
+            return None
+        payload = payload.get(part)
+    return payload
+
+
+def _field_matches(value, match):
+    # like Qdrant, a list value matches when any of its elements does
+    values = value if isinstance(value, list) else [value]
+    if isinstance(match, MatchValue):
+        return match.value in values
+    if isinstance(match, MatchAny):
+        return any(v in match.any for v in values)
+    if isinstance(match, MatchExcept):
+        return value is not None and all(v not in match.except_ for v in values)
+    raise ValueError(f"Unsupported match in a local index filter: {match!r}")
+
+
+class LocalIndex:
+    """
+    Memory-mapped snapshot written by export_index(), searched in process.
+
+    Args:
+        path: Directory of the snapshot
+    """
+
+    def __init__(self, path):
+        with open(os.path.join(path, MANIFEST_FILE), encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode="r")
+        with open(os.path.join(path, PAYLOADS_FILE), encoding="utf-8") as f:
+            self.payloads = [json.loads(line) for line in f]
+        if not len(self.vectors) == len(self.payloads) == self.manifest["rows"]:
+            raise ValueError(f"Local index at {path} is incomplete; export it again")
+        self.dimensions = self.vectors.shape[1]
+        # boolean row masks per filter: the generators use a handful of filters
+        self._masks = {}
+        logger.info(
+            "Local index of %s: %d rows, exported %s",
+            self.manifest["collection"], len(self.payloads), self.manifest["exported_at"],
+        )
+
+    def _condition(self, condition):
+        if isinstance(condition, Filter):
+            return self._mask(condition)
+        if isinstance(condition, FieldCondition) and condition.match is not None:
+            return np.fromiter(
+                (_field_matches(_value(payload, condition.key), condition.match) for payload in self.payloads),
+                dtype=bool,
+                count=len(self.payloads),
+            )
+        raise ValueError(f"Unsupported condition in a local index filter: {condition!r}")
+
+    @staticmethod
+    def _conditions(conditions):
+        if conditions is None:
+            return []
+        return conditions if isinstance(conditions, list) else [conditions]
+
+    def _mask(self, filter):
+        """Rows a Filter (must / should / must_not) selects."""
+        key = filter.model_dump_json()
+        mask = self._masks.get(key)
+        if mask is not None:
+            return mask
+        mask = np.ones(len(self.payloads), dtype=bool)
+        for condition in self._conditions(filter.must):
+            mask &= self._condition(condition)
+        should = self._conditions(filter.should)
+        if should:
+            mask &= np.logical_or.reduce([self._condition(condition) for condition in should])
+        for condition in self._conditions(filter.must_not):
+            mask &= ~self._condition(condition)
+        self._masks[key] = mask
+        return mask
+
+    def _scores(self, query):
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        return np.concatenate([
+            self.vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32) @ query
+            for start in range(0, len(self.vectors), SCORE_BLOCK_ROWS)
+        ])
+
+    def search(self, vector, k, filter=None):
+        """
+        Top k chunks by cosine similarity, as Documents (the interface of the
+        vector store's similarity_search).
+
+        Args:
+            vector: Query embedding
+            k: Number of results
+            filter: qdrant_client Filter on the payload, or None
+        """
+        query = np.asarray(vector, dtype=np.float32)
+        if query.shape != (self.dimensions,):
+            raise ValueError(f"Query has {query.shape[-1]} dimensions, the local index {self.dimensions}")
+        query /= max(float(np.linalg.norm(query)), 1e-12)
+
+        scores = self._scores(query)
+        if filter is not None:
+            scores = np.where(self._mask(filter), scores, -np.inf)
+        k = min(k, len(scores))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            Document(
+                page_content=self.payloads[row].get("page_content", ""),
+                metadata=self.payloads[row].get("metadata") or {},
+            )
+            for row in top
+            if scores[row] != -np.inf
+        ]
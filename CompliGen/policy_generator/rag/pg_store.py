@@ -0,0 +1,258 @@
+# pg_store.py
+# The law collection stored in the app's own Postgres database with pgvector.
+#
+# Retrieval otherwise needs a separate Qdrant deployment and a network hop
+# per search. With VECTOR_BACKEND=pgvector the chunks live in one table of
+# the database the app already uses, searched over the app's own
+# connections:
+#   - embedding: pgvector column with an HNSW index (cosine distance)
+#   - content / metadata: the chunk text and its metadata (jsonb, GIN index)
+#   - doc_type / policy_type: generated from the metadata, B-tree indexed,
+#     the fields the generators filter on
+#
+# The table is not a Django model: the vector extension is only needed where
+# this backend is used, so it is created by create_table() (or by
+# `python manage.py law_collection pgvector`, which also copies the Qdrant
+# collection into it) rather than by a migration. The generators keep
+# passing qdrant_client Filter objects; they are translated to SQL here.
+# Searches run by run() on its pool threads get their connections closed
+# there after each step (see pipeline.py); async searches run on Django's
+# thread-sensitive executor.
+#
+# Reingestion never writes into the table being searched: it loads a
+# staging table, checks it, and swap_table() renames it into place in one
+# transaction (the pgvector counterpart of reindex.swap_alias). Searches
+# see the old chunks or the new ones, never a partial or duplicated set.
+
+import json
+import os
+from django.db import connection, transaction
+from langchain_core.documents import Document
+from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchExcept, MatchValue
+from .collection import COLLECTION_SUFFIX, COPY_BATCH_SIZE, EMBEDDING_DIMENSIONS
+from .reindex import MIN_POINTS_RATIO, ReindexError
+
+TABLE = os.getenv("PGVECTOR_TABLE", "law_chunks" + COLLECTION_SUFFIX)
+# where reingestion builds the next version of TABLE
+STAGING_TABLE = TABLE + "_new"
+# candidates the HNSW scan keeps; raise it if filtered searches return fewer than k
+EF_SEARCH = int(os.getenv("PGVECTOR_EF_SEARCH", "100"))
+
+# metadata fields stored as indexed columns
+COLUMNS = {"metadata.doc_type": "doc_type", "metadata.policy_type": "policy_type", "page_content": "content"}
+
+
+# suffixes of the indexes create_table() names after the table
+INDEXES = ("embedding", "types", "metadata")
+
+
+def create_table(dimensions=EMBEDDING_DIMENSIONS, table=TABLE):
+    """Create the vector extension, the chunk table and its indexes (if missing)."""
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS vector")
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                id text PRIMARY KEY,
+                content text NOT NULL,
+                metadata jsonb NOT NULL DEFAULT '{{}}',
+                doc_type text GENERATED ALWAYS AS (metadata->>'doc_type') STORED,
+                policy_type text GENERATED ALWAYS AS (metadata->>'policy_type') STORED,
+                embedding vector({int(dimensions)}) NOT NULL
+            )
+        """)
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_embedding ON {table} "
+            "USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64)"
+        )
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_types ON {table} (doc_type, policy_type)")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_metadata ON {table} USING gin (metadata jsonb_path_ops)")
+
+
+def create_staging_table(dimensions=EMBEDDING_DIMENSIONS):
+    """Start the next version of the table from empty (dropping a staging table an aborted run left)."""
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+    create_table(dimensions, STAGING_TABLE)
+    return STAGING_TABLE
+
+
+def count(table=TABLE):
+    """Number of chunks in a table (0 if it does not exist yet)."""
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [table])
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute(f"SELECT count(*) FROM {table}")
+        return cursor.fetchone()[0]
+
+
+def validate_table(table, expected_rows):
+    """
+    Check a staging table before it goes live, like reindex.validate_version:
+    every uploaded chunk is there, and it is not much smaller than the live table.
+    """
+    rows = count(table)
+    if rows != expected_rows:
+        raise ReindexError(f"{table} has {rows} chunks, {expected_rows} were uploaded")
+    live_rows = count(TABLE)
+    if rows < live_rows * MIN_POINTS_RATIO:
+        raise ReindexError(f"{table} has {rows} chunks, the live {TABLE} has {live_rows}")
+
+
+def _rename(cursor, old, new):
+    cursor.execute(f"ALTER TABLE {old} RENAME TO {new}")
+    # Postgres named the primary key after the table too
+    cursor.execute(f"ALTER TABLE {new} RENAME CONSTRAINT {old}_pkey TO {new}_pkey")
+    for suffix in INDEXES:
+        cursor.execute(f"ALTER INDEX IF EXISTS {old}_{suffix} RENAME TO {new}_{suffix}")
+
+
+def swap_table(staging=STAGING_TABLE):
+    """
+    Make a staging table the live one, in one transaction; the old chunks
+    are dropped. Searches running meanwhile finish on the old table, the
+    next ones wait for the commit and then read the new one.
+    """
+    previous = TABLE + "_old"
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {previous}")
+        cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [TABLE])
+        if cursor.fetchone()[0]:
+            _rename(cursor, TABLE, previous)
+        _rename(cursor, staging, TABLE)
+        cursor.execute(f"DROP TABLE IF EXISTS {previous}")
+
+
+def _vector(values):
+    return "[" + ",".join(repr(float(x)) for x in values) + "]"
+
+
+def upsert(rows, table=TABLE):
+    """
+    Insert or replace chunks.
+
+    Args:
+        rows: Iterable of (id, content, metadata dict, embedding)
+        table: The live table, or a staging table being loaded
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {table} (id, content, metadata, embedding) VALUES (%s, %s, %s::jsonb, %s::vector) "
+            "ON CONFLICT (id) DO UPDATE SET content = EXCLUDED.content, metadata = EXCLUDED.metadata, "
+            "embedding = EXCLUDED.embedding",
+            [(str(id), content, json.dumps(metadata or {}), _vector(embedding)) for id, content, metadata, embedding in rows],
+        )
+
+
+def add_documents(documents, ids, embeddings, table=TABLE):
+    """Embed Documents and store them (the ingestion counterpart of QdrantVectorStore.add_documents)."""
+    vectors = embeddings.embed_documents([d.page_content for d in documents])
+    upsert(zip(ids, (d.page_content for d in documents), (d.metadata for d in documents), vectors), table)
+
+
+def copy_from_qdrant(client, collection, table=TABLE):
+    """
+    Copy a Qdrant collection into a table: ids, payloads and vectors as
+    they are, so nothing is embedded again.
+
+    Returns:
+        int: Number of chunks copied
+    """
+    copied = 0
+    offset = None
+    while True:
+        records, offset = client.scroll(
+            collection_name=collection,
+            limit=COPY_BATCH_SIZE,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True,
+        )
+        upsert(
+            [
+                (record.id, (record.payload or {}).get("page_content", ""), (record.payload or {}).get("metadata"), record.vector)
+                for record in records
+            ],
+            table,
+        )
+        copied += len(records)
+        if offset is None:
+            return copied
+
+
+# -----------------------------
+# Filters
+# -----------------------------
+def _text(value):
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _field(key):
+    """SQL expression and parameters of a payload key (scalar fields)."""
+    if key in COLUMNS:
+        return COLUMNS[key], []
+    if key.startswith("metadata."):
+        return "metadata #>> %s", [key.split(".")[1:]]
+    raise ValueError(f"Unsupported key in a pgvector filter: {key!r}")
+
+
+def _condition(condition):
+    if isinstance(condition, Filter):
+        return where(condition)
+    if not isinstance(condition, FieldCondition):
+        raise ValueError(f"Unsupported condition in a pgvector filter: {condition!r}")
+    field, params = _field(condition.key)
+    match = condition.match
+    if isinstance(match, MatchValue):
+        return f"{field} = %s", params + [_text(match.value)]
+    if isinstance(match, MatchAny):
+        return f"{field} = ANY(%s)", params + [[_text(v) for v in match.any]]
+    if isinstance(match, MatchExcept):
+        return f"{field} <> ALL(%s)", params + [[_text(v) for v in match.except_]]
+    raise ValueError(f"Unsupported match in a pgvector filter: {match!r}")
+
+
+def _conditions(conditions):
+    if conditions is None:
+        return []
+    return conditions if isinstance(conditions, list) else [conditions]
+
+
+def where(filter):
+    """
+    SQL condition and parameters selecting the rows a qdrant_client Filter
+    (must / should / must_not) selects.
+    """
+    clauses, params = [], []
+
+    def add(sql, values, template="({})"):
+        clauses.append(template.format(sql))
+        params.extend(values)
+
+    for condition in _conditions(filter.must):
+        add(*_condition(condition))
+    should = [_condition(condition) for condition in _conditions(filter.should)]
+    if should:
+        add(" OR ".join(f"({sql})" for sql, _ in should), [v for _, values in should for v in values])
+    for condition in _conditions(filter.must_not):
+        add(*_condition(condition), template="NOT ({})")
+    return " AND ".join(clauses) or "TRUE", params
+
+
+def search(vector, k, filter=None):
+    """Top k chunks by cosine distance, as Documents (the interface of the vector store's similarity_search)."""
+    condition, params = where(filter) if filter is not None else ("TRUE", [])
+    query = _vector(vector)
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL hnsw.ef_search = %s", [EF_SEARCH])
+        cursor.execute(
+            f"SELECT content, metadata FROM {TABLE} WHERE {condition} "
+            "ORDER BY embedding <=> %s::vector LIMIT %s",
+            params + [query, k],
+        )
+        rows = cursor.fetchall()
+    # Django leaves jsonb undecoded (its JSONField does that)
+    return [
+        Document(page_content=content, metadata=json.loads(metadata) if isinstance(metadata, str) else metadata or {})
+        for content, metadata in rows
+    ]
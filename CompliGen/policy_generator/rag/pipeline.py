@@ -0,0 +1,100 @@
+# pipeline.py
+# Runs a generator's steps with blocking or async I/O.
+#
+# Each generate_* function is written once, as a step generator: it yields
+# the I/O it needs (a vector search, an LLM call, or a list of them to run
+# together) and gets the results back. run() executes the steps with the
+# blocking clients (DRF views, scripts); arun() with the async clients, so an
+# ASGI worker can hold many generations that are waiting on I/O.
+# run() stops between steps once the generation is cancelled (see
+# cancellation.py); arun() is stopped by cancelling its task.
+#
+# Steps run on the pool may query the database (VECTOR_BACKEND=pgvector).
+# Django only opens and closes connections around requests, so a pool
+# thread's connection would never be closed or checked: each pool task is
+# wrapped like a request, with close_old_connections() before and after.
+#
+#     def _cookie_policy_steps(...):
+#         legal_docs, example_docs = yield [Search(...), Search(...)]
+#         result = yield Invoke(chain, {"input": prompt})
+#         return result.model_dump()
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from typing import Any, NamedTuple
+from django.db import close_old_connections
+from . import store
+from .cancellation import raise_if_cancelled
+
+# run() executes steps yielded together on this pool
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="pipeline")
+
+
+class Search(NamedTuple):
+    """Vector search step; the result is a list of Documents."""
+    query: str
+    k: int
+    filter: Any = None
+
+
+class Invoke(NamedTuple):
+    """LLM step; the result is whatever the chain returns."""
+    chain: Any
+    inputs: dict
+
+
+def _pooled(step):
+    """_execute() on a pool thread, with the database connection handling of a request."""
+    close_old_connections()
+    try:
+        return _execute(step)
+    finally:
+        close_old_connections()
+
+
+def _execute(step):
+    if isinstance(step, list):
+        # steps yielded together are independent, so they run concurrently;
+        # each gets a copy of the context so usage tracking follows it
+        futures = [_executor.submit(copy_context().run, _pooled, s) for s in step]
+        return [future.result() for future in futures]
+    if isinstance(step, Search):
+        return store.similarity_search(step.query, k=step.k, filter=step.filter)
+    if isinstance(step, Invoke):
+        return step.chain.invoke(step.inputs)
+    raise TypeError(f"Unknown pipeline step: {step!r}")
+
+
+async def _aexecute(step):
+    if isinstance(step, list):
+        # steps yielded together are independent, so they run concurrently
+        return list(await asyncio.gather(*(_aexecute(s) for s in step)))
+    if isinstance(step, Search):
+        return await store.asimilarity_search(step.query, k=step.k, filter=step.filter)
+    if isinstance(step, Invoke):
+        return await step.chain.ainvoke(step.inputs)
+    raise TypeError(f"Unknown pipeline step: {step!r}")
+
+
+def run(steps):
+    """Drive a step generator with blocking I/O and return its result."""
+    result = None
+    while True:
+        try:
+            step = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        raise_if_cancelled()
+        result = _execute(step)
+
+
+async def arun(steps):
+    """Drive a step generator with async I/O and return its result."""
+    result = None
+    while True:
+        try:
+            step = steps.send(result)
+        except StopIteration as done:
+            return done.value
+        result = await _aexecute(step)
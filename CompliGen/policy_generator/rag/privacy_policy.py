@@ -1,96 +1,63 @@
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from .privacy_output import StructuredPrivacyPolicy
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+from .sectioned import sectioned_steps, use_sectioned
+from .fragments import PRIVACY_FIELDS, fill, privacy_fragments, without_fields
+from .prompt_cache import static_prefix
 
 # Load environment
 load_dotenv()
 
-# Initialize LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=.3,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    streaming=False
-)
-
-# Initialize embeddings model
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
-
-# Initialize Qdrant client and vector store
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
-
-# Simple prompt template
-prompt_template = ChatPromptTemplate.from_messages([
-    ("human", "{input}"),
-])
-
-llm_with_structured_output = llm.with_structured_output(StructuredPrivacyPolicy)
-
-chain = prompt_template | llm_with_structured_output
-
-# prompt for privacy policy generation
-PRIVACY_POLICY_PROMPT = """
-    You are an expert Australian privacy law consultant specializing in drafting Privacy Act 1988 compliant privacy policies. You have deep knowledge of all 13 Australian Privacy Principles (APPs) and create clear, professional privacy policies for Australian businesses.
-
-    === LEGAL REQUIREMENTS ===
+# what the model is asked for: the policy without the boilerplate fields,
+# which are rendered from the inputs (see fragments.py)
+GeneratedPrivacyPolicy = without_fields(StructuredPrivacyPolicy, PRIVACY_FIELDS)
 
-    The following are excerpts from the Privacy Act 1988 and Australian Privacy Principles Guidelines that MUST be addressed in this privacy policy:
-
-    {legal_context}
+# structured output chain with deadlines, retries, hedging and fallback (see llm.py)
+chain = build_chain(GeneratedPrivacyPolicy, "privacy")
 
-    === INDUSTRY EXAMPLES ===
+PRIVACY_POLICY_ROLE = """
+    You are an expert Australian privacy law consultant specializing in drafting Privacy Act 1988 compliant privacy policies. You have deep knowledge of all 13 Australian Privacy Principles (APPs) and create clear, professional privacy policies for Australian businesses.
+"""
 
-    Here are examples of how similar companies in the {industry} industry have structured their privacy policies:
+# rules for every part of the policy, whether written in one call or section by section
+PRIVACY_POLICY_RULES = """
+    **CONTENT RULES (STRICT):**
+    - Use only the company information explicitly provided.
+    - Do **not** invent business practices, overseas disclosures, marketing activities, payment processing, cookies, or third-party sharing.
+    - Do **not** use placeholders such as “[Insert …]”.
+    - Where certain activities are **not** undertaken (e.g. no direct marketing, no overseas disclosure), clearly state that fact in the relevant APP section.
 
-    {example_context}
+    **STYLE:**
+    - Australian English spelling
+    - Clear, accessible language suitable for the general public
+    - First person (“we”) and second person (“you”)
+    - Professional tone appropriate for the company's industry
 
-    === COMPANY INFORMATION ===
+    Do not use placeholders such as [Insert Address Here]. 
+    If a postal address is not provided, omit postal address entirely and provide email contact only.
 
-    Company Details:
-    - Company Name: {company_name}
-    - Business Description: {business_description}
-    - Industry: {industry}
-    - Company Size: {company_size}
-    - Location: {location}
-    - Website: {website}
-    - Contact Email: {contact_email}
-    - Phone: {phone_number}
-    - Customer Type: {customer_type}
-    - International Operations: {international_operations}
-    - Serves Children Under 18: {serves_children}
+    - Do not write “APP X does not apply”. Instead write what the company does or does not do in practice (e.g., “We do not currently disclose overseas…”).
+    - Do not claim we de-identify personal information before all disclosures. Only describe de-identification for analytics/research/statistical purposes.
+    - If cookies_used is False, do not mention cookies or tracking. If True, include a Cookies/Tracking section with choices/controls.
+    - For APP 5, explicitly state the main consequence if personal information is not provided (e.g., cannot provide the Services).
 
-    Data Collection Information:
-    - Types of Personal Information Collected: {data_types}
-    - Collection Methods: {collection_methods}
-    - Purposes of Collection: {collection_purposes}
-    - Third-Party Sharing: {third_parties}
-    - Data Storage Location: {storage_location}
-    - Security Measures: {security_measures}
-    - Data Retention Period: {retention_period}
+    - Do NOT state that any Australian Privacy Principle “does not apply”.
+    - Where an activity is not undertaken (e.g. direct marketing, overseas disclosure),
+    explain this fact in practical terms (e.g. “We do not currently…”)
+    and describe what will happen if this changes.
+"""
 
-   === YOUR TASK ===
+# fixed part of the privacy policy prompt: the same for every request, so
+# it is sent first and cached by the provider (see prompt_cache.py)
+PRIVACY_POLICY_INSTRUCTIONS = PRIVACY_POLICY_ROLE + """
+    === YOUR TASK ===
 
-    Generate a comprehensive Privacy Policy for {company_name} (2,000–3,000 words) that complies with the Australian Privacy Act 1988.
+    Generate a comprehensive Privacy Policy (2,000–3,000 words) for the company described after these instructions, that complies with the Australian Privacy Act 1988.
 
     **COMPLIANCE REQUIREMENTS:**
     - Address all 13 Australian Privacy Principles (APPs).
@@ -109,12 +76,6 @@ PRIVACY_POLICY_PROMPT = """
     - APP 12 (Access)
     - APP 13 (Correction)
 
-    **CONTENT RULES (STRICT):**
-    - Use only the company information explicitly provided.
-    - Do **not** invent business practices, overseas disclosures, marketing activities, payment processing, cookies, or third-party sharing.
-    - Do **not** use placeholders such as “[Insert …]”.
-    - Where certain activities are **not** undertaken (e.g. no direct marketing, no overseas disclosure), clearly state that fact in the relevant APP section.
-
     **MANDATORY SECTIONS:**
     - Collection of Personal Information
     - Use and Disclosure of Personal Information
@@ -123,23 +84,68 @@ PRIVACY_POLICY_PROMPT = """
     - Complaints and OAIC Contact
     - How to Contact Us
 
-    **STYLE:**
-    - Australian English spelling
-    - Clear, accessible language suitable for the general public
-    - First person (“we”) and second person (“you”)
-    - Professional tone appropriate for the {industry} industry
+    **STRUCTURE:**
     - Numbered sections with clear headings aligned to the APPs
+""" + PRIVACY_POLICY_RULES
 
-    {additional_instructions}
+# sent before every privacy policy prompt (instructions + output schema)
+PRIVACY_POLICY_PREFIX = static_prefix(PRIVACY_POLICY_INSTRUCTIONS, GeneratedPrivacyPolicy)
 
-    === OUTPUT ===
+# instructions of the section calls when the policy is written section by section
+# (see sectioned.py): the rules, without the whole-document requirements
+PRIVACY_POLICY_SECTION_INSTRUCTIONS = PRIVACY_POLICY_ROLE + """
+    === YOUR TASK ===
+
+    Write ONE numbered section of a Privacy Act 1988 compliant Privacy Policy for the company described after these instructions. The other sections are written separately from the same outline; address only the APPs this section covers.
+""" + PRIVACY_POLICY_RULES
+
+# per request part of the prompt, sent after the instructions
+PRIVACY_POLICY_PROMPT = """
+    === LEGAL REQUIREMENTS ===
+
+    The following are excerpts from the Privacy Act 1988 and Australian Privacy Principles Guidelines that MUST be addressed in this privacy policy:
+
+    {legal_context}
+
+    === INDUSTRY EXAMPLES ===
+
+    Here are examples of how similar companies in the {industry} industry have structured their privacy policies:
+
+    {example_context}
+
+    === COMPANY INFORMATION ===
+
+    Company Details:
+    - Company Name: {company_name}
+    - Business Description: {business_description}
+    - Industry: {industry}
+    - Company Size: {company_size}
+    - Location: {location}
+    - Website: {website}
+    - Contact Email: {contact_email}
+    - Phone: {phone_number}
+    - Customer Type: {customer_type}
+    - International Operations: {international_operations}
+    - Serves Children Under 18: {serves_children}
+    - Payment Data Collected: {payment_data_collected}
+    - Cookies Used (cookies_used): {cookies_used}
+    - Marketing Purpose: {marketing_purpose}
 
-    Generate the complete Privacy Policy now.
-    Include “Last Updated: {Current_Date}” at the top.
+    Data Collection Information:
+    - Types of Personal Information Collected: {data_types}
+    - Collection Methods: {collection_methods}
+    - Purposes of Collection: {collection_purposes}
+    - Third-Party Sharing: {third_parties}
+    - Data Storage Location: {storage_location}
+    - Security Measures: {security_measures}
+    - Data Retention Period: {retention_period}
 
+    === OUTPUT ===
+
+    Generate the complete Privacy Policy for {company_name} now.
 """
 
-def generate_privacy_policy(
+def _privacy_policy_steps(
     company_name,
     business_description,
     industry,
@@ -160,7 +166,8 @@ def generate_privacy_policy(
     third_parties,             # String
     storage_location,
     security_measures,
-    retention_period
+    retention_period,
+    sectioned=None,            # outline first, then sections in parallel (see sectioned.py)
 ):
     today = datetime.now(ZoneInfo("Australia/Sydney"))
     # CREATE LOCAL VARIABLES (don't modify globals!)
@@ -190,23 +197,26 @@ def generate_privacy_policy(
     example_query += f" {industry} {customer_type}"
 
 
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
     # RETRIEVAL STEP
     # get the legal docs chunks
-    legal_docs = vector_store.similarity_search(
-        legal_query,
-        k=12,
-        filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
-    )
-
-    # get the example docs chunks
-    example_docs = vector_store.similarity_search(
-        example_query,
-        k=6,
-        filter=Filter(must=[
-            FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
-            FieldCondition(key="metadata.policy_type", match=MatchValue(value="Privacy Policy")),
-        ])
-    )
+    legal_docs, example_docs = yield [
+        Search(
+            legal_query,
+            k=12,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
+        ),
+        Search(
+            example_query,
+            k=6,
+            filter=Filter(must=[
+                FieldCondition(key="metadata.doc_type", match=MatchValue(value="example")),
+                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Privacy Policy")),
+            ])
+        ),
+    ]
 
     # get the legal context
     legal_context = "\n\n---\n\n".join([doc.page_content for doc in legal_docs])
@@ -214,52 +224,66 @@ def generate_privacy_policy(
     # get the example context
     example_context = "\n\n---\n\n".join([doc.page_content for doc in example_docs])
 
-    additional_instructions = """
-    Do not use placeholders such as [Insert Address Here]. 
-    If a postal address is not provided, omit postal address entirely and provide email contact only.
-
-    - Do not write “APP X does not apply”. Instead write what the company does or does not do in practice (e.g., “We do not currently disclose overseas…”).
-    - Do not claim we de-identify personal information before all disclosures. Only describe de-identification for analytics/research/statistical purposes.
-    - If cookies_used is False, do not mention cookies or tracking. If True, include a Cookies/Tracking section with choices/controls.
-    - For APP 5, explicitly state the main consequence if personal information is not provided (e.g., cannot provide the Services).
-
-    - Do NOT state that any Australian Privacy Principle “does not apply”.
-    - Where an activity is not undertaken (e.g. direct marketing, overseas disclosure),
-    explain this fact in practical terms (e.g. “We do not currently…”)
-    and describe what will happen if this changes.
-    """
-
     # AUGUMENTATION STEP
-    prompt = PRIVACY_POLICY_PROMPT.format(
-        legal_context = legal_context,
-        example_context = example_context,
-        company_name = company_name,
-        business_description = business_description,
-        industry = industry,
-        company_size = company_size,
-        location = location,
-        website = website,
-        contact_email = contact_email,
-        phone_number = phone_number,
-        customer_type = customer_type,
-        international_operations = international_operations,  
-        serves_children = serves_children,         
-        data_types = data_types,
-        payment_data_collected = payment_data_collected,    
-        cookies_used = cookies_used,              
-        collection_methods = collection_methods,
-        marketing_purpose = marketing_purpose,         
-        collection_purposes = collection_purposes,
-        third_parties = third_parties,             
-        storage_location = storage_location,
-        security_measures = security_measures,
-        retention_period = retention_period,
-        additional_instructions=additional_instructions,
-        Current_Date=today.strftime("%Y-%m-%d")
-    ) 
+    def build_prompt(legal_context, example_context):
+        return PRIVACY_POLICY_PROMPT.format(
+            legal_context = legal_context,
+            example_context = example_context,
+            company_name = company_name,
+            business_description = business_description,
+            industry = industry,
+            company_size = company_size,
+            location = location,
+            website = website,
+            contact_email = contact_email,
+            phone_number = phone_number,
+            customer_type = customer_type,
+            international_operations = international_operations,  
+            serves_children = serves_children,         
+            data_types = data_types,
+            payment_data_collected = payment_data_collected,    
+            cookies_used = cookies_used,              
+            collection_methods = collection_methods,
+            marketing_purpose = marketing_purpose,         
+            collection_purposes = collection_purposes,
+            third_parties = third_parties,             
+            storage_location = storage_location,
+            security_measures = security_measures,
+            retention_period = retention_period,
+        )
+
+    prompt = build_prompt(legal_context, example_context)
+
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
+        legal_context=legal_context,
+        example_context=example_context,
+        instructions=PRIVACY_POLICY_PREFIX + PRIVACY_POLICY_PROMPT,
+    )
 
     # GENERATION STEP
-    result = chain.invoke({"input": prompt})
-    return result.model_dump()
+    if use_sectioned(sectioned):
+        policy_dict = yield from sectioned_steps(
+            GeneratedPrivacyPolicy, build_prompt, legal_docs, example_docs,
+            min_sections=13, prefix=PRIVACY_POLICY_PREFIX,
+            section_instructions=PRIVACY_POLICY_SECTION_INSTRUCTIONS,
+        )
+    else:
+        result = yield Invoke(chain, {"prefix": PRIVACY_POLICY_PREFIX, "input": prompt})
+        policy_dict = result.model_dump()
+
+    return fill(
+        StructuredPrivacyPolicy,
+        policy_dict,
+        privacy_fragments(company_name, website, contact_email, phone_number, today),
+    )
+
+
+def generate_privacy_policy(**inputs):
+    """_privacy_policy_steps() with blocking I/O, for sync callers."""
+    return run(_privacy_policy_steps(**inputs))
 
 
+async def agenerate_privacy_policy(**inputs):
+    """_privacy_policy_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_privacy_policy_steps(**inputs))
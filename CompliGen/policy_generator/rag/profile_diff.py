@@ -0,0 +1,378 @@
+# profile_diff.py
+# Maps changes in a company's input profile to the policy sections they affect,
+# so an edit only re-runs those sections instead of the whole document.
+
+import re
+
+# -----------------------------
+# Identity fields
+# These never need the LLM: the old value is swapped for the new one in the
+# stored text and the matching output field is overwritten.
+# input field -> output field(s) on the generated policy dict
+# -----------------------------
+IDENTITY_FIELDS = {
+    "privacy": {
+        "company_name": ["company_name"],
+        "website": ["contact_info.website"],
+        "contact_email": ["contact_info.email"],
+        "phone_number": ["contact_info.phone"],
+    },
+    "tos": {
+        "company_name": ["company_name"],
+        "website": ["website_url"],
+        "contact_email": ["contact_email"],
+        "phone_number": ["phone_number"],
+    },
+    "cookie": {
+        "company_name": ["company_name"],
+        "website": ["website"],
+        "contact_email": ["contact_email"],
+        "phone_number": ["contact_phone"],
+    },
+    "aup": {
+        "company_name": ["company_name"],
+        "website_url": ["website_url"],
+        "contact_email": ["contact_email"],
+        "phone_number": ["phone_number"],
+    },
+    "dpa": {
+        "company_name": ["company_name"],
+        "website_url": ["website_url"],
+        "contact_email": ["contact_email"],
+        "phone_number": ["phone_number"],
+    },
+}
+
+# -----------------------------
+# Summary fields
+# Top-level list fields the model writes from one input (e.g. the ToS
+# refund_policy statements). No generator copies them from the input as
+# they are: the ToS and DPA generators only fill them from it when the model
+# left them empty, and the AUP and cookie generators not at all. So a change
+# is not copied in; the update view has the field rewritten with the section
+# chain (regenerate_field()), and the sections the input feeds are
+# regenerated as well.
+# input field -> output field
+# -----------------------------
+SUMMARY_FIELDS = {
+    "privacy": {},
+    "tos": {
+        "service_type": "service_type",
+        "pricing_model": "pricing_model",
+        "payment_terms": "payment_terms",
+        "refund_policy": "refund_policy",
+        "prohibited_activities": "prohibited_activities",
+    },
+    "cookie": {
+        "cookie_duration": "cookie_duration",
+    },
+    "aup": {
+        "permitted_usage_types": "permitted_usage_types",
+        "prohibited_activities": "prohibited_activities",
+        "industry_specific_restrictions": "industry_specific_restrictions",
+        "user_monitoring_practices": "user_monitoring_practices",
+        "reporting_illegal_activities": "reporting_illegal_activities",
+    },
+    "dpa": {
+        "role_controller_or_processor": "role_controller_or_processor",
+        "breach_notification_timeframe": "breach_notification_timeframe",
+        "data_deletion_timelines": "data_deletion_timelines",
+        "audit_rights": "audit_rights",
+        "data_processing_locations": "data_processing_locations",
+    },
+}
+
+# -----------------------------
+# Privacy policy: input field -> APP numbers it feeds
+# Mirrors the conditional query boosts in generate_privacy_policy().
+# -----------------------------
+PRIVACY_FIELD_APPS = {
+    "business_description": [1],
+    "industry": [1],
+    "company_size": [1],
+    "location": [1],
+    "customer_type": [1, 3],
+    "international_operations": [8],
+    "serves_children": [3],
+    "data_types": [3, 5],
+    "payment_data_collected": [3, 11],
+    "cookies_used": [5],
+    "collection_methods": [3, 5],
+    "marketing_purpose": [7],
+    "collection_purposes": [5, 6],
+    "third_parties": [6, 8],
+    "storage_location": [8, 11],
+    "security_measures": [11],
+    "retention_period": [11],
+}
+
+# headings the model uses for each APP when it does not cite the number
+APP_KEYWORDS = {
+    1: ["introduction", "open and transparent", "about this policy", "who we are"],
+    2: ["anonymity", "pseudonymity"],
+    3: ["collection of", "information we collect", "collect"],
+    4: ["unsolicited"],
+    5: ["notification", "notice of collection"],
+    6: ["use and disclosure", "disclosure"],
+    7: ["direct marketing", "marketing"],
+    8: ["cross-border", "overseas"],
+    9: ["government related identifiers", "identifiers"],
+    10: ["quality"],
+    11: ["security", "retention"],
+    12: ["access"],
+    13: ["correction"],
+}
+
+# heading of the section added for an APP the policy did not address yet
+APP_HEADINGS = {
+    1: "Open and Transparent Management of Personal Information (APP 1)",
+    2: "Anonymity and Pseudonymity (APP 2)",
+    3: "Collection of Solicited Personal Information (APP 3)",
+    4: "Dealing with Unsolicited Personal Information (APP 4)",
+    5: "Notification of the Collection of Personal Information (APP 5)",
+    6: "Use or Disclosure of Personal Information (APP 6)",
+    7: "Direct Marketing (APP 7)",
+    8: "Cross-border Disclosure of Personal Information (APP 8)",
+    9: "Adoption, Use or Disclosure of Government Related Identifiers (APP 9)",
+    10: "Quality of Personal Information (APP 10)",
+    11: "Security of Personal Information (APP 11)",
+    12: "Access to Personal Information (APP 12)",
+    13: "Correction of Personal Information (APP 13)",
+}
+
+# extra headings for privacy fields that have their own section
+PRIVACY_FIELD_KEYWORDS = {
+    "cookies_used": ["cookie", "tracking"],
+}
+
+# -----------------------------
+# Other policy types: input field -> heading keywords of affected sections
+# -----------------------------
+SECTION_KEYWORDS = {
+    "tos": {
+        "business_description": ["description of services"],
+        "industry": ["description of services"],
+        "customer_type": ["accounts and eligibility", "eligibility"],
+        "service_type": ["description of services"],
+        "pricing_model": ["subscription", "billing", "pricing"],
+        "free_trial": ["trial"],
+        "refund_policy": ["refund"],
+        "minor_restrictions": ["eligibility"],
+        "user_content_uploads": ["user content"],
+        "prohibited_activities": ["acceptable use", "prohibited"],
+        "international_operations": ["governing law", "international"],
+        "subscription_features": ["subscription"],
+        "payment_terms": ["billing", "payment"],
+    },
+    "cookie": {
+        "business_description": ["what are cookies"],
+        "essential_cookies": ["types of cookies", "why we use"],
+        "analytics_cookies": ["types of cookies", "why we use"],
+        "marketing_cookies": ["types of cookies", "why we use"],
+        "advertising_cookies": ["types of cookies", "why we use"],
+        "functional_cookies": ["types of cookies", "why we use"],
+        "third_party_services": ["third-party", "third party", "manage"],
+        "cookie_duration": ["duration", "expiry"],
+    },
+    "aup": {
+        "business_description": ["purpose"],
+        "industry_type": ["industry"],
+        "customer_type": ["applies to"],
+        "international_customers": ["applies to"],
+        "children_under_18_served": ["applies to"],
+        "permitted_usage_types": ["permitted"],
+        "prohibited_activities": ["prohibited"],
+        "industry_specific_restrictions": ["industry"],
+        "user_monitoring_practices": ["monitoring"],
+        "reporting_illegal_activities": ["reporting"],
+    },
+    "dpa": {
+        "business_description": ["parties and purpose"],
+        "customer_type": ["roles and scope"],
+        "international_customers": ["overseas"],
+        "role_controller_or_processor": ["roles and scope"],
+        "sub_processors_used": ["sub-processor"],
+        "data_processing_locations": ["overseas", "details of processing"],
+        "security_certifications": ["security"],
+        "breach_notification_timeframe": ["breach"],
+        "data_deletion_timelines": ["deletion"],
+        "audit_rights": ["audit"],
+        "processing_summary": ["details of processing"],
+    },
+}
+
+APP_PATTERN = re.compile(r"\bAPP\s*(\d{1,2})\b", re.IGNORECASE)
+
+
+def diff_profiles(old, new):
+    """Return the input fields whose value differs between two profiles."""
+    keys = set(old or {}) | set(new or {})
+    return sorted(k for k in keys if (old or {}).get(k) != (new or {}).get(k))
+
+
+def _heading_matches(heading, keywords):
+    heading = heading.lower()
+    return any(keyword in heading for keyword in keywords)
+
+
+def _privacy_section_apps(section):
+    """
+    APP numbers a privacy section addresses.
+
+    Checked in order of reliability: APP numbers cited in the heading, known
+    APP headings, then APP numbers cited in the section content.
+    """
+    apps = {int(n) for n in APP_PATTERN.findall(section["heading"])}
+    if not apps:
+        apps = {app for app, keywords in APP_KEYWORDS.items() if _heading_matches(section["heading"], keywords)}
+    if not apps:
+        apps = {int(n) for n in APP_PATTERN.findall(" ".join(section.get("content", [])))}
+    return apps
+
+
+def affected_sections(policy_type, changed_fields, sections, apps_addressed=None):
+    """
+    Work out which sections have to be re-run for a set of changed fields.
+
+    For a privacy policy a field triggers APPs (PRIVACY_FIELD_APPS), which
+    are checked against the APPs the policy addresses (its apps_addressed):
+        - an addressed APP is rewritten in the sections that cover it
+        - an APP the policy does not address yet, and no section covers,
+          gets a new section of its own
+        - an addressed APP no section can be found for cannot be updated in
+          place, so the field is unmatched
+
+    Args:
+        policy_type: "privacy", "tos", "cookie", "aup" or "dpa"
+        changed_fields: Input fields that differ (identity fields excluded)
+        sections: Section dicts with at least section_number, heading and content
+        apps_addressed: APP numbers the privacy policy addresses
+
+    Returns:
+        tuple: (sorted section numbers to regenerate, fields that matched no
+        section, sorted APP numbers that need a new section)
+    """
+    numbers = set()
+    unmatched = []
+    new_apps = set()
+    addressed = set(apps_addressed or [])
+    section_apps = {s["section_number"]: _privacy_section_apps(s) for s in sections} if policy_type == "privacy" else {}
+    covered = set().union(*section_apps.values())
+
+    for field in changed_fields:
+        matched = set()
+
+        if policy_type == "privacy":
+            apps = set(PRIVACY_FIELD_APPS.get(field, []))
+            keywords = PRIVACY_FIELD_KEYWORDS.get(field, [])
+            for section in sections:
+                if apps & section_apps[section["section_number"]] or _heading_matches(section["heading"], keywords):
+                    matched.add(section["section_number"])
+            missing = apps - covered
+            if missing & addressed or not (matched or missing):
+                unmatched.append(field)
+                continue
+            new_apps |= missing
+        else:
+            keywords = SECTION_KEYWORDS.get(policy_type, {}).get(field, [])
+            for section in sections:
+                if _heading_matches(section["heading"], keywords):
+                    matched.add(section["section_number"])
+            if not matched:
+                unmatched.append(field)
+                continue
+
+        numbers |= matched
+
+    return sorted(numbers), unmatched, sorted(new_apps)
+
+
+def plan_update(policy_type, old_profile, new_profile, sections, apps_addressed=None):
+    """
+    Build the update plan for a profile edit.
+
+    Returns:
+        dict with
+            changed: every input field that changed
+            identity: changed fields handled by text replacement
+            summary: changed fields whose top-level output field is rewritten
+            sections: section numbers to regenerate
+            new_apps: APPs that get a new section (privacy only)
+            apps_addressed: APPs the updated privacy policy addresses
+            full: True when a change cannot be mapped to sections and the
+                  whole document has to be generated again
+    """
+    changed = diff_profiles(old_profile, new_profile)
+    identity = [f for f in changed if f in IDENTITY_FIELDS[policy_type]]
+    summary = [f for f in changed if f in SUMMARY_FIELDS[policy_type]]
+
+    # identity fields are fully handled locally; summary fields still
+    # change the wording of their sections
+    section_fields = [f for f in changed if f not in identity]
+    numbers, unmatched, new_apps = affected_sections(policy_type, section_fields, sections, apps_addressed)
+
+    # the triggered APPs are addressed once their sections are rewritten or added
+    addressed = set(apps_addressed or []) | set(new_apps)
+    if policy_type == "privacy":
+        rewritten = set().union(*(_privacy_section_apps(s) for s in sections if s["section_number"] in numbers))
+        addressed |= rewritten & {app for f in section_fields for app in PRIVACY_FIELD_APPS.get(f, [])}
+
+    return {
+        "changed": changed,
+        "identity": identity,
+        "summary": summary,
+        "sections": numbers,
+        "new_apps": new_apps,
+        "apps_addressed": sorted(addressed),
+        "full": bool(unmatched),
+    }
+
+
+def _replace_text(value, old, new):
+    """
+    Swap old for new in a string or (nested) list of strings.
+
+    Only whole words are replaced: a company called "Data" must not
+    rewrite "metadata" or "database". Lookarounds instead of \\b, so
+    values that start or end with punctuation (URLs, emails) match too.
+    """
+    pattern = old if isinstance(old, re.Pattern) else re.compile(rf"(?<!\w){re.escape(old)}(?!\w)")
+    if isinstance(value, str):
+        return pattern.sub(lambda match: new, value)
+    if isinstance(value, list):
+        return [_replace_text(item, pattern, new) for item in value]
+    if isinstance(value, dict):
+        return {k: _replace_text(v, pattern, new) for k, v in value.items()}
+    return value
+
+
+def apply_local_changes(policy_type, policy, plan, old_profile, new_profile):
+    """
+    Apply the identity part of a plan to a policy dict in place.
+
+    Identity values are replaced wherever the old value appears in the
+    document text and written to their output fields. A privacy policy's
+    apps_addressed takes in the APPs its rewritten and new sections address
+    (plan["apps_addressed"]). Summary fields
+    and sections are left to the LLM (see the update view).
+    """
+    for field in plan["identity"]:
+        old_value = old_profile.get(field)
+        new_value = new_profile.get(field)
+
+        if old_value and new_value:
+            for key in ("introduction", "sections", "complaints_process"):
+                if key in policy:
+                    policy[key] = _replace_text(policy[key], str(old_value), str(new_value))
+
+        for target in IDENTITY_FIELDS[policy_type][field]:
+            container = policy
+            *parents, leaf = target.split(".")
+            for parent in parents:
+                container = container[parent]
+            container[leaf] = new_value or None
+
+    if policy_type == "privacy":
+        policy["apps_addressed"] = plan["apps_addressed"]
+
+    return policy
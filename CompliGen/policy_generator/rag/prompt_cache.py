@@ -0,0 +1,180 @@
+# prompt_cache.py
+# Provider-side caching of the fixed part of each prompt.
+#
+# Every generator prompt starts with the same instructions (role, rules,
+# required sections, the output schema) and ends with what differs per
+# request (retrieved context, which depends on the inputs, and the company
+# details). The fixed prefix is registered once per model
+# with the provider's cached-content API, and requests then send only the
+# variable suffix with the cache name, which cuts input cost and the time to
+# the first token.
+#
+# Lookups never wait on the provider: the first request for a prefix is sent
+# inline while the prefix is registered in the background, and so is any
+# request while a cache is being renewed or after registration failed.
+#
+# LLM_PROMPT_CACHE selects the backend: "gemini" (default), "local" (an
+# in-process stand-in that only records the hits, for tests and development)
+# or "off".
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from .usage import count_tokens, record_cache_hit
+
+logger = logging.getLogger(__name__)
+
+# Load environment
+load_dotenv()
+
+PROMPT_CACHE_BACKEND = os.getenv("LLM_PROMPT_CACHE", "gemini").lower()
+PROMPT_CACHE_TTL = int(os.getenv("LLM_PROMPT_CACHE_TTL", "3600"))      # seconds
+# the provider rejects shorter cached contents; shorter prefixes are always inline
+MIN_PREFIX_TOKENS = int(os.getenv("LLM_PROMPT_CACHE_MIN_TOKENS", "1024"))
+
+RENEW_BEFORE = 120      # seconds; a cache this close to expiry is replaced, not used
+RETRY_AFTER = 600       # seconds before a failed registration is tried again
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class GeminiContextCache:
+    """Cached contents on the Gemini API."""
+
+    # requests using it are sent with the cache name and without the prefix
+    remote = True
+
+    def __init__(self):
+        self._client = None
+
+    def create(self, model, prefix, ttl):
+        from google import genai
+        from google.genai import types
+
+        if self._client is None:
+            self._client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
+        cache = self._client.caches.create(
+            model=model,
+            config=types.CreateCachedContentConfig(
+                display_name=f"compligen-{_digest(prefix)[:16]}",
+                contents=[types.Content(role="user", parts=[types.Part(text=prefix)])],
+                ttl=f"{ttl}s",
+            ),
+        )
+        return cache.name
+
+
+class LocalContextCache:
+    """In-process stand-in: keeps the prefixes itself and sends them inline."""
+
+    remote = False
+
+    def __init__(self):
+        self.prefixes = {}
+
+    def create(self, model, prefix, ttl):
+        name = f"local/{model}/{_digest(prefix)[:16]}"
+        self.prefixes[name] = prefix
+        return name
+
+
+class PromptCache:
+    """
+    Cache names per (model, prefix).
+
+    Args:
+        backend: GeminiContextCache, LocalContextCache or None (disabled)
+        ttl: Lifetime of a registered cache, seconds
+        min_tokens: Prefixes shorter than this are never registered
+        submit: Runs a registration (a background pool by default; tests
+                pass one that runs it straight away)
+    """
+
+    def __init__(self, backend, ttl=PROMPT_CACHE_TTL, min_tokens=MIN_PREFIX_TOKENS, submit=None):
+        self.backend = backend
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        if submit is None:
+            submit = ThreadPoolExecutor(max_workers=2, thread_name_prefix="prompt-cache").submit
+        self.submit = submit
+        # (model, digest) -> (cache name or None while inline, monotonic time it holds until)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def lookup(self, model, prefix):
+        """The cache name for the prefix, or None to send it inline (registration starts if due)."""
+        if self.backend is None or not prefix:
+            return None
+        key = (model, _digest(prefix))
+        entry = self._entries.get(key)
+        if entry is not None and time.monotonic() < entry[1]:
+            return entry[0]
+        if entry is None and count_tokens(prefix) < self.min_tokens:
+            self._entries[key] = (None, float("inf"))
+            return None
+
+        with self._lock:
+            # another request may have started the registration meanwhile
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() < entry[1]:
+                return entry[0]
+            # unknown or expiring: inline until the registration is done
+            self._entries[key] = (None, time.monotonic() + RETRY_AFTER)
+
+        self.submit(self._register, key, model, prefix)
+        return None
+
+    def _register(self, key, model, prefix):
+        started = time.monotonic()
+        try:
+            name = self.backend.create(model, prefix, self.ttl)
+        except Exception:
+            logger.warning("Could not cache the prompt prefix for %s; sending it inline", model, exc_info=True)
+            return
+        with self._lock:
+            self._entries[key] = (name, started + self.ttl - RENEW_BEFORE)
+
+    def discard(self, model, prefix):
+        """Stop using a cache the provider rejected; the prefix is inline for RETRY_AFTER, then registered again."""
+        with self._lock:
+            self._entries[(model, _digest(prefix))] = (None, time.monotonic() + RETRY_AFTER)
+
+    def split(self, model, prefix):
+        """
+        (cached_content, inline_prefix) for a request: the cache name to send
+        and the part of the prefix that still goes in the prompt.
+        """
+        name = self.lookup(model, prefix)
+        if name is None:
+            return None, prefix or ""
+        if not self.backend.remote:
+            record_cache_hit()
+            return None, self.backend.prefixes[name]
+        return name, ""
+
+
+def static_prefix(instructions, schema):
+    """
+    The fixed prefix of a generator's prompts: its instructions and the
+    output schema, spelled out for the model (field names, types and
+    descriptions).
+    """
+    return instructions + "\n=== OUTPUT SCHEMA ===\n" + json.dumps(schema.model_json_schema(), indent=1) + "\n"
+
+
+def _backend(name):
+    if name == "gemini":
+        return GeminiContextCache()
+    if name == "local":
+        return LocalContextCache()
+    return None
+
+
+prompt_cache = PromptCache(_backend(PROMPT_CACHE_BACKEND))
@@ -0,0 +1,170 @@
+# reindex.py
+# Versioned law collections behind an alias, for reingestion under load.
+#
+# Ingestion used to write straight into the collection every generator
+# queries, so while it ran searches saw a half-built corpus and duplicate
+# chunks. Now QDRANT_COLLECTION is an alias: ingestion builds a new
+# collection `<alias>_v<timestamp>` (payload indexes first, then the bulk
+# upload), validates it (point count, a smoke retrieval per document type
+# the generators filter on), and then points the alias at it in one atomic
+# operation. Searches go to the old version or the new one, never to a
+# partial one. The previous version is kept so `law_collection rollback` can
+# switch back, and older ones are deleted.
+#
+# A deployment that still has a plain collection under the alias name is
+# converted once with `python manage.py law_collection adopt`.
+
+import os
+from datetime import datetime, timezone
+from qdrant_client.models import (
+    CreateAlias,
+    CreateAliasOperation,
+    DeleteAlias,
+    DeleteAliasOperation,
+    FieldCondition,
+    Filter,
+    MatchValue,
+)
+from .collection import copy_collection
+
+# versions kept: the live one and the ones before it, for rollback
+KEEP_VERSIONS = int(os.getenv("QDRANT_KEEP_VERSIONS", "2"))
+# a new version with fewer points than this share of the live one is refused
+MIN_POINTS_RATIO = float(os.getenv("REINDEX_MIN_POINTS_RATIO", "0.9"))
+
+# (query, doc_type): every document type the generators retrieve must answer
+SMOKE_QUERIES = (
+    ("privacy policy Australian Privacy Principles collection use disclosure", "law"),
+    ("privacy policy", "example"),
+)
+
+
+class ReindexError(Exception):
+    """A new version failed validation, or the alias cannot be switched."""
+
+
+def new_version(alias, now=None):
+    """Name of a new version of the collection behind an alias."""
+    now = now or datetime.now(timezone.utc)
+    return f"{alias}_v{now:%Y%m%d%H%M%S}"
+
+
+def versions(client, alias):
+    """Versions of the collection behind an alias, oldest first."""
+    prefix = f"{alias}_v"
+    return sorted(
+        c.name for c in client.get_collections().collections
+        if c.name.startswith(prefix) and c.name[len(prefix):].isdigit()
+    )
+
+
+def live_version(client, alias):
+    """The collection the alias points at, or None if there is no alias yet."""
+    for description in client.get_aliases().aliases:
+        if description.alias_name == alias:
+            return description.collection_name
+    if client.collection_exists(alias):
+        raise ReindexError(
+            f"{alias} is a collection, not an alias; run `python manage.py law_collection adopt` once first"
+        )
+    return None
+
+
+def validate_version(client, name, expected_points, embeddings, live=None):
+    """
+    Check a new version before it goes live.
+
+    Args:
+        client: QdrantClient
+        name: The new version
+        expected_points: Number of chunks uploaded to it
+        embeddings: Embeddings model of the collection, for the smoke queries
+        live: The live version, whose size the new one is compared with
+    """
+    points = client.count(collection_name=name, exact=True).count
+    if points != expected_points:
+        raise ReindexError(f"{name} has {points} points, {expected_points} chunks were uploaded")
+    if live is not None:
+        live_points = client.count(collection_name=live, exact=True).count
+        if points < live_points * MIN_POINTS_RATIO:
+            raise ReindexError(f"{name} has {points} points, the live {live} has {live_points}")
+
+    for query, doc_type in SMOKE_QUERIES:
+        found = client.query_points(
+            collection_name=name,
+            query=embeddings.embed_query(query),
+            query_filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value=doc_type))]),
+            limit=3,
+            with_payload=True,
+        ).points
+        if not found or not all((point.payload or {}).get("page_content") for point in found):
+            raise ReindexError(f"{name} returns no {doc_type} chunks for {query!r}")
+
+
+def swap_alias(client, alias, collection):
+    """
+    Point the alias at a collection, in one atomic operation.
+
+    Returns:
+        str | None: The collection it pointed at before
+    """
+    previous = live_version(client, alias)
+    operations = [DeleteAliasOperation(delete_alias=DeleteAlias(alias_name=alias))] if previous else []
+    operations.append(CreateAliasOperation(create_alias=CreateAlias(collection_name=collection, alias_name=alias)))
+    client.update_collection_aliases(change_aliases_operations=operations)
+    return previous
+
+
+def prune_versions(client, alias, keep=KEEP_VERSIONS):
+    """
+    Delete the versions older than the last `keep` up to the live one.
+    Newer versions are left alone (another ingestion may be building one).
+
+    Returns:
+        list[str]: The deleted versions
+    """
+    live = live_version(client, alias)
+    existing = versions(client, alias)
+    if live not in existing:
+        return []
+    older = existing[:existing.index(live) + 1][:-max(keep, 1)]
+    for name in older:
+        client.delete_collection(name)
+    return older
+
+
+def rollback(client, alias):
+    """
+    Point the alias back at the version before the live one.
+
+    Returns:
+        str: The version now live
+    """
+    live = live_version(client, alias)
+    existing = versions(client, alias)
+    if live not in existing or existing.index(live) == 0:
+        raise ReindexError(f"No version of {alias} older than {live} to roll back to")
+    previous = existing[existing.index(live) - 1]
+    swap_alias(client, alias, previous)
+    return previous
+
+
+def adopt(client, alias):
+    """
+    Turn a plain collection named like the alias into the first version
+    behind the alias. Searches fail for the moment between deleting the
+    collection and creating the alias, so run this once, off-peak.
+
+    Returns:
+        str: The first version
+    """
+    if any(description.alias_name == alias for description in client.get_aliases().aliases):
+        raise ReindexError(f"{alias} is already an alias")
+    version = new_version(alias)
+    copy_collection(client, alias, version)
+    if client.count(collection_name=version, exact=True).count != client.count(collection_name=alias, exact=True).count:
+        client.delete_collection(version)
+        raise ReindexError(f"Copying {alias} to {version} lost points")
+    client.delete_collection(alias)
+    swap_alias(client, alias, version)
+    return version
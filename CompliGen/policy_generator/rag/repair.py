@@ -0,0 +1,362 @@
+# repair.py
+# Repairs structured output that failed validation instead of throwing the
+# whole generation away.
+#
+# 1. coerce(): fixes the defects the model commonly makes, locally
+#    (a string where a list of paragraphs is expected, a missing or "3."
+#    section_number, "Last Updated: 5 March 2025" instead of 2025-03-05, ...)
+# 2. repair_output(): if fields are still invalid, asks the model again for
+#    just those fields (or just the broken list items, e.g. one section) and
+#    merges the answer into the output it already produced.
+
+import json
+import re
+import types
+from datetime import datetime
+from typing import Any, List, Union, get_args, get_origin
+from pydantic import BaseModel, ValidationError, create_model
+
+# fields holding a YYYY-MM-DD date
+DATE_FIELDS = {"last_updated", "effective_date"}
+DATE_PREFIX = re.compile(r"^\s*(last\s+updated|effective\s+date|updated|date)\s*[:\-]?\s*", re.IGNORECASE)
+ISO_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+DATE_FORMATS = ("%d %B %Y", "%d %b %Y", "%B %d, %Y", "%B %d %Y", "%d/%m/%Y")
+
+# longest current value quoted back to the model in a repair prompt
+MAX_QUOTED_CHARS = 1500
+
+REPAIR_PROMPT = """
+You are fixing part of a generated {document} for {company_name}. The rest of the document is correct and is kept exactly as it is.
+
+=== DOCUMENT OUTLINE ===
+{outline}
+
+=== PARTS TO FIX ===
+{problems}
+
+=== RULES ===
+- Return only the fields in the output schema, each complete and valid.
+- Keep section numbers and headings unless they are the problem.
+- Australian English spelling, clear and professional language.
+- NO placeholders (e.g., "[insert…]", "TBD").
+- Content arrays are lists of plain-text paragraphs (no markdown).
+"""
+
+
+class StructuredOutputError(Exception):
+    """The model returned nothing that can be parsed as JSON."""
+
+
+# -----------------------------
+# Raw output
+# -----------------------------
+def raw_output_data(raw):
+    """
+    The JSON the model produced, from a with_structured_output(include_raw=True)
+    result's raw message: native JSON output is in the content, function
+    calling output is in the tool call args.
+    """
+    tool_calls = getattr(raw, "tool_calls", None) or []
+    if tool_calls:
+        return dict(tool_calls[0].get("args") or {})
+
+    content = getattr(raw, "content", raw)
+    if isinstance(content, list):
+        content = "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
+
+    text = str(content or "").strip()
+    # strip a ```json fence if the model added one
+    text = re.sub(r"^```(?:json)?\s*|\s*```$", "", text)
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise StructuredOutputError("Model output is not valid JSON") from e
+    if not isinstance(data, dict):
+        raise StructuredOutputError("Model output is not a JSON object")
+    return data
+
+
+# -----------------------------
+# Local coercion
+# -----------------------------
+def _is_model(annotation):
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
+
+
+def _split_paragraphs(text):
+    parts = re.split(r"\n\s*\n|\n", text)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def normalise_date(value):
+    """'Last Updated: 5 March 2025' -> '2025-03-05'; unknown formats are returned stripped."""
+    value = DATE_PREFIX.sub("", str(value)).strip()
+    match = ISO_DATE.search(value)
+    if match:
+        return match.group()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+
+def _coerce_value(annotation, value, name=""):
+    origin = get_origin(annotation)
+
+    # Optional[X]
+    if origin in (Union, types.UnionType):
+        if value is None:
+            return None
+        args = [a for a in get_args(annotation) if a is not type(None)]
+        annotation = args[0] if args else Any
+        origin = get_origin(annotation)
+
+    if origin in (list, List):
+        item_type = (get_args(annotation) or (Any,))[0]
+        if value is None:
+            return []
+        if isinstance(value, str):
+            value = _split_paragraphs(value) if item_type is str else [value]
+        elif isinstance(value, dict):
+            value = [value]
+        elif not isinstance(value, list):
+            value = [value]
+
+        items = [_coerce_value(item_type, item) for item in value]
+        if item_type is str:
+            items = [item for item in items if item]
+        if _is_model(item_type) and "section_number" in item_type.model_fields:
+            # sections are numbered in order; fill numbers the model left out
+            for index, item in enumerate(items, start=1):
+                if isinstance(item, dict) and not isinstance(item.get("section_number"), int):
+                    item["section_number"] = index
+        return items
+
+    if _is_model(annotation):
+        return coerce(annotation, value) if isinstance(value, dict) else value
+
+    if annotation is str:
+        if value is None:
+            return None
+        if isinstance(value, list):
+            value = " ".join(str(v) for v in value if v)
+        value = str(value)
+        return normalise_date(value) if name in DATE_FIELDS else value
+
+    if annotation is int:
+        if isinstance(value, str):
+            match = re.search(r"\d+", value)
+            return int(match.group()) if match else value
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+
+    return value
+
+
+def coerce(schema, data):
+    """Apply the local fixes to a raw output dict for a schema (returns a new dict)."""
+    if not isinstance(data, dict):
+        return data
+
+    forbid_extra = schema.model_config.get("extra") == "forbid"
+    result = {}
+    for key, value in data.items():
+        field = schema.model_fields.get(key)
+        if field is None:
+            if not forbid_extra:
+                result[key] = value
+            continue
+        result[key] = _coerce_value(field.annotation, value, key)
+    return result
+
+
+# -----------------------------
+# Locating the problems
+# -----------------------------
+def _list_item_type(schema, field):
+    """Model type of a list-of-models field, else None."""
+    info = schema.model_fields.get(field)
+    if info is None or get_origin(info.annotation) not in (list, List):
+        return None
+    item_type = (get_args(info.annotation) or (None,))[0]
+    return item_type if _is_model(item_type) else None
+
+
+def problems_from_validation_error(schema, error, data):
+    """
+    {location: message} for a pydantic ValidationError, where a location is
+    (field,) or (field, index) when only one item of a list of models is broken
+    or missing.
+    """
+    problems = {}
+    for err in error.errors():
+        loc = err["loc"]
+        if err["type"] == "too_short" and len(loc) == 1 and _list_item_type(schema, loc[0]):
+            # ask for the missing items only, not the whole list again
+            have = len(data.get(loc[0]) or [])
+            for index in range(have, err["ctx"]["min_length"]):
+                problems[(loc[0], index)] = f"missing, write item {index + 1} (it must not repeat the other items)"
+            continue
+        if len(loc) > 1 and isinstance(loc[1], int) and _list_item_type(schema, loc[0]):
+            location = (loc[0], loc[1])
+        else:
+            location = (loc[0],)
+        problems.setdefault(location, err["msg"])
+    return problems
+
+
+def problems_from_serializer_errors(schema, errors):
+    """{location: message} for DRF serializer.errors, limited to schema fields."""
+    problems = {}
+    for field, detail in errors.items():
+        if field not in schema.model_fields:
+            continue
+        if isinstance(detail, list) and detail and all(isinstance(d, dict) for d in detail) and _list_item_type(schema, field):
+            for index, item_errors in enumerate(detail):
+                if item_errors:
+                    problems[(field, index)] = json.dumps(item_errors, default=str)
+        else:
+            problems[(field,)] = json.dumps(detail, default=str)
+    return problems
+
+
+# -----------------------------
+# Re-asking the model
+# -----------------------------
+def document_name(schema):
+    """StructuredTermsOfService -> 'Terms Of Service', for repair prompts."""
+    name = schema.__name__.removeprefix("Structured")
+    return " ".join(re.findall(r"[A-Z]+(?![a-z])|[A-Z][a-z]*", name)) or name
+
+
+def _repair_schema(schema, problems):
+    """A model holding only the broken fields / items."""
+    fields = {}
+    for location in problems:
+        if len(location) == 2:
+            field, index = location
+            fields[f"{field}_{index}"] = (_list_item_type(schema, field), ...)
+        else:
+            info = schema.model_fields[location[0]]
+            fields[location[0]] = (info.annotation, info)
+    return create_model(f"{schema.__name__}Repair", **fields)
+
+
+def _quote(value):
+    text = json.dumps(value, default=str, ensure_ascii=False)
+    return text if len(text) <= MAX_QUOTED_CHARS else text[:MAX_QUOTED_CHARS] + "…"
+
+
+def _outline(data):
+    sections = data.get("sections") if isinstance(data.get("sections"), list) else []
+    lines = [
+        f"{s.get('section_number', i)}. {s.get('heading', '')}"
+        for i, s in enumerate(sections, start=1) if isinstance(s, dict)
+    ]
+    return "\n".join(lines) or "Not available"
+
+
+def _build_prompt(schema, data, problems, document):
+    lines = []
+    for location, message in problems.items():
+        if len(location) == 2:
+            field, index = location
+            items = data.get(field) or []
+            current = items[index] if index < len(items) else None
+            lines.append(f"- {field}_{index} (item {index + 1} of {field}): {message}. Current value: {_quote(current)}")
+        else:
+            lines.append(f"- {location[0]}: {message}. Current value: {_quote(data.get(location[0]))}")
+
+    return REPAIR_PROMPT.format(
+        document=document,
+        company_name=data.get("company_name") or "the company",
+        outline=_outline(data),
+        problems="\n".join(lines),
+    )
+
+
+def _merge(data, problems, fixed):
+    data = dict(data)
+    # in order, so missing items are appended in their place
+    for location in sorted(problems):
+        if len(location) == 2:
+            field, index = location
+            item = fixed[f"{field}_{index}"]
+            items = list(data.get(field) or [])
+            original = items[index] if index < len(items) else {"section_number": index + 1}
+            # the item keeps its place in the document
+            if isinstance(original, dict) and "section_number" in original and "section_number" in item:
+                item["section_number"] = original["section_number"]
+            if index < len(items):
+                items[index] = item
+            else:
+                items.append(item)
+            data[field] = items
+        else:
+            data[location[0]] = fixed[location[0]]
+    return data
+
+
+def repair_fields(schema, data, problems, ask, document=None):
+    """
+    Ask the model for only the broken parts and merge them into data.
+
+    Args:
+        schema: Pydantic schema of the full output
+        data: Output dict (already coerced)
+        problems: {location: message}, see problems_from_*()
+        ask: Callable(repair_schema, prompt) -> repair_schema instance
+        document: Human name of the document for the prompt (from the schema by default)
+
+    Returns:
+        dict: data with the repaired parts merged in and coerced again
+    """
+    repair_schema = _repair_schema(schema, problems)
+    fixed = ask(repair_schema, _build_prompt(schema, data, problems, document or document_name(schema)))
+    return _merge_fixed(schema, data, problems, fixed)
+
+
+async def arepair_fields(schema, data, problems, aask, document=None):
+    """repair_fields() with an async ask."""
+    repair_schema = _repair_schema(schema, problems)
+    fixed = await aask(repair_schema, _build_prompt(schema, data, problems, document or document_name(schema)))
+    return _merge_fixed(schema, data, problems, fixed)
+
+
+def _merge_fixed(schema, data, problems, fixed):
+    if isinstance(fixed, BaseModel):
+        fixed = fixed.model_dump()
+    return coerce(schema, _merge(data, problems, fixed))
+
+
+def _validate_locally(schema, data):
+    """(instance, data, problems): the instance if coercion was enough, else the problems left."""
+    data = coerce(schema, data)
+    try:
+        return schema.model_validate(data), data, None
+    except ValidationError as e:
+        return None, data, problems_from_validation_error(schema, e, data)
+
+
+def repair_output(schema, data, ask, document=None):
+    """
+    Turn raw output that failed validation into a valid schema instance.
+
+    Local coercion first; the model is asked again (once) only for the
+    fields that are still invalid. Raises the ValidationError if the output
+    is still invalid after that.
+    """
+    instance, data, problems = _validate_locally(schema, data)
+    if instance is not None:
+        return instance
+    return schema.model_validate(repair_fields(schema, data, problems, ask, document))
+
+
+async def arepair_output(schema, data, aask, document=None):
+    """repair_output() with an async ask."""
+    instance, data, problems = _validate_locally(schema, data)
+    if instance is not None:
+        return instance
+    return schema.model_validate(await arepair_fields(schema, data, problems, aask, document))
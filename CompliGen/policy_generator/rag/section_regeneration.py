@@ -0,0 +1,226 @@
+import os
+from dotenv import load_dotenv
+from .privacy_output import PolicySection
+from .cookie_output import CookieSection
+from .policy_outputs import ToSSection, DPASection, AUPSection
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+
+# Load environment
+load_dotenv()
+
+# -----------------------------
+# Per policy type settings
+# - schema: the section schema the full generator already uses
+# - example_types: metadata.policy_type values of the ingested examples
+# - legal_focus: keywords appended to the heading for the law search
+# -----------------------------
+SECTION_TYPES = {
+    "privacy": {
+        "label": "Privacy Policy",
+        "schema": PolicySection,
+        "example_types": ["Privacy Policy"],
+        "legal_focus": "Privacy Act 1988 Australian Privacy Principles",
+    },
+    "tos": {
+        "label": "Terms of Service",
+        "schema": ToSSection,
+        "example_types": ["Terms of use", "Terms of Service"],
+        "legal_focus": "Australian Consumer Law consumer guarantees unfair contract terms",
+    },
+    "dpa": {
+        "label": "Data Processing Agreement",
+        "schema": DPASection,
+        "example_types": ["Data Processing Addendum", "Data Processing Agreement"],
+        "legal_focus": "Privacy Act 1988 APP 8 Notifiable Data Breaches processor obligations",
+    },
+    "aup": {
+        "label": "Acceptable Use Policy",
+        "schema": AUPSection,
+        "example_types": ["Acceptable Use Policy"],
+        "legal_focus": "platform misuse monitoring enforcement illegal activity reporting",
+    },
+    "cookie": {
+        "label": "Cookie Policy",
+        "schema": CookieSection,
+        "example_types": ["Cookies Policy"],
+        "legal_focus": "Privacy Act 1988 cookies tracking technologies consent opt out",
+    },
+}
+
+# one chain per section schema, built once at import like the full generators;
+# all of them use the (shorter) "section" deadline
+chains = {
+    policy_type: build_chain(settings["schema"], "section")
+    for policy_type, settings in SECTION_TYPES.items()
+}
+
+SECTION_PROMPT = """
+You are an expert Australian compliance consultant. You are revising ONE section of an existing {label} for the company described below.
+Rewrite only this section. The rest of the document stays exactly as it is, so do not repeat content that belongs to other sections.
+
+=== LEGAL CONTEXT (GUIDANCE ONLY) ===
+{legal_context}
+
+=== INDUSTRY EXAMPLES (GUIDANCE ONLY) ===
+{example_context}
+
+=== COMPANY INFORMATION ===
+{company_details}
+
+=== DOCUMENT OUTLINE ===
+{outline}
+
+=== SECTION TO REWRITE ===
+Section number: {section_number}
+Heading: {heading}
+Current content:
+{current_content}
+
+=== CUSTOMER INSTRUCTIONS ===
+{instructions}
+
+=== RULES ===
+- Keep the section number ({section_number}) and the heading ("{heading}").
+- Australian English spelling, clear and professional language.
+- Use only the company information provided. Do NOT invent facts.
+- NO placeholders (e.g., "[insert…]", "TBD").
+- Do NOT include "Creative Commons", "Commonwealth of Australia", or "Source: Licensed from the Commonwealth".
+- Content is an array of plain-text paragraphs (no markdown).
+
+=== OUTPUT ===
+Generate the revised section now.
+"""
+
+
+def _format_details(details):
+    """Render a dict of company/profile values as a bullet list for the prompt."""
+    lines = []
+    for key, value in (details or {}).items():
+        if value in (None, "", [], {}):
+            continue
+        if isinstance(value, (list, tuple)):
+            value = ", ".join(str(v) for v in value)
+        lines.append(f"- {key.replace('_', ' ').capitalize()}: {value}")
+    return "\n".join(lines) or "Not specified"
+
+
+def _regenerate_section_steps(
+    policy_type,
+    section_number,
+    heading,
+    current_content,
+    outline,
+    company_details,
+    instructions="",
+):
+    """
+    Regenerate a single section of an existing policy.
+
+    Only the context relevant to the section heading is retrieved (a handful
+    of chunks instead of the full document query) and the LLM is asked for the
+    section schema alone, so the call is a fraction of a full generation.
+
+    Args:
+        policy_type: One of SECTION_TYPES ("privacy", "tos", "dpa", "aup", "cookie")
+        section_number: Number of the section being replaced
+        heading: Current heading of the section
+        current_content: Current paragraphs of the section
+        outline: List of (section_number, heading) for the whole document
+        company_details: Dict of company/profile values to ground the section
+        instructions: Optional free-text instructions from the customer
+
+    Returns:
+        dict: The regenerated section matching the policy's section schema
+    """
+    settings = SECTION_TYPES[policy_type]
+
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
+    # RETRIEVAL STEP (scoped to this section only)
+    legal_docs, example_docs = yield [
+        Search(
+            f"{heading} {settings['legal_focus']}",
+            k=4,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))]),
+        ),
+        Search(
+            f"{settings['label']} {heading}",
+            k=3,
+            filter=Filter(
+                must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="example"))],
+                should=[
+                    FieldCondition(key="metadata.policy_type", match=MatchValue(value=example_type))
+                    for example_type in settings["example_types"]
+                ],
+            ),
+        ),
+    ]
+
+    legal_context = "\n\n---\n\n".join(d.page_content for d in legal_docs) or "Not specified"
+    example_context = "\n\n---\n\n".join(d.page_content for d in example_docs) or "Not specified"
+
+    # AUGMENTATION STEP
+    prompt = SECTION_PROMPT.format(
+        label=settings["label"],
+        legal_context=legal_context,
+        example_context=example_context,
+        company_details=_format_details(company_details),
+        outline="\n".join(f"{number}. {title}" for number, title in outline),
+        section_number=section_number,
+        heading=heading,
+        current_content="\n".join(current_content) or "Empty",
+        instructions=instructions or "None. Improve clarity and compliance.",
+    )
+
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
+        legal_context=legal_context,
+        example_context=example_context,
+        current_content="\n".join(current_content),
+        instructions=SECTION_PROMPT,
+    )
+
+    # GENERATION STEP
+    result = yield Invoke(chains[policy_type], {"input": prompt})
+    section = result.model_dump()
+
+    # the section replaces an existing row, so its position never moves
+    section["section_number"] = section_number
+    section["heading"] = heading
+    return section
+
+
+def regenerate_section(**inputs):
+    """_regenerate_section_steps() with blocking I/O, for sync callers."""
+    return run(_regenerate_section_steps(**inputs))
+
+
+async def aregenerate_section(**inputs):
+    """_regenerate_section_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_regenerate_section_steps(**inputs))
+
+
+def regenerate_field(policy_type, field, current_values, outline, company_details, instructions=""):
+    """
+    Rewrite a top-level list field of a policy (e.g. the ToS refund_policy
+    statements) with the section chain: the statements are the content of a
+    section headed by the field name, so the field keeps its shape.
+
+    Returns:
+        list[str]: The new statements
+    """
+    if not isinstance(current_values, list):
+        current_values = [current_values] if current_values else []
+    section = regenerate_section(
+        policy_type=policy_type,
+        section_number=0,
+        heading=field.replace("_", " ").capitalize(),
+        current_content=[str(value) for value in current_values],
+        outline=outline,
+        company_details=company_details,
+        instructions=instructions,
+    )
+    return section["content"]
@@ -0,0 +1,181 @@
+# sectioned.py
+# Section-parallel generation: outline first, then the sections concurrently.
+#
+# A long policy produced by one structured-output call is one long
+# sequential decode, so its latency grows with the length of the document.
+# In this mode the model first returns a short outline (the section headings
+# and what each one must cover). The sections and the rest of the document
+# (the "frame": introduction, contact details, summary fields, ...) are then
+# written by separate calls that run concurrently, each section with the
+# slice of the retrieved context that matches it. The parts are assembled
+# and validated against the document schema, so callers get the same output
+# as from a single call, in roughly the time of the longest section.
+#
+# A section call is asked for one section only: it gets its own cached
+# prefix (the generator's section instructions and the section schema), not
+# the document's, which asks for the whole document at its full length. All
+# of them go out at once, so the document takes the outline plus its slowest
+# call. The fan-out is bounded elsewhere: a document makes one call per
+# section plus the frame, generations are admitted per customer and in total
+# (admission.py), and run() executes steps on a fixed pool (pipeline.py), where
+# a queued call's deadline only starts when a worker picks it up.
+#
+# Used for the long documents (privacy policy, terms of service), per call
+# with sectioned=True or for every generation with LLM_SECTIONED=true.
+
+import os
+import re
+from functools import lru_cache
+from typing import List, get_args
+from pydantic import BaseModel, Field, create_model
+from .llm import build_chain
+from .pipeline import Invoke
+from .prompt_cache import static_prefix
+from .repair import coerce
+
+SECTIONED_BY_DEFAULT = os.getenv("LLM_SECTIONED", "false").lower() in ("1", "true", "yes")
+
+# retrieved chunks each section call gets, picked from what the document retrieved
+LEGAL_CHUNKS_PER_SECTION = 3
+EXAMPLE_CHUNKS_PER_SECTION = 2
+
+OUTLINE_INSTRUCTIONS = """
+=== OUTLINE ONLY ===
+Do not write the document yet. Return only its outline: at least {min_sections} numbered sections in the order they will appear, each with its heading and one sentence on what it must cover (name the legal requirements it addresses).
+"""
+
+SECTION_INSTRUCTIONS = """
+=== WRITE ONE SECTION ===
+The document is written one section at a time. Its outline is:
+{outline}
+
+Write only section {section_number}, "{heading}". It must cover: {covers}
+Do not repeat what belongs to the other sections. Write it at the length this one section needs (usually 150–300 words), not the length of the whole document.
+"""
+
+FRAME_INSTRUCTIONS = """
+=== WRITE EVERYTHING EXCEPT THE SECTIONS ===
+The numbered sections are written separately. Their outline is:
+{outline}
+
+Return every other field of the document, consistent with that outline.
+"""
+
+
+class OutlineSection(BaseModel):
+    section_number: int = Field(..., description="Section number (1, 2, 3...)")
+    heading: str = Field(..., description="Section heading")
+    covers: str = Field(..., description="One sentence on what the section must cover")
+
+
+def use_sectioned(sectioned=None):
+    """Whether to generate section by section; None follows LLM_SECTIONED."""
+    return SECTIONED_BY_DEFAULT if sectioned is None else bool(sectioned)
+
+
+@lru_cache(maxsize=None)
+def _chains(schema, min_sections):
+    """(outline, frame, section) chains for a document schema with a `sections` list."""
+    section_schema = get_args(schema.model_fields["sections"].annotation)[0]
+    outline_schema = create_model(
+        f"{schema.__name__}Outline",
+        sections=(List[OutlineSection], Field(..., min_length=min_sections)),
+    )
+    frame_schema = create_model(
+        f"{schema.__name__}Frame",
+        **{name: (info.annotation, info) for name, info in schema.model_fields.items() if name != "sections"},
+    )
+    return (
+        build_chain(outline_schema, "outline"),
+        build_chain(frame_schema, "section"),
+        build_chain(section_schema, "section"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _section_prefix(schema, section_instructions):
+    """Cached prefix of the section calls: the section instructions and the section schema."""
+    section_schema = get_args(schema.model_fields["sections"].annotation)[0]
+    return static_prefix(section_instructions, section_schema)
+
+
+def _without_output(prompt):
+    """
+    A build_prompt() prompt without its closing === OUTPUT === block, which
+    asks for the whole document; each call adds its own request instead.
+    """
+    head, marker, _ = prompt.rpartition("=== OUTPUT ===")
+    return head if marker else prompt
+
+
+def _words(text):
+    return set(re.findall(r"[a-z]{3,}|\d+", text.lower()))
+
+
+def slice_context(docs, query, k):
+    """The k retrieved chunks sharing the most words with the query, in retrieval order."""
+    words = _words(query)
+    ranked = sorted(range(len(docs)), key=lambda i: (-len(words & _words(docs[i].page_content)), i))
+    return "\n\n---\n\n".join(docs[i].page_content for i in sorted(ranked[:k])) or "Not specified"
+
+
+def sectioned_steps(schema, build_prompt, legal_docs, example_docs, min_sections, prefix=None, section_instructions=""):
+    """
+    Step generator (see pipeline.py) writing a document section by section.
+
+    Args:
+        schema: Document schema; must have a `sections` list
+        build_prompt: Callable(legal_context, example_context) -> the
+                      single-call prompt of the document
+        legal_docs / example_docs: Documents retrieved for the whole document
+        min_sections: Fewest sections the outline may have
+        prefix: Fixed instructions sent before the outline and frame prompts,
+                cached by the provider (see prompt_cache.py)
+        section_instructions: Fixed instructions of the section calls: the
+                document's rules without its whole-document requirements
+                (length, required sections), sent with the section schema
+
+    Returns:
+        dict: The document, validated against the schema
+    """
+    outline_chain, frame_chain, section_chain = _chains(schema, min_sections)
+    legal_context = "\n\n---\n\n".join(d.page_content for d in legal_docs)
+    example_context = "\n\n---\n\n".join(d.page_content for d in example_docs)
+
+    # OUTLINE STEP (short output: headings and one line each)
+    outline = yield Invoke(outline_chain, {
+        "prefix": prefix,
+        "input": _without_output(build_prompt(legal_context, example_context))
+        + OUTLINE_INSTRUCTIONS.format(min_sections=min_sections),
+    })
+    items = sorted(outline.sections, key=lambda s: s.section_number)
+    outline_text = "\n".join(f"{number}. {item.heading}" for number, item in enumerate(items, start=1))
+
+    # SECTION STEP (frame and sections, all at once)
+    calls = [Invoke(frame_chain, {
+        "prefix": prefix,
+        "input": _without_output(build_prompt(legal_context, example_context))
+        + FRAME_INSTRUCTIONS.format(outline=outline_text),
+    })]
+    section_prefix = _section_prefix(schema, section_instructions)
+    for number, item in enumerate(items, start=1):
+        query = f"{item.heading} {item.covers}"
+        prompt = _without_output(build_prompt(
+            slice_context(legal_docs, query, LEGAL_CHUNKS_PER_SECTION),
+            slice_context(example_docs, query, EXAMPLE_CHUNKS_PER_SECTION),
+        )) + SECTION_INSTRUCTIONS.format(outline=outline_text, section_number=number, heading=item.heading, covers=item.covers)
+        calls.append(Invoke(section_chain, {"prefix": section_prefix, "input": prompt}))
+
+    frame, *sections = yield calls
+
+    # ASSEMBLY STEP
+    data = frame.model_dump()
+    data["sections"] = []
+    for number, (item, section) in enumerate(zip(items, sections), start=1):
+        section = section.model_dump()
+        # the outline decides numbering and headings, so the parts agree
+        section["section_number"] = number
+        section["heading"] = item.heading
+        data["sections"].append(section)
+
+    return schema.model_validate(coerce(schema, data)).model_dump()
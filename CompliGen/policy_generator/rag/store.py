@@ -0,0 +1,137 @@
+# store.py
+# The vector store every generator retrieves from: one embeddings model and
+# one Qdrant collection, searchable with blocking or async clients.
+#
+# QdrantVectorStore only wraps the blocking client (its async methods run the
+# blocking ones in a thread), so async search embeds the query with the async
+# OpenAI client and queries Qdrant with AsyncQdrantClient directly.
+#
+# The embedding size and quantized search follow the collection's storage
+# settings (see collection.py). With VECTOR_INDEX_PATH set, searches run in
+# process on an exported snapshot of the collection instead (see
+# local_index.py); only the query embedding leaves the process. With
+# VECTOR_BACKEND=pgvector they run in the app's Postgres database (see
+# pg_store.py).
+#
+# Importing this module is free: the SDKs are imported and the clients
+# created on the first search (or by warm_up(), which the WSGI/ASGI entry
+# points run in the background), so management commands and worker boots do
+# not pay for them.
+
+import os
+import threading
+from asgiref.sync import sync_to_async
+from dotenv import load_dotenv
+
+# Load environment
+load_dotenv()
+
+# payload keys QdrantVectorStore writes at ingestion
+CONTENT_KEY = "page_content"
+METADATA_KEY = "metadata"
+
+# in-process snapshot of the collection, unset to search the backend
+LOCAL_INDEX_PATH = os.environ.get("VECTOR_INDEX_PATH")
+
+
+class _Retriever:
+    """The embeddings model, clients and backend settings, created together on first use."""
+
+    def __init__(self):
+        from langchain_qdrant import QdrantVectorStore
+        from qdrant_client import AsyncQdrantClient, QdrantClient
+        from . import pg_store
+        from .collection import COLLECTION_NAME, EMBEDDING_DIMENSIONS, VECTOR_BACKEND, search_params
+        from .embeddings import LocalEmbeddings, make_embeddings
+        from .local_index import LocalIndex
+
+        self.collection_name = COLLECTION_NAME
+        self.backend = VECTOR_BACKEND
+        self.pg_store = pg_store
+
+        # Initialize embeddings model (OpenAI, or a local CPU model: see embeddings.py)
+        self.embeddings = make_embeddings()
+        self.local_model = isinstance(self.embeddings, LocalEmbeddings)
+
+        # Initialize Qdrant clients and vector store
+        self.client = QdrantClient(
+            url=os.environ.get("QDRANT_URL"),
+            api_key=os.environ.get("QDRANT_API_KEY"),
+        )
+        self.async_client = AsyncQdrantClient(
+            url=os.environ.get("QDRANT_URL"),
+            api_key=os.environ.get("QDRANT_API_KEY"),
+        )
+        self.vector_store = QdrantVectorStore(
+            client=self.client,
+            collection_name=COLLECTION_NAME,
+            embedding=self.embeddings,
+        )
+
+        # rescoring of quantized search, None for a full-precision collection
+        self.search_params = search_params()
+
+        self.local_index = LocalIndex(LOCAL_INDEX_PATH) if LOCAL_INDEX_PATH else None
+        if self.local_index is not None and self.local_index.dimensions != EMBEDDING_DIMENSIONS:
+            raise ValueError(
+                f"The local index at {LOCAL_INDEX_PATH} has {self.local_index.dimensions} dimensions, "
+                f"EMBEDDING_DIMENSIONS is {EMBEDDING_DIMENSIONS}"
+            )
+
+
+_retriever = None
+_lock = threading.Lock()
+
+
+def retriever():
+    """The shared _Retriever, created by the first caller."""
+    global _retriever
+    if _retriever is None:
+        with _lock:
+            if _retriever is None:
+                _retriever = _Retriever()
+    return _retriever
+
+
+def warm_up():
+    """Create the retriever and load a local embeddings model, so the first generation does not wait for them."""
+    r = retriever()
+    if r.local_model:
+        r.embeddings.warmup()
+
+
+def similarity_search(query, k, filter=None):
+    """Top k chunks for a query (blocking)."""
+    r = retriever()
+    if r.local_index is not None:
+        return r.local_index.search(r.embeddings.embed_query(query), k, filter)
+    if r.backend == "pgvector":
+        return r.pg_store.search(r.embeddings.embed_query(query), k, filter)
+    return r.vector_store.similarity_search(query, k=k, filter=filter, search_params=r.search_params)
+
+
+async def asimilarity_search(query, k, filter=None):
+    """Top k chunks for a query, same results as similarity_search()."""
+    from langchain_core.documents import Document
+
+    r = retriever()
+    vector = await r.embeddings.aembed_query(query)
+    if r.local_index is not None:
+        return r.local_index.search(vector, k, filter)
+    if r.backend == "pgvector":
+        return await sync_to_async(r.pg_store.search)(vector, k, filter)
+    response = await r.async_client.query_points(
+        collection_name=r.collection_name,
+        query=vector,
+        query_filter=filter,
+        search_params=r.search_params,
+        limit=k,
+        with_payload=True,
+    )
+    return [
+        Document(
+            page_content=(point.payload or {}).get(CONTENT_KEY, ""),
+            metadata=(point.payload or {}).get(METADATA_KEY) or {},
+        )
+        for point in response.points
+    ]
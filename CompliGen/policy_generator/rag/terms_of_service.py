@@ -1,53 +1,98 @@
 import os
 from dotenv import load_dotenv
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_core.prompts import ChatPromptTemplate
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from .policy_outputs import StructuredTermsOfService
-from langchain_openai import OpenAIEmbeddings
-from langchain_qdrant import QdrantVectorStore
-from qdrant_client import QdrantClient
-from qdrant_client.models import Filter, FieldCondition, MatchValue
+from .usage import note_prompt_parts
+from .llm import build_chain
+from .pipeline import Invoke, Search, arun, run
+from .sectioned import sectioned_steps, use_sectioned
+from .fragments import CONTACT_FIELDS, contact_fragments, fill, without_fields
+from .prompt_cache import static_prefix
 
 # Load environment
 load_dotenv()
 
-# Initialize LLM
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0.3,
-    api_key=os.getenv("GOOGLE_API_KEY"),
-    streaming=False,
-)
-
-embeddings = OpenAIEmbeddings(
-    model="text-embedding-3-small",
-    openai_api_key=os.environ.get("OPENAI_API_KEY")
-)
-
-# Initialize Qdrant client and vector store
-client = QdrantClient(
-    url=os.environ.get("QDRANT_URL"),
-    api_key=os.environ.get("QDRANT_API_KEY"),
-)
-
-vector_store = QdrantVectorStore(
-    client=client,
-    collection_name="ingested_law_docs",
-    embedding=embeddings,
-)
-
-# Simple prompt template
-prompt_template = ChatPromptTemplate.from_messages([("human", "{input}")])
-
-# structured llm with output
-llm_with_output = llm.with_structured_output(StructuredTermsOfService)
-chain = prompt_template | llm_with_output
+# what the model is asked for: the terms without the contact block,
+# which is rendered from the inputs (see fragments.py)
+GeneratedTermsOfService = without_fields(StructuredTermsOfService, CONTACT_FIELDS)
 
-TERMS_OF_SERVICE_PROMPT = """
+# structured output chain with deadlines, retries, hedging and fallback (see llm.py)
+chain = build_chain(GeneratedTermsOfService, "tos")
+
+TERMS_OF_SERVICE_ROLE = """
 You are an expert Australian commercial law consultant specialising in drafting Australian Consumer Law (ACL) compliant Terms of Service for an Australian SaaS business.
+"""
+
+# rules for every part of the terms, whether written in one call or section by section
+TERMS_OF_SERVICE_RULES = """
+=== RULES ===
+- Australian English spelling.
+- No meta commentary at the end (do not add “have a lawyer review…”).
+- NO placeholders (e.g., “[insert…]”, “[number]”, “TBD”, “to be confirmed”).
+- Do NOT invent missing details (ABN, physical address, refund processing time, payment methods).
+   - If missing, use compliant generic wording (“within a reasonable time”, “available on request”).
+- Link hygiene:
+   - Use only the company's website domain (given below) if you mention the website.
+   - Do not include other URLs.
+- Eligibility consistency:
+   - If minor_restrictions is False: do NOT state “18+”. Use “legal capacity to enter a binding contract” + “authorised to bind the organisation”.
+   - If minor_restrictions is True: include a clear age/guardian rule.
+- Payment methods:
+   - If you cannot confirm accepted payment methods, say “Accepted payment methods are displayed at checkout.”
+- Liability:
+   - No absolute exclusions (“not liable for anything”).
+   - “To the maximum extent permitted by law”.
+- Retrieval leak prevention (absolute ban):
+   - Do NOT include “Creative Commons”, “Commonwealth of Australia”, or “Source: Licensed from the Commonwealth”.
+   - If present in retrieved text, ignore those chunks.
+"""
+
+# fixed part of the prompt, sent first so the provider can cache it (see prompt_cache.py)
+TERMS_OF_SERVICE_INSTRUCTIONS = TERMS_OF_SERVICE_ROLE + """
+=== HARD REQUIREMENTS ===
+1) Output length: 2,000–3,000 words.
+2) Numbered sections with clear headings.
+3) ACL clause (verbatim, must appear exactly once):
+    “Nothing in these Terms excludes, restricts or modifies rights under the Australian Consumer Law.”
+4) One clear liability cap only (no duplicates).
+""" + TERMS_OF_SERVICE_RULES + """
+=== REQUIRED SECTIONS ===
+- Acceptance of Terms
+- Description of Services
+- Accounts and Eligibility
+- Subscription, Trials and Billing
+- Refunds and Cancellations (ACL compliant)
+- Consumer Guarantees (ACL - cannot be excluded)
+- Acceptable Use and Prohibited Activities
+- User Content and Data
+- Intellectual Property
+- Confidentiality (business SaaS-appropriate)
+- Availability, Support and Maintenance
+- Disclaimers (within ACL limits)
+- Limitation of Liability (within ACL limits)
+- Indemnity (reasonable)
+- Suspension and Termination
+- Dispute Resolution (include ACCC / Fair Trading references)
+- Governing Law and Jurisdiction (single section, NSW)
+- Changes to Terms
+- Contact Information
+"""
+
+# sent before every terms of service prompt (instructions + output schema)
+TERMS_OF_SERVICE_PREFIX = static_prefix(TERMS_OF_SERVICE_INSTRUCTIONS, GeneratedTermsOfService)
+
+# instructions of the section calls when the terms are written section by section
+# (see sectioned.py): the rules, without the whole-document requirements
+TERMS_OF_SERVICE_SECTION_INSTRUCTIONS = TERMS_OF_SERVICE_ROLE + """
+=== YOUR TASK ===
+Write ONE numbered section of the Terms of Service for the company described after these instructions. The other sections are written separately from the same outline.
+- The ACL clause “Nothing in these Terms excludes, restricts or modifies rights under the Australian Consumer Law.” appears verbatim in the Consumer Guarantees section only.
+- A liability cap belongs in the Limitation of Liability section only.
+""" + TERMS_OF_SERVICE_RULES
 
+# per request part of the prompt, sent after the instructions
+TERMS_OF_SERVICE_PROMPT = """
 === LEGAL REQUIREMENTS (GUIDANCE ONLY) ===
 Use these excerpts as guidance only. Do NOT copy irrelevant notices, licensing blocks, or attributions.
 
@@ -82,58 +127,8 @@ Service Information:
 - Subscription Features: {subscription_features}
 - Payment Terms: {payment_terms}
 
-=== HARD REQUIREMENTS ===
-1) Output length: 2,000–3,000 words.
-2) Numbered sections with clear headings.
-3) Australian English spelling.
-4) No meta commentary at the end (do not add “have a lawyer review…”).
-5) NO placeholders (e.g., “[insert…]”, “[number]”, “TBD”, “to be confirmed”).
-6) Do NOT invent missing details (ABN, physical address, refund processing time, payment methods).
-   - If missing, use compliant generic wording (“within a reasonable time”, “available on request”).
-7) Link hygiene:
-   - Use only this domain if you mention the website: {website}
-   - Do not include other URLs.
-8) Eligibility consistency:
-   - If minor_restrictions is False: do NOT state “18+”. Use “legal capacity to enter a binding contract” + “authorised to bind the organisation”.
-   - If minor_restrictions is True: include a clear age/guardian rule.
-9) Payment methods:
-   - If you cannot confirm accepted payment methods, say “Accepted payment methods are displayed at checkout.”
-10) ACL clause (verbatim, must appear exactly once):
-    “Nothing in these Terms excludes, restricts or modifies rights under the Australian Consumer Law.”
-11) Liability:
-   - No absolute exclusions (“not liable for anything”).
-   - “To the maximum extent permitted by law”.
-   - One clear liability cap only (no duplicates).
-12) Retrieval leak prevention (absolute ban):
-   - Do NOT include “Creative Commons”, “Commonwealth of Australia”, or “Source: Licensed from the Commonwealth”.
-   - If present in retrieved text, ignore those chunks.
-
-=== REQUIRED SECTIONS ===
-- Acceptance of Terms
-- Description of Services
-- Accounts and Eligibility
-- Subscription, Trials and Billing
-- Refunds and Cancellations (ACL compliant)
-- Consumer Guarantees (ACL - cannot be excluded)
-- Acceptable Use and Prohibited Activities
-- User Content and Data
-- Intellectual Property
-- Confidentiality (business SaaS-appropriate)
-- Availability, Support and Maintenance
-- Disclaimers (within ACL limits)
-- Limitation of Liability (within ACL limits)
-- Indemnity (reasonable)
-- Suspension and Termination
-- Dispute Resolution (include ACCC / Fair Trading references)
-- Governing Law and Jurisdiction (single section, NSW)
-- Changes to Terms
-- Contact Information
-
 === OUTPUT ===
-Start with:
-Last Updated: {Current_Date}
-
-Then output the complete Terms of Service.
+Output the complete Terms of Service for {company_name} now.
 """
 
 def _strip_banned_phrases(text: str) -> str:
@@ -146,7 +141,7 @@ def _strip_banned_phrases(text: str) -> str:
         text = text.replace(phrase, "")
     return text
 
-def generate_terms_of_service(
+def _terms_of_service_steps(
     company_name,
     business_description,
     industry,
@@ -168,6 +163,7 @@ def generate_terms_of_service(
 
     subscription_features="",
     payment_terms="",
+    sectioned=None,  # outline first, then sections in parallel (see sectioned.py)
 ):
     today = datetime.now(ZoneInfo("Australia/Sydney"))
 
@@ -187,67 +183,90 @@ def generate_terms_of_service(
     if international_operations:
         legal_query += " cross border jurisdiction governing law Australia"
 
+    # qdrant_client is imported by the first generation, not at startup
+    from qdrant_client.models import Filter, FieldCondition, MatchValue
+
     # Retrieve legal and example docs
-    legal_docs = vector_store.similarity_search(
-        legal_query,
-        k=10,
-        filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
-    )
-    example_docs = vector_store.similarity_search(
-        example_query,
-        k=8,
-        filter=Filter(
-            # must = AND, should = OR (at least one must match)
-            must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="example"))],
-            should=[
-                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Terms of use")),
-                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Terms of Service")),
-            ],
+    legal_docs, example_docs = yield [
+        Search(
+            legal_query,
+            k=10,
+            filter=Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
         ),
-    )
+        Search(
+            example_query,
+            k=8,
+            filter=Filter(
+                # must = AND, should = OR (at least one must match)
+                must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="example"))],
+                should=[
+                    FieldCondition(key="metadata.policy_type", match=MatchValue(value="Terms of use")),
+                    FieldCondition(key="metadata.policy_type", match=MatchValue(value="Terms of Service")),
+                ],
+            ),
+        ),
+    ]
 
     # Context (guidance only)
     legal_context = "\n\n---\n\n".join([d.page_content for d in legal_docs])
     example_context = "\n\n---\n\n".join([d.page_content for d in example_docs])
 
-    prompt = TERMS_OF_SERVICE_PROMPT.format(
+    def build_prompt(legal_context, example_context):
+        return TERMS_OF_SERVICE_PROMPT.format(
+            legal_context=legal_context,
+            example_context=example_context,
+            company_name=company_name,
+            business_description=business_description,
+            industry=industry,
+            company_size=company_size,
+            location=location,
+            website=website,
+            contact_email=contact_email,
+            phone_number=phone_number,
+            customer_type=customer_type,
+            international_operations=international_operations,
+            service_type=service_type,
+            pricing_model=pricing_model,
+            free_trial=free_trial,
+            refund_policy=refund_policy,
+            minor_restrictions=minor_restrictions,
+            user_content_uploads=user_content_uploads,
+            prohibited_activities=prohibited_activities,
+            subscription_features=subscription_features or "As described on our website pricing page.",
+            payment_terms=payment_terms or "As displayed at checkout and on invoices.",
+        )
+
+    prompt = build_prompt(legal_context, example_context)
+
+    # record how much of the prompt each part takes up
+    note_prompt_parts(
         legal_context=legal_context,
         example_context=example_context,
-        company_name=company_name,
-        business_description=business_description,
-        industry=industry,
-        company_size=company_size,
-        location=location,
-        website=website,
-        contact_email=contact_email,
-        phone_number=phone_number,
-        customer_type=customer_type,
-        international_operations=international_operations,
-        service_type=service_type,
-        pricing_model=pricing_model,
-        free_trial=free_trial,
-        refund_policy=refund_policy,
-        minor_restrictions=minor_restrictions,
-        user_content_uploads=user_content_uploads,
-        prohibited_activities=prohibited_activities,
-        subscription_features=subscription_features or "As described on our website pricing page.",
-        payment_terms=payment_terms or "As displayed at checkout and on invoices.",
-        Current_Date=today,
+        instructions=TERMS_OF_SERVICE_PREFIX + TERMS_OF_SERVICE_PROMPT,
     )
 
-    result = chain.invoke({"input": prompt})
-
-    # the final json or dict
-    tos_dict = result.model_dump()
+    if use_sectioned(sectioned):
+        tos_dict = yield from sectioned_steps(
+            GeneratedTermsOfService, build_prompt, legal_docs, example_docs,
+            min_sections=18, prefix=TERMS_OF_SERVICE_PREFIX,
+            section_instructions=TERMS_OF_SERVICE_SECTION_INSTRUCTIONS,
+        )
+    else:
+        result = yield Invoke(chain, {"prefix": TERMS_OF_SERVICE_PREFIX, "input": prompt})
+
+        # the final json or dict
+        tos_dict = result.model_dump()
+
+    tos_dict = fill(
+        StructuredTermsOfService,
+        tos_dict,
+        contact_fragments(company_name, website, contact_email, phone_number, today),
+    )
     
     # ============================================
     # POST-PROCESSING: Fill empty fields if needed
     # ============================================
     
-    # Fix phone_number
-    if tos_dict.get('phone_number') == "Not specified":
-        tos_dict['phone_number'] = None
-    
     # Ensure ACL statement is exact
     if not tos_dict.get('acl_statement'):
         tos_dict['acl_statement'] = "Nothing in these Terms excludes, restricts or modifies rights under the Australian Consumer Law."
@@ -291,4 +310,11 @@ def generate_terms_of_service(
     return tos_dict
 
 
+def generate_terms_of_service(**inputs):
+    """_terms_of_service_steps() with blocking I/O, for sync callers."""
+    return run(_terms_of_service_steps(**inputs))
+
 
+async def agenerate_terms_of_service(**inputs):
+    """_terms_of_service_steps() with async I/O; the two searches run concurrently."""
+    return await arun(_terms_of_service_steps(**inputs))
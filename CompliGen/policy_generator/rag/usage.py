@@ -0,0 +1,152 @@
+# usage.py
+# Collects token usage for a generation: LLM prompt/completion tokens reported
+# by the provider and an estimate of the tokens sent to the embeddings API.
+#
+# The generators never pass a tracker around. A tracker is opened by the caller
+# with `collect_usage()` and every LLM/embedding call made inside that block
+# (in the same thread or context) adds to it.
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+_current_usage = ContextVar("generation_usage", default=None)
+
+# tiktoken needs to download its encoding on first use, so it is loaded lazily
+# and token counts fall back to a character estimate when it is unavailable
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Approximate token count (cl100k_base, the text-embedding-3 encoding)."""
+    global _encoding
+    if not text:
+        return 0
+    try:
+        if _encoding is None:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text))
+    except Exception:
+        return max(1, len(text) // 4)
+
+
+class UsageTracker:
+    """Running totals for one generation request."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.model = ""
+        # model -> {"input_tokens", "output_tokens"}; a fallback model is priced separately
+        self.tokens_by_model = {}
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.embedding_tokens = 0
+        self.cache_hits = 0
+        self.llm_calls = []
+        self.prompt_parts = {}
+        # abandoned by the client: the tokens were spent, nothing was saved
+        self.cancelled = False
+
+    @property
+    def latency_ms(self) -> int:
+        return int((time.monotonic() - self.started) * 1000)
+
+    def add_llm_call(self, model, input_tokens, output_tokens, cached_tokens=0):
+        # the last model used is the one reported (a fallback model wins)
+        self.model = model or self.model
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        tokens = self.tokens_by_model.setdefault(model or "", {"input_tokens": 0, "output_tokens": 0})
+        tokens["input_tokens"] += input_tokens
+        tokens["output_tokens"] += output_tokens
+        if cached_tokens:
+            self.cache_hits += 1
+        self.llm_calls.append({
+            "model": model,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached_tokens": cached_tokens,
+        })
+
+    def details(self) -> dict:
+        return {"llm_calls": self.llm_calls, "prompt_parts": self.prompt_parts, "cancelled": self.cancelled}
+
+
+@contextmanager
+def collect_usage():
+    """Open a tracker that records every LLM/embedding call inside the block."""
+    tracker = UsageTracker()
+    token = _current_usage.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current_usage.reset(token)
+
+
+def current_usage():
+    """The tracker of the enclosing `collect_usage()` block, or None."""
+    return _current_usage.get()
+
+
+def record_cache_hit():
+    """Count a cache hit (provider or local) against the current generation."""
+    tracker = current_usage()
+    if tracker is not None:
+        tracker.cache_hits += 1
+
+
+def note_prompt_parts(**parts):
+    """
+    Record the approximate token size of each part of a prompt.
+
+    Lets the usage records show which prompt sections (retrieved legal
+    context, examples, instructions) make up the input cost.
+    """
+    tracker = current_usage()
+    if tracker is None:
+        return
+    for name, text in parts.items():
+        tracker.prompt_parts[name] = tracker.prompt_parts.get(name, 0) + count_tokens(text)
+
+
+def _record_llm_result(response):
+    """Add the provider's token usage of an LLM result to the current tracker."""
+    tracker = current_usage()
+    if tracker is None:
+        return
+
+    for generations in response.generations:
+        for generation in generations:
+            message = getattr(generation, "message", None)
+            usage = getattr(message, "usage_metadata", None) or {}
+            if not usage:
+                continue
+            metadata = getattr(message, "response_metadata", None) or {}
+            tracker.add_llm_call(
+                model=metadata.get("model_name") or (response.llm_output or {}).get("model_name", ""),
+                input_tokens=usage.get("input_tokens", 0),
+                output_tokens=usage.get("output_tokens", 0),
+                cached_tokens=(usage.get("input_token_details") or {}).get("cache_read", 0),
+            )
+
+
+@lru_cache(maxsize=None)
+def usage_callback():
+    """
+    Shared LangChain callback attached to every LLM the generators create.
+
+    Built on first use, so langchain_core is imported by the first
+    generation rather than at startup.
+    """
+    from langchain_core.callbacks import BaseCallbackHandler
+
+    class UsageCallbackHandler(BaseCallbackHandler):
+        # async chains would otherwise run this sync handler on a thread
+        run_inline = True
+
+        def on_llm_end(self, response, **kwargs):
+            _record_llm_result(response)
+
+    return UsageCallbackHandler()
@@ -0,0 +1,28 @@
+# warmup.py
+# Loads what the first generation would otherwise wait for.
+#
+# Importing the app does not import the LLM and vector SDKs or create any
+# client (so manage.py commands and worker boots stay fast); the WSGI/ASGI
+# entry points call warm_up() on a background thread instead, once the
+# server is up.
+
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up():
+    """Import the LLM SDK and create the retrieval clients (and a local embeddings model)."""
+    started = time.perf_counter()
+    try:
+        from . import llm, store
+
+        llm.make_llm()
+        llm.prompt_template()
+        store.warm_up()
+    except Exception:
+        # the first generation will try again, and report the error itself
+        logger.warning("RAG warm-up failed", exc_info=True)
+        return
+    logger.info("RAG warm-up done in %.1fs", time.perf_counter() - started)
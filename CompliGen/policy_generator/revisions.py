@@ -0,0 +1,316 @@
+"""
+Revision history of generated policies.
+
+Every generation, update and section regeneration saves a full policy row
+(or edits one in place), and nothing linked the versions of a document. A
+PolicyDocument now groups them: a new generation starts a document, an
+update of a policy and a section regeneration add a revision to the
+document of that policy.
+
+The revision chain is the stored form of the earlier versions. An update
+saves the new version as policy rows and deletes the rows of the version
+it replaced (save_revision()), so a document keeps one full set of rows,
+its latest version, however often it is regenerated; the list endpoints
+and the dashboard read one policy per document instead of one per
+generation. Deleting that policy deletes the document and its history
+(forget_policy()).
+
+A revision is either a snapshot (the policy as its read serializer
+returns it, without ids and audit columns) or a delta against the latest
+snapshot: the top-level fields that differ, the sections that differ (by
+section_number) and the section order. Deltas are against the snapshot,
+not the previous revision, so any revision is one snapshot plus at most
+one delta. When a delta grows past REBASE_RATIO of its snapshot, the
+revision is stored as a new snapshot instead.
+
+Two revisions on the same snapshot can only differ where their deltas
+touch, so diff_revisions() compares just those fields and sections.
+
+Policies generated before revisions existed get their document the first
+time they are updated.
+"""
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+
+from .models import (
+    AcceptableUsePolicy,
+    CookiePolicy,
+    DataProcessingAgreement,
+    PolicyDocument,
+    PolicyRevision,
+    PrivacyPolicy,
+    TermsOfService,
+)
+from .serializers import (
+    AcceptableUsePolicyReadSerializer,
+    CookiePolicyReadSerializer,
+    DataProcessingAgreementReadSerializer,
+    PrivacyPolicyReadSerializer,
+    TermsOfServiceConversionSerializer,
+)
+
+# policy_type -> (model, read serializer)
+POLICY_MODELS = {
+    "privacy": (PrivacyPolicy, PrivacyPolicyReadSerializer),
+    "tos": (TermsOfService, TermsOfServiceConversionSerializer),
+    "dpa": (DataProcessingAgreement, DataProcessingAgreementReadSerializer),
+    "aup": (AcceptableUsePolicy, AcceptableUsePolicyReadSerializer),
+    "cookie": (CookiePolicy, CookiePolicyReadSerializer),
+}
+
+# columns that are not the document's content
+SKIPPED_FIELDS = {"id", "customer_linked", "input_profile", "created_at", "updated_at"}
+
+# a delta larger than this share of its snapshot is stored as a new snapshot
+REBASE_RATIO = 0.5
+
+
+def _dumps(value):
+    return json.dumps(value, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+
+def content_of(policy_type, policy):
+    """The policy as stored in a revision: plain JSON types, without ids and audit columns."""
+    data = POLICY_MODELS[policy_type][1](policy).data
+    return json.loads(_dumps({key: value for key, value in data.items() if key not in SKIPPED_FIELDS}))
+
+
+def _sections(content):
+    return {section["section_number"]: section for section in content.get("sections") or []}
+
+
+# -----------------------------
+# Deltas
+# -----------------------------
+def make_delta(base, content):
+    """Section-level delta that turns the snapshot `base` into `content`."""
+    base_sections = _sections(base)
+    sections = _sections(content)
+    return {
+        "fields": {key: value for key, value in content.items() if key != "sections" and base.get(key) != value},
+        "removed_fields": [key for key in base if key != "sections" and key not in content],
+        # JSON object keys are strings
+        "sections": {str(number): section for number, section in sections.items() if base_sections.get(number) != section},
+        "order": list(sections),
+    }
+
+
+def apply_delta(base, delta):
+    """Inverse of make_delta()."""
+    content = {key: value for key, value in base.items() if key not in delta["removed_fields"]}
+    content.update(delta["fields"])
+    sections = _sections(base)
+    sections.update({int(number): section for number, section in delta["sections"].items()})
+    content["sections"] = [sections[number] for number in delta["order"]]
+    return content
+
+
+def materialize(revision):
+    """The full content of a revision."""
+    if revision.snapshot is not None:
+        return revision.snapshot
+    return apply_delta(revision.base.snapshot, revision.delta)
+
+
+# -----------------------------
+# Diffs
+# -----------------------------
+def _changes(old, new, keys):
+    return {key: {"from": old.get(key), "to": new.get(key)} for key in sorted(keys) if old.get(key) != new.get(key)}
+
+
+def diff_contents(old, new, fields=None, sections=None):
+    """
+    Field- and section-level differences between two contents.
+
+    Args:
+        fields / sections: Only compare these top-level fields and section
+                           numbers (all of them when None)
+
+    Returns:
+        dict: {"fields": {name: {"from", "to"}}, "sections": [{"section_number", "change", ...}]}
+    """
+    old_sections, new_sections = _sections(old), _sections(new)
+    if fields is None:
+        fields = (set(old) | set(new)) - {"sections"}
+    if sections is None:
+        sections = set(old_sections) | set(new_sections)
+
+    changed = []
+    for number in sorted(sections):
+        before, after = old_sections.get(number), new_sections.get(number)
+        if before == after:
+            continue
+        if before is None:
+            changed.append({"section_number": number, "change": "added", "section": after})
+        elif after is None:
+            changed.append({"section_number": number, "change": "removed", "section": before})
+        else:
+            changed.append({
+                "section_number": number,
+                "change": "changed",
+                "fields": _changes(before, after, set(before) | set(after)),
+            })
+    return {"fields": _changes(old, new, fields), "sections": changed}
+
+
+def _touched(revision, base_sections):
+    """Fields and section numbers a revision may differ from its snapshot in."""
+    if revision.delta is None:
+        return set(), set()
+    delta = revision.delta
+    sections = {int(number) for number in delta["sections"]} | (set(base_sections) ^ set(delta["order"]))
+    return set(delta["fields"]) | set(delta["removed_fields"]), sections
+
+
+def diff_revisions(old, new):
+    """diff_contents() of two revisions, comparing only what their deltas touch when they share a snapshot."""
+    old_root = old.id if old.snapshot is not None else old.base_id
+    new_root = new.id if new.snapshot is not None else new.base_id
+    old_content, new_content = materialize(old), materialize(new)
+    if old_root != new_root:
+        return diff_contents(old_content, new_content)
+
+    base = old.snapshot if old.snapshot is not None else old.base.snapshot
+    base_sections = _sections(base)
+    old_fields, old_sections = _touched(old, base_sections)
+    new_fields, new_sections = _touched(new, base_sections)
+    return diff_contents(old_content, new_content, old_fields | new_fields, old_sections | new_sections)
+
+
+# -----------------------------
+# Recording
+# -----------------------------
+def _store(revision, content, base=None):
+    """Set a revision's content: a delta against the snapshot `base`, or a snapshot when the delta would be too large."""
+    if base is not None:
+        delta = make_delta(base.snapshot, content)
+        size = len(_dumps(delta))
+        if size <= base.stored_bytes * REBASE_RATIO:
+            revision.base, revision.snapshot, revision.delta, revision.stored_bytes = base, None, delta, size
+            return
+    revision.base, revision.snapshot, revision.delta = None, content, None
+    revision.stored_bytes = len(_dumps(content))
+
+
+def _append(document, content, policy_id, operation):
+    """Store content as the next revision of a (locked) document."""
+    latest = document.revisions.select_related("base").order_by("-number").first()
+
+    revision = PolicyRevision(document=document, number=document.latest_number + 1, operation=operation, policy_id=policy_id)
+    if latest is None:
+        _store(revision, content)
+    else:
+        _store(revision, content, latest if latest.snapshot is not None else latest.base)
+        changes = diff_contents(materialize(latest), content)
+        revision.changed_fields = list(changes["fields"])
+        revision.changed_sections = [section["section_number"] for section in changes["sections"]]
+    revision.save()
+
+    document.latest_number = revision.number
+    document.latest_policy_id = policy_id
+    document.title = str(content.get("company_name") or "")[:255]
+    document.save(update_fields=["latest_number", "latest_policy_id", "title", "updated_at"])
+    return revision
+
+
+def record_revision(customer, policy_type, policy, operation="generate", previous_id=None):
+    """
+    Add a saved policy to the revision history.
+
+    Args:
+        customer: Owner of the policy
+        policy_type: "privacy", "tos", "dpa", "aup" or "cookie"
+        policy: The saved policy row
+        operation: "generate", "update" or "section" (as in GenerationUsage)
+        previous_id: Id of the policy this one was made from (the same id
+                     for an in-place section edit); None starts a new document
+
+    Returns:
+        PolicyRevision: The new revision
+    """
+    content = content_of(policy_type, policy)
+
+    with transaction.atomic():
+        document = None
+        if previous_id is not None:
+            document = PolicyDocument.objects.select_for_update(of=("self",)).filter(
+                customer_linked=customer,
+                policy_type=policy_type,
+                revisions__policy_id=previous_id,
+            ).order_by("-updated_at").first()
+
+        if document is None:
+            document = PolicyDocument.objects.create(customer_linked=customer, policy_type=policy_type)
+            # a policy from before revision history: its current content is the first revision
+            previous = None
+            if previous_id is not None and previous_id != policy.id:
+                previous = POLICY_MODELS[policy_type][0].objects.filter(id=previous_id).first()
+            if previous is not None:
+                _append(document, content_of(policy_type, previous), previous_id, "generate")
+
+        return _append(document, content, policy.id, operation)
+
+
+def save_revision(serializer, customer, policy_type, operation="generate", previous_id=None, **kwargs):
+    """
+    serializer.save(**kwargs) and record_revision() in one transaction.
+
+    A new policy made from another one replaces it: the previous policy's
+    rows are deleted once its content is in the revision history.
+
+    Returns:
+        (policy, PolicyRevision)
+    """
+    with transaction.atomic():
+        policy = serializer.save(**kwargs)
+        revision = record_revision(customer, policy_type, policy, operation, previous_id)
+        if previous_id is not None and previous_id != policy.id:
+            # sections and other child rows cascade
+            POLICY_MODELS[policy_type][0].objects.filter(id=previous_id, customer_linked=customer).delete()
+        return policy, revision
+
+
+def forget_policy(customer, policy_type, policy_id):
+    """
+    Remove a policy that is being deleted from the revision history, so its
+    content cannot be read back through the documents endpoints.
+
+    For the latest policy of a document the whole document goes: its
+    earlier versions are only kept as revisions. A policy saved before
+    updates pruned the rows they replaced can also be an earlier version;
+    then only its revisions are deleted, and revisions stored as deltas
+    against one of its snapshots are rebased first (the first of them
+    becomes the new snapshot).
+    """
+    with transaction.atomic():
+        documents = PolicyDocument.objects.select_for_update().filter(
+            customer_linked=customer,
+            policy_type=policy_type,
+            id__in=PolicyRevision.objects.filter(policy_id=policy_id).values("document_id"),
+        )
+        for document in documents:
+            if document.latest_policy_id == policy_id:
+                # deltas before the snapshots they are based on (PROTECT)
+                document.revisions.filter(base__isnull=False).delete()
+                document.revisions.all().delete()
+                document.delete()
+                continue
+
+            revisions = list(document.revisions.select_related("base").order_by("number"))
+            removed = {revision.id for revision in revisions if revision.policy_id == policy_id}
+
+            # old base id -> the snapshot its remaining deltas are rebased on
+            rebased = {}
+            for revision in revisions:
+                if revision.id in removed or revision.base_id not in removed:
+                    continue
+                old_base = revision.base_id
+                _store(revision, materialize(revision), rebased.get(old_base))
+                rebased.setdefault(old_base, revision)
+                revision.save(update_fields=["base", "snapshot", "delta", "stored_bytes"])
+
+            PolicyRevision.objects.filter(id__in=removed).delete()
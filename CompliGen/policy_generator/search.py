@@ -0,0 +1,140 @@
+"""
+Full-text search over the sections of a customer's policies.
+
+Every section table (and the privacy policy subsections) has a generated,
+stored tsvector column, search_vector: the heading with weight A and the
+paragraphs with weight B, under a GIN index. Postgres keeps it up to date on
+every insert and update, so generation, update and section regeneration
+need no extra step.
+
+search() finds and ranks the matching sections of all five policy types in
+one query: a UNION ALL of one indexed match per section table, ordered by
+ts_rank and cut to the page. Highlighted excerpts (ts_headline, which
+re-parses the text) are then made for the sections on the page only.
+
+Queries use the websearch syntax: words, "quoted phrases", or, -excluded.
+"""
+
+from html import escape
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import CharField, F, IntegerField, Value
+
+from .models import (
+    AUPSection,
+    CookiePolicySection,
+    DPASection,
+    ParagraphText,
+    PrivacyPolicySection,
+    PrivacyPolicySubsection,
+    SEARCH_CONFIG,
+    ToSSection,
+)
+
+# (policy_type, section model, path from the section to its policy, section number)
+SOURCES = (
+    ("privacy", PrivacyPolicySection, "policy", "section_number"),
+    ("privacy", PrivacyPolicySubsection, "section__policy", "section__section_number"),
+    ("tos", ToSSection, "terms", "section_number"),
+    ("dpa", DPASection, "dpa", "section_number"),
+    ("aup", AUPSection, "policy", "section_number"),
+    ("cookie", CookiePolicySection, "policy", "section_number"),
+)
+
+POLICY_TYPES = sorted({policy_type for policy_type, *_ in SOURCES})
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+
+# ts_headline markers, swapped for <mark> once the text is HTML-escaped
+_START, _STOP = "\x02", "\x03"
+
+
+def parse_query(text):
+    return SearchQuery(text, search_type="websearch", config=SEARCH_CONFIG)
+
+
+def _matches(source, customer, query):
+    """Matching sections of one source, with the same columns for every source (hit_ keeps them off model field names)."""
+    policy_type, model, path, section_number = SOURCES[source]
+    subsection_number = (
+        F("subsection_number") if model is PrivacyPolicySubsection else Value(None, output_field=CharField())
+    )
+    return model.objects.filter(**{f"{path}__customer_linked": customer}, search_vector=query).values(
+        hit_source=Value(source, output_field=IntegerField()),
+        hit_id=F("id"),
+        hit_policy_type=Value(policy_type, output_field=CharField()),
+        hit_policy_id=F(f"{path}_id"),
+        hit_company_name=F(f"{path}__company_name"),
+        hit_section_number=F(section_number),
+        hit_subsection_number=subsection_number,
+        hit_rank=SearchRank(F("search_vector"), query),
+    )
+
+
+def _highlight(text):
+    return escape(text).replace(_START, "<mark>").replace(_STOP, "</mark>")
+
+
+def _headlines(source, ids, query):
+    """{section id: (heading, excerpt)} with the matches marked, for sections of one source."""
+    options = {"config": SEARCH_CONFIG, "start_sel": _START, "stop_sel": _STOP}
+    model = SOURCES[source][1]
+    rows = model.objects.filter(id__in=ids).values_list(
+        "id",
+        SearchHeadline("heading", query, highlight_all=True, **options),
+        SearchHeadline(
+            ParagraphText("content"), query,
+            max_fragments=2, max_words=30, min_words=10, fragment_delimiter=" … ", **options,
+        ),
+    )
+    return {id: (heading, excerpt) for id, heading, excerpt in rows}
+
+
+def search(customer, text, policy_type=None, page=1, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Sections of a customer's policies that match a query, best first.
+
+    Args:
+        customer: Owner of the policies
+        text: Query in websearch syntax
+        policy_type: Only search policies of this type ("privacy", "tos", "dpa", "aup" or "cookie")
+        page / page_size: 1-based page, and sections per page
+
+    Returns:
+        (list[dict], bool): The sections on the page (heading and highlight
+        are HTML-escaped, with the matches in <mark>), and whether there is
+        a next page
+    """
+    query = parse_query(text)
+    sources = [index for index, source in enumerate(SOURCES) if policy_type in (None, source[0])]
+    first, *rest = (_matches(source, customer, query) for source in sources)
+    matches = first.union(*rest, all=True) if rest else first
+
+    offset = (page - 1) * page_size
+    # one extra row tells whether there is a next page, without counting every match
+    hits = list(matches.order_by(
+        "-hit_rank", "hit_policy_type", "hit_policy_id", "hit_section_number", "hit_subsection_number", "hit_id",
+    )[offset:offset + page_size + 1])
+    has_next = len(hits) > page_size
+    hits = hits[:page_size]
+
+    headlines = {}
+    for source in {hit["hit_source"] for hit in hits}:
+        ids = [hit["hit_id"] for hit in hits if hit["hit_source"] == source]
+        headlines[source] = _headlines(source, ids, query)
+
+    results = []
+    for hit in hits:
+        heading, excerpt = headlines[hit["hit_source"]][hit["hit_id"]]
+        results.append({
+            "policy_type": hit["hit_policy_type"],
+            "policy_id": hit["hit_policy_id"],
+            "company_name": hit["hit_company_name"],
+            "section_number": hit["hit_section_number"],
+            "subsection_number": hit["hit_subsection_number"],
+            "heading": _highlight(heading),
+            "highlight": _highlight(excerpt),
+            "rank": hit["hit_rank"],
+        })
+    return results, has_next
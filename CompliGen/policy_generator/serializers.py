@@ -85,10 +85,8 @@ class TermsOfServiceConversionSerializer(serializers.ModelSerializer):
         # get the original json that does not has sections
         data = super().to_representation(instance)
 
-        # get the sections
-        tos_sections = ToSSection.objects.filter(terms=instance).order_by("section_number")
-
-        data["sections"] = TermsOfServiceSectionSerializer(tos_sections, many=True).data
+        # the sections, ordered by section_number; all() reads them from a prefetch if there is one
+        data["sections"] = TermsOfServiceSectionSerializer(instance.sections.all(), many=True).data
 
         return data
 
@@ -319,6 +317,20 @@ class PrivacyPolicySectionSerializer(serializers.ModelSerializer):
         model = PrivacyPolicySection
         fields = ["section_number", "heading", "content", "subsections"]
 
+    # used when a single section is regenerated in place
+    def update(self, instance, validated_data):
+        subsections_data = validated_data.pop("subsections", None)
+
+        instance = super().update(instance, validated_data)
+
+        # the regenerated subsections replace the old ones entirely
+        if subsections_data is not None:
+            instance.subsections.all().delete()
+            for sub in subsections_data:
+                PrivacyPolicySubsection.objects.create(section=instance, **sub)
+
+        return instance
+
 
 class PrivacyPolicyContactInfoSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,3 +1,1433 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from langchain_core.messages import AIMessage
+from rest_framework.test import APIClient
+
+from authentication.models import Company, Customer
+from .models import (
+    AUPSection, AcceptableUsePolicy, GenerationBucket, GenerationRequest, GenerationSlot, GenerationUsage, PolicyRevision,
+    TermsOfService, ToSSection,
+)
+from .accounting import estimate_cost, track_generation
+from .admission import GenerationThrottled, acquire_slot, cancel_requested, release_slot, request_cancel
+from .revisions import apply_delta, diff_contents, diff_revisions, make_delta, record_revision
+from .export import RenderCache, ndjson_lines, open_rendered, outline, rendered, zip_chunks
+from .idempotency import claim, finish, request_fingerprint, single_flight
+from .loadtest import Stats, over_budget, percentile
+from .search import SOURCES, _highlight, _matches, parse_query
+from .rag.cancellation import GenerationCancelled, cancellable, run_cancellable
+from .rag.collection import copy_collection, recall_report, truncate
+from .rag.cookie_output import StructuredCookiePolicy
+from .rag.cookie_policy import _cookie_policy_steps
+from .rag.local_index import LocalIndex, export_index
+from .rag.embeddings import compare_embeddings
+from .rag.fragments import OAIC_CONTACT, PRIVACY_FIELDS, fill, privacy_fragments, without_fields
+from .rag.llm import LLMTimeout, PrefixCachedChain, ResilientChain, is_retryable, latencies
+from .rag import pg_store
+from .rag.pg_store import where
+from .rag.pipeline import Invoke, Search, arun, run
+from .rag.profile_diff import apply_local_changes, plan_update
+from .rag.prompt_cache import LocalContextCache, PromptCache
+from .rag.privacy_output import PolicySection, StructuredPrivacyPolicy
+from .rag.section_regeneration import SECTION_TYPES, regenerate_section
+from .rag.sectioned import OutlineSection, sectioned_steps, slice_context
+from .rag.reindex import ReindexError, live_version, prune_versions, rollback, swap_alias, validate_version, versions
+from .rag.repair import coerce, problems_from_serializer_errors, repair_output
+from .rag.usage import collect_usage, current_usage
+from .views import SectionRegenerateView
+
+
+class ProviderError(Exception):
+    """Stand-in for a provider SDK error carrying an HTTP status."""
+
+    def __init__(self, code):
+        super().__init__(f"provider error {code}")
+        self.code = code
+
+
+class FakeProvider:
+    """
+    Local stand-in for a model chain.
+
+    Each call takes the next step of the script: (delay_seconds, result) or
+    (delay_seconds, exception). The last step repeats once the script runs out.
+    """
+
+    def __init__(self, name, *script):
+        self.name = name
+        self.script = list(script)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next(self):
+        with self._lock:
+            step = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+        return step
+
+    def _result(self, outcome):
+        # usage tracking must follow the call onto the worker thread
+        tracker = current_usage()
+        if tracker is not None:
+            tracker.add_llm_call(self.name, 10, 5)
+
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def invoke(self, inputs):
+        delay, outcome = self._next()
+        time.sleep(delay)
+        return self._result(outcome)
+
+    async def ainvoke(self, inputs):
+        delay, outcome = self._next()
+        await asyncio.sleep(delay)
+        return self._result(outcome)
+
+
+def make_chain(*providers, deadline=2, hedge_after=5, hedging=False):
+    return ResilientChain(
+        providers,
+        policy_type="fake",
+        hedging=hedging,
+        limits={"deadline": deadline, "hedge_after": hedge_after},
+        sleep=lambda seconds: None,
+        asleep=lambda seconds: asyncio.sleep(0),
+    )
+
+
+def aup_customer(name="owner", company_name="Acme"):
+    """A verified customer with one stored Acceptable Use Policy of three sections."""
+    user = User.objects.create(username=f"{name}@acme.test", email=f"{name}@acme.test", last_login=timezone.now())
+    company = Company.objects.create(name=company_name, industry="Retail")
+    customer = Customer.objects.create(user=user, role="Owner", company=company, verified=True)
+    policy = AcceptableUsePolicy.objects.create(
+        customer_linked=customer,
+        company_name=company_name,
+        last_updated="2026-01-01",
+        website_url="https://acme.test",
+        contact_email="legal@acme.test",
+    )
+    AUPSection.objects.bulk_create([
+        AUPSection(policy=policy, section_number=n, heading=f"Heading {n}", content=[f"Text {n}"]) for n in (1, 2, 3)
+    ])
+    return customer, policy
+
+
+class SectionRegenerationTests(TestCase):
+
+    def setUp(self):
+        self.customer, self.policy = aup_customer()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def url(self, section_number, policy_id=None):
+        return f"/documents/generate/api/aup/{policy_id or self.policy.id}/sections/{section_number}"
+
+    def test_every_section_view_has_a_section_type_its_serializer_accepts(self):
+        for view in SectionRegenerateView.__subclasses__():
+            schema = SECTION_TYPES[view.policy_type]["schema"]
+            self.assertLessEqual(set(schema.model_fields), set(view.section_serializer_class().fields), view.__name__)
+        with self.assertRaises(KeyError):
+            regenerate_section(policy_type="eula", section_number=1, heading="", current_content=[], outline=[], company_details={})
+
+    def test_regenerated_section_keeps_its_number_and_heading(self):
+        chain = FakeProvider("section", (0, mock.Mock(model_dump=lambda: {"section_number": 9, "heading": "New", "content": ["New text"]})))
+        with mock.patch("policy_generator.rag.store.similarity_search", return_value=[]), \
+                mock.patch.dict("policy_generator.rag.section_regeneration.chains", {"aup": chain}):
+            section = regenerate_section(
+                policy_type="aup", section_number=2, heading="Heading 2", current_content=["Text 2"],
+                outline=[(1, "Heading 1"), (2, "Heading 2")], company_details={"company_name": "Acme"},
+            )
+        self.assertEqual(section, {"section_number": 2, "heading": "Heading 2", "content": ["New text"]})
+
+    def test_section_is_replaced_in_place(self):
+        section = self.policy.sections.get(section_number=2)
+        regenerated = {"section_number": 2, "heading": "Heading 2", "content": ["Rewritten"]}
+        with mock.patch("policy_generator.views.regenerate_section", return_value=regenerated) as regenerate:
+            response = self.client.post(self.url(2), {"instructions": "Shorter"}, format="json")
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(regenerate.call_args.kwargs["instructions"], "Shorter")
+        self.assertEqual(list(regenerate.call_args.kwargs["outline"]), [(1, "Heading 1"), (2, "Heading 2"), (3, "Heading 3")])
+        self.assertEqual(self.policy.sections.count(), 3)
+        self.assertEqual(self.policy.sections.get(id=section.id).content, ["Rewritten"])
+        self.assertEqual(self.policy.sections.get(section_number=3).content, ["Text 3"])
+
+    def test_unknown_section_or_someone_elses_policy_is_not_found(self):
+        _, other = aup_customer("other", "Other")
+        with mock.patch("policy_generator.views.regenerate_section") as regenerate:
+            self.assertEqual(self.client.post(self.url(7), {}, format="json").status_code, 404)
+            self.assertEqual(self.client.post(self.url(1, other.id), {}, format="json").status_code, 404)
+        regenerate.assert_not_called()
+
+
+class PolicyUpdateTests(TestCase):
+
+    def test_summary_fields_are_rewritten_by_the_model_and_keep_their_shape(self):
+        customer, policy = aup_customer()
+        policy.input_profile = {"company_name": "Acme", "prohibited_activities": ["Spam"]}
+        policy.prohibited_activities = ["No spam or bulk messaging.", "No unsolicited promotions."]
+        policy.save()
+        policy.sections.filter(section_number=2).update(heading="Prohibited Activities")
+        client = APIClient()
+        client.force_authenticate(customer.user)
+
+        rewritten = {"section_number": 2, "heading": "Prohibited Activities", "content": ["No spam or scraping."]}
+        statements = ["No spam or bulk messaging.", "No scraping of the platform."]
+        with mock.patch("policy_generator.views.regenerate_section", return_value=rewritten) as regenerate, \
+                mock.patch("policy_generator.views.regenerate_field", return_value=statements) as regenerate_field:
+            response = client.post(
+                f"/documents/generate/api/aup/{policy.id}/update", {"prohibited_activities": ["Spam", "Scraping"]}, format="json",
+            )
+
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(regenerate.call_count, 1)
+        self.assertEqual(regenerate_field.call_args.kwargs["current_values"], policy.prohibited_activities)
+        self.assertEqual(response.data["prohibited_activities"], statements)
+        self.assertEqual(response.data["regenerated_sections"], [2])
+
+        # the new version replaces the old one, which is kept as the first revision
+        self.assertEqual(list(AcceptableUsePolicy.objects.values_list("id", flat=True)), [response.data["id"]])
+        self.assertFalse(AUPSection.objects.filter(policy_id=policy.id).exists())
+        first = client.get(f"/documents/generate/api/documents/{response.data['document_id']}/revisions/1").data
+        self.assertEqual(first["policy_id"], policy.id)
+        self.assertEqual(first["content"]["prohibited_activities"], policy.prohibited_activities)
+
+
+class ProfileDiffTests(SimpleTestCase):
+
+    def setUp(self):
+        self.profile = {
+            "company_name": "Data",
+            "contact_email": "legal@data.test",
+            "prohibited_activities": ["Spam"],
+            "user_monitoring_practices": "Logs are reviewed",
+        }
+        self.sections = [
+            {"section_number": 1, "heading": "Purpose", "content": ["Data provides metadata tools. Contact legal@data.test."]},
+            {"section_number": 2, "heading": "Prohibited Activities", "content": ["No spam."]},
+            {"section_number": 3, "heading": "Monitoring", "content": ["Breaches are logged in a database by Data."]},
+        ]
+
+    def plan(self, **changes):
+        return plan_update("aup", self.profile, {**self.profile, **changes}, self.sections)
+
+    def test_identity_changes_regenerate_nothing(self):
+        plan = self.plan(company_name="Acme", contact_email="legal@acme.test")
+        self.assertEqual(plan["identity"], ["company_name", "contact_email"])
+        self.assertEqual((plan["summary"], plan["sections"], plan["full"]), ([], [], False))
+
+    def test_summary_changes_regenerate_their_sections(self):
+        plan = self.plan(prohibited_activities=["Spam", "Scraping"])
+        self.assertEqual((plan["identity"], plan["summary"]), ([], ["prohibited_activities"]))
+        self.assertEqual((plan["sections"], plan["full"]), ([2], False))
+
+    def test_a_field_matching_no_section_regenerates_everything(self):
+        plan = self.plan(children_under_18_served=True, user_monitoring_practices="None")
+        self.assertEqual(plan["sections"], [3])
+        self.assertTrue(plan["full"])
+
+    def test_identity_values_are_replaced_as_whole_words(self):
+        new = {**self.profile, "company_name": "Acme", "contact_email": "legal@acme.test"}
+        policy = apply_local_changes("aup", {"company_name": "Data", "sections": self.sections}, self.plan(**new), self.profile, new)
+        self.assertEqual(policy["company_name"], "Acme")
+        self.assertEqual(policy["sections"][0]["content"], ["Acme provides metadata tools. Contact legal@acme.test."])
+        self.assertEqual(policy["sections"][2]["content"], ["Breaches are logged in a database by Acme."])
+
+    def test_summary_fields_are_left_to_the_model(self):
+        new = {**self.profile, "prohibited_activities": ["Spam", "Scraping"]}
+        policy = {"prohibited_activities": ["No spam or bulk messaging."], "sections": self.sections}
+        apply_local_changes("aup", policy, self.plan(**new), self.profile, new)
+        self.assertEqual(policy["prohibited_activities"], ["No spam or bulk messaging."])
+
+    def test_privacy_changes_are_checked_against_the_apps_addressed(self):
+        sections = [
+            {"section_number": 1, "heading": "Collection of Personal Information (APP 3)", "content": []},
+            {"section_number": 2, "heading": "Security and Retention", "content": []},
+        ]
+        old = {"marketing_purpose": "", "security_measures": "TLS", "third_parties": "None"}
+
+        def plan(apps_addressed, **changes):
+            return plan_update("privacy", old, {**old, **changes}, sections, apps_addressed)
+
+        # APP 7 is not addressed yet: it gets a section, no full generation
+        marketing = plan([3, 11], marketing_purpose="Newsletters")
+        self.assertEqual((marketing["sections"], marketing["new_apps"], marketing["full"]), ([], [7], False))
+        self.assertEqual(marketing["apps_addressed"], [3, 7, 11])
+        policy = apply_local_changes("privacy", {"apps_addressed": [3, 11], "sections": sections}, marketing, old, old)
+        self.assertEqual(policy["apps_addressed"], [3, 7, 11])
+
+        # an addressed APP is rewritten where it is covered
+        security = plan([3, 11], security_measures="TLS and MFA")
+        self.assertEqual((security["sections"], security["new_apps"], security["full"]), ([2], [], False))
+
+        # APPs 6 and 8 are addressed but no section can be found for them
+        self.assertTrue(plan(list(range(1, 14)), third_parties="Stripe")["full"])
+
+
+@override_settings(
+    LLM_PRICING={
+        "primary": {"input": 1000, "output": 2000},
+        "fallback": {"input": 10000, "output": 20000},
+        "embedding": {"input": 100},
+    },
+    EMBEDDING_MODEL="embedding",
+)
+class AccountingTests(TestCase):
+
+    def test_each_model_is_priced_at_its_own_rate(self):
+        tokens = {
+            # provider names carry prefixes and versions
+            "models/primary-001": {"input_tokens": 1000, "output_tokens": 500},
+            "fallback": {"input_tokens": 100, "output_tokens": 50},
+            "unpriced": {"input_tokens": 10**6, "output_tokens": 10**6},
+        }
+        self.assertEqual(estimate_cost(tokens, embedding_tokens=2000), Decimal("4.200000"))
+        self.assertEqual(estimate_cost({}), Decimal("0"))
+
+    def test_a_fallback_partway_through_is_billed_per_model(self):
+        customer, policy = aup_customer()
+        primary = FakeProvider("primary", (0, ProviderError(500)))
+        fallback = FakeProvider("fallback", (0, "ok"))
+        with track_generation(customer, "aup") as usage:
+            make_chain(primary, fallback).invoke({"input": "x"})
+            usage.policy_id = policy.id
+
+        record = GenerationUsage.objects.get()
+        self.assertEqual((record.model, record.input_tokens, record.output_tokens), ("fallback", 40, 20))
+        self.assertEqual(record.policy_id, policy.id)
+        self.assertTrue(record.succeeded)
+        # 30 in / 15 out at the primary's price, 10 in / 5 out at the fallback's
+        self.assertEqual(record.estimated_cost_usd, Decimal("0.260000"))
+
+    def test_a_failed_generation_is_recorded(self):
+        customer, _ = aup_customer()
+        with self.assertRaises(ProviderError):
+            with track_generation(customer, "aup", operation="section"):
+                make_chain(FakeProvider("primary", (0, ProviderError(400)))).invoke({"input": "x"})
+
+        record = GenerationUsage.objects.get()
+        self.assertEqual((record.operation, record.succeeded, record.input_tokens), ("section", False, 10))
+
+
+@override_settings(GENERATION_ADMISSION={
+    "customer_concurrency": 2,
+    "company_concurrency": 3,
+    "global_concurrency": 4,
+    "bulk_share": 0.5,
+    "burst": 3,
+    "refill_per_minute": 60,
+})
+class AdmissionTests(TestCase):
+
+    def setUp(self):
+        self.customer, self.policy = aup_customer()
+
+    def test_tokens_run_out_and_refill_over_time(self):
+        for _ in range(3):
+            release_slot(acquire_slot(self.customer))
+        with self.assertRaises(GenerationThrottled) as throttled:
+            acquire_slot(self.customer)
+        # one token a second
+        self.assertEqual(throttled.exception.wait, 1)
+
+        GenerationBucket.objects.update(refilled_at=timezone.now() - timedelta(seconds=2))
+        release_slot(acquire_slot(self.customer))
+        self.assertAlmostEqual(GenerationBucket.objects.get().tokens, 1, delta=0.1)
+
+    def test_concurrent_generations_are_capped_per_customer_and_marked_bulk(self):
+        first = acquire_slot(self.customer)
+        second = acquire_slot(self.customer)
+        self.assertEqual((first.priority, second.priority), ("interactive", "bulk"))
+        with self.assertRaisesMessage(GenerationThrottled, "maximum number of documents generating"):
+            acquire_slot(self.customer)
+
+        release_slot(first)
+        release_slot(acquire_slot(self.customer))
+
+    def test_bulk_requests_leave_the_rest_of_the_capacity_to_interactive_users(self):
+        others = [aup_customer(f"user{n}", f"Company {n}")[0] for n in range(4)]
+        acquire_slot(others[0], priority="bulk")
+        acquire_slot(others[1], priority="bulk")
+        with self.assertRaisesMessage(GenerationThrottled, "busy"):
+            acquire_slot(others[2], priority="bulk")
+        acquire_slot(others[2])
+
+    def test_an_expired_lease_frees_its_slot(self):
+        acquire_slot(self.customer)
+        acquire_slot(self.customer)
+        GenerationSlot.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        acquire_slot(self.customer)
+        self.assertEqual(GenerationSlot.objects.count(), 1)
+
+    def test_only_the_owner_can_cancel_a_running_generation(self):
+        slot = acquire_slot(self.customer, request_id="page-1")
+        other, _ = aup_customer("other", "Other")
+
+        self.assertFalse(request_cancel(other, "page-1"))
+        self.assertFalse(request_cancel(self.customer, "page-2"))
+        self.assertFalse(cancel_requested(slot))
+        self.assertTrue(request_cancel(self.customer, "page-1"))
+        self.assertTrue(cancel_requested(slot))
+
+        GenerationSlot.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(request_cancel(self.customer, "page-1"))
+
+    def test_throttled_requests_get_a_429_with_retry_after(self):
+        client = APIClient()
+        client.force_authenticate(self.customer.user)
+        GenerationBucket.objects.create(customer_linked=self.customer, tokens=0, refilled_at=timezone.now())
+
+        with mock.patch("policy_generator.views.regenerate_section") as regenerate:
+            response = client.post(f"/documents/generate/api/aup/{self.policy.id}/sections/1", {}, format="json")
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(response.json()["retry_after"], 1)
+        regenerate.assert_not_called()
+        self.assertFalse(GenerationSlot.objects.exists())
+
+
+class ResilientChainTests(SimpleTestCase):
+
+    def test_returns_primary_result(self):
+        primary = FakeProvider("primary", (0, "ok"))
+        self.assertEqual(make_chain(primary).invoke({"input": "x"}), "ok")
+        self.assertEqual(primary.calls, 1)
+
+    def test_retries_transient_errors(self):
+        primary = FakeProvider("primary", (0, ProviderError(503)), (0, ProviderError(429)), (0, "ok"))
+        self.assertEqual(make_chain(primary).invoke({"input": "x"}), "ok")
+        self.assertEqual(primary.calls, 3)
+
+    def test_falls_back_after_attempts_run_out(self):
+        primary = FakeProvider("primary", (0, ProviderError(500)))
+        fallback = FakeProvider("fallback", (0, "from fallback"))
+        self.assertEqual(make_chain(primary, fallback).invoke({"input": "x"}), "from fallback")
+        self.assertEqual(primary.calls, 3)
+        self.assertEqual(fallback.calls, 1)
+
+    def test_bad_request_is_not_retried(self):
+        primary = FakeProvider("primary", (0, ProviderError(400)))
+        fallback = FakeProvider("fallback", (0, "from fallback"))
+        self.assertEqual(make_chain(primary, fallback).invoke({"input": "x"}), "from fallback")
+        self.assertEqual(primary.calls, 1)
+
+    def test_raises_last_error_when_every_model_fails(self):
+        primary = FakeProvider("primary", (0, ProviderError(500)))
+        fallback = FakeProvider("fallback", (0, ProviderError(502)))
+        with self.assertRaises(ProviderError) as ctx:
+            make_chain(primary, fallback).invoke({"input": "x"})
+        self.assertEqual(ctx.exception.code, 502)
+
+    def test_deadline_stops_waiting_on_a_slow_provider(self):
+        primary = FakeProvider("primary", (2, "too late"))
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeout):
+            make_chain(primary, deadline=0.3).invoke({"input": "x"})
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_hedged_request_wins_over_a_slow_first_request(self):
+        primary = FakeProvider("primary", (1.5, "slow"), (0, "hedged"))
+        started = time.monotonic()
+        result = make_chain(primary, deadline=3, hedge_after=0.1, hedging=True).invoke({"input": "x"})
+        self.assertEqual(result, "hedged")
+        self.assertEqual(primary.calls, 2)
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_hedge_threshold_follows_observed_p95(self):
+        for seconds in range(1, 21):
+            latencies.record("fake-p95", seconds / 10)
+        chain = ResilientChain([], "fake-p95", limits={"deadline": 5, "hedge_after": 9})
+        self.assertAlmostEqual(chain.hedge_after(), 1.9)
+
+    def test_usage_is_recorded_from_worker_threads(self):
+        primary = FakeProvider("primary", (0, ProviderError(503)), (0, "ok"))
+        with collect_usage() as usage:
+            make_chain(primary).invoke({"input": "x"})
+        self.assertEqual(len(usage.llm_calls), 2)
+        self.assertEqual(usage.input_tokens, 20)
+
+    def test_is_retryable(self):
+        self.assertTrue(is_retryable(TimeoutError()))
+        self.assertTrue(is_retryable(ProviderError(429)))
+        self.assertTrue(is_retryable(ProviderError(503)))
+        self.assertFalse(is_retryable(ProviderError(401)))
+
+
+def privacy_output(**overrides):
+    """Raw privacy policy output as the model returns it, valid unless overridden."""
+    data = {
+        "company_name": "Acme Pty Ltd",
+        "last_updated": "2026-01-01",
+        "introduction": ["Acme respects your privacy."],
+        "sections": [
+            {"section_number": n, "heading": f"Section {n}", "content": [f"Content {n}."], "subsections": []}
+            for n in range(1, 14)
+        ],
+        "complaints_process": ["Email us."],
+        "oaic_contact": ["www.oaic.gov.au"],
+        "contact_info": {"email": "privacy@acme.test", "website": "https://acme.test"},
+        "apps_addressed": list(range(1, 14)),
+    }
+    data.update(overrides)
+    return data
+
+
+class RepairTests(SimpleTestCase):
+
+    def no_llm(self, repair_schema, prompt):
+        self.fail("the model should not be asked again")
+
+    def test_common_defects_are_fixed_locally(self):
+        sections = privacy_output()["sections"]
+        sections[0]["content"] = "First paragraph.\n\nSecond paragraph."
+        del sections[1]["section_number"]
+        sections[2]["section_number"] = "3."
+
+        policy = repair_output(
+            StructuredPrivacyPolicy,
+            privacy_output(last_updated="Last Updated: 5 March 2026", sections=sections),
+            self.no_llm,
+        )
+
+        self.assertEqual(policy.last_updated, "2026-03-05")
+        self.assertEqual(policy.sections[0].content, ["First paragraph.", "Second paragraph."])
+        self.assertEqual([s.section_number for s in policy.sections[:3]], [1, 2, 3])
+
+    def test_only_the_broken_section_is_asked_for(self):
+        sections = privacy_output()["sections"]
+        del sections[4]["heading"]
+        asked = []
+
+        def ask(repair_schema, prompt):
+            asked.append(list(repair_schema.model_fields))
+            return {"sections_4": {"section_number": 99, "heading": "Notification", "content": ["Fixed."]}}
+
+        policy = repair_output(StructuredPrivacyPolicy, privacy_output(sections=sections), ask)
+
+        self.assertEqual(asked, [["sections_4"]])
+        self.assertEqual(policy.sections[4].heading, "Notification")
+        # the repaired section keeps its position
+        self.assertEqual(policy.sections[4].section_number, 5)
+        self.assertEqual(policy.sections[5].content, ["Content 6."])
+
+    def test_missing_sections_are_asked_for_without_the_rest(self):
+        asked = []
+
+        def ask(repair_schema, prompt):
+            asked.append(sorted(repair_schema.model_fields))
+            return {
+                name: {"section_number": 0, "heading": f"Extra {name}", "content": ["New."]}
+                for name in repair_schema.model_fields
+            }
+
+        policy = repair_output(
+            StructuredPrivacyPolicy, privacy_output(sections=privacy_output()["sections"][:11]), ask
+        )
+
+        self.assertEqual(asked, [["sections_11", "sections_12"]])
+        self.assertEqual([s.section_number for s in policy.sections], list(range(1, 14)))
+
+    def test_serializer_errors_map_to_fields_and_items(self):
+        errors = {"sections": [{}, {"heading": ["This field may not be blank."]}], "introduction": ["Required."], "id": ["x"]}
+        problems = problems_from_serializer_errors(StructuredPrivacyPolicy, errors)
+        self.assertEqual(sorted(problems), [("introduction",), ("sections", 1)])
+
+    def test_unknown_fields_are_dropped_for_strict_schemas(self):
+        self.assertNotIn("notes", coerce(StructuredPrivacyPolicy, privacy_output(notes="extra")))
+
+    def test_chain_repairs_unparsed_output(self):
+        raw = AIMessage(content=json.dumps(privacy_output(last_updated="Last Updated: 2026-02-01")))
+        provider = FakeProvider("primary", (0, {"raw": raw, "parsed": None, "parsing_error": ValueError("bad")}))
+        chain = ResilientChain([provider], "fake", schema=StructuredPrivacyPolicy, hedging=False,
+                               limits={"deadline": 2, "hedge_after": 5}, sleep=lambda seconds: None)
+
+        policy = chain.invoke({"input": "x"})
+
+        self.assertEqual(policy.last_updated, "2026-02-01")
+        self.assertEqual(provider.calls, 1)
+
+
+class AsyncResilientChainTests(SimpleTestCase):
+
+    def test_falls_back_after_attempts_run_out(self):
+        primary = FakeProvider("primary", (0, ProviderError(503)))
+        fallback = FakeProvider("fallback", (0, "fallback ok"))
+        result = asyncio.run(make_chain(primary, fallback).ainvoke({"input": "x"}))
+        self.assertEqual(result, "fallback ok")
+        self.assertEqual(primary.calls, 3)
+
+    def test_deadline_stops_waiting_on_a_slow_provider(self):
+        slow = FakeProvider("slow", (5, "late"))
+        started = time.monotonic()
+        with self.assertRaises(LLMTimeout):
+            asyncio.run(make_chain(slow, deadline=0.2).ainvoke({"input": "x"}))
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_hedged_request_wins_over_a_slow_first_request(self):
+        provider = FakeProvider("primary", (5, "slow"), (0, "hedged"))
+        chain = make_chain(provider, deadline=2, hedge_after=0.05, hedging=True)
+        with mock.patch.object(latencies, "p95", return_value=None):
+            self.assertEqual(asyncio.run(chain.ainvoke({"input": "x"})), "hedged")
+        self.assertEqual(provider.calls, 2)
+
+    def test_no_hedge_is_sent_when_the_deadline_comes_first(self):
+        slow = FakeProvider("slow", (5, "late"))
+        chain = make_chain(slow, deadline=0.2, hedge_after=5, hedging=True)
+        with mock.patch.object(latencies, "p95", return_value=None), \
+                mock.patch.object(slow, "ainvoke", wraps=slow.ainvoke) as ainvoke:
+            with self.assertRaises(LLMTimeout):
+                asyncio.run(chain.ainvoke({"input": "x"}))
+        self.assertEqual(ainvoke.call_count, 1)
+
+
+def fake_steps(query):
+    legal, examples = yield [Search(query, k=2), Search(query, k=1)]
+    result = yield Invoke(FakeProvider("primary", (0, "generated")), {"input": query})
+    return {"result": result, "retrieved": len(legal) + len(examples)}
+
+
+class PipelineTests(SimpleTestCase):
+
+    def test_run_executes_steps_with_blocking_clients(self):
+        with mock.patch("policy_generator.rag.store.similarity_search", side_effect=lambda q, k, filter=None: [q] * k):
+            self.assertEqual(run(fake_steps("q")), {"result": "generated", "retrieved": 3})
+
+    def test_pool_threads_close_their_database_connections(self):
+        threads = []
+
+        def close_old_connections():
+            threads.append(threading.current_thread().name)
+
+        with mock.patch("policy_generator.rag.store.similarity_search", side_effect=lambda q, k, filter=None: [q] * k), \
+                mock.patch("policy_generator.rag.pipeline.close_old_connections", side_effect=close_old_connections):
+            run(fake_steps("q"))
+        # before and after each of the two searches, never on the calling thread
+        self.assertEqual(len(threads), 4)
+        self.assertTrue(all(name.startswith("pipeline") for name in threads))
+
+    def test_arun_runs_steps_yielded_together_concurrently(self):
+
+        async def search(query, k, filter=None):
+            await asyncio.sleep(0.1)
+            return [query] * k
+
+        with mock.patch("policy_generator.rag.store.asimilarity_search", side_effect=search):
+            started = time.monotonic()
+            result = asyncio.run(arun(fake_steps("q")))
+
+        self.assertEqual(result, {"result": "generated", "retrieved": 3})
+        self.assertLess(time.monotonic() - started, 0.19)
+
+
+class CancellationTests(SimpleTestCase):
+
+    def test_run_stops_between_steps(self):
+        cancelled = []
+        searches = []
+
+        def search(query, k, filter=None):
+            searches.append(k)
+            cancelled.append(True)  # cancelled while the searches run
+            return [query] * k
+
+        with mock.patch("policy_generator.rag.store.similarity_search", side_effect=search):
+            with cancellable(lambda: bool(cancelled), poll_seconds=0):
+                with self.assertRaises(GenerationCancelled):
+                    run(fake_steps("q"))
+        self.assertEqual(searches, [2, 1])
+
+    def test_blocking_call_stops_waiting_once_cancelled(self):
+        slow = FakeProvider("slow", (5, "late"))
+        started = time.monotonic()
+        with cancellable(lambda: time.monotonic() - started > 0.1, poll_seconds=0.05):
+            with self.assertRaises(GenerationCancelled):
+                make_chain(slow, deadline=10).invoke({"input": "x"})
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(slow.calls, 1)
+
+    def test_run_cancellable_cancels_the_generation(self):
+        finished = []
+
+        async def generation():
+            await asyncio.sleep(5)
+            finished.append(True)
+
+        async def is_cancelled():
+            return True
+
+        with self.assertRaises(GenerationCancelled):
+            asyncio.run(run_cancellable(generation(), is_cancelled, poll_seconds=0.01))
+        self.assertEqual(finished, [])
+
+    def test_run_cancellable_returns_the_result(self):
+        async def generation():
+            await asyncio.sleep(0.01)
+            return "done"
+
+        async def is_cancelled():
+            return False
+
+        self.assertEqual(asyncio.run(run_cancellable(generation(), is_cancelled, poll_seconds=0.01)), "done")
+
+
+class SectionedGenerationTests(SimpleTestCase):
+
+    def setUp(self):
+        self.calls = []
+        self.running = self.peak = 0
+        self.outline = mock.Mock(sections=[
+            OutlineSection(section_number=n, heading=f"Heading {n}", covers=f"APP {n}") for n in range(13, 0, -1)
+        ])
+        frame = mock.Mock()
+        frame.model_dump.return_value = {k: v for k, v in privacy_output().items() if k != "sections"}
+
+        def provider(name, outcome):
+            fake = FakeProvider(name, (0.1, outcome))
+            invoke, ainvoke = fake.invoke, fake.ainvoke
+
+            async def tracked(inputs):
+                self.calls.append(inputs)
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+                try:
+                    return await ainvoke(inputs)
+                finally:
+                    self.running -= 1
+
+            fake.invoke = lambda inputs: self.calls.append(inputs) or invoke(inputs)
+            fake.ainvoke = tracked
+            return fake
+
+        self.chains = (
+            provider("outline", self.outline),
+            provider("frame", frame),
+            provider("section", PolicySection(section_number=99, heading="Drafted heading", content=["Text."])),
+        )
+        patcher = mock.patch("policy_generator.rag.sectioned._chains", return_value=self.chains)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @property
+    def prompts(self):
+        return [inputs["input"] for inputs in self.calls]
+
+    def steps(self):
+        docs = [mock.Mock(page_content=f"law about APP {n}") for n in range(1, 14)]
+        return sectioned_steps(
+            StructuredPrivacyPolicy,
+            lambda legal, examples: f"CONTEXT: {legal}\n=== OUTPUT ===\nGenerate the complete policy now.",
+            docs, [], min_sections=13, prefix="DOCUMENT RULES", section_instructions="SECTION RULES",
+        )
+
+    def test_sections_follow_the_outline(self):
+        policy = run(self.steps())
+
+        self.assertEqual([s["section_number"] for s in policy["sections"]], list(range(1, 14)))
+        self.assertEqual(policy["sections"][0]["heading"], "Heading 1")
+        self.assertEqual(policy["complaints_process"], ["Email us."])
+        # outline, then frame + 13 sections
+        self.assertEqual(len(self.prompts), 15)
+
+    def test_sections_are_generated_concurrently(self):
+        started = time.monotonic()
+        asyncio.run(arun(self.steps()))
+        # outline, then frame + 13 sections at once, 0.1s each: the time of two calls
+        self.assertEqual(self.peak, 14)
+        self.assertLess(time.monotonic() - started, 0.35)
+
+    def test_each_section_gets_its_own_context_and_instructions(self):
+        run(self.steps())
+        section = next(inputs for inputs in self.calls if 'section 5, "Heading 5"' in inputs["input"])
+        self.assertIn("law about APP 5", section["input"])
+        self.assertNotIn("law about APP 7", section["input"])
+        # asked for this section, not the whole document
+        self.assertNotIn("complete policy", section["input"])
+        self.assertTrue(section["prefix"].startswith("SECTION RULES"))
+        self.assertNotIn("complaints_process", section["prefix"])
+        self.assertEqual(self.calls[0]["prefix"], "DOCUMENT RULES")
+
+    def test_slice_context_keeps_retrieval_order(self):
+        docs = [mock.Mock(page_content=text) for text in ("cookies consent", "overseas disclosure", "cookies tracking")]
+        self.assertEqual(slice_context(docs, "cookies", 2), "cookies consent\n\n---\n\ncookies tracking")
+
+
+class FragmentTests(SimpleTestCase):
+    today = datetime(2026, 3, 5)
+
+    def test_model_is_not_asked_for_boilerplate_fields(self):
+        generated = without_fields(StructuredPrivacyPolicy, PRIVACY_FIELDS)
+        self.assertNotIn("oaic_contact", generated.model_fields)
+        self.assertNotIn("contact_info", generated.model_fields)
+        self.assertIn("sections", generated.model_fields)
+
+    def test_fragments_complete_the_document(self):
+        data = {k: v for k, v in privacy_output().items() if k not in PRIVACY_FIELDS}
+        policy = fill(
+            StructuredPrivacyPolicy, data,
+            privacy_fragments("Acme", "https://acme.test", "privacy@acme.test", "Not specified", self.today),
+        )
+
+        self.assertEqual(policy["last_updated"], "2026-03-05")
+        self.assertEqual(policy["oaic_contact"], OAIC_CONTACT)
+        self.assertEqual(policy["contact_info"]["email"], "privacy@acme.test")
+        self.assertIsNone(policy["contact_info"]["phone"])
+        self.assertIn("privacy@acme.test", policy["complaints_process"][0])
+
+    def test_cookie_links_come_from_the_library(self):
+        steps = _cookie_policy_steps(
+            company_name="Acme", business_description="Analytics", industry="SaaS",
+            website="https://acme.test", contact_email="hi@acme.test", phone_number="02 9000 0000",
+            essential_cookies=True, analytics_cookies=True, marketing_cookies=False,
+            advertising_cookies=False, functional_cookies=False,
+            third_party_services=["Google Analytics", "Hotjar"], cookie_duration="2 years",
+        )
+        steps.send(None)
+        invoke = steps.send([[], []])
+        self.assertNotIn("browser_instructions", invoke.chain.schema.model_fields)
+
+        generated = mock.Mock()
+        generated.model_dump.return_value = {
+            "introduction": ["We use cookies."],
+            "cookie_types": ["Essential", "Analytics"],
+            "sections": [{"section_number": n, "heading": f"Section {n}", "content": ["Text."]} for n in range(1, 9)],
+            "third_party_services": [
+                {"service_name": "Google Analytics", "purpose": ["Measurement"], "opt_out_link": "https://made-up.test"},
+                {"service_name": "Hotjar", "purpose": ["Heatmaps"], "opt_out_link": "https://made-up.test"},
+            ],
+            "cookie_duration": ["2 years"],
+        }
+        with self.assertRaises(StopIteration) as done:
+            steps.send(generated)
+        policy = done.exception.value
+
+        links = {s["service_name"]: s["opt_out_link"] for s in policy["third_party_services"]}
+        self.assertEqual(links, {"Google Analytics": "https://tools.google.com/dlpage/gaoptout/", "Hotjar": None})
+        self.assertEqual(len(policy["browser_instructions"]), 6)
+        self.assertEqual(policy["contact_phone"], "02 9000 0000")
+        StructuredCookiePolicy.model_validate(policy)
+
+
+class PromptCacheTests(SimpleTestCase):
+    prefix = "INSTRUCTIONS " * 50
+
+    def cache(self, backend, **kwargs):
+        # registrations run straight away instead of in the background
+        return PromptCache(backend, min_tokens=10, submit=lambda fn, *args: fn(*args), **kwargs)
+
+    def test_prefix_is_registered_once_and_then_served_from_the_cache(self):
+        backend = LocalContextCache()
+        cache = self.cache(backend)
+
+        with collect_usage() as usage:
+            self.assertEqual(cache.split("model", self.prefix), (None, self.prefix))
+            self.assertEqual(cache.split("model", self.prefix), (None, self.prefix))
+            self.assertEqual(cache.split("model", self.prefix), (None, self.prefix))
+
+        self.assertEqual(len(backend.prefixes), 1)
+        # the first request went inline while the prefix was registered
+        self.assertEqual(usage.cache_hits, 2)
+
+    def test_short_prefixes_are_not_registered(self):
+        backend = mock.Mock(remote=True)
+        cache = self.cache(backend)
+        self.assertIsNone(cache.lookup("model", "short"))
+        self.assertIsNone(cache.lookup("model", "short"))
+        backend.create.assert_not_called()
+
+    def test_only_the_suffix_is_sent_with_the_cache_and_rejections_go_inline(self):
+        backend = mock.Mock(remote=True)
+        backend.create.return_value = "cachedContents/abc"
+        cache = self.cache(backend)
+        cache.lookup("model", self.prefix)
+
+        sent = []
+
+        def structured_chain(model, schema, temperature, timeout, include_raw, cached_content=None):
+            def invoke(inputs):
+                sent.append((cached_content, inputs["input"]))
+                if cached_content:
+                    raise ProviderError(400)
+                return "ok"
+            return mock.Mock(invoke=invoke)
+
+        chain = PrefixCachedChain("model", None, 0.3, 10, include_raw=True, cache=cache)
+        with mock.patch("policy_generator.rag.llm.structured_chain", structured_chain):
+            self.assertEqual(chain.invoke({"prefix": self.prefix, "input": "SUFFIX"}), "ok")
+
+        self.assertEqual(sent, [("cachedContents/abc", "SUFFIX"), (None, self.prefix + "SUFFIX")])
+        # the rejected cache is not used again for a while
+        self.assertIsNone(cache.lookup("model", self.prefix))
+
+
+class CollectionTests(SimpleTestCase):
+    def setUp(self):
+        from qdrant_client import QdrantClient
+        from qdrant_client.models import Distance, PointStruct, VectorParams
+
+        self.client = QdrantClient(location=":memory:")
+        self.client.create_collection("laws", vectors_config=VectorParams(size=8, distance=Distance.COSINE))
+        rng = random.Random(0)
+        self.client.upsert("laws", points=[
+            PointStruct(id=i, vector=truncate([rng.uniform(-1, 1) for _ in range(8)], 8), payload={"page_content": f"chunk {i}"})
+            for i in range(40)
+        ])
+
+    def test_truncate_renormalises(self):
+        self.assertEqual(truncate([3.0, 4.0, 12.0], 2), [0.6, 0.8])
+
+    def test_copy_keeps_ids_and_payload_and_truncates_vectors(self):
+        with mock.patch("policy_generator.rag.collection.ensure_payload_indexes"):
+            copied = copy_collection(self.client, "laws", "laws_4", dimensions=4, quantization="scalar", on_disk_payload=True)
+
+        self.assertEqual(copied, 40)
+        record = self.client.retrieve("laws_4", ids=[3], with_vectors=True)[0]
+        self.assertEqual(record.payload, {"page_content": "chunk 3"})
+        self.assertEqual(len(record.vector), 4)
+
+    def test_report_measures_recall_against_exact_search(self):
+        with mock.patch("policy_generator.rag.collection.ensure_payload_indexes"):
+            rows = recall_report(self.client, "laws", [(8, "none"), (4, "none")], k=5, samples=10)
+
+        self.assertEqual(rows[0]["recall"], 1.0)
+        self.assertLessEqual(rows[1]["recall"], 1.0)
+        self.assertEqual(rows[1]["vector_ram_mb"], 40 * 4 * 4 / 1_000_000)
+        # the temporary collections are dropped
+        self.assertEqual([c.name for c in self.client.get_collections().collections], ["laws"])
+
+    def test_local_index_matches_qdrant_search(self):
+        from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+
+        self.client.set_payload("laws", payload={"metadata": {"doc_type": "law"}}, points=list(range(0, 40, 2)))
+        with tempfile.TemporaryDirectory() as path:
+            self.assertEqual(export_index(self.client, "laws", path, dtype="float32"), 40)
+            index = LocalIndex(path)
+
+            query = truncate([1, -2, 3, 0, 5, -1, 2, 4], 8)
+            expected = self.client.query_points("laws", query=query, limit=5, with_payload=True).points
+            self.assertEqual(
+                [d.page_content for d in index.search(query, 5)],
+                [p.payload["page_content"] for p in expected],
+            )
+
+            laws = Filter(must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="law"))])
+            expected = self.client.query_points("laws", query=query, limit=5, query_filter=laws, with_payload=True).points
+            self.assertEqual(
+                [d.page_content for d in index.search(query, 5, laws)],
+                [p.payload["page_content"] for p in expected],
+            )
+            self.assertEqual(index.search(query, 5, laws)[0].metadata, {"doc_type": "law"})
+
+            nothing = Filter(should=[FieldCondition(key="metadata.doc_type", match=MatchAny(any=["example"]))])
+            self.assertEqual(index.search(query, 5, nothing), [])
+
+    def test_filters_translate_to_sql_on_the_indexed_columns(self):
+        from qdrant_client.models import FieldCondition, Filter, MatchAny, MatchValue
+
+        sql, params = where(Filter(
+            must=[FieldCondition(key="metadata.doc_type", match=MatchValue(value="example"))],
+            should=[
+                FieldCondition(key="metadata.policy_type", match=MatchValue(value="Privacy Policy")),
+                FieldCondition(key="metadata.jurisdiction", match=MatchAny(any=["Australia"])),
+            ],
+        ))
+        self.assertEqual(sql, "(doc_type = %s) AND ((policy_type = %s) OR (metadata #>> %s = ANY(%s)))")
+        self.assertEqual(params, ["example", "Privacy Policy", ["jurisdiction"], ["Australia"]])
+
+    def test_benchmark_finds_the_chunk_each_query_came_from(self):
+        from langchain_core.embeddings import Embeddings
+
+        class Exact(Embeddings):
+            """Embeds a chunk (or a run of its words) as that chunk's stored vector."""
+
+            def __init__(inner, client):
+                inner.vectors = {
+                    r.payload["page_content"]: r.vector
+                    for r in client.scroll("laws", limit=100, with_payload=True, with_vectors=True)[0]
+                }
+
+            def embed_documents(inner, texts):
+                return [inner.embed_query(t) for t in texts]
+
+            def embed_query(inner, text):
+                return next((v for content, v in inner.vectors.items() if content.endswith(text)), [1.0] + [0.0] * 7)
+
+        rows = compare_embeddings(self.client, [("exact", Exact(self.client), "laws")], k=3, samples=10)
+        self.assertEqual(rows[0]["hit_rate"], 1.0)
+        self.assertEqual(rows[0]["mrr"], 1.0)
+
+
+class StartupTests(SimpleTestCase):
+    def test_loading_the_app_imports_no_llm_or_vector_sdk(self):
+        import os
+        import subprocess
+        import sys
+        from django.conf import settings
+        from .management.commands.startup_benchmark import HEAVY_MODULES, WSGI_READY
+
+        script = (
+            "import sys\n"
+            f"before = {{m for m in {HEAVY_MODULES!r} if m in sys.modules}}\n"
+            + WSGI_READY +
+            f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules and m not in before))\n"
+        )
+        env = {**os.environ, "RAG_WARM_UP": "false", "DJANGO_SETTINGS_MODULE": "CompliGen.settings"}
+        result = subprocess.run(
+            [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+
+class ReindexTests(SimpleTestCase):
+    def setUp(self):
+        from qdrant_client import QdrantClient
+
+        self.client = QdrantClient(location=":memory:")
+        self.embeddings = mock.Mock(embed_query=lambda text: [1.0, 0.0])
+
+    def build(self, name, doc_types=("law", "example")):
+        from qdrant_client.models import Distance, PointStruct, VectorParams
+
+        self.client.create_collection(name, vectors_config=VectorParams(size=2, distance=Distance.COSINE))
+        self.client.upsert(name, points=[
+            PointStruct(id=i, vector=[1.0, i / 10], payload={"page_content": f"chunk {i}", "metadata": {"doc_type": doc_type}})
+            for i, doc_type in enumerate(doc_types)
+        ])
+        return name
+
+    def test_versions_are_swapped_pruned_and_rolled_back(self):
+        for version in ("laws_v1", "laws_v2", "laws_v3"):
+            self.build(version)
+            validate_version(self.client, version, 2, self.embeddings, live=live_version(self.client, "laws"))
+            swap_alias(self.client, "laws", version)
+
+        self.assertEqual(live_version(self.client, "laws"), "laws_v3")
+        self.assertEqual(self.client.count("laws").count, 2)
+        self.assertEqual(prune_versions(self.client, "laws", keep=2), ["laws_v1"])
+        self.assertEqual(rollback(self.client, "laws"), "laws_v2")
+        self.assertEqual(versions(self.client, "laws"), ["laws_v2", "laws_v3"])
+        with self.assertRaises(ReindexError):
+            rollback(self.client, "laws")
+
+    def test_incomplete_versions_are_refused(self):
+        swap_alias(self.client, "laws", self.build("laws_v1"))
+        # fewer chunks than uploaded
+        with self.assertRaises(ReindexError):
+            validate_version(self.client, self.build("laws_v2"), 3, self.embeddings)
+        # no example chunks for the generators
+        with self.assertRaises(ReindexError):
+            validate_version(self.client, self.build("laws_v3", doc_types=("law", "law")), 2, self.embeddings)
+        self.assertEqual(live_version(self.client, "laws"), "laws_v1")
+
+    def test_a_plain_collection_must_be_adopted_first(self):
+        self.build("laws")
+        with self.assertRaises(ReindexError):
+            swap_alias(self.client, "laws", self.build("laws_v1"))
+
+
+class PgStoreReindexTests(TestCase):
+    def load(self, table, ids):
+        from langchain_core.documents import Document
+
+        embeddings = mock.Mock(embed_documents=lambda texts: [[1.0, 0.0] for _ in texts])
+        documents = [Document(page_content=f"chunk {id}", metadata={"doc_type": "law"}) for id in ids]
+        pg_store.add_documents(documents, ids, embeddings, table)
+
+    def test_reingestion_replaces_the_live_table_in_one_swap(self):
+        pg_store.create_table(dimensions=2)
+        self.load(pg_store.TABLE, ["a", "b"])
+
+        staging = pg_store.create_staging_table(dimensions=2)
+        self.load(staging, ["c", "d", "e"])
+        # searches still see only the old chunks while the new ones load
+        self.assertEqual(
+            sorted(d.page_content for d in pg_store.search([1.0, 0.0], 10)), ["chunk a", "chunk b"],
+        )
+        pg_store.validate_table(staging, 3)
+        pg_store.swap_table(staging)
+
+        self.assertEqual(
+            sorted(d.page_content for d in pg_store.search([1.0, 0.0], 10)), ["chunk c", "chunk d", "chunk e"],
+        )
+        self.assertEqual(pg_store.count(staging), 0)
+
+        # the next reingestion starts from an empty staging table again
+        staging = pg_store.create_staging_table(dimensions=2)
+        self.load(staging, ["c", "d", "e"])
+        pg_store.swap_table(staging)
+        self.assertEqual(pg_store.count(), 3)
+
+    def test_incomplete_tables_are_refused(self):
+        pg_store.create_table(dimensions=2)
+        self.load(pg_store.TABLE, ["a", "b", "c"])
+        staging = pg_store.create_staging_table(dimensions=2)
+        self.load(staging, ["a"])
+        # fewer chunks than uploaded
+        with self.assertRaises(ReindexError):
+            pg_store.validate_table(staging, 2)
+        # much smaller than the live table
+        with self.assertRaises(ReindexError):
+            pg_store.validate_table(staging, 1)
+
+
+class SingleFlightTests(SimpleTestCase):
+    """single_flight() with the Postgres rows replaced by one in-memory record."""
+
+    def setUp(self):
+        self.record = mock.Mock(customer_linked_id=1, key="k", replayable=False, state="running")
+        self.claims = iter([(self.record, True)] + [(self.record, False)] * 5)
+        self.finished = []
+        patches = [
+            mock.patch("policy_generator.idempotency.claim", side_effect=lambda *args: next(self.claims)),
+            mock.patch("policy_generator.idempotency.finish", side_effect=lambda record, *outcome: self.finished.append(outcome)),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_concurrent_requests_share_one_generation(self):
+        calls = []
+
+        async def compute():
+            calls.append(True)
+            await asyncio.sleep(0.05)
+            return 200, {"id": 7}
+
+        async def requests():
+            return await asyncio.gather(*(single_flight("customer", "", "/p", {}, compute) for _ in range(3)))
+
+        results = asyncio.run(requests())
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([replayed for _, _, replayed in results], [False, True, True])
+        self.assertEqual({(status, body["id"]) for status, body, _ in results}, {(200, 7)})
+        self.assertEqual(self.finished, [(200, {"id": 7})])
+
+    def test_a_generation_with_a_key_outlives_its_request(self):
+        self.record.replayable = True
+
+        async def compute():
+            await asyncio.sleep(0.05)
+            return 200, {"id": 7}
+
+        async def disconnect():
+            request = asyncio.ensure_future(single_flight("customer", "k", "/p", {}, compute))
+            await asyncio.sleep(0.01)
+            request.cancel()
+            await asyncio.sleep(0.1)
+
+        asyncio.run(disconnect())
+        self.assertEqual(self.finished, [(200, {"id": 7})])
+
+    def test_a_generation_without_a_key_stops_with_its_last_request(self):
+        async def compute():
+            await asyncio.sleep(5)
+            return 200, {}
+
+        async def disconnect():
+            request = asyncio.ensure_future(single_flight("customer", "", "/p", {}, compute))
+            await asyncio.sleep(0.01)
+            request.cancel()
+            await asyncio.sleep(0.05)
+
+        asyncio.run(disconnect())
+        self.assertEqual(self.finished, [(409, {"error": "Generation was cancelled"})])
+
+    def test_fingerprint_ignores_key_order(self):
+        self.assertEqual(request_fingerprint("/p", {"a": 1, "b": 2}), request_fingerprint("/p", {"b": 2, "a": 1}))
+        self.assertNotEqual(request_fingerprint("/p", {"a": 1}), request_fingerprint("/q", {"a": 1}))
+
+
+class ClaimTests(TestCase):
+    def setUp(self):
+        self.customer, _ = aup_customer()
+
+    def test_a_request_with_a_key_is_replayed_after_it_finished(self):
+        record, leader = claim(self.customer, "k", "/p", {"a": 1})
+        self.assertTrue(leader)
+        finish(record, 201, {"id": 7})
+
+        record, leader = claim(self.customer, "k", "/p", {"a": 1})
+        self.assertFalse(leader)
+        self.assertEqual((record.status_code, record.response), (201, {"id": 7}))
+
+    def test_a_request_without_a_key_is_not_replayed_after_it_finished(self):
+        record, leader = claim(self.customer, "", "/p", {"a": 1})
+        self.assertTrue(leader)
+        # an identical request arriving meanwhile shares the running generation
+        self.assertFalse(claim(self.customer, "", "/p", {"a": 1})[1])
+        finish(record, 201, {"id": 7})
+
+        record, leader = claim(self.customer, "", "/p", {"a": 1})
+        self.assertTrue(leader)
+        self.assertEqual(record.state, GenerationRequest.RUNNING)
+        self.assertIsNone(record.response)
+
+
+class RevisionTests(SimpleTestCase):
+
+    def setUp(self):
+        self.base = {
+            "company_name": "Acme",
+            "last_updated": "2026-01-01",
+            "sections": [
+                {"section_number": n, "heading": f"Heading {n}", "content": [f"Text {n}"]} for n in range(1, 6)
+            ],
+        }
+
+    def edited(self, **changes):
+        content = json.loads(json.dumps(self.base))
+        for number, text in changes.items():
+            content["sections"][int(number[1:]) - 1]["content"] = [text]
+        return content
+
+    def test_delta_round_trips(self):
+        new = self.edited(s2="Changed")
+        new["company_name"] = "Acme Pty Ltd"
+        new["sections"].pop()  # section 5 removed
+        new["sections"].append({"section_number": 6, "heading": "New", "content": ["Added"]})
+
+        delta = make_delta(self.base, new)
+        self.assertEqual(set(delta["sections"]), {"2", "6"})
+        self.assertEqual(apply_delta(self.base, json.loads(json.dumps(delta))), new)
+
+        changes = diff_contents(self.base, new)
+        self.assertEqual(list(changes["fields"]), ["company_name"])
+        self.assertEqual(
+            [(s["section_number"], s["change"]) for s in changes["sections"]],
+            [(2, "changed"), (5, "removed"), (6, "added")],
+        )
+
+    def test_revisions_on_one_snapshot_diff_like_their_contents(self):
+        snapshot = PolicyRevision(id=1, number=1, snapshot=self.base)
+        first = self.edited(s2="Changed", s4="Changed")
+        second = self.edited(s2="Changed", s3="Changed")
+        revisions = [
+            PolicyRevision(id=n, number=n, base=snapshot, delta=make_delta(self.base, content))
+            for n, content in ((2, first), (3, second))
+        ]
+
+        self.assertEqual(diff_revisions(*revisions), diff_contents(first, second))
+        self.assertEqual(diff_revisions(snapshot, revisions[1]), diff_contents(self.base, second))
+        self.assertEqual([s["section_number"] for s in diff_revisions(*revisions)["sections"]], [3, 4])
+
+
+class RevisionDeletionTests(TestCase):
+
+    def setUp(self):
+        self.customer, self.first = aup_customer()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+        self.document_id = record_revision(self.customer, "aup", self.first).document_id
+
+        # an update saved before updates deleted the rows they replace: a new
+        # row with section 2 rewritten, stored as a delta on the first one
+        self.second = AcceptableUsePolicy.objects.get(id=self.first.id)
+        self.second.pk = None
+        self.second.save()
+        AUPSection.objects.bulk_create([
+            AUPSection(policy=self.second, section_number=n, heading=f"Heading {n}", content=["Rewritten" if n == 2 else f"Text {n}"])
+            for n in (1, 2, 3)
+        ])
+        self.assertIsNotNone(record_revision(self.customer, "aup", self.second, "update", self.first.id).delta)
+
+    def revision(self, number):
+        return self.client.get(f"/documents/generate/api/documents/{self.document_id}/revisions/{number}")
+
+    def test_a_deleted_policy_cannot_be_read_from_its_revisions(self):
+        self.assertEqual(self.client.delete(f"/documents/generate/api/aup/{self.first.id}").status_code, 204)
+
+        self.assertEqual(self.revision(1).status_code, 404)
+        # the update stored as a delta on it still reads back whole
+        response = self.revision(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["policy_id"], self.second.id)
+        self.assertEqual([s["content"] for s in response.data["content"]["sections"]], [["Text 1"], ["Rewritten"], ["Text 3"]])
+        self.assertEqual(
+            [d["latest_policy_id"] for d in self.client.get("/documents/generate/api/documents").data], [self.second.id],
+        )
+
+        self.assertEqual(self.client.delete(f"/documents/generate/api/aup/{self.second.id}").status_code, 204)
+        self.assertEqual(self.revision(2).status_code, 404)
+        self.assertEqual(self.client.get("/documents/generate/api/documents").data, [])
+        self.assertFalse(PolicyRevision.objects.exists())
+
+    def test_documents_are_listed_by_known_policy_type(self):
+        self.assertEqual(len(self.client.get("/documents/generate/api/documents?policy_type=aup").data), 1)
+        self.assertEqual(self.client.get("/documents/generate/api/documents?policy_type=tos").data, [])
+        self.assertEqual(self.client.get("/documents/generate/api/documents?policy_type=eula").status_code, 400)
+
+    def test_deleting_the_latest_policy_deletes_the_history(self):
+        self.assertEqual(self.client.delete(f"/documents/generate/api/aup/{self.second.id}").status_code, 204)
+
+        self.assertEqual(self.revision(1).status_code, 404)
+        self.assertEqual(self.client.get("/documents/generate/api/documents").data, [])
+        self.assertFalse(PolicyRevision.objects.exists())
+
+
+class ExportTests(SimpleTestCase):
+
+    def test_outline_follows_the_policy_structure(self):
+        title, meta, blocks = outline("dpa", {
+            "company_name": "Acme",
+            "contact_email": "privacy@acme.test",
+            "phone_number": None,
+            "role_controller_or_processor": ["Processor"],
+            "sections": [{
+                "section_number": 1,
+                "heading": "Scope",
+                "content": ["One", "Two"],
+                "subsections": [{"subsection_number": "1.1", "heading": "Detail", "content": ["Three"]}],
+            }],
+            "annex_b": {"technical_measures": ["Encryption"], "organisational_measures": []},
+        })
+        self.assertEqual(title, "Data Processing Agreement")
+        self.assertEqual(meta, [("Company", "Acme"), ("Contact", "privacy@acme.test")])
+        self.assertEqual(blocks, [
+            ("heading", "Role", 1), ("bullet", "Processor"),
+            ("heading", "1. Scope", 1), ("paragraph", "One"), ("paragraph", "Two"),
+            ("heading", "1.1 Detail", 2), ("paragraph", "Three"),
+            ("heading", "Annex B – Technical and Organisational Measures", 1),
+            ("heading", "Technical Measures", 2), ("bullet", "Encryption"),
+        ])
+
+    def test_cache_evicts_the_least_recently_used_files(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = RenderCache(directory, max_bytes=25)
+            cache.put("a.pdf", b"x" * 10)
+            cache.put("b.pdf", b"x" * 10)
+            # make a the older file, then read it so b is the least recently used
+            os.utime(cache.path("a.pdf"), (1, 1))
+            self.assertIsNotNone(cache.get("a.pdf"))
+            os.utime(cache.path("b.pdf"), (2, 2))
+
+            cache.put("c.pdf", b"x" * 10)
+            self.assertIsNone(cache.get("b.pdf"))
+            self.assertEqual(cache.path("a.pdf").read_bytes(), b"x" * 10)
+            self.assertIsNotNone(cache.get("c.pdf"))
+
+    def test_a_policy_is_rendered_once_then_read_from_the_cache(self):
+        policy = mock.Mock(id=1, updated_at=datetime(2025, 1, 2))
+        serializer = mock.Mock(return_value=mock.Mock(data={}))
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch("policy_generator.export._cache", RenderCache(directory, max_bytes=1000)), \
+                mock.patch.dict("policy_generator.export.POLICY_MODELS", {"aup": (None, serializer)}), \
+                mock.patch("policy_generator.export.render", return_value=b"%PDF aup") as render:
+            stream, hit = open_rendered("aup", policy, "pdf")
+            with stream:
+                self.assertEqual((stream.read(), hit), (b"%PDF aup", False))
+            stream, hit = open_rendered("aup", policy, "pdf")
+            with stream:
+                self.assertEqual((stream.read(), hit), (b"%PDF aup", True))
+            self.assertEqual(rendered("aup", policy, "pdf"), b"%PDF aup")
+        render.assert_called_once()
+
+    def test_bulk_zip_is_streamed_per_policy(self):
+        policies = [
+            ("aup", mock.Mock(id=1, company_name="Acme", updated_at=datetime(2025, 1, 2))),
+            ("tos", mock.Mock(id=2, company_name="Acme", updated_at=datetime(2025, 1, 3))),
+        ]
+
+        def rendered(policy_type, policy, fmt):
+            if policy_type == "tos":
+                raise ValueError("broken")
+            return b"%PDF aup"
+
+        with mock.patch("policy_generator.export.customer_policies", return_value=iter(policies)), \
+                mock.patch("policy_generator.export.rendered", side_effect=rendered):
+            chunks = list(zip_chunks(customer=None, fmt="pdf"))
+
+        # the first file is sent before the next policy is rendered
+        self.assertGreater(len(chunks), 1)
+        self.assertIn(b"%PDF aup", chunks[0])
+        with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertEqual(archive.namelist(), ["aup/1_Acceptable_Use_Policy_Acme.pdf", "FAILED.txt"])
+            self.assertIn("tos/2_Terms_of_Service_Acme.pdf", archive.read("FAILED.txt").decode())
+
+
+class BulkExportTests(TestCase):
+
+    def add_tos(self, customer, count):
+        for _ in range(count):
+            tos = TermsOfService.objects.create(
+                customer_linked=customer,
+                company_name="Acme",
+                last_updated="2026-01-01",
+                website_url="https://acme.test",
+                contact_email="legal@acme.test",
+            )
+            ToSSection.objects.bulk_create([
+                ToSSection(terms=tos, section_number=n, heading=f"Heading {n}", content=[f"Text {n}"]) for n in (2, 1)
+            ])
+
+    def test_export_queries_do_not_grow_with_the_policies(self):
+        customer, _ = aup_customer()
+        self.add_tos(customer, 1)
+        with CaptureQueriesContext(connection) as one:
+            list(ndjson_lines(customer))
+
+        self.add_tos(customer, 4)
+        with self.assertNumQueries(len(one)):
+            lines = [json.loads(line) for line in ndjson_lines(customer)]
+        tos = [line for line in lines if line["policy_type"] == "tos"]
+        self.assertEqual(len(tos), 5)
+        self.assertEqual([section["section_number"] for section in tos[0]["sections"]], [1, 2])
+
+
+class SearchTests(SimpleTestCase):
+
+    def test_every_section_table_selects_the_same_columns(self):
+        # the per-table matches are combined with UNION ALL
+        query = parse_query("refund")
+        columns = [list(_matches(source, None, query).query.annotation_select) for source in range(len(SOURCES))]
+        self.assertTrue(all(names == columns[0] for names in columns))
+        self.assertEqual(columns[0][-1], "hit_rank")
+
+    def test_highlight_escapes_the_policy_text(self):
+        self.assertEqual(
+            _highlight("Email <support@acme.test> for a \x02refund\x03 & more"),
+            "Email &lt;support@acme.test&gt; for a <mark>refund</mark> &amp; more",
+        )
+
+
+class LoadTestReportTests(SimpleTestCase):
+
+    def test_percentiles_and_query_budgets_per_endpoint(self):
+        self.assertEqual(percentile([5, 1, 4, 2, 3], 50), 3)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        self.assertEqual(percentile([7], 99), 7)
+
+        stats = Stats()
+        for queries in (3, 3, 9):
+            stats.record("search", 0.01, queries, True)
+        stats.record("list privacy", 0.02, 80, False)
+        rows = {row["endpoint"]: row for row in stats.summary(wall_seconds=2)}
+        self.assertEqual((rows["search"]["requests"], rows["search"]["queries_max"]), (3, 9))
+        self.assertEqual(rows["search"]["throughput"], 1.5)
+        self.assertEqual(rows["list privacy"]["errors"], 1)
+
+        # lists have no budget; "generate aup" falls under "generate"
+        stats.record("generate aup", 0.5, 71, True)
+        self.assertEqual(
+            over_budget(stats.summary(wall_seconds=2), {"search": 8, "generate": 70}),
+            [("search", 9, 8), ("generate aup", 71, 70)],
+        )
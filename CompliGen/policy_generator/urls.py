@@ -16,7 +16,45 @@ urlpatterns = [
     path('api/cookie/<int:id>', CookiePolicyDeleteView.as_view(), name='cookie-delete'),
     path('api/dpa/<int:id>', DataProcessingAgreementDeleteView.as_view(), name='dpa-delete'),
     path('api/aup/<int:id>', AcceptableUsePolicyDeleteView.as_view(), name='aup-delete'),
-    path('api/dashboard', DashboardView.as_view(), name='dashboard')
+
+    # regenerating a single section of an existing policy
+    path('api/tos/<int:id>/sections/<int:section_number>', TermsOfServiceSectionView.as_view(), name='tos-section'),
+    path('api/privacypolicy/<int:id>/sections/<int:section_number>', PrivacyPolicySectionView.as_view(), name='privacy-section'),
+    path('api/cookie/<int:id>/sections/<int:section_number>', CookiePolicySectionView.as_view(), name='cookie-section'),
+    path('api/dpa/<int:id>/sections/<int:section_number>', DataProcessingAgreementSectionView.as_view(), name='dpa-section'),
+    path('api/aup/<int:id>/sections/<int:section_number>', AcceptableUsePolicySectionView.as_view(), name='aup-section'),
+
+    # incremental update after a change to the company profile
+    path('api/tos/<int:id>/update', TermsOfServiceUpdateView.as_view(), name='tos-update'),
+    path('api/privacypolicy/<int:id>/update', PrivacyPolicyUpdateView.as_view(), name='privacy-update'),
+    path('api/cookie/<int:id>/update', CookiePolicyUpdateView.as_view(), name='cookie-update'),
+    path('api/dpa/<int:id>/update', DataProcessingAgreementUpdateView.as_view(), name='dpa-update'),
+    path('api/aup/<int:id>/update', AcceptableUsePolicyUpdateView.as_view(), name='aup-update'),
+
+    # server-side PDF/DOCX download
+    path('api/tos/<int:id>/export/<str:fmt>', TermsOfServiceExportView.as_view(), name='tos-export'),
+    path('api/privacypolicy/<int:id>/export/<str:fmt>', PrivacyPolicyExportView.as_view(), name='privacy-export'),
+    path('api/cookie/<int:id>/export/<str:fmt>', CookiePolicyExportView.as_view(), name='cookie-export'),
+    path('api/dpa/<int:id>/export/<str:fmt>', DataProcessingAgreementExportView.as_view(), name='dpa-export'),
+    path('api/aup/<int:id>/export/<str:fmt>', AcceptableUsePolicyExportView.as_view(), name='aup-export'),
+
+    # every policy of the user at once (ndjson or zip)
+    path('api/export/<str:kind>', BulkExportView.as_view(), name='bulk-export'),
+
+    path('api/dashboard', DashboardView.as_view(), name='dashboard'),
+    path('api/usage', UsageView.as_view(), name='usage'),
+
+    # revision history of a document across its generations
+    path('api/documents', PolicyDocumentListView.as_view(), name='documents'),
+    path('api/documents/<int:id>/revisions', PolicyRevisionListView.as_view(), name='document-revisions'),
+    path('api/documents/<int:id>/revisions/<int:number>', PolicyRevisionView.as_view(), name='document-revision'),
+    path('api/documents/<int:id>/diff', PolicyRevisionDiffView.as_view(), name='document-diff'),
+
+    # full-text search over the sections of all the user's policies
+    path('api/search', PolicySearchView.as_view(), name='search'),
+
+    # cancelling a running generation started with an X-Request-ID header
+    path('api/generations/<str:request_id>', GenerationCancelView.as_view(), name='generation-cancel'),
 ]
 
     
\ No newline at end of file
@@ -30,11 +30,50 @@ from .rag.cookie_policy import *
 from .rag.data_processing_agreement import *
 from .rag.privacy_policy import *
 from .rag.terms_of_service import *
+from .rag.section_regeneration import regenerate_field, regenerate_section
+from .rag.profile_diff import APP_HEADINGS, SUMMARY_FIELDS, plan_update, apply_local_changes
+from .rag.llm import LLMTimeout, aask_repair, ask_repair
+from .rag.cancellation import GenerationCancelled, raise_if_cancelled, run_cancellable
+from .rag.repair import arepair_fields, coerce, problems_from_serializer_errors, repair_fields
+from .rag.privacy_output import StructuredPrivacyPolicy
+from .rag.cookie_output import StructuredCookiePolicy
+from .rag.policy_outputs import (
+    StructuredAcceptableUsePolicy,
+    StructuredDataProcessingAgreement,
+    StructuredTermsOfService,
+)
+from .accounting import atrack_generation, track_generation
+from .revisions import POLICY_MODELS, diff_revisions, forget_policy, materialize, record_revision, save_revision
+from . import export, search
+from .idempotency import IdempotencyConflict, single_flight
+from .admission import (
+    GenerationAdmissionMixin,
+    GenerationThrottled,
+    acquire_slot,
+    cancel_requested,
+    release_slot,
+    request_cancel,
+)
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
-from django.db import IntegrityError
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from django.contrib.postgres.fields import ArrayField
+from django.db import IntegrityError, transaction
+from django.db.models import Avg, Count, F, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+import json
 import traceback
 import logging
 
@@ -55,7 +94,7 @@ def log_exception(logger, request, exc, context):
 
     Args:
         logger: Python logger instance
-        request: DRF request object
+        request: DRF or Django request object
         exc: Exception that was raised
         context: String describing the error context (e.g., "PrivacyPolicy IntegrityError")
     """
@@ -65,114 +104,308 @@ def log_exception(logger, request, exc, context):
         extra={
             "path": request.path,
             "method": request.method,
-            "payload": request.data,
+            # plain Django requests (async views) have no parsed .data
+            "payload": getattr(request, "data", None),
         },
     )
 
 
+def _check_serializer(serializer_class, data, schema, context):
+    """
+    First two passes of validated_serializer(): as generated, then coerced.
+
+    Returns:
+        (serializer, None) once valid, or (None, problems) for the model to repair
+    """
+    serializer = serializer_class(data=data, context=context or {})
+    if serializer.is_valid():
+        return serializer, None
+
+    problems = problems_from_serializer_errors(schema, serializer.errors)
+    if not problems:
+        serializer.is_valid(raise_exception=True)
+
+    data.update(coerce(schema, data))
+    serializer = serializer_class(data=data, context=context or {})
+    if serializer.is_valid():
+        return serializer, None
+
+    return None, problems_from_serializer_errors(schema, serializer.errors)
+
+
+def validated_serializer(serializer_class, data, schema, context=None):
+    """
+    Validate generated output with its create serializer, repairing it if needed.
+
+    Output that passed the Pydantic schema can still fail the serializer
+    (e.g. a field the model models more strictly). Instead of failing the
+    whole generation, the common defects are fixed locally and the model is
+    asked again for only the fields the serializer rejected. `data` is
+    updated in place so the response matches what is saved.
+
+    Raises:
+        serializers.ValidationError: If the output is still invalid
+    """
+    serializer, problems = _check_serializer(serializer_class, data, schema, context)
+    if serializer is not None:
+        return serializer
+
+    data.update(repair_fields(schema, coerce(schema, data), problems, ask_repair))
+
+    serializer = serializer_class(data=data, context=context or {})
+    serializer.is_valid(raise_exception=True)
+    return serializer
+
+
 # =============================================================================
-# PRIVACY POLICY VIEWS
+# ASYNC GENERATION VIEWS
+# Generation is almost all waiting on Qdrant, OpenAI and Gemini, so the
+# generate/list endpoints are native async views. Under ASGI (uvicorn) one
+# process holds many in-flight generations instead of one per worker thread.
+# DRF's APIView is sync only, so these are plain Django views doing the same
+# JWT authentication, admission control and error responses themselves.
 # =============================================================================
 
-class PrivacyPolicyView(APIView):
+async def authenticate_jwt(request):
     """
-    Generate and retrieve Privacy Policies compliant with Australian Privacy Act 1988.
+    Authenticate the request with SimpleJWT, like the DRF views do.
 
-    POST: Generate a new privacy policy using RAG pipeline
-        - Retrieves relevant legal context (Privacy Act, APPs)
-        - Retrieves industry-specific examples from vector store
-        - Generates structured policy via Gemini with Pydantic validation
-        - Stores policy with nested sections in PostgreSQL
+    Returns:
+        The user, or a 401 JsonResponse in DRF's error format
+    """
+    try:
+        result = await sync_to_async(JWTAuthentication().authenticate)(request)
+    except AuthenticationFailed as e:
+        # same body as DRF's exception handler
+        data = e.detail if isinstance(e.detail, (list, dict)) else {"detail": e.detail}
+        return JsonResponse(data, safe=False, status=401, encoder=DjangoJSONEncoder)
 
-    GET: Retrieve all privacy policies for the authenticated user
-        - Returns policies ordered by creation date (newest first)
-        - Includes all nested sections and subsections
+    if result is None:
+        return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+    return result[0]
 
-    Endpoints:
-        POST /documents/generate/api/privacypolicy
-        GET /documents/generate/api/privacypolicy
+
+async def avalidated_serializer(serializer_class, data, schema, context=None):
+    """validated_serializer() for async views; the repair call is awaited, not run on a thread."""
+    serializer, problems = await sync_to_async(_check_serializer)(serializer_class, data, schema, context)
+    if serializer is not None:
+        return serializer
+
+    data.update(await arepair_fields(schema, coerce(schema, data), problems, aask_repair))
+
+    serializer = serializer_class(data=data, context=context or {})
+    await sync_to_async(serializer.is_valid)(raise_exception=True)
+    return serializer
+
+
+class AsyncGenerationView(View):
     """
-    permission_classes = [IsAuthenticated]
+    Generate (POST) and list (GET) one policy type, asynchronously.
+
+    POST runs the step generator of the policy type with the async clients
+    (see rag/pipeline.py), then validates and saves the output with the
+    create serializer. GET lists the customer's policies, newest first.
+
+    A generation stops, and nothing is saved, when the client disconnects or
+    cancels it with DELETE api/generations/<X-Request-ID>.
+
+    A POST with an Idempotency-Key header that is retried attaches to the
+    running generation, or gets its stored response once it has finished;
+    identical POSTs sent at the same time share one generation even without
+    a key (see idempotency.py). Admission control applies to the one request
+    that runs it.
+
+    Subclasses set:
+        policy_type: Key used for usage accounting and LLM limits
+        log_context: Prefix of the log messages
+        generate: Async generation function (agenerate_*)
+        schema: Pydantic schema of the generated output
+        create_serializer / read_serializer: DRF serializers for saving / listing
+        model: Policy model
+    """
+    policy_type = None
+    log_context = None
+    generate = None
+    schema = None
+    create_serializer = None
+    read_serializer = None
+    model = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        # authentication is by JWT header, not session cookie (same as APIView)
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        user = await authenticate_jwt(request)
+        if isinstance(user, JsonResponse):
+            return user
+        request.user = user
+        return await super().dispatch(request, *args, **kwargs)
+
+    async def post(self, request):
+        """Generate a new policy using the RAG pipeline."""
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"detail": "JSON parse error"}, status=400)
+
+        customer = await Customer.objects.filter(user=request.user).afirst()
+        if customer is None:
+            return await self._admitted(request, customer, data)
+
+        # a retried or duplicated POST shares one generation (see idempotency.py)
+        async def compute():
+            response = await self._admitted(request, customer, data)
+            return response.status_code, json.loads(response.content)
 
-    def post(self, request):
-        """Generate a new privacy policy using the RAG pipeline."""
         try:
-            user = request.user
-            data = request.data
-
-            # Get customer record to link policy ownership
-            customer = Customer.objects.filter(user=user).first()
-
-            # === RAG PIPELINE EXECUTION ===
-            # 1. Retrieves relevant legal docs from QdrantDB (Privacy Act, APPs)
-            # 2. Retrieves industry-specific policy examples
-            # 3. Constructs prompt with retrieved context + user data
-            # 4. Generates structured policy via Gemini LLM
-            # 5. Validates output against Pydantic schema
-            generated_policy = generate_privacy_policy(**data)
-
-            # Validate LLM output and save to database
-            # Serializer handles nested section creation via nested serializers
-            serializer = PrivacyPolicyCreateSerializer(
-                data=generated_policy,
-                context={"customer": customer}  # Pass customer for foreign key
+            status_code, body, replayed = await single_flight(
+                customer, request.headers.get("Idempotency-Key", ""), request.path, data, compute
             )
-            serializer.is_valid(raise_exception=True)
-            saved_obj = serializer.save()
+        except IdempotencyConflict as e:
+            return JsonResponse({"error": str(e)}, status=422)
+
+        response = JsonResponse(body, safe=False, status=status_code, encoder=DjangoJSONEncoder)
+        if status_code == 429 and isinstance(body, dict) and "retry_after" in body:
+            response["Retry-After"] = str(body["retry_after"])
+        if replayed:
+            response["Idempotent-Replayed"] = "true"
+        return response
+
+    async def _admitted(self, request, customer, data):
+        # admission control, as GenerationAdmissionMixin does for the sync views
+        slot = None
+        request_id = request.headers.get("X-Request-ID", "")
+        if customer is not None:
+            priority = "bulk" if request.headers.get("X-Generation-Priority", "").lower() == "bulk" else "interactive"
+            try:
+                slot = await sync_to_async(acquire_slot)(
+                    customer, priority=priority, path=request.path, request_id=request_id
+                )
+            except GenerationThrottled as e:
+                response = JsonResponse({"error": e.message, "retry_after": e.wait}, status=429)
+                response["Retry-After"] = str(e.wait)
+                return response
+
+        try:
+            generation = self._generate(request, customer, data, slot)
+            if slot is None or not request_id:
+                return await generation
+
+            # DELETE api/generations/<request_id> stops the generation; a client
+            # disconnect cancels this task (and the generation) by itself
+            return await run_cancellable(generation, lambda: sync_to_async(cancel_requested)(slot))
+
+        except GenerationCancelled:
+            logger.info(f"{self.log_context} cancelled for user_id={request.user.id}")
+            return JsonResponse({"error": "Generation was cancelled"}, status=409)
+
+        finally:
+            await sync_to_async(release_slot)(slot)
+
+    async def _generate(self, request, customer, data, slot):
+        try:
+            async with atrack_generation(customer, self.policy_type) as usage:
+                generated_policy = await self.generate(**data)
+
+                # Validate LLM output and save to database
+                serializer = await avalidated_serializer(
+                    self.create_serializer,
+                    generated_policy,
+                    self.schema,
+                    context={"customer": customer}  # Pass customer for foreign key
+                )
+
+                # nothing is saved for a generation the client gave up on
+                if slot is not None and slot.request_id and await sync_to_async(cancel_requested)(slot):
+                    raise GenerationCancelled("Generation was cancelled")
+                saved_obj, revision = await sync_to_async(save_revision)(
+                    serializer, customer, self.policy_type, input_profile=data
+                )
+                usage.policy_id = saved_obj.id
 
             # Attach database ID for frontend reference
             generated_policy["id"] = saved_obj.id
-            return Response(generated_policy, status=200)
+            generated_policy["document_id"] = revision.document_id
+            generated_policy["revision"] = revision.number
+            return JsonResponse(generated_policy, status=200, encoder=DjangoJSONEncoder)
+
+        except GenerationCancelled:
+            raise
 
         except IntegrityError as e:
             # Database constraint violation (e.g., duplicate, null constraint)
-            log_exception(logger, request, e, "PrivacyPolicy IntegrityError")
-            return Response(
-                {"error": "Policy failed to generate. Please retry"},
-                status=500
-            )
+            log_exception(logger, request, e, f"{self.log_context} IntegrityError")
+            return JsonResponse({"error": "Policy failed to generate. Please retry"}, status=500)
+
+        except LLMTimeout as e:
+            # the model did not answer within the deadline for this policy type
+            log_exception(logger, request, e, f"{self.log_context} Timeout")
+            return JsonResponse({"error": "Policy failed to generate in time. Please retry"}, status=504)
 
         except serializers.ValidationError as e:
             # LLM output didn't match expected schema structure
-            log_exception(logger, request, e, "PrivacyPolicy ValidationError")
-            return Response(
-                {"error": "Policy failed to generate. Please retry"},
-                status=500
-            )
+            log_exception(logger, request, e, f"{self.log_context} ValidationError")
+            return JsonResponse({"error": "Policy failed to generate. Please retry"}, status=500)
 
         except Exception as e:
             # Catch-all for LLM errors, network issues, etc.
-            log_exception(logger, request, e, "PrivacyPolicy UnknownError")
-            return Response(
-                {"error": "Policy failed to generate. Please retry"},
-                status=500
-            )
+            log_exception(logger, request, e, f"{self.log_context} UnknownError")
+            return JsonResponse({"error": "Policy failed to generate. Please retry"}, status=500)
 
-    def get(self, request):
-        """Retrieve all privacy policies for the authenticated user."""
+    async def get(self, request):
+        """Retrieve all policies of this type for the authenticated user."""
         try:
-            user = request.user
-
-            # Get customer record to filter policies by ownership
-            customer = Customer.objects.filter(user=user).first()
+            customer = await Customer.objects.filter(user=request.user).afirst()
 
             # Fetch all policies for this customer, newest first
-            # order_by("-created_at") ensures most recent appears first
-            policies = PrivacyPolicy.objects.filter(customer_linked=customer).order_by("-created_at")
+            policies = self.model.objects.filter(customer_linked=customer).order_by("-created_at")
 
-            # Serialize with nested sections included (via ReadSerializer)
-            serializer = PrivacyPolicyReadSerializer(policies, many=True)
-            return Response(serializer.data, status=200)
+            # nested sections are read by the serializer, which is sync only
+            data = await sync_to_async(lambda: self.read_serializer(policies, many=True).data)()
+            return JsonResponse(data, safe=False, status=200, encoder=DjangoJSONEncoder)
 
         except Exception as e:
-            return Response({"error": "Failed to get the policies"}, status=500)
+            return JsonResponse({"error": "Failed to get the policies"}, status=500)
+
+
+# =============================================================================
+# PRIVACY POLICY VIEWS
+# =============================================================================
+
+class PrivacyPolicyView(AsyncGenerationView):
+    """
+    Generate and retrieve Privacy Policies compliant with Australian Privacy Act 1988.
+
+    POST: Generate a new privacy policy using RAG pipeline
+        - Retrieves relevant legal context (Privacy Act, APPs)
+        - Retrieves industry-specific examples from vector store
+        - Generates structured policy via Gemini with Pydantic validation
+        - Stores policy with nested sections in PostgreSQL
+
+    GET: Retrieve all privacy policies for the authenticated user
+        - Returns policies ordered by creation date (newest first)
+        - Includes all nested sections and subsections
+
+    Endpoints:
+        POST /documents/generate/api/privacypolicy
+        GET /documents/generate/api/privacypolicy
+    """
+    policy_type = "privacy"
+    log_context = "PrivacyPolicy"
+    generate = staticmethod(agenerate_privacy_policy)
+    schema = StructuredPrivacyPolicy
+    create_serializer = PrivacyPolicyCreateSerializer
+    read_serializer = PrivacyPolicyReadSerializer
+    model = PrivacyPolicy
 
 
 # =============================================================================
 # TERMS OF SERVICE VIEWS
 # =============================================================================
 
-class TermsOfServiceView(APIView):
+class TermsOfServiceView(AsyncGenerationView):
     """
     Generate and retrieve Terms of Service compliant with Australian Consumer Law.
 
@@ -187,70 +420,20 @@ class TermsOfServiceView(APIView):
         POST /documents/generate/api/tos
         GET /documents/generate/api/tos
     """
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        """Generate a new Terms of Service using the RAG pipeline."""
-        try:
-            user = request.user
-            data = request.data
-
-            # Link policy to authenticated user's customer account
-            customer = Customer.objects.filter(user=user).first()
-
-            # RAG pipeline: retrieves ACL laws + ToS examples, generates via Gemini
-            # Ensures Australian Consumer Law compliance statements are included
-            generated_policy = generate_terms_of_service(**data)
-
-            # Validate and persist with customer foreign key
-            serializer = TermsOfServiceSerializer(
-                data=generated_policy,
-                context={"customer": customer}
-            )
-            serializer.is_valid(raise_exception=True)
-            saved_obj = serializer.save()
-
-            # Include database ID in response for frontend tracking
-            generated_policy["id"] = saved_obj.id
-            return Response(generated_policy, status=200)
-
-        except IntegrityError as e:
-            # Database constraint violation during save
-            log_exception(logger, request, e, "ToS IntegrityError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except serializers.ValidationError as e:
-            # Schema mismatch between LLM output and expected structure
-            log_exception(logger, request, e, "ToS ValidationError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except Exception as e:
-            # Catch LLM API errors, timeouts, malformed responses
-            log_exception(logger, request, e, "ToS UnknownError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-    def get(self, request):
-        """Retrieve all Terms of Service for the authenticated user."""
-        try:
-            user = request.user
-            customer = Customer.objects.filter(user=user).first()
-
-            # Filter by customer ownership, sort by newest first
-            policies = TermsOfService.objects.filter(customer_linked=customer).order_by('-created_at')
-
-            # ConversionSerializer handles nested ToS sections
-            serializer = TermsOfServiceConversionSerializer(policies, many=True)
-            return Response(serializer.data, status=200)
-
-        except Exception as e:
-            return Response({"error": "Failed to get the policies"}, status=500)
+    policy_type = "tos"
+    log_context = "ToS"
+    generate = staticmethod(agenerate_terms_of_service)
+    schema = StructuredTermsOfService
+    create_serializer = TermsOfServiceSerializer
+    read_serializer = TermsOfServiceConversionSerializer
+    model = TermsOfService
 
 
 # =============================================================================
 # DATA PROCESSING AGREEMENT VIEWS
 # =============================================================================
 
-class DataProcessisingAgreementView(APIView):
+class DataProcessisingAgreementView(AsyncGenerationView):
     """
     Generate and retrieve Data Processing Agreements (DPAs).
 
@@ -265,64 +448,20 @@ class DataProcessisingAgreementView(APIView):
         POST /documents/generate/api/dpa
         GET /documents/generate/api/dpa
     """
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        """Generate a new Data Processing Agreement using the RAG pipeline."""
-        try:
-            user = request.user
-            data = request.data
-            customer = Customer.objects.filter(user=user).first()
-
-            # RAG pipeline generates GDPR-style DPA with:
-            # - Controller/processor definitions
-            # - Security measures and obligations
-            # - Sub-processor management terms
-            # - Annex A (processing details) and Annex B (security measures)
-            generated_policy = generate_data_processing_agreement(**data)
-
-            # Serialize complex nested structure (sections, annexes, sub-processors)
-            serializer = DataProcessingAgreementCreateSerializer(
-                data=generated_policy,
-                context={"customer": customer}
-            )
-            serializer.is_valid(raise_exception=True)
-            saved_obj = serializer.save()
-
-            generated_policy["id"] = saved_obj.id
-            return Response(generated_policy, status=200)
-
-        except IntegrityError as e:
-            log_exception(logger, request, e, "DPA IntegrityError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except serializers.ValidationError as e:
-            log_exception(logger, request, e, "DPA ValidationError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except Exception as e:
-            return log_exception(logger, request, e, "DPA UnknownError")
-
-    def get(self, request):
-        """Retrieve all Data Processing Agreements for the authenticated user."""
-        try:
-            user = request.user
-            customer = Customer.objects.filter(user=user).first()
-
-            # DPAs include complex nested structures (annexes, sub-processors)
-            policies = DataProcessingAgreement.objects.filter(customer_linked=customer).order_by("-created_at")
-            serializer = DataProcessingAgreementReadSerializer(policies, many=True)
-            return Response(serializer.data, status=200)
-
-        except Exception as e:
-            return Response({"error": "Failed to get the policies"}, status=500)
+    policy_type = "dpa"
+    log_context = "DPA"
+    generate = staticmethod(agenerate_data_processing_agreement)
+    schema = StructuredDataProcessingAgreement
+    create_serializer = DataProcessingAgreementCreateSerializer
+    read_serializer = DataProcessingAgreementReadSerializer
+    model = DataProcessingAgreement
 
 
 # =============================================================================
 # ACCEPTABLE USE POLICY VIEWS
 # =============================================================================
 
-class AcceptableUsePolicyView(APIView):
+class AcceptableUsePolicyView(AsyncGenerationView):
     """
     Generate and retrieve Acceptable Use Policies (AUPs).
 
@@ -337,64 +476,20 @@ class AcceptableUsePolicyView(APIView):
         POST /documents/generate/api/aup
         GET /documents/generate/api/aup
     """
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        """Generate a new Acceptable Use Policy using the RAG pipeline."""
-        try:
-            user = request.user
-            data = request.data
-            customer = Customer.objects.filter(user=user).first()
-
-            # RAG pipeline generates AUP covering:
-            # - Permitted and prohibited activities
-            # - Monitoring and enforcement policies
-            # - Violation consequences and appeals
-            # - Abuse reporting mechanisms
-            generated_policy = generate_acceptable_use_policy(**data)
-
-            serializer = AcceptableUsePolicyCreateSerializer(
-                data=generated_policy,
-                context={"customer": customer}
-            )
-            serializer.is_valid(raise_exception=True)
-            saved_obj = serializer.save()
-
-            generated_policy["id"] = saved_obj.id
-            return Response(generated_policy, status=200)
-
-        except IntegrityError as e:
-            log_exception(logger, request, e, "AUP IntegrityError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except serializers.ValidationError as e:
-            log_exception(logger, request, e, "AUP ValidationError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except Exception as e:
-            log_exception(logger, request, e, "AUP UnknownError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-    def get(self, request):
-        """Retrieve all Acceptable Use Policies for the authenticated user."""
-        try:
-            user = request.user
-            customer = Customer.objects.filter(user=user).first()
-
-            # Fetch AUPs with nested sections included
-            policies = AcceptableUsePolicy.objects.filter(customer_linked=customer).order_by("-created_at")
-            serializer = AcceptableUsePolicyReadSerializer(policies, many=True)
-            return Response(serializer.data, status=200)
-
-        except Exception as e:
-            return Response({"error": "Failed to get the policies"}, status=500)
+    policy_type = "aup"
+    log_context = "AUP"
+    generate = staticmethod(agenerate_acceptable_use_policy)
+    schema = StructuredAcceptableUsePolicy
+    create_serializer = AcceptableUsePolicyCreateSerializer
+    read_serializer = AcceptableUsePolicyReadSerializer
+    model = AcceptableUsePolicy
 
 
 # =============================================================================
 # COOKIE POLICY VIEWS
 # =============================================================================
 
-class CookiePolicyView(APIView):
+class CookiePolicyView(AsyncGenerationView):
     """
     Generate and retrieve Cookie Policies compliant with Privacy Act 1988.
 
@@ -410,58 +505,13 @@ class CookiePolicyView(APIView):
         POST /documents/generate/api/cookie
         GET /documents/generate/api/cookie
     """
-    permission_classes = [IsAuthenticated]
-
-    def post(self, request):
-        """Generate a new Cookie Policy using the RAG pipeline."""
-        try:
-            user = request.user
-            data = request.data
-            customer = Customer.objects.filter(user=user).first()
-
-            # RAG pipeline generates cookie policy (800-1500 words) covering:
-            # - Cookie types (essential, analytics, marketing, preferences)
-            # - Purpose and duration of each cookie
-            # - Third-party services and their cookies
-            # - Browser-specific opt-out instructions
-            generated_policy = generate_cookie_policy(**data)
-
-            # Serialize nested structure (sections, third-party services, browser instructions)
-            serializer = CookiePolicyCreateSerializer(
-                data=generated_policy,
-                context={"customer": customer}
-            )
-            serializer.is_valid(raise_exception=True)
-            saved_obj = serializer.save()
-
-            generated_policy["id"] = saved_obj.id
-            return Response(generated_policy, status=200)
-
-        except IntegrityError as e:
-            log_exception(logger, request, e, "CookiePolicy IntegrityError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except serializers.ValidationError as e:
-            log_exception(logger, request, e, "CookiePolicy ValidationError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-        except Exception as e:
-            log_exception(logger, request, e, "CookiePolicy UnknownError")
-            return Response({"error": "Policy failed to generate. Please retry"}, status=500)
-
-    def get(self, request):
-        """Retrieve all Cookie Policies for the authenticated user."""
-        try:
-            user = request.user
-            customer = Customer.objects.filter(user=user).first()
-
-            # Includes nested third-party services and browser instructions
-            policies = CookiePolicy.objects.filter(customer_linked=customer).order_by("-created_at")
-            serializer = CookiePolicyReadSerializer(policies, many=True)
-            return Response(serializer.data, status=200)
-
-        except Exception as e:
-            return Response({"error": "Failed to get the policies"}, status=500)
+    policy_type = "cookie"
+    log_context = "CookiePolicy"
+    generate = staticmethod(agenerate_cookie_policy)
+    schema = StructuredCookiePolicy
+    create_serializer = CookiePolicyCreateSerializer
+    read_serializer = CookiePolicyReadSerializer
+    model = CookiePolicy
 
 
 # =============================================================================
@@ -495,8 +545,11 @@ class PrivacyPolicyDeleteView(APIView):
             # This prevents information disclosure about other users' policies
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        # CASCADE delete removes related sections automatically (via ForeignKey)
-        obj.delete()
+        # CASCADE delete removes related sections automatically (via ForeignKey);
+        # the revision history is not linked by a ForeignKey and is removed here
+        with transaction.atomic():
+            forget_policy(customer, "privacy", obj.id)
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -517,7 +570,9 @@ class TermsOfServiceDeleteView(APIView):
         if not obj:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        obj.delete()
+        with transaction.atomic():
+            forget_policy(customer, "tos", obj.id)
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -538,7 +593,9 @@ class DataProcessingAgreementDeleteView(APIView):
         if not obj:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        obj.delete()
+        with transaction.atomic():
+            forget_policy(customer, "dpa", obj.id)
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -559,7 +616,9 @@ class AcceptableUsePolicyDeleteView(APIView):
         if not obj:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        obj.delete()
+        with transaction.atomic():
+            forget_policy(customer, "aup", obj.id)
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -580,10 +639,374 @@ class CookiePolicyDeleteView(APIView):
         if not obj:
             return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        obj.delete()
+        with transaction.atomic():
+            forget_policy(customer, "cookie", obj.id)
+            obj.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+# =============================================================================
+# SECTION REGENERATION VIEWS
+# Regenerate a single section of an existing policy in place instead of
+# running (and storing) a whole new generation.
+# =============================================================================
+
+def policy_company_details(policy):
+    """
+    Collect the single-value company fields of a stored policy.
+
+    Array fields and audit columns are skipped - the section prompt only needs
+    the company identity and contact details to stay consistent with the
+    rest of the document.
+    """
+    skipped = {"id", "customer_linked", "created_at", "updated_at"}
+    details = {
+        field.name: getattr(policy, field.name)
+        for field in policy._meta.concrete_fields
+        if field.name not in skipped and not isinstance(field, ArrayField)
+    }
+
+    # privacy policies keep their contact details in a OneToOne row
+    contact_info = getattr(policy, "contact_info", None)
+    if isinstance(contact_info, PrivacyPolicyContactInfo):
+        details.update(
+            email=contact_info.email,
+            phone=contact_info.phone,
+            website=contact_info.website,
+        )
+    return details
+
+
+class SectionRegenerateView(GenerationAdmissionMixin, APIView):
+    """
+    Base view for regenerating one section of a policy.
+
+    Subclasses set the policy model, the section model, the foreign key from
+    the section to its policy and the section serializer used to validate and
+    save the regenerated content.
+
+    POST /documents/generate/api/<policy>/<id>/sections/<section_number>
+    Request Body:
+        - instructions: Optional free-text guidance for the rewrite
+    """
+    permission_classes = [IsAuthenticated]
+
+    policy_type = None
+    model = None
+    section_model = None
+    section_parent_field = None
+    section_serializer_class = None
+
+    def post(self, request, id, section_number):
+        """Regenerate the section and update it in place."""
+        user = request.user
+        customer = Customer.objects.filter(user=user).first()
+
+        # ownership check, same as the delete views
+        policy = self.model.objects.filter(id=id, customer_linked=customer).first()
+        if not policy:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        sections = self.section_model.objects.filter(**{self.section_parent_field: policy})
+        section = sections.filter(section_number=section_number).first()
+        if not section:
+            return Response({"error": "Section not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            with track_generation(customer, self.policy_type, operation="section") as usage:
+                usage.policy_id = policy.id
+                regenerated = regenerate_section(
+                    policy_type=self.policy_type,
+                    section_number=section.section_number,
+                    heading=section.heading,
+                    current_content=section.content,
+                    outline=sections.order_by("section_number").values_list("section_number", "heading"),
+                    # the stored input profile is richer than the policy columns
+                    company_details=policy.input_profile or policy_company_details(policy),
+                    instructions=request.data.get("instructions", ""),
+                )
+
+                serializer = self.section_serializer_class(section, data=regenerated)
+                serializer.is_valid(raise_exception=True)
+
+                # nothing is saved for a generation the client gave up on
+                raise_if_cancelled(force=True)
+                with transaction.atomic():
+                    serializer.save()
+                    # bump updated_at so the policy reflects the edit
+                    policy.save(update_fields=["updated_at"])
+                    record_revision(customer, self.policy_type, policy, "section", policy.id)
+
+            return Response(serializer.data, status=200)
+
+        except GenerationCancelled:
+            logger.info(f"{self.model.__name__} section cancelled for user_id={request.user.id}")
+            return Response({"error": "Generation was cancelled"}, status=409)
+
+        except LLMTimeout as e:
+            # the model did not answer within the deadline for this policy type
+            log_exception(logger, request, e, f"{self.model.__name__} section Timeout")
+            return Response({"error": "Section failed to generate in time. Please retry"}, status=504)
+
+        except serializers.ValidationError as e:
+            log_exception(logger, request, e, f"{self.model.__name__} section ValidationError")
+            return Response({"error": "Section failed to generate. Please retry"}, status=500)
+
+        except Exception as e:
+            log_exception(logger, request, e, f"{self.model.__name__} section UnknownError")
+            return Response({"error": "Section failed to generate. Please retry"}, status=500)
+
+
+class PrivacyPolicySectionView(SectionRegenerateView):
+    """POST /documents/generate/api/privacypolicy/<id>/sections/<section_number>"""
+    policy_type = "privacy"
+    model = PrivacyPolicy
+    section_model = PrivacyPolicySection
+    section_parent_field = "policy"
+    section_serializer_class = PrivacyPolicySectionSerializer
+
+
+class TermsOfServiceSectionView(SectionRegenerateView):
+    """POST /documents/generate/api/tos/<id>/sections/<section_number>"""
+    policy_type = "tos"
+    model = TermsOfService
+    section_model = ToSSection
+    section_parent_field = "terms"
+    section_serializer_class = TermsOfServiceSectionSerializer
+
+
+class DataProcessingAgreementSectionView(SectionRegenerateView):
+    """POST /documents/generate/api/dpa/<id>/sections/<section_number>"""
+    policy_type = "dpa"
+    model = DataProcessingAgreement
+    section_model = DPASection
+    section_parent_field = "dpa"
+    section_serializer_class = DPASectionSerializer
+
+
+class AcceptableUsePolicySectionView(SectionRegenerateView):
+    """POST /documents/generate/api/aup/<id>/sections/<section_number>"""
+    policy_type = "aup"
+    model = AcceptableUsePolicy
+    section_model = AUPSection
+    section_parent_field = "policy"
+    section_serializer_class = AUPSectionSerializer
+
+
+class CookiePolicySectionView(SectionRegenerateView):
+    """POST /documents/generate/api/cookie/<id>/sections/<section_number>"""
+    policy_type = "cookie"
+    model = CookiePolicy
+    section_model = CookiePolicySection
+    section_parent_field = "policy"
+    section_serializer_class = CookiePolicySectionSerializer
+
+
+# =============================================================================
+# INCREMENTAL UPDATE VIEWS
+# Diff a changed input profile against the one stored with the policy and
+# re-run only the sections the changed fields feed into.
+# =============================================================================
+
+class PolicyUpdateView(GenerationAdmissionMixin, APIView):
+    """
+    Base view for profile-driven incremental policy updates.
+
+    The request body holds the changed input fields (or the whole profile).
+    It is merged over the profile stored with the policy, the two profiles are
+    diffed and the changes are applied in the cheapest way possible:
+        - identity fields (company name, contact details) are replaced locally
+        - affected sections are regenerated one by one; for a privacy policy,
+          an APP a change triggers that it did not address yet gets a new section
+        - top-level statements the model wrote from a changed input (summary
+          fields) are rewritten with the section chain
+        - a change that maps to no section falls back to a full generation
+
+    The result is saved as a new policy that replaces the previous one; the
+    previous version is kept as a revision of the document (see revisions.py).
+
+    POST /documents/generate/api/<policy>/<id>/update
+    """
+    permission_classes = [IsAuthenticated]
+
+    policy_type = None
+    model = None
+    read_serializer_class = None
+    create_serializer_class = None
+    schema = None
+    generate = None
+
+    def post(self, request, id):
+        """Apply the profile change and save the result as a new revision."""
+        user = request.user
+        customer = Customer.objects.filter(user=user).first()
+
+        policy = self.model.objects.filter(id=id, customer_linked=customer).first()
+        if not policy:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        # policies generated before profiles were stored cannot be diffed
+        if not policy.input_profile:
+            return Response(
+                {"error": "This policy has no stored input profile. Please generate it again."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        old_profile = policy.input_profile
+        new_profile = {**old_profile, **request.data}
+
+        current = dict(self.read_serializer_class(policy).data)
+        plan = plan_update(
+            self.policy_type, old_profile, new_profile, current["sections"], current.get("apps_addressed")
+        )
+
+        if not plan["changed"]:
+            current["changed_fields"] = []
+            return Response(current, status=200)
+
+        try:
+            with track_generation(customer, self.policy_type, operation="update") as usage:
+                if plan["full"]:
+                    updated_policy = self.generate(**new_profile)
+                else:
+                    updated_policy = apply_local_changes(self.policy_type, current, plan, old_profile, new_profile)
+
+                    # a short note so the rewrite reflects exactly what changed
+                    changes = "; ".join(
+                        f"{field}: {old_profile.get(field)!r} -> {new_profile.get(field)!r}"
+                        for field in plan["changed"]
+                    )
+
+                    # an APP the privacy policy did not address yet gets its own section, at the end
+                    new_numbers = set()
+                    for app in plan["new_apps"]:
+                        number = max((s["section_number"] for s in updated_policy["sections"]), default=0) + 1
+                        updated_policy["sections"].append({"section_number": number, "heading": APP_HEADINGS[app], "content": []})
+                        new_numbers.add(number)
+                    outline = [(s["section_number"], s["heading"]) for s in updated_policy["sections"]]
+
+                    for section in updated_policy["sections"]:
+                        is_new = section["section_number"] in new_numbers
+                        if not is_new and section["section_number"] not in plan["sections"]:
+                            continue
+                        section.update(regenerate_section(
+                            policy_type=self.policy_type,
+                            section_number=section["section_number"],
+                            heading=section["heading"],
+                            current_content=section["content"],
+                            outline=outline,
+                            company_details=new_profile,
+                            instructions=(
+                                f"The company profile changed ({changes}). "
+                                + ("Write this new section for it." if is_new else "Update this section to match.")
+                            ),
+                        ))
+
+                    # the model wrote these from the old input; rewrite them the same way
+                    for field in plan["summary"]:
+                        target = SUMMARY_FIELDS[self.policy_type][field]
+                        updated_policy[target] = regenerate_field(
+                            policy_type=self.policy_type,
+                            field=target,
+                            current_values=updated_policy.get(target),
+                            outline=outline,
+                            company_details=new_profile,
+                            instructions=f"The company profile changed ({changes}). Update these statements to match.",
+                        )
+
+                serializer = validated_serializer(
+                    self.create_serializer_class,
+                    updated_policy,
+                    self.schema,
+                    context={"customer": customer}
+                )
+                # nothing is saved for a generation the client gave up on
+                raise_if_cancelled(force=True)
+                saved_obj, revision = save_revision(
+                    serializer, customer, self.policy_type, "update", policy.id, input_profile=new_profile
+                )
+                usage.policy_id = saved_obj.id
+
+            response = self.read_serializer_class(saved_obj).data
+            response["previous_id"] = policy.id
+            response["document_id"] = revision.document_id
+            response["revision"] = revision.number
+            response["changed_fields"] = plan["changed"]
+            response["regenerated_sections"] = "all" if plan["full"] else plan["sections"]
+            return Response(response, status=200)
+
+        except GenerationCancelled:
+            logger.info(f"{self.model.__name__} update cancelled for user_id={request.user.id}")
+            return Response({"error": "Generation was cancelled"}, status=409)
+
+        except IntegrityError as e:
+            log_exception(logger, request, e, f"{self.model.__name__} update IntegrityError")
+            return Response({"error": "Policy failed to update. Please retry"}, status=500)
+
+        except LLMTimeout as e:
+            # the model did not answer within the deadline for this policy type
+            log_exception(logger, request, e, f"{self.model.__name__} update Timeout")
+            return Response({"error": "Policy failed to update in time. Please retry"}, status=504)
+
+        except serializers.ValidationError as e:
+            log_exception(logger, request, e, f"{self.model.__name__} update ValidationError")
+            return Response({"error": "Policy failed to update. Please retry"}, status=500)
+
+        except Exception as e:
+            log_exception(logger, request, e, f"{self.model.__name__} update UnknownError")
+            return Response({"error": "Policy failed to update. Please retry"}, status=500)
+
+
+class PrivacyPolicyUpdateView(PolicyUpdateView):
+    """POST /documents/generate/api/privacypolicy/<id>/update"""
+    policy_type = "privacy"
+    model = PrivacyPolicy
+    read_serializer_class = PrivacyPolicyReadSerializer
+    create_serializer_class = PrivacyPolicyCreateSerializer
+    schema = StructuredPrivacyPolicy
+    generate = staticmethod(generate_privacy_policy)
+
+
+class TermsOfServiceUpdateView(PolicyUpdateView):
+    """POST /documents/generate/api/tos/<id>/update"""
+    policy_type = "tos"
+    model = TermsOfService
+    read_serializer_class = TermsOfServiceConversionSerializer
+    create_serializer_class = TermsOfServiceSerializer
+    schema = StructuredTermsOfService
+    generate = staticmethod(generate_terms_of_service)
+
+
+class DataProcessingAgreementUpdateView(PolicyUpdateView):
+    """POST /documents/generate/api/dpa/<id>/update"""
+    policy_type = "dpa"
+    model = DataProcessingAgreement
+    read_serializer_class = DataProcessingAgreementReadSerializer
+    create_serializer_class = DataProcessingAgreementCreateSerializer
+    schema = StructuredDataProcessingAgreement
+    generate = staticmethod(generate_data_processing_agreement)
+
+
+class AcceptableUsePolicyUpdateView(PolicyUpdateView):
+    """POST /documents/generate/api/aup/<id>/update"""
+    policy_type = "aup"
+    model = AcceptableUsePolicy
+    read_serializer_class = AcceptableUsePolicyReadSerializer
+    create_serializer_class = AcceptableUsePolicyCreateSerializer
+    schema = StructuredAcceptableUsePolicy
+    generate = staticmethod(generate_acceptable_use_policy)
+
+
+class CookiePolicyUpdateView(PolicyUpdateView):
+    """POST /documents/generate/api/cookie/<id>/update"""
+    policy_type = "cookie"
+    model = CookiePolicy
+    read_serializer_class = CookiePolicyReadSerializer
+    create_serializer_class = CookiePolicyCreateSerializer
+    schema = StructuredCookiePolicy
+    generate = staticmethod(generate_cookie_policy)
+
+
 # =============================================================================
 # DASHBOARD VIEW
 # =============================================================================
@@ -703,3 +1126,401 @@ class DashboardView(APIView):
         }
 
         return Response(response, status=200)
+
+
+# =============================================================================
+# USAGE VIEW
+# =============================================================================
+
+class UsageView(APIView):
+    """
+    Token usage and estimated cost of the authenticated user's generations.
+
+    GET /documents/generate/api/usage?days=30
+
+    Query Parameters:
+        - days: Size of the window in days (default 30, max 365)
+
+    Response Structure:
+        {
+            "days": int,
+            "totals": {...},
+            "by_day": [{"day": "YYYY-MM-DD", ...}, ...],
+            "by_policy_type": [{"policy_type": str, "operation": str, ...}, ...]
+        }
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        """Aggregate usage records per day and per policy type."""
+        user = request.user
+        customer = Customer.objects.filter(user=user).first()
+
+        if not customer:
+            return Response({"error": "Customer not found"}, status=404)
+
+        try:
+            days = min(max(int(request.query_params.get("days", 30)), 1), 365)
+        except ValueError:
+            return Response({"error": "days must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        usage = GenerationUsage.objects.filter(
+            customer_linked=customer,
+            created_at__gte=timezone.now() - timedelta(days=days),
+        )
+
+        # same aggregate for every grouping
+        aggregates = {
+            "generations": Count("id"),
+            "failed": Count("id", filter=Q(succeeded=False)),
+            # abandoned by the client (a subset of failed)
+            "cancelled": Count("id", filter=Q(details__cancelled=True)),
+            "input_tokens": Coalesce(Sum("input_tokens"), 0),
+            "output_tokens": Coalesce(Sum("output_tokens"), 0),
+            "embedding_tokens": Coalesce(Sum("embedding_tokens"), 0),
+            "cache_hits": Coalesce(Sum("cache_hits"), 0),
+            "estimated_cost_usd": Coalesce(Sum("estimated_cost_usd"), Decimal("0")),
+            "avg_latency_ms": Avg("latency_ms"),
+        }
+
+        by_day = (
+            usage.annotate(day=TruncDate("created_at"))
+            .values("day")
+            .annotate(**aggregates)
+            .order_by("day")
+        )
+        by_policy_type = (
+            usage.values("policy_type", "operation")
+            .annotate(**aggregates)
+            .order_by("-estimated_cost_usd")
+        )
+
+        response = {
+            "days": days,
+            "totals": usage.aggregate(**aggregates),
+            "by_day": list(by_day),
+            "by_policy_type": list(by_policy_type),
+        }
+        return Response(response, status=200)
+
+
+# =============================================================================
+# GENERATION CANCELLATION
+# =============================================================================
+
+class GenerationCancelView(APIView):
+    """
+    Cancel a running generation of the authenticated user.
+
+    The generation must have been started with an X-Request-ID header; its
+    request then returns 409 and nothing is saved.
+
+    Endpoint:
+        DELETE /documents/generate/api/generations/<request_id>
+    """
+    permission_classes = [IsAuthenticated]
+
+    def delete(self, request, request_id):
+        customer = Customer.objects.filter(user=request.user).first()
+        if customer is None or not request_cancel(customer, request_id):
+            return Response({"error": "No running generation with this request id"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"message": "Generation cancelled"}, status=status.HTTP_202_ACCEPTED)
+
+
+# =============================================================================
+# REVISION HISTORY VIEWS
+# Documents group the generations of one policy; their revisions are stored
+# as snapshots and section-level deltas (see revisions.py).
+# =============================================================================
+
+class PolicyDocumentListView(APIView):
+    """
+    The authenticated user's documents, most recently changed first, without
+    their content.
+
+    GET /documents/generate/api/documents?policy_type=privacy
+
+    Query Parameters:
+        - policy_type: Optional, one of privacy, tos, dpa, aup, cookie
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        customer = Customer.objects.filter(user=request.user).first()
+        documents = PolicyDocument.objects.filter(customer_linked=customer).order_by("-updated_at")
+
+        policy_type = request.query_params.get("policy_type")
+        if policy_type:
+            if policy_type not in POLICY_MODELS:
+                return Response(
+                    {"error": f"policy_type must be one of {', '.join(POLICY_MODELS)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            documents = documents.filter(policy_type=policy_type)
+
+        return Response(list(documents.values(
+            "id", "policy_type", "title", "latest_number", "latest_policy_id", "created_at", "updated_at"
+        )), status=200)
+
+
+class PolicyRevisionListView(APIView):
+    """
+    Revisions of a document, newest first, with what changed in each.
+
+    GET /documents/generate/api/documents/<id>/revisions
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        customer = Customer.objects.filter(user=request.user).first()
+        document = PolicyDocument.objects.filter(id=id, customer_linked=customer).first()
+        if not document:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        revisions = document.revisions.order_by("-number").annotate(base_number=F("base__number")).values(
+            "number", "operation", "policy_id", "changed_fields", "changed_sections",
+            "stored_bytes", "base_number", "created_at",
+        )
+        return Response({
+            "id": document.id,
+            "policy_type": document.policy_type,
+            "title": document.title,
+            # base_number is None for a revision stored as a snapshot
+            "revisions": list(revisions),
+        }, status=200)
+
+
+class PolicyRevisionView(APIView):
+    """
+    The full content of one revision of a document.
+
+    GET /documents/generate/api/documents/<id>/revisions/<number>
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id, number):
+        customer = Customer.objects.filter(user=request.user).first()
+        revision = PolicyRevision.objects.select_related("base", "document").filter(
+            document_id=id, document__customer_linked=customer, number=number
+        ).first()
+        if not revision:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "number": revision.number,
+            "operation": revision.operation,
+            "policy_id": revision.policy_id,
+            "policy_type": revision.document.policy_type,
+            "created_at": revision.created_at,
+            "content": materialize(revision),
+        }, status=200)
+
+
+class PolicyRevisionDiffView(APIView):
+    """
+    Field- and section-level differences between two revisions of a document.
+
+    GET /documents/generate/api/documents/<id>/diff?from=1&to=3
+
+    Query Parameters:
+        - to: Revision number (default: the latest)
+        - from: Revision number (default: the one before `to`)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, id):
+        customer = Customer.objects.filter(user=request.user).first()
+        document = PolicyDocument.objects.filter(id=id, customer_linked=customer).first()
+        if not document:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            to_number = int(request.query_params.get("to", document.latest_number))
+            from_number = int(request.query_params.get("from", to_number - 1))
+        except ValueError:
+            return Response({"error": "from and to must be revision numbers"}, status=status.HTTP_400_BAD_REQUEST)
+
+        revisions = {
+            revision.number: revision
+            for revision in document.revisions.select_related("base").filter(number__in=[from_number, to_number])
+        }
+        if from_number not in revisions or to_number not in revisions:
+            return Response({"error": "Revision not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response({
+            "from": from_number,
+            "to": to_number,
+            **diff_revisions(revisions[from_number], revisions[to_number]),
+        }, status=200)
+
+
+# =============================================================================
+# EXPORT VIEWS
+# PDF/DOCX rendered on the server from the stored policy, and cached per
+# policy version (see export.py).
+# =============================================================================
+
+class PolicyExportView(APIView):
+    """
+    Download a policy as a PDF or DOCX file.
+
+    The file is streamed from the render cache when this version of the
+    policy was exported before, and rendered (then cached) otherwise. The
+    ETag names the version, so a client that sends it back in If-None-Match
+    gets a 304 while the policy is unchanged.
+
+    GET /documents/generate/api/<policy>/<id>/export/<format>
+
+    format is pdf or docx (DRF keeps the ?format= query parameter for
+    content negotiation).
+    """
+    permission_classes = [IsAuthenticated]
+
+    policy_type = None
+
+    def get(self, request, id, fmt):
+        if fmt not in export.FORMATS:
+            return Response({"error": "format must be pdf or docx"}, status=status.HTTP_400_BAD_REQUEST)
+
+        customer = Customer.objects.filter(user=request.user).first()
+        model = POLICY_MODELS[self.policy_type][0]
+        policy = model.objects.filter(id=id, customer_linked=customer).first()
+        if not policy:
+            return Response({"error": "Not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        key = export.cache_key(self.policy_type, policy, fmt)
+        etag = f'"{key}"'
+        if request.headers.get("If-None-Match") == etag:
+            return HttpResponseNotModified(headers={"ETag": etag})
+
+        try:
+            stream, hit = export.open_rendered(self.policy_type, policy, fmt)
+        except Exception as e:
+            log_exception(logger, request, e, f"{model.__name__} export")
+            return Response({"error": "Policy failed to export. Please retry"}, status=500)
+
+        response = FileResponse(
+            stream,
+            as_attachment=True,
+            filename=export.filename(self.policy_type, policy.company_name, fmt),
+            content_type=export.FORMATS[fmt],
+        )
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, no-cache"
+        response["X-Export-Cache"] = "hit" if hit else "miss"
+        return response
+
+
+class PrivacyPolicyExportView(PolicyExportView):
+    """GET /documents/generate/api/privacypolicy/<id>/export/<format>"""
+    policy_type = "privacy"
+
+
+class TermsOfServiceExportView(PolicyExportView):
+    """GET /documents/generate/api/tos/<id>/export/<format>"""
+    policy_type = "tos"
+
+
+class DataProcessingAgreementExportView(PolicyExportView):
+    """GET /documents/generate/api/dpa/<id>/export/<format>"""
+    policy_type = "dpa"
+
+
+class AcceptableUsePolicyExportView(PolicyExportView):
+    """GET /documents/generate/api/aup/<id>/export/<format>"""
+    policy_type = "aup"
+
+
+class CookiePolicyExportView(PolicyExportView):
+    """GET /documents/generate/api/cookie/<id>/export/<format>"""
+    policy_type = "cookie"
+
+
+class BulkExportView(APIView):
+    """
+    Every policy of the authenticated user in one download, for audits.
+
+    GET /documents/generate/api/export/ndjson
+        One JSON object per line: {"policy_type": ..., <fields as the list endpoints return them>}
+    GET /documents/generate/api/export/zip?files=pdf
+        A ZIP with one rendered file per policy (files: pdf or docx)
+
+    The response is streamed while the policies are read, so memory stays
+    flat however many documents there are (see export.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, kind):
+        customer = Customer.objects.filter(user=request.user).first()
+        if not customer:
+            return Response({"error": "Customer not found"}, status=404)
+
+        if kind == "ndjson":
+            chunks, content_type = export.ndjson_lines(customer), "application/x-ndjson"
+        elif kind == "zip":
+            fmt = request.query_params.get("files", "pdf").lower()
+            if fmt not in export.FORMATS:
+                return Response({"error": "files must be pdf or docx"}, status=status.HTTP_400_BAD_REQUEST)
+            chunks, content_type = export.zip_chunks(customer, fmt), "application/zip"
+        else:
+            return Response({"error": "Export must be ndjson or zip"}, status=status.HTTP_404_NOT_FOUND)
+
+        # under ASGI a blocking iterator would be read whole before sending
+        if isinstance(request._request, ASGIRequest):
+            chunks = export.aiterate(chunks)
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="CompliGen_policies_{timezone.now():%Y-%m-%d}.{kind}"'
+        return response
+
+
+class PolicySearchView(APIView):
+    """
+    Full-text search over the section headings and content of the
+    authenticated user's policies, best match first (see search.py).
+
+    GET /documents/generate/api/search?q=refund%20period&policy_type=tos&page=1&page_size=20
+
+    Query Parameters:
+        - q: Required; words, "quoted phrases", or, -excluded words
+        - policy_type: Optional, one of privacy, tos, dpa, aup, cookie
+        - page: Optional, 1-based (default 1)
+        - page_size: Optional, up to 50 (default 20)
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        customer = Customer.objects.filter(user=request.user).first()
+        if not customer:
+            return Response({"error": "Customer not found"}, status=404)
+
+        text = request.query_params.get("q", "").strip()
+        if not text:
+            return Response({"error": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+
+        policy_type = request.query_params.get("policy_type") or None
+        if policy_type is not None and policy_type not in search.POLICY_TYPES:
+            return Response(
+                {"error": f"policy_type must be one of {', '.join(search.POLICY_TYPES)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            page = int(request.query_params.get("page", 1))
+            page_size = int(request.query_params.get("page_size", search.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return Response({"error": "page and page_size must be numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        if page < 1 or not 1 <= page_size <= search.MAX_PAGE_SIZE:
+            return Response(
+                {"error": f"page must be at least 1 and page_size between 1 and {search.MAX_PAGE_SIZE}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        results, has_next = search.search(customer, text, policy_type, page, page_size)
+        return Response({
+            "query": text,
+            "page": page,
+            "page_size": page_size,
+            "has_next": has_next,
+            "results": results,
+        }, status=200)
@@ -32,7 +32,7 @@ const CookiePolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
     }));
   };
 
-  const submitData = async (access_token) => {
+  const submitData = async (access_token, idempotency_key) => {
     try {
       // Convert third_party_services string to array for backend
       const submissionData = {
@@ -48,6 +48,7 @@ const CookiePolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
         headers: {
           "Content-Type": "application/json",
           "Authorization": `Bearer ${access_token}`,
+          "Idempotency-Key": idempotency_key,
         },
         body: JSON.stringify(submissionData)
       });
@@ -64,7 +65,7 @@ const CookiePolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
 
         if (refreshData.access) {
           localStorage.setItem("access_token", refreshData.access);
-          return submitData(refreshData.access); // Recursive call with new token
+          return submitData(refreshData.access, idempotency_key); // Recursive call with new token
         } else {
           throw new Error("Token refresh failed");
         }
@@ -94,7 +95,8 @@ const CookiePolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
     if (onLoadingChange) onLoadingChange(true);
 
     const access_token = localStorage.getItem("access_token");
-    submitData(access_token);
+    // one key per submission: a resent request reuses the running generation
+    submitData(access_token, crypto.randomUUID());
   };
 
   const industryOptions = [
@@ -1,7 +1,6 @@
 import React, { useState, useEffect } from 'react'
 import { useNavigate } from 'react-router-dom'
 import AuthenticatedNavbar from './AuthenticatedNavbar'
-import { generatePDF } from './Pdfgenerator'
 import '../styling/DisplayPolicies.css'
 
 
@@ -181,21 +180,54 @@ const PolicyListBase = ({ policyType, policyConfig, renderContent }) => {
     setPolicyToDelete(null)
   }
 
-    const handleDownload = async (policy) => {
-    console.log("1. handleDownload called")
-    console.log("2. Policy:", policy)
-    console.log("3. Config name:", policyConfig.name)
-    
+  // rendered (and cached) on the server, the browser only saves the file
+  const handleDownload = async (policy, format = 'pdf', access_token = null) => {
+    setDownloading(true)
+    const token = access_token || localStorage.getItem('access_token')
+
     try {
-        console.log("4. About to call generatePDF")
-        await generatePDF(policy, policyConfig.name, formatDate)
-        console.log("5. generatePDF completed")
+      const response = await fetch(
+        `http://127.0.0.1:8000/documents/generate/${policyConfig.endpoint}/${policy.id}/export/${format}`,
+        { headers: { 'Authorization': `Bearer ${token}` } }
+      )
+
+      if (response.status === 401) {
+        const refresh_token = localStorage.getItem('refresh_token')
+        const refreshResponse = refresh_token && await fetch('http://127.0.0.1:8000/api/token/refresh/', {
+          method: 'POST',
+          headers: { 'Content-Type': 'application/json' },
+          body: JSON.stringify({ refresh: refresh_token })
+        })
+
+        if (refreshResponse && refreshResponse.ok) {
+          const refreshData = await refreshResponse.json()
+          localStorage.setItem('access_token', refreshData.access)
+          return handleDownload(policy, format, refreshData.access)
+        }
+        localStorage.removeItem("isAuthenticated")
+        navigate('/login')
+        return
+      }
+
+      if (!response.ok) {
+        throw new Error('Failed to download policy')
+      }
+
+      const url = URL.createObjectURL(await response.blob())
+      const link = document.createElement('a')
+      link.href = url
+      link.download = `${policyConfig.name.replace(/\s+/g, '_')}_${policy.company_name.replace(/\s+/g, '_')}.${format}`
+      document.body.appendChild(link)
+      link.click()
+      document.body.removeChild(link)
+      URL.revokeObjectURL(url)
     } catch (err) {
-        console.error('6. Error in generatePDF:', err)
-        console.error('Error details:', err.message)
-        console.error('Stack:', err.stack)
-    }
+      console.error('Error downloading policy:', err)
+      setError('An error occurred while downloading the policy.')
+    } finally {
+      setDownloading(false)
     }
+  }
 
   const formatDate = (dateString) => {
     if (!dateString) return 'N/A'
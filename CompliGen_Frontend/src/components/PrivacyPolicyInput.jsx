@@ -42,13 +42,14 @@ const PrivacyPolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
     }));
   };
 
-  const submitData = async (access_token) => {
+  const submitData = async (access_token, idempotency_key) => {
     try {
       const response = await fetch(`http://127.0.0.1:8000/documents/generate/api/privacypolicy`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
           "Authorization": `Bearer ${access_token}`,
+          "Idempotency-Key": idempotency_key,
         },
         body: JSON.stringify(formData)
       });
@@ -65,7 +66,7 @@ const PrivacyPolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
 
         if (refreshData.access) {
           localStorage.setItem("access_token", refreshData.access);
-          return submitData(refreshData.access); // Recursive call with new token
+          return submitData(refreshData.access, idempotency_key); // Recursive call with new token
         } else {
           throw new Error("Token refresh failed");
         }
@@ -95,7 +96,8 @@ const PrivacyPolicyInput = ({ onPolicyGenerated, onLoadingChange }) => {
       if (onLoadingChange) onLoadingChange(true);
 
       const access_token = localStorage.getItem("access_token");
-      submitData(access_token);
+      // one key per submission: a resent request reuses the running generation
+      submitData(access_token, crypto.randomUUID());
   };
 
 
@@ -40,13 +40,14 @@ const TosInput = ({ onPolicyGenerated, onLoadingChange }) => {
     }));
   };
 
-  const submitData = async (access_token) => {
+  const submitData = async (access_token, idempotency_key) => {
     try {
       const response = await fetch(`http://127.0.0.1:8000/documents/generate/api/tos`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
           "Authorization": `Bearer ${access_token}`,
+          "Idempotency-Key": idempotency_key,
         },
         body: JSON.stringify(formData)
       });
@@ -63,7 +64,7 @@ const TosInput = ({ onPolicyGenerated, onLoadingChange }) => {
 
         if (refreshData.access) {
           localStorage.setItem("access_token", refreshData.access);
-          return submitData(refreshData.access); // Recursive call with new token
+          return submitData(refreshData.access, idempotency_key); // Recursive call with new token
         } else {
           throw new Error("Token refresh failed");
         }
@@ -93,7 +94,8 @@ const TosInput = ({ onPolicyGenerated, onLoadingChange }) => {
     if (onLoadingChange) onLoadingChange(true);
 
     const access_token = localStorage.getItem("access_token");
-    submitData(access_token);
+    // one key per submission: a resent request reuses the running generation
+    submitData(access_token, crypto.randomUUID());
   };
 
   const industryOptions = [